@@ -16,6 +16,21 @@
 #define DEFAULT_SHORT_BREAK 5 * 60 * 1000   // 5 minutes
 #define DEFAULT_LONG_BREAK 15 * 60 * 1000   // 15 minutes
 
+// Synchronized start: accepted start_at window around millis()
+#define MAX_START_DELAY 60000L  // furthest a start can be armed ahead
+#define MAX_START_SKEW 5000L    // how late a start_at may arrive and still count
+
+// Multicast control channel (packet format: python-cli/ledtomato_cli/multicast.py)
+#define MULTICAST_GROUP 239, 255, 77, 77
+#define MULTICAST_PORT 4210
+#define BEACON_PORT 4211
+#define BEACON_INTERVAL 5000  // ms between status beacons
+#define MULTICAST_KEY_SIZE 16
+
+// Config persistence: changes apply at once, NVS is written once they settle
+#define CONFIG_FLUSH_DELAY 2000       // ms without changes before saving
+#define CONFIG_FLUSH_MAX_DELAY 10000  // longest a change stays unsaved under continuous updates
+
 // LED Animation Settings
 #define BREATHING_SPEED 20  // Lower = faster
 #define BREATHING_MIN_BRIGHTNESS 10
@@ -6,10 +6,13 @@
 #include <Preferences.h>
 #include <ESPmDNS.h>
 #include <Adafruit_NeoPixel.h>
+#include <AsyncUDP.h>
+#include "mbedtls/md.h"
 #include "config.h"
 
 // Global objects
 AsyncWebServer server(80);
+AsyncUDP udp;
 DNSServer dnsServer;
 Preferences preferences;
 Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_GRB + NEO_KHZ800);
@@ -37,7 +40,13 @@ struct PomodoroConfig {
   bool workAnimation = false;
   bool breakAnimation = true;
   uint8_t brightness = LED_BRIGHTNESS;
-} pomodoroConfig;
+};
+
+// Live config the timer and LEDs use; a schedule overrides it while it runs
+PomodoroConfig pomodoroConfig;
+// The user's config: what NVS holds plus changes not flushed yet. Config
+// POSTs update both; savePomodoroConfig() writes only this one
+PomodoroConfig savedConfig;
 
 struct PomodoroTimer {
   PomodoroState state = IDLE;
@@ -45,8 +54,56 @@ struct PomodoroTimer {
   unsigned long duration = 0;
   uint8_t session = 0;
   bool running = false;
+  bool armed = false;            // waiting for a synchronized start at startTime
+  unsigned long startedAt = 0;   // millis() when the session actually began
 } pomodoroTimer;
 
+// Device-side cycle schedule: the client uploads the whole plan once and the
+// device advances sessions by itself (no client round-trips per transition)
+struct PomodoroSchedule {
+  bool active = false;
+  String sequence = "";       // 'W' work, 'S' short break, 'L' long break
+  uint16_t repeat = 0;        // passes over the sequence, 0 = until stopped
+  uint16_t index = 0;         // position in sequence
+  uint16_t round = 0;         // completed passes
+  unsigned long completed = 0;
+} pomodoroSchedule;
+
+// Config changed since the last NVS write; saved by flushPomodoroConfig()
+struct ConfigPersistence {
+  bool dirty = false;
+  unsigned long firstChange = 0;  // millis() of the oldest unsaved change
+  unsigned long lastChange = 0;
+} configPersistence;
+
+// Multicast control channel: one authenticated datagram reaches every device
+#define PACKET_HEADER_SIZE 14
+#define PACKET_TAG_SIZE 8
+#define PACKET_VERSION 1
+#define PACKET_START 1
+#define PACKET_STOP 2
+#define PACKET_CONFIG 3
+#define PACKET_ACK 4
+#define PACKET_BEACON 5
+#define ACK_OK 0
+#define ACK_REJECTED 1
+#define ACK_STALE 2  // from an older controller epoch: not executed
+
+// Replay protection: the packet's session field is the controller's epoch,
+// a counter kept per key that every controller run raises. Commands from an
+// older epoch are never executed, and within the current one each sequence
+// number runs once; the epoch is kept in NVS, so this survives a reboot.
+struct MulticastState {
+  bool enabled = false;
+  bool listening = false;
+  uint8_t key[MULTICAST_KEY_SIZE];
+  uint32_t epoch = 0;         // highest controller epoch seen
+  uint32_t lastSeq = 0;       // last sequence number executed in it
+  uint8_t lastResult = ACK_OK;
+  uint32_t beaconSeq = 0;
+  unsigned long lastBeacon = 0;
+} multicast;
+
 // LED Animation variables
 unsigned long lastAnimationUpdate = 0;
 float breathingPhase = 0;
@@ -61,6 +118,7 @@ void handleRoot(AsyncWebServerRequest *request);
 void handleWiFiConfig(AsyncWebServerRequest *request);
 void handlePomodoroControl(AsyncWebServerRequest *request);
 void handlePomodoroConfig(AsyncWebServerRequest *request);
+void handlePomodoroSchedule(AsyncWebServerRequest *request);
 void handleStatus(AsyncWebServerRequest *request);
 void updateLEDs();
 void breathingAnimation(uint32_t color);
@@ -68,7 +126,22 @@ void solidColor(uint32_t color);
 uint32_t parseColor(String colorStr);
 void savePomodoroConfig();
 void loadPomodoroConfig();
+void markConfigDirty();
+void flushPomodoroConfig(bool force);
 void updatePomodoroTimer();
+void startScheduledSession();
+void endSchedule();
+void startPomodoro(const String &type, unsigned long startAt, unsigned long now);
+void handleMulticast(AsyncWebServerRequest *request);
+void setupMulticast();
+void handleMulticastPacket(AsyncUDPPacket &packet);
+uint8_t executeMulticastCommand(uint8_t type, const uint8_t *payload, uint16_t length);
+void applyConfigParam(PomodoroConfig &config, const String &name, const String &value);
+void applyUserConfigParam(const String &name, const String &value);
+void writeConfigJson(JsonObject json, const PomodoroConfig &config);
+size_t buildPacket(uint8_t *buffer, uint8_t type, uint32_t session, uint32_t seq, const uint8_t *payload, uint16_t length);
+bool computeTag(const uint8_t *data, size_t length, uint8_t *tag);
+void sendBeacon();
 
 void setup() {
   Serial.begin(115200);
@@ -93,6 +166,9 @@ void setup() {
   // Setup web server
   setupWebServer();
   
+  // Listen for fleet commands once a key has been provisioned
+  setupMulticast();
+  
   Serial.println("Setup complete!");
 }
 
@@ -103,8 +179,22 @@ void loop() {
   
   updatePomodoroTimer();
   updateLEDs();
+  flushPomodoroConfig(false);
   
-  delay(50);
+  if (multicast.listening && millis() - multicast.lastBeacon >= BEACON_INTERVAL) {
+    multicast.lastBeacon = millis();
+    sendBeacon();
+  }
+  
+  // Wake up on time for an armed start rather than up to 50 ms late
+  unsigned long pause = 50;
+  if (pomodoroTimer.armed) {
+    long untilStart = (long)(pomodoroTimer.startTime - millis());
+    if (untilStart < (long)pause) {
+      pause = untilStart > 0 ? untilStart : 0;
+    }
+  }
+  delay(pause);
 }
 
 void setupWiFi() {
@@ -173,7 +263,11 @@ void setupRoutes() {
   server.on("/api/pomodoro/stop", HTTP_POST, handlePomodoroControl);
   server.on("/api/pomodoro/config", HTTP_GET, handlePomodoroConfig);
   server.on("/api/pomodoro/config", HTTP_POST, handlePomodoroConfig);
+  server.on("/api/pomodoro/schedule", HTTP_GET, handlePomodoroSchedule);
+  server.on("/api/pomodoro/schedule", HTTP_POST, handlePomodoroSchedule);
   server.on("/api/status", HTTP_GET, handleStatus);
+  server.on("/api/multicast", HTTP_GET, handleMulticast);
+  server.on("/api/multicast", HTTP_POST, handleMulticast);
   
   // CORS headers
   server.onNotFound([](AsyncWebServerRequest *request) {
@@ -267,8 +361,9 @@ void handleWiFiConfig(AsyncWebServerRequest *request) {
     
     request->send(200, "text/html", response);
     
-    // Restart after a delay
+    // Restart after a delay, keeping any config change not yet saved
     delay(1000);
+    flushPomodoroConfig(true);
     ESP.restart();
   } else {
     request->send(400, "text/plain", "Missing parameters");
@@ -286,32 +381,36 @@ void handlePomodoroControl(AsyncWebServerRequest *request) {
   DynamicJsonDocument doc(1024);
   
   if (action == "start") {
-    if (request->hasParam("type", true)) {
-      String type = request->getParam("type", true)->value();
-      
-      pomodoroTimer.running = true;
-      pomodoroTimer.startTime = millis();
-      
-      if (type == "work") {
-        pomodoroTimer.state = WORKING;
-        pomodoroTimer.duration = pomodoroConfig.workTime;
-      } else if (type == "short_break") {
-        pomodoroTimer.state = SHORT_BREAK;
-        pomodoroTimer.duration = pomodoroConfig.shortBreakTime;
-      } else if (type == "long_break") {
-        pomodoroTimer.state = LONG_BREAK;
-        pomodoroTimer.duration = pomodoroConfig.longBreakTime;
-      }
+    unsigned long now = millis();
+    unsigned long startAt = now;
+    bool startAtValid = true;
+    if (request->hasParam("start_at", true)) {
+      // Synchronized start at a device-monotonic instant (see "uptime" in /api/status)
+      startAt = strtoul(request->getParam("start_at", true)->value().c_str(), NULL, 10);
+      long offset = (long)(startAt - now);
+      startAtValid = offset >= -MAX_START_SKEW && offset <= MAX_START_DELAY;
+    }
+    
+    if (!startAtValid) {
+      doc["success"] = false;
+      doc["message"] = "start_at out of range";
+    } else if (request->hasParam("type", true)) {
+      startPomodoro(request->getParam("type", true)->value(), startAt, now);
       
       doc["success"] = true;
-      doc["message"] = "Pomodoro started";
+      doc["message"] = pomodoroTimer.armed ? "Pomodoro armed" : "Pomodoro started";
+      doc["startAt"] = startAt;
     } else {
       doc["success"] = false;
       doc["message"] = "Missing type parameter";
     }
   } else if (action == "stop") {
     pomodoroTimer.running = false;
+    pomodoroTimer.armed = false;
     pomodoroTimer.state = IDLE;
+    if (pomodoroSchedule.active) {
+      endSchedule();
+    }
     doc["success"] = true;
     doc["message"] = "Pomodoro stopped";
   }
@@ -324,48 +423,53 @@ void handlePomodoroControl(AsyncWebServerRequest *request) {
   request->send(resp);
 }
 
+void startPomodoro(const String &type, unsigned long startAt, unsigned long now) {
+  // A manual start takes over from any uploaded schedule
+  if (pomodoroSchedule.active) {
+    endSchedule();
+  }
+  
+  // A start_at in the future arms the timer; updatePomodoroTimer() fires it.
+  // One slightly in the past still counts elapsed time from start_at.
+  pomodoroTimer.armed = (long)(startAt - now) > 0;
+  pomodoroTimer.running = !pomodoroTimer.armed;
+  pomodoroTimer.startTime = startAt;
+  pomodoroTimer.startedAt = now;
+  
+  if (type == "work") {
+    pomodoroTimer.state = WORKING;
+    pomodoroTimer.duration = pomodoroConfig.workTime;
+  } else if (type == "short_break") {
+    pomodoroTimer.state = SHORT_BREAK;
+    pomodoroTimer.duration = pomodoroConfig.shortBreakTime;
+  } else if (type == "long_break") {
+    pomodoroTimer.state = LONG_BREAK;
+    pomodoroTimer.duration = pomodoroConfig.longBreakTime;
+  }
+}
+
 void handlePomodoroConfig(AsyncWebServerRequest *request) {
   DynamicJsonDocument doc(1024);
   
   if (request->method() == HTTP_GET) {
-    // Return current configuration
-    doc["workTime"] = pomodoroConfig.workTime / 1000;
-    doc["shortBreakTime"] = pomodoroConfig.shortBreakTime / 1000;
-    doc["longBreakTime"] = pomodoroConfig.longBreakTime / 1000;
-    doc["workColor"] = String(pomodoroConfig.workColor, HEX);
-    doc["breakColor"] = String(pomodoroConfig.breakColor, HEX);
-    doc["workAnimation"] = pomodoroConfig.workAnimation;
-    doc["breakAnimation"] = pomodoroConfig.breakAnimation;
-    doc["brightness"] = pomodoroConfig.brightness;
+    // The user's configuration, which a client may read, modify and POST
+    // back; a running schedule's overrides are reported apart from it
+    writeConfigJson(doc.to<JsonObject>(), savedConfig);
+    if (pomodoroSchedule.active) {
+      writeConfigJson(doc.createNestedObject("schedule"), pomodoroConfig);
+    }
   } else if (request->method() == HTTP_POST) {
     // Update configuration
-    if (request->hasParam("workTime", true)) {
-      pomodoroConfig.workTime = request->getParam("workTime", true)->value().toInt() * 1000;
-    }
-    if (request->hasParam("shortBreakTime", true)) {
-      pomodoroConfig.shortBreakTime = request->getParam("shortBreakTime", true)->value().toInt() * 1000;
-    }
-    if (request->hasParam("longBreakTime", true)) {
-      pomodoroConfig.longBreakTime = request->getParam("longBreakTime", true)->value().toInt() * 1000;
-    }
-    if (request->hasParam("workColor", true)) {
-      pomodoroConfig.workColor = parseColor(request->getParam("workColor", true)->value());
-    }
-    if (request->hasParam("breakColor", true)) {
-      pomodoroConfig.breakColor = parseColor(request->getParam("breakColor", true)->value());
-    }
-    if (request->hasParam("workAnimation", true)) {
-      pomodoroConfig.workAnimation = request->getParam("workAnimation", true)->value() == "true";
-    }
-    if (request->hasParam("breakAnimation", true)) {
-      pomodoroConfig.breakAnimation = request->getParam("breakAnimation", true)->value() == "true";
-    }
-    if (request->hasParam("brightness", true)) {
-      pomodoroConfig.brightness = request->getParam("brightness", true)->value().toInt();
-      strip.setBrightness(pomodoroConfig.brightness);
+    static const char *params[] = {"workTime", "shortBreakTime", "longBreakTime", "workColor",
+                                   "breakColor", "workAnimation", "breakAnimation", "brightness"};
+    for (const char *name : params) {
+      if (request->hasParam(name, true)) {
+        applyUserConfigParam(name, request->getParam(name, true)->value());
+      }
     }
     
-    savePomodoroConfig();
+    // Applied live above; the flash write waits until changes stop coming
+    markConfigDirty();
     doc["success"] = true;
     doc["message"] = "Configuration updated";
   }
@@ -378,21 +482,105 @@ void handlePomodoroConfig(AsyncWebServerRequest *request) {
   request->send(resp);
 }
 
+void writeConfigJson(JsonObject json, const PomodoroConfig &config) {
+  json["workTime"] = config.workTime / 1000;
+  json["shortBreakTime"] = config.shortBreakTime / 1000;
+  json["longBreakTime"] = config.longBreakTime / 1000;
+  json["workColor"] = String(config.workColor, HEX);
+  json["breakColor"] = String(config.breakColor, HEX);
+  json["workAnimation"] = config.workAnimation;
+  json["breakAnimation"] = config.breakAnimation;
+  json["brightness"] = config.brightness;
+}
+
+void handlePomodoroSchedule(AsyncWebServerRequest *request) {
+  DynamicJsonDocument doc(1024);
+  int status = 200;
+  
+  if (request->method() == HTTP_POST) {
+    String sequence = request->hasParam("sequence", true) ? request->getParam("sequence", true)->value() : "";
+    bool valid = sequence.length() > 0 && sequence.length() <= 64;
+    for (unsigned int i = 0; valid && i < sequence.length(); i++) {
+      char c = sequence.charAt(i);
+      valid = (c == 'W' || c == 'S' || c == 'L');
+    }
+    
+    if (!valid) {
+      status = 400;
+      doc["success"] = false;
+      doc["message"] = "Invalid sequence";
+    } else {
+      // Save pending config changes first: from here on the live config
+      // holds the schedule's overrides, which never reach NVS
+      flushPomodoroConfig(true);
+      static const char *params[] = {"workTime", "shortBreakTime", "longBreakTime", "workColor",
+                                     "breakColor", "workAnimation", "breakAnimation"};
+      for (const char *name : params) {
+        if (request->hasParam(name, true)) {
+          applyConfigParam(pomodoroConfig, name, request->getParam(name, true)->value());
+        }
+      }
+      
+      pomodoroSchedule.sequence = sequence;
+      pomodoroSchedule.repeat = request->hasParam("repeat", true) ? request->getParam("repeat", true)->value().toInt() : 0;
+      pomodoroSchedule.index = 0;
+      pomodoroSchedule.round = 0;
+      pomodoroSchedule.completed = 0;
+      pomodoroSchedule.active = true;
+      startScheduledSession();
+      
+      doc["success"] = true;
+      doc["message"] = "Schedule started";
+    }
+  } else {
+    doc["active"] = pomodoroSchedule.active;
+    doc["sequence"] = pomodoroSchedule.sequence;
+    doc["repeat"] = pomodoroSchedule.repeat;
+    doc["index"] = pomodoroSchedule.index;
+    doc["round"] = pomodoroSchedule.round;
+    doc["completed"] = pomodoroSchedule.completed;
+  }
+  
+  String response;
+  serializeJson(doc, response);
+  
+  AsyncWebServerResponse *resp = request->beginResponse(status, "application/json", response);
+  resp->addHeader("Access-Control-Allow-Origin", "*");
+  request->send(resp);
+}
+
 void handleStatus(AsyncWebServerRequest *request) {
   DynamicJsonDocument doc(1024);
   
   doc["wifiConnected"] = wifiConnected;
   doc["ipAddress"] = wifiConnected ? WiFi.localIP().toString() : WiFi.softAPIP().toString();
   doc["hostname"] = HOSTNAME;
+  doc["mac"] = WiFi.macAddress();
+  // Device-monotonic clock, for client offset estimation and start_at
+  doc["uptime"] = millis();
   doc["pomodoro"]["state"] = pomodoroTimer.state;
   doc["pomodoro"]["running"] = pomodoroTimer.running;
   
+  if (pomodoroTimer.armed) {
+    doc["pomodoro"]["armed"] = true;
+    doc["pomodoro"]["startAt"] = pomodoroTimer.startTime;
+  }
+  
   if (pomodoroTimer.running) {
     unsigned long elapsed = millis() - pomodoroTimer.startTime;
     unsigned long remaining = pomodoroTimer.duration > elapsed ? pomodoroTimer.duration - elapsed : 0;
     doc["pomodoro"]["remaining"] = remaining / 1000;
     doc["pomodoro"]["elapsed"] = elapsed / 1000;
     doc["pomodoro"]["duration"] = pomodoroTimer.duration / 1000;
+    doc["pomodoro"]["startedAt"] = pomodoroTimer.startedAt;
+  }
+  
+  if (pomodoroSchedule.active) {
+    doc["schedule"]["active"] = true;
+    doc["schedule"]["index"] = pomodoroSchedule.index;
+    doc["schedule"]["length"] = pomodoroSchedule.sequence.length();
+    doc["schedule"]["round"] = pomodoroSchedule.round;
+    doc["schedule"]["completed"] = pomodoroSchedule.completed;
   }
   
   String response;
@@ -491,30 +679,61 @@ uint32_t parseColor(String colorStr) {
 }
 
 void savePomodoroConfig() {
-  preferences.putULong("workTime", pomodoroConfig.workTime);
-  preferences.putULong("shortBreak", pomodoroConfig.shortBreakTime);
-  preferences.putULong("longBreak", pomodoroConfig.longBreakTime);
-  preferences.putULong("workColor", pomodoroConfig.workColor);
-  preferences.putULong("breakColor", pomodoroConfig.breakColor);
-  preferences.putBool("workAnim", pomodoroConfig.workAnimation);
-  preferences.putBool("breakAnim", pomodoroConfig.breakAnimation);
-  preferences.putUChar("brightness", pomodoroConfig.brightness);
+  preferences.putULong("workTime", savedConfig.workTime);
+  preferences.putULong("shortBreak", savedConfig.shortBreakTime);
+  preferences.putULong("longBreak", savedConfig.longBreakTime);
+  preferences.putULong("workColor", savedConfig.workColor);
+  preferences.putULong("breakColor", savedConfig.breakColor);
+  preferences.putBool("workAnim", savedConfig.workAnimation);
+  preferences.putBool("breakAnim", savedConfig.breakAnimation);
+  preferences.putUChar("brightness", savedConfig.brightness);
+}
+
+void markConfigDirty() {
+  unsigned long now = millis();
+  if (!configPersistence.dirty) {
+    configPersistence.dirty = true;
+    configPersistence.firstChange = now;
+  }
+  configPersistence.lastChange = now;
+}
+
+void flushPomodoroConfig(bool force) {
+  // A slider or scripted fade sends many changes a second; write NVS once
+  // they have settled, or at the latest CONFIG_FLUSH_MAX_DELAY after the first
+  if (!configPersistence.dirty) {
+    return;
+  }
+  unsigned long now = millis();
+  if (force || now - configPersistence.lastChange >= CONFIG_FLUSH_DELAY ||
+      now - configPersistence.firstChange >= CONFIG_FLUSH_MAX_DELAY) {
+    savePomodoroConfig();
+    configPersistence.dirty = false;
+  }
 }
 
 void loadPomodoroConfig() {
-  pomodoroConfig.workTime = preferences.getULong("workTime", DEFAULT_WORK_TIME);
-  pomodoroConfig.shortBreakTime = preferences.getULong("shortBreak", DEFAULT_SHORT_BREAK);
-  pomodoroConfig.longBreakTime = preferences.getULong("longBreak", DEFAULT_LONG_BREAK);
-  pomodoroConfig.workColor = preferences.getULong("workColor", strip.Color(255, 0, 0));
-  pomodoroConfig.breakColor = preferences.getULong("breakColor", strip.Color(0, 255, 0));
-  pomodoroConfig.workAnimation = preferences.getBool("workAnim", false);
-  pomodoroConfig.breakAnimation = preferences.getBool("breakAnim", true);
-  pomodoroConfig.brightness = preferences.getUChar("brightness", LED_BRIGHTNESS);
+  savedConfig.workTime = preferences.getULong("workTime", DEFAULT_WORK_TIME);
+  savedConfig.shortBreakTime = preferences.getULong("shortBreak", DEFAULT_SHORT_BREAK);
+  savedConfig.longBreakTime = preferences.getULong("longBreak", DEFAULT_LONG_BREAK);
+  savedConfig.workColor = preferences.getULong("workColor", strip.Color(255, 0, 0));
+  savedConfig.breakColor = preferences.getULong("breakColor", strip.Color(0, 255, 0));
+  savedConfig.workAnimation = preferences.getBool("workAnim", false);
+  savedConfig.breakAnimation = preferences.getBool("breakAnim", true);
+  savedConfig.brightness = preferences.getUChar("brightness", LED_BRIGHTNESS);
+  pomodoroConfig = savedConfig;
   
   strip.setBrightness(pomodoroConfig.brightness);
 }
 
 void updatePomodoroTimer() {
+  if (pomodoroTimer.armed && (long)(millis() - pomodoroTimer.startTime) >= 0) {
+    // Synchronized start: begin at the shared instant
+    pomodoroTimer.armed = false;
+    pomodoroTimer.running = true;
+    pomodoroTimer.startedAt = millis();
+  }
+  
   if (pomodoroTimer.running) {
     unsigned long elapsed = millis() - pomodoroTimer.startTime;
     
@@ -530,6 +749,296 @@ void updatePomodoroTimer() {
         solidColor(strip.Color(0, 0, 0));
         delay(200);
       }
+      
+      // Advance the uploaded schedule without waiting for the client
+      if (pomodoroSchedule.active) {
+        pomodoroSchedule.completed++;
+        pomodoroSchedule.index++;
+        if (pomodoroSchedule.index >= pomodoroSchedule.sequence.length()) {
+          pomodoroSchedule.index = 0;
+          pomodoroSchedule.round++;
+        }
+        
+        if (pomodoroSchedule.repeat > 0 && pomodoroSchedule.round >= pomodoroSchedule.repeat) {
+          endSchedule();
+        } else {
+          startScheduledSession();
+        }
+      }
     }
   }
 }
+
+void startScheduledSession() {
+  char code = pomodoroSchedule.sequence.charAt(pomodoroSchedule.index);
+  
+  pomodoroTimer.running = true;
+  pomodoroTimer.armed = false;
+  pomodoroTimer.startTime = millis();
+  pomodoroTimer.startedAt = pomodoroTimer.startTime;
+  
+  if (code == 'W') {
+    pomodoroTimer.state = WORKING;
+    pomodoroTimer.duration = pomodoroConfig.workTime;
+  } else if (code == 'S') {
+    pomodoroTimer.state = SHORT_BREAK;
+    pomodoroTimer.duration = pomodoroConfig.shortBreakTime;
+  } else {
+    pomodoroTimer.state = LONG_BREAK;
+    pomodoroTimer.duration = pomodoroConfig.longBreakTime;
+  }
+}
+
+void endSchedule() {
+  pomodoroSchedule.active = false;
+  // Drop the schedule's live overrides and go back to the user's config,
+  // including changes made during the schedule that are not flushed yet
+  pomodoroConfig = savedConfig;
+  strip.setBrightness(pomodoroConfig.brightness);
+}
+
+void handleMulticast(AsyncWebServerRequest *request) {
+  DynamicJsonDocument doc(512);
+  int status = 200;
+  
+  if (request->method() == HTTP_POST) {
+    String key = request->hasParam("key", true) ? request->getParam("key", true)->value() : "";
+    bool valid = key.length() == MULTICAST_KEY_SIZE * 2;
+    for (unsigned int i = 0; valid && i < key.length(); i++) {
+      valid = isHexadecimalDigit(key.charAt(i));
+    }
+    
+    if (!valid) {
+      status = 400;
+      doc["success"] = false;
+      doc["message"] = "Invalid key";
+    } else {
+      for (int i = 0; i < MULTICAST_KEY_SIZE; i++) {
+        multicast.key[i] = strtoul(key.substring(i * 2, i * 2 + 2).c_str(), NULL, 16);
+      }
+      preferences.putBytes("mcKey", multicast.key, MULTICAST_KEY_SIZE);
+      // Epochs count per key
+      multicast.epoch = 0;
+      multicast.lastSeq = 0;
+      preferences.putULong("mcEpoch", 0);
+      multicast.enabled = true;
+      setupMulticast();
+      doc["success"] = true;
+      doc["message"] = "Multicast key saved";
+    }
+  } else {
+    doc["enabled"] = multicast.enabled;
+    doc["mac"] = WiFi.macAddress();
+    doc["group"] = IPAddress(MULTICAST_GROUP).toString();
+    doc["port"] = MULTICAST_PORT;
+  }
+  
+  String response;
+  serializeJson(doc, response);
+  
+  AsyncWebServerResponse *resp = request->beginResponse(status, "application/json", response);
+  resp->addHeader("Access-Control-Allow-Origin", "*");
+  request->send(resp);
+}
+
+void setupMulticast() {
+  if (!multicast.enabled) {
+    multicast.enabled = preferences.getBytes("mcKey", multicast.key, MULTICAST_KEY_SIZE) == MULTICAST_KEY_SIZE;
+    multicast.epoch = preferences.getULong("mcEpoch", 0);
+  }
+  if (!multicast.enabled || multicast.listening || !wifiConnected) {
+    return;
+  }
+  
+  if (udp.listenMulticast(IPAddress(MULTICAST_GROUP), MULTICAST_PORT)) {
+    multicast.listening = true;
+    udp.onPacket(handleMulticastPacket);
+    Serial.println("Multicast control channel listening");
+  }
+}
+
+static uint32_t readU32(const uint8_t *data) {
+  return (uint32_t)data[0] | ((uint32_t)data[1] << 8) | ((uint32_t)data[2] << 16) | ((uint32_t)data[3] << 24);
+}
+
+static void writeU32(uint8_t *data, uint32_t value) {
+  for (int i = 0; i < 4; i++) {
+    data[i] = (value >> (8 * i)) & 0xFF;
+  }
+}
+
+bool computeTag(const uint8_t *data, size_t length, uint8_t *tag) {
+  uint8_t digest[32];
+  const mbedtls_md_info_t *info = mbedtls_md_info_from_type(MBEDTLS_MD_SHA256);
+  if (mbedtls_md_hmac(info, multicast.key, MULTICAST_KEY_SIZE, data, length, digest) != 0) {
+    return false;
+  }
+  memcpy(tag, digest, PACKET_TAG_SIZE);
+  return true;
+}
+
+size_t buildPacket(uint8_t *buffer, uint8_t type, uint32_t session, uint32_t seq, const uint8_t *payload, uint16_t length) {
+  buffer[0] = 'L';
+  buffer[1] = 'T';
+  buffer[2] = PACKET_VERSION;
+  buffer[3] = type;
+  writeU32(buffer + 4, session);
+  writeU32(buffer + 8, seq);
+  buffer[12] = length & 0xFF;
+  buffer[13] = length >> 8;
+  memcpy(buffer + PACKET_HEADER_SIZE, payload, length);
+  computeTag(buffer, PACKET_HEADER_SIZE + length, buffer + PACKET_HEADER_SIZE + length);
+  return PACKET_HEADER_SIZE + length + PACKET_TAG_SIZE;
+}
+
+void handleMulticastPacket(AsyncUDPPacket &packet) {
+  const uint8_t *data = packet.data();
+  size_t length = packet.length();
+  if (length < PACKET_HEADER_SIZE + PACKET_TAG_SIZE || data[0] != 'L' || data[1] != 'T' || data[2] != PACKET_VERSION) {
+    return;
+  }
+  uint16_t payloadLength = data[12] | (data[13] << 8);
+  if (length != PACKET_HEADER_SIZE + payloadLength + PACKET_TAG_SIZE) {
+    return;
+  }
+  uint8_t type = data[3];
+  if (type != PACKET_START && type != PACKET_STOP && type != PACKET_CONFIG) {
+    return;  // beacons and ACKs from other devices
+  }
+  
+  // Constant-time tag comparison
+  uint8_t tag[PACKET_TAG_SIZE];
+  if (!computeTag(data, PACKET_HEADER_SIZE + payloadLength, tag)) {
+    return;
+  }
+  uint8_t diff = 0;
+  for (int i = 0; i < PACKET_TAG_SIZE; i++) {
+    diff |= tag[i] ^ data[PACKET_HEADER_SIZE + payloadLength + i];
+  }
+  if (diff != 0) {
+    return;
+  }
+  
+  uint32_t session = readU32(data + 4);
+  uint32_t seq = readU32(data + 8);
+  uint8_t result;
+  if (session < multicast.epoch) {
+    // An older controller run, or a replay of one
+    result = ACK_STALE;
+  } else if (session == multicast.epoch && (long)(seq - multicast.lastSeq) <= 0) {
+    // Retransmission of a command already executed: acknowledge again
+    result = multicast.lastResult;
+  } else {
+    if (session > multicast.epoch) {
+      multicast.epoch = session;
+      preferences.putULong("mcEpoch", session);
+    }
+    result = executeMulticastCommand(type, data + PACKET_HEADER_SIZE, payloadLength);
+    multicast.lastSeq = seq;
+    multicast.lastResult = result;
+  }
+  
+  // ACK by unicast: MAC, result and the device's epoch (to resync a stale controller)
+  uint8_t payload[11];
+  WiFi.macAddress(payload);
+  payload[6] = result;
+  writeU32(payload + 7, multicast.epoch);
+  uint8_t ack[PACKET_HEADER_SIZE + sizeof(payload) + PACKET_TAG_SIZE];
+  size_t ackLength = buildPacket(ack, PACKET_ACK, session, seq, payload, sizeof(payload));
+  packet.write(ack, ackLength);
+}
+
+uint8_t executeMulticastCommand(uint8_t type, const uint8_t *payload, uint16_t length) {
+  if (type == PACKET_START) {
+    static const char *types[] = {"work", "short_break", "long_break"};
+    if (length < 1 || payload[0] > 2) {
+      return ACK_REJECTED;
+    }
+    unsigned long now = millis();
+    startPomodoro(types[payload[0]], now, now);
+  } else if (type == PACKET_STOP) {
+    pomodoroTimer.running = false;
+    pomodoroTimer.armed = false;
+    pomodoroTimer.state = IDLE;
+    if (pomodoroSchedule.active) {
+      endSchedule();
+    }
+  } else {
+    // Same form body as POST /api/pomodoro/config
+    String form = "";
+    for (uint16_t i = 0; i < length; i++) {
+      form += (char)payload[i];
+    }
+    int start = 0;
+    while (start < (int)form.length()) {
+      int end = form.indexOf('&', start);
+      if (end < 0) {
+        end = form.length();
+      }
+      String pair = form.substring(start, end);
+      int equals = pair.indexOf('=');
+      if (equals > 0) {
+        applyUserConfigParam(pair.substring(0, equals), pair.substring(equals + 1));
+      }
+      start = end + 1;
+    }
+    markConfigDirty();
+  }
+  return ACK_OK;
+}
+
+void applyConfigParam(PomodoroConfig &config, const String &name, const String &value) {
+  if (name == "workTime") {
+    config.workTime = value.toInt() * 1000;
+  } else if (name == "shortBreakTime") {
+    config.shortBreakTime = value.toInt() * 1000;
+  } else if (name == "longBreakTime") {
+    config.longBreakTime = value.toInt() * 1000;
+  } else if (name == "workColor") {
+    config.workColor = parseColor(value);
+  } else if (name == "breakColor") {
+    config.breakColor = parseColor(value);
+  } else if (name == "workAnimation") {
+    config.workAnimation = value == "true";
+  } else if (name == "breakAnimation") {
+    config.breakAnimation = value == "true";
+  } else if (name == "brightness") {
+    config.brightness = value.toInt();
+  }
+}
+
+void applyUserConfigParam(const String &name, const String &value) {
+  // A user change applies live at once and is saved by the next flush
+  applyConfigParam(savedConfig, name, value);
+  applyConfigParam(pomodoroConfig, name, value);
+  if (name == "brightness" && strip.getBrightness() != pomodoroConfig.brightness) {
+    strip.setBrightness(pomodoroConfig.brightness);
+  }
+}
+
+void sendBeacon() {
+  // MAC, IPv4, HTTP port, state, flags, remaining s, uptime, completed sessions
+  uint8_t payload[24];
+  WiFi.macAddress(payload);
+  IPAddress ip = WiFi.localIP();
+  for (int i = 0; i < 4; i++) {
+    payload[6 + i] = ip[i];
+  }
+  payload[10] = 80;
+  payload[11] = 0;
+  payload[12] = pomodoroTimer.state;
+  payload[13] = (pomodoroTimer.running ? 0x01 : 0) | (pomodoroTimer.armed ? 0x02 : 0) | (pomodoroSchedule.active ? 0x04 : 0);
+  unsigned long remaining = 0;
+  if (pomodoroTimer.running) {
+    unsigned long elapsed = millis() - pomodoroTimer.startTime;
+    remaining = pomodoroTimer.duration > elapsed ? (pomodoroTimer.duration - elapsed) / 1000 : 0;
+  }
+  writeU32(payload + 14, remaining);
+  writeU32(payload + 18, millis());
+  payload[22] = pomodoroSchedule.completed & 0xFF;
+  payload[23] = (pomodoroSchedule.completed >> 8) & 0xFF;
+  
+  uint8_t beacon[PACKET_HEADER_SIZE + sizeof(payload) + PACKET_TAG_SIZE];
+  size_t length = buildPacket(beacon, PACKET_BEACON, 0, ++multicast.beaconSeq, payload, sizeof(payload));
+  udp.writeTo(beacon, length, IPAddress(MULTICAST_GROUP), BEACON_PORT);
+}
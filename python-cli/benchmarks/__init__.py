@@ -0,0 +1,11 @@
+"""Performance benchmarks for the LED Tomato CLI
+
+Scenarios run against the in-process device emulator, so results do not
+depend on hardware or WiFi. Run from the ``python-cli`` directory::
+
+    python -m benchmarks --quick -o results.json
+    python -m benchmarks --compare results.json
+
+See ``python -m benchmarks --help`` for scenario selection and network
+conditions.
+"""
@@ -0,0 +1,80 @@
+"""Benchmark runner"""
+
+import asyncio
+import inspect
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+import click
+
+from ledtomato_cli.emulator import NetworkConditions
+
+from .harness import Results, compare, load_results
+from .scenarios import SCENARIOS, BenchContext
+
+
+def _format_value(value: Optional[float], unit: str) -> str:
+    if value is None:
+        return "-"
+    return f"{value:,.3f} {unit}" if value < 100 else f"{value:,.1f} {unit}"
+
+
+@click.command()
+@click.argument('scenarios', nargs=-1, type=click.Choice(sorted(SCENARIOS)))
+@click.option('--quick', is_flag=True, help='Skip the largest sizes (/16 scan, 1000 devices, 10M entries)')
+@click.option('--repeat', default=1, show_default=True, help='Multiply iterations per scenario')
+@click.option('--latency', default=0.0, show_default=True, help='Emulated device latency (ms)')
+@click.option('--jitter', default=0.0, show_default=True, help='Emulated latency jitter (ms)')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, path_type=Path),
+              help='Write results JSON (use as a future baseline)')
+@click.option('--compare', 'baseline', type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help='Compare against a saved results file')
+@click.option('--threshold', default=0.10, show_default=True,
+              help='Relative change counted as a regression or improvement')
+@click.option('--fixtures', type=click.Path(file_okay=False, path_type=Path),
+              default=Path(tempfile.gettempdir()) / 'ledtomato-bench', show_default=True,
+              help='Cache directory for generated session logs')
+def main(scenarios: Tuple[str, ...], quick: bool, repeat: int, latency: float, jitter: float,
+         output: Optional[Path], baseline: Optional[Path], threshold: float, fixtures: Path) -> None:
+    """🍅 Benchmark client, discovery, monitoring and stats hot paths"""
+    results = Results(quick=quick, settings={
+        'repeat': repeat, 'latency_ms': latency, 'jitter_ms': jitter,
+        'scenarios': list(scenarios or sorted(SCENARIOS)),
+    })
+    ctx = BenchContext(
+        results=results,
+        quick=quick,
+        repeat=repeat,
+        conditions=NetworkConditions(latency_ms=latency, jitter_ms=jitter),
+        fixtures_dir=fixtures,
+    )
+
+    for name in scenarios or sorted(SCENARIOS):
+        func = SCENARIOS[name]
+        click.echo(f"🍅 {name}: {inspect.getdoc(func).splitlines()[0]}", err=True)
+        outcome = func(ctx)
+        if inspect.isawaitable(outcome):
+            asyncio.run(outcome)
+
+    for metric_name, metric in sorted(results.metrics.items()):
+        click.echo(f"{metric_name:48} {_format_value(metric['value'], metric['unit'])}")
+
+    if output:
+        results.save(output)
+        click.echo(f"Results written to {output}", err=True)
+
+    if baseline:
+        rows = compare(load_results(baseline), results.to_dict(), threshold)
+        click.echo(f"\nCompared with {baseline} (threshold {threshold:.0%}):")
+        for row in rows:
+            change = "" if row.change is None else f"{row.change:+.1%}"
+            click.echo(f"{row.name:48} {_format_value(row.baseline, row.unit):>18} -> "
+                       f"{_format_value(row.current, row.unit):>18} {change:>8}  {row.status}")
+        if any(row.status == 'regressed' for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
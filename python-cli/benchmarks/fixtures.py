@@ -0,0 +1,84 @@
+"""Generated data for benchmarks"""
+
+import gzip
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, IO, Optional
+
+from ledtomato_cli import sessionlog
+from ledtomato_cli.sessionlog import SEGMENT_SUFFIX, SessionLog
+
+HISTORY_DAYS = 730  # entries are spread evenly over two years
+COMPLETE_MARKER = ".complete"
+
+
+def _open_writer(log_dir: Path, key: str, current: bool) -> IO[bytes]:
+    """Open a segment for writing; closed months are written compressed"""
+    if current:
+        return open(log_dir / f"{key}{SEGMENT_SUFFIX}", 'wb')
+    if sessionlog.ZSTD_AVAILABLE:
+        raw = open(log_dir / f"{key}.jsonl.zst", 'wb')
+        return sessionlog.zstandard.ZstdCompressor(level=1).stream_writer(raw, closefd=True)
+    # Level 1 keeps generation fast; readers do not care about the level
+    return gzip.open(log_dir / f"{key}.jsonl.gz", 'wb', compresslevel=1)
+
+
+def session_log(root: Path, count: int, now: datetime) -> SessionLog:
+    """Build (or reuse) a session log holding ``count`` entries ending at ``now``
+
+    Segments and the index are written directly in the ``SessionLog`` format
+    instead of through ``append`` so ten million entries take seconds, not
+    hours. Fixtures are cached under ``root`` and reused across runs.
+    """
+    log_dir = root / f"sessions-{count}-{now:%Y%m%d}"
+    log = SessionLog(log_dir)
+    if (log_dir / COMPLETE_MARKER).exists():
+        return log
+
+    log_dir.mkdir(parents=True, exist_ok=True)
+    for stale in log_dir.iterdir():
+        stale.unlink()
+
+    start = now - timedelta(days=HISTORY_DAYS)
+    step = timedelta(days=HISTORY_DAYS) / count
+    current_key = now.strftime("%Y-%m")
+    segments: Dict[str, Dict[str, Any]] = {}
+
+    writer: Optional[IO[bytes]] = None
+    key = None
+    summary: Dict[str, Any] = {}
+    offset = 0
+    try:
+        for i in range(count):
+            timestamp = start + step * (i + 1)
+            entry_key = timestamp.strftime("%Y-%m")
+            if entry_key != key:
+                if writer is not None:
+                    writer.close()
+                key = entry_key
+                writer = _open_writer(log_dir, key, current=key == current_key)
+                file_name = f"{key}{SEGMENT_SUFFIX}"
+                if key != current_key:
+                    file_name += ".zst" if sessionlog.ZSTD_AVAILABLE else ".gz"
+                summary = segments[key] = sessionlog._empty_summary(file_name)
+                offset = 0
+
+            work = i % 2 == 0
+            entry = {
+                'timestamp': timestamp.isoformat(),
+                'type': 'work' if work else 'short_break',
+                'duration_minutes': 25 if work else 5,
+                'completed': True,
+            }
+            line = (json.dumps(entry, separators=(',', ':')) + "\n").encode('utf-8')
+            writer.write(line)
+            log._add_to_summary(summary, entry, offset)
+            offset += len(line)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    log._write_index({'version': sessionlog.INDEX_VERSION, 'segments': segments})
+    (log_dir / COMPLETE_MARKER).touch()
+    return SessionLog(log_dir)
@@ -0,0 +1,160 @@
+"""Timing, result files and baseline comparison"""
+
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+RESULTS_FORMAT = 1
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Reduce raw samples to the statistics stored in result files"""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, max(0, round(0.95 * len(ordered)) - 1))
+    return {
+        'median': statistics.median(ordered),
+        'mean': statistics.fmean(ordered),
+        'min': ordered[0],
+        'max': ordered[-1],
+        'p95': ordered[p95_index],
+        'samples': len(ordered),
+    }
+
+
+class Stopwatch:
+    """Collects wall-clock samples in milliseconds"""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self._start = 0.0
+
+    def __enter__(self) -> 'Stopwatch':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.samples.append((time.perf_counter() - self._start) * 1000.0)
+
+
+@dataclass
+class Results:
+    """Metrics recorded during one benchmark run"""
+    quick: bool = False
+    settings: Dict[str, Any] = field(default_factory=dict)
+    metrics: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    def record(self, name: str, value: float, unit: str, better: str = 'lower',
+               samples: Optional[List[float]] = None, **extra: Any) -> None:
+        """Record a metric
+
+        Args:
+            name: Dotted metric name, e.g. "command.status"
+            value: Headline value compared against baselines
+            unit: Unit of value ("ms", "requests", "hosts/s", ...)
+            better: "lower" or "higher"
+            samples: Raw samples; summarized alongside the value
+        """
+        metric: Dict[str, Any] = {'value': value, 'unit': unit, 'better': better}
+        if samples:
+            metric.update(summarize(samples))
+        metric.update(extra)
+        self.metrics[name] = metric
+
+    def record_samples(self, name: str, samples: List[float], unit: str = 'ms', **extra: Any) -> None:
+        """Record a latency metric whose headline value is the median"""
+        self.record(name, statistics.median(samples), unit, 'lower', samples, **extra)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'format': RESULTS_FORMAT,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': {
+                'python': sys.version.split()[0],
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'machine': platform.machine(),
+            },
+            'quick': self.quick,
+            'settings': self.settings,
+            'metrics': self.metrics,
+        }
+
+    def save(self, path: Path) -> None:
+        """Write results as JSON"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+def load_results(path: Path) -> Dict[str, Any]:
+    """Load a results file written by ``Results.save``"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('format') != RESULTS_FORMAT:
+        raise ValueError(f"{path} is not a benchmark results file (format {data.get('format')})")
+    return data
+
+
+@dataclass
+class Comparison:
+    """One metric compared against the baseline"""
+    name: str
+    unit: str
+    baseline: Optional[float]
+    current: Optional[float]
+    change: Optional[float]  # relative, positive = worse
+    status: str  # "ok", "regressed", "improved", "new" or "missing"
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.10) -> List[Comparison]:
+    """Compare two results files
+
+    A metric regresses when it is worse than the baseline by more than
+    ``threshold`` (relative), and improves when it is better by as much.
+    Baseline metrics of scenarios that were not run are skipped.
+    """
+    rows = []
+    base_metrics = baseline.get('metrics', {})
+    current_metrics = current.get('metrics', {})
+    # Metric names start with their scenario; ignore scenarios not run this time
+    scenarios = current.get('settings', {}).get('scenarios')
+    if scenarios:
+        base_metrics = {name: metric for name, metric in base_metrics.items()
+                        if name.split('.', 1)[0] in scenarios}
+
+    for name in sorted(set(base_metrics) | set(current_metrics)):
+        base = base_metrics.get(name)
+        metric = current_metrics.get(name)
+        if base is None or metric is None:
+            source = metric or base
+            rows.append(Comparison(
+                name, source['unit'],
+                base['value'] if base else None,
+                metric['value'] if metric else None,
+                None, 'new' if base is None else 'missing',
+            ))
+            continue
+
+        base_value, value = base['value'], metric['value']
+        if base_value == 0:
+            change = 0.0 if value == 0 else float('inf')
+        else:
+            change = (value - base_value) / abs(base_value)
+        if metric.get('better', 'lower') == 'higher':
+            change = -change
+
+        status = 'ok'
+        if change > threshold:
+            status = 'regressed'
+        elif change < -threshold:
+            status = 'improved'
+        rows.append(Comparison(name, metric['unit'], base_value, value, change, status))
+
+    return rows
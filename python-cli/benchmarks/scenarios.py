@@ -0,0 +1,272 @@
+"""Benchmark scenarios
+
+Every scenario runs against the in-process emulator (or generated data)
+and records one or more metrics. Sizes marked "full" only run without
+``--quick``.
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Union
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.emulator import EmulatorFleet, NetworkConditions
+
+from . import fixtures
+from .harness import Results, Stopwatch
+
+SCAN_PORT = 8080
+SCAN_DEVICES = 16
+
+CLI_DIR = Path(__file__).resolve().parent.parent
+
+# Run in a fresh interpreter: milliseconds to import the CLI, then to load its config
+STARTUP_PROBE = """
+import sys, time
+started = time.perf_counter()
+import ledtomato_cli.main
+imported = time.perf_counter()
+from ledtomato_cli.config import Config
+Config.load(sys.argv[1])
+print((imported - started) * 1000.0, (time.perf_counter() - imported) * 1000.0)
+"""
+
+
+@dataclass
+class BenchContext:
+    """Settings shared by all scenarios"""
+    results: Results
+    quick: bool
+    repeat: int
+    conditions: NetworkConditions
+    fixtures_dir: Path
+
+    def sizes(self, quick: List[int], full: List[int]) -> List[int]:
+        """Pick problem sizes for the current mode"""
+        return quick if self.quick else quick + full
+
+
+ScenarioFunc = Callable[[BenchContext], Union[None, Awaitable[None]]]
+SCENARIOS: Dict[str, ScenarioFunc] = {}
+
+
+def scenario(name: str) -> Callable[[ScenarioFunc], ScenarioFunc]:
+    """Register a scenario under ``name``"""
+    def register(func: ScenarioFunc) -> ScenarioFunc:
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def _quiet_timer_manager(client: LEDTomatoClient, refresh_interval: float):
+    """TimerManager whose display output goes nowhere"""
+    from rich.console import Console
+
+    from ledtomato_cli.config import Config
+    from ledtomato_cli.display import Display
+    from ledtomato_cli.timer import TimerManager
+
+    config = Config()
+    config.display.refresh_interval = refresh_interval
+    config.sound.enabled = False
+    display = Display()
+    display.console = Console(file=io.StringIO(), width=100)
+    return TimerManager(client, display, config)
+
+
+@scenario('command')
+async def command_latency(ctx: BenchContext) -> None:
+    """Request sequence of each single-shot command, and its request count"""
+    async with EmulatorFleet(1, conditions=ctx.conditions, seed=1) as fleet:
+        device = fleet.devices[0]
+        client = LEDTomatoClient(fleet.addresses[0])
+
+        async def start() -> None:
+            await client.start_timer('work')
+
+        async def stop() -> None:
+            await client.stop_timer()
+
+        async def status() -> None:
+            await client.get_status()
+
+        async def config() -> None:
+            current = await client.get_config()
+            current['brightness'] = 100
+            await client.update_config(current)
+
+        commands = {'start': start, 'stop': stop, 'status': status, 'config': config}
+        iterations = 20 if ctx.quick else 100
+        for name, command in commands.items():
+            await command()  # warm up
+            watch = Stopwatch()
+            before = sum(device.requests.values())
+            for _ in range(iterations * ctx.repeat):
+                with watch:
+                    await command()
+            count = sum(device.requests.values()) - before
+            ctx.results.record_samples(f"command.{name}", watch.samples)
+            ctx.results.record(f"command.{name}.requests", count / (iterations * ctx.repeat), 'requests')
+
+
+@scenario('monitor')
+async def monitor_loop(ctx: BenchContext) -> None:
+    """Status requests made by ``monitor_session`` over one session"""
+    session_seconds = 3 if ctx.quick else 10
+    async with EmulatorFleet(1, conditions=ctx.conditions, seed=2) as fleet:
+        device = fleet.devices[0]
+        device.work_time = session_seconds * 1000
+        client = LEDTomatoClient(fleet.addresses[0])
+        timer_manager = _quiet_timer_manager(client, refresh_interval=1.0)
+
+        requests = []
+        periods = []
+        for _ in range(ctx.repeat):
+            await client.start_timer('work')
+            before = device.requests.get('/api/status', 0)
+            started = time.perf_counter()
+            # rich progress bars write to the global console
+            with contextlib.redirect_stdout(io.StringIO()):
+                await timer_manager.monitor_session()
+            elapsed = time.perf_counter() - started
+            count = device.requests.get('/api/status', 0) - before
+            requests.append(count)
+            periods.append(elapsed * 1000.0 / max(count, 1))
+            # Let the completion flash finish before the next session
+            await asyncio.sleep(1.3)
+
+    per_minute = sum(requests) / len(requests) * 60.0 / session_seconds
+    ctx.results.record('monitor.requests_per_session_minute', per_minute, 'requests',
+                       session_seconds=session_seconds)
+    ctx.results.record_samples('monitor.poll_period', periods)
+
+
+@scenario('cycle')
+async def cycle_transitions(ctx: BenchContext) -> None:
+    """Round-trips and client time per session transition, client-driven vs device schedule"""
+    from ledtomato_cli.schedule import CyclePlan
+
+    transitions = 10 if ctx.quick else 50
+    async with EmulatorFleet(1, conditions=ctx.conditions, seed=3) as fleet:
+        device = fleet.devices[0]
+        client = LEDTomatoClient(fleet.addresses[0])
+        timer_manager = _quiet_timer_manager(client, refresh_interval=1.0)
+        sessions = ['work', 'short'] * transitions
+
+        # Client-driven: _start_and_monitor restores colors and starts each session
+        watch = Stopwatch()
+        before = sum(device.requests.values())
+        for session in sessions[:transitions * ctx.repeat]:
+            with watch:
+                await timer_manager._restore_session_colors('work' if session == 'work' else 'break')
+                await client.start_timer('work' if session == 'work' else 'short_break')
+        legacy_requests = (sum(device.requests.values()) - before) / len(watch.samples)
+        ctx.results.record_samples('cycle.client_driven.transition', watch.samples)
+        ctx.results.record('cycle.client_driven.requests_per_transition', legacy_requests, 'requests')
+
+        # Device schedule: one upload covers every transition of the cycle
+        plan = CyclePlan.compile(long_break_every=3, repeat=1)
+        watch = Stopwatch()
+        before = sum(device.requests.values())
+        for _ in range(ctx.repeat):
+            with watch:
+                await client.start_schedule(plan.to_form())
+        uploads = sum(device.requests.values()) - before
+        per_transition = [sample / len(plan.sequence) for sample in watch.samples]
+        ctx.results.record_samples('cycle.schedule.transition', per_transition)
+        ctx.results.record('cycle.schedule.requests_per_transition',
+                           uploads / ctx.repeat / len(plan.sequence), 'requests')
+        await client.stop_timer()
+
+
+@scenario('scan')
+async def subnet_scan(ctx: BenchContext) -> None:
+    """Subnet scan throughput with devices on distinct loopback addresses"""
+    from ledtomato_cli.discovery import DeviceDiscovery
+
+    networks = ['127.0.0.0/24'] + ([] if ctx.quick else ['127.0.0.0/16'])
+    async with EmulatorFleet(SCAN_DEVICES, base_port=SCAN_PORT, loopback=True,
+                             loopback_network='127.0.0.0/24', conditions=ctx.conditions) as fleet:
+        discovery = DeviceDiscovery()
+        for network in networks:
+            prefix = network.split('/')[1]
+            hosts = 2 ** (32 - int(prefix)) - 2
+            watch = Stopwatch()
+            found = 0
+            for _ in range(ctx.repeat):
+                with watch:
+                    found = len(await discovery.scan_subnet(network, port=SCAN_PORT, concurrency=256))
+            best = min(watch.samples) / 1000.0
+            ctx.results.record_samples(f"scan.slash{prefix}.duration", watch.samples)
+            ctx.results.record(f"scan.slash{prefix}.throughput", hosts / best, 'hosts/s', 'higher',
+                               found=found, expected=len(fleet.servers))
+
+
+@scenario('fanout')
+async def fleet_fanout(ctx: BenchContext) -> None:
+    """Concurrent status reads across a fleet"""
+    for count in ctx.sizes([10, 100], [1000]):
+        async with EmulatorFleet(count, conditions=ctx.conditions, seed=4) as fleet:
+            clients = [LEDTomatoClient(address) for address in fleet.addresses]
+            watch = Stopwatch()
+            for _ in range(3 * ctx.repeat):
+                with watch:
+                    statuses = await asyncio.gather(*(client.get_status() for client in clients))
+            failures = sum(1 for status in statuses if status is None)
+            ctx.results.record_samples(f"fanout.{count}.status", watch.samples, failures=failures)
+
+
+@scenario('stats')
+def session_stats(ctx: BenchContext) -> None:
+    """Session statistics over large generated logs (cold index load)"""
+    from ledtomato_cli.sessionlog import SessionLog
+
+    now = datetime.now().replace(microsecond=0)
+    for count in ctx.sizes([1_000, 100_000], [10_000_000]):
+        log = fixtures.session_log(ctx.fixtures_dir, count, now)
+        watch = Stopwatch()
+        for _ in range(5 * ctx.repeat):
+            with watch:
+                SessionLog(log.log_dir).stats(now)
+        ctx.results.record_samples(f"stats.{count}", watch.samples)
+
+
+@scenario('startup')
+def cli_startup(ctx: BenchContext) -> None:
+    """Fresh-process CLI startup: module import, config load and ``--help``"""
+    from ledtomato_cli.config import Config
+
+    with tempfile.TemporaryDirectory() as home:
+        config_file = Path(home) / 'config.json'
+        Config().save(str(config_file))
+        env = dict(os.environ, XDG_CONFIG_HOME=home, XDG_DATA_HOME=home, XDG_CACHE_HOME=home)
+        imports, loads = [], []
+        help_watch = Stopwatch()
+        for _ in range(10 * ctx.repeat):
+            probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE, str(config_file)], cwd=CLI_DIR,
+                                   env=env, capture_output=True, text=True, check=True)
+            imported, loaded = map(float, probe.stdout.split())
+            imports.append(imported)
+            loads.append(loaded)
+            with help_watch:
+                subprocess.run([sys.executable, '-m', 'ledtomato_cli.main', '--help'], cwd=CLI_DIR, env=env,
+                               stdout=subprocess.DEVNULL, check=True)
+        ctx.results.record_samples('startup.import', imports)
+        ctx.results.record_samples('startup.config_load', loads)
+        ctx.results.record_samples('startup.help', help_watch.samples)
+
+        # Reloads in a running process (what ConfigWatcher triggers) hit the snapshot cache
+        watch = Stopwatch()
+        for _ in range(100 * ctx.repeat):
+            with watch:
+                Config.load(str(config_file))
+        ctx.results.record_samples('startup.config_reload', watch.samples)
@@ -0,0 +1,159 @@
+"""Non-blocking audio playback for LED Tomato CLI
+
+Sound cues are handed to a background worker thread through a small queue,
+so playing a clip never blocks the event loop. Sound files from
+``SoundConfig`` are resolved once and, when ``simpleaudio`` is installed,
+WAV files are decoded (with volume applied) and cached in memory. Other
+formats fall back to ``playsound`` on the worker thread.
+"""
+
+import queue
+import threading
+import wave
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from .config import SoundConfig
+
+
+class _Sound:
+    """A resolved sound file and its decoded PCM data, if available"""
+
+    def __init__(self, path: Path, pcm: Optional[Tuple[bytes, int, int, int]] = None):
+        self.path = path
+        self.pcm = pcm  # (frames, channels, sample width, frame rate)
+
+
+class AudioPlayer:
+    """Fire-and-forget audio player backed by a worker thread"""
+
+    QUEUE_SIZE = 4
+
+    def __init__(self, sound_config: SoundConfig, log: Optional[Callable[[str], None]] = None):
+        """Initialize audio player
+
+        Args:
+            sound_config: Sound settings with the cue file paths
+            log: Callback for diagnostic messages (e.g. Display.print_verbose)
+        """
+        self.sound_config = sound_config
+        self.log = log or (lambda message: None)
+        self._queue: 'queue.Queue[Optional[Path]]' = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._cache: Dict[Path, Optional[_Sound]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker thread and preload configured sounds"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ledtomato-audio", daemon=True)
+                self._thread.start()
+
+    def play(self, sound_file: Optional[str]) -> None:
+        """Queue a sound cue and return immediately"""
+        if not self.sound_config.enabled or not sound_file:
+            return
+        self.start()
+        self._put(Path(sound_file).expanduser())
+
+    def close(self) -> None:
+        """Stop the worker thread after the current cue"""
+        if self._thread is not None:
+            self._put(None)
+
+    def _put(self, item: Optional[Path]) -> None:
+        """Queue an item without blocking"""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Drop the oldest pending cue; newer cues supersede it anyway
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                pass
+
+    def preload(self) -> None:
+        """Resolve and decode every sound file configured in SoundConfig"""
+        for sound_file in (self.sound_config.work_start_sound,
+                           self.sound_config.break_start_sound,
+                           self.sound_config.session_end_sound):
+            if sound_file:
+                self._load(Path(sound_file).expanduser())
+
+    def _load(self, path: Path) -> Optional[_Sound]:
+        """Get a cached sound, loading it on first use"""
+        if path in self._cache:
+            return self._cache[path]
+
+        sound = None
+        if path.exists():
+            sound = _Sound(path, self._decode(path))
+        else:
+            self.log(f"Sound file not found: {path}")
+        self._cache[path] = sound
+        return sound
+
+    def _decode(self, path: Path) -> Optional[Tuple[bytes, int, int, int]]:
+        """Decode a WAV file to PCM frames scaled to the configured volume"""
+        if path.suffix.lower() != '.wav':
+            return None
+        try:
+            import simpleaudio  # noqa: F401
+        except ImportError:
+            return None
+
+        try:
+            with wave.open(str(path), 'rb') as wav:
+                frames = wav.readframes(wav.getnframes())
+                channels = wav.getnchannels()
+                sample_width = wav.getsampwidth()
+                frame_rate = wav.getframerate()
+        except (wave.Error, EOFError) as e:
+            self.log(f"Could not decode {path.name}: {e}")
+            return None
+
+        volume = self.sound_config.volume
+        if sample_width == 2 and volume < 1.0:
+            samples = array('h', frames)
+            for i in range(len(samples)):
+                samples[i] = int(samples[i] * volume)
+            frames = samples.tobytes()
+        return (frames, channels, sample_width, frame_rate)
+
+    def _run(self) -> None:
+        """Worker loop: play queued cues one at a time"""
+        self.preload()
+        while True:
+            path = self._queue.get()
+            # Coalesce overlapping cues: only the most recent one is played
+            while True:
+                try:
+                    path = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if path is None:
+                return
+            sound = self._load(path)
+            if sound is not None:
+                self._play(sound)
+
+    def _play(self, sound: _Sound) -> None:
+        """Play a sound, blocking the worker thread until it finishes"""
+        try:
+            if sound.pcm is not None:
+                import simpleaudio
+                frames, channels, sample_width, frame_rate = sound.pcm
+                simpleaudio.play_buffer(frames, channels, sample_width, frame_rate).wait_done()
+            else:
+                from playsound import playsound
+                playsound(str(sound.path))
+        except ImportError:
+            self.log("Sound support requires playsound or simpleaudio")
+        except Exception as e:
+            self.log(f"Could not play sound: {e}")
@@ -1,106 +1,368 @@
 """LED Tomato API Client"""
 
 import asyncio
-from typing import Dict, Optional, Any
+import socket
+from typing import Dict, Optional, Any, Protocol, Tuple
 import aiohttp
 import json
 
+from .coalesce import CoalescingWriter
+from .deadline import Deadline, DeadlineExceeded
+from .metrics import MetricsRegistry, RequestTiming, active_registry
+from .resilience import CircuitOpenError, Resilience, active_resilience
+from .resolver import MDNSResolver, active_resolver, is_mdns_name
+from .traffic import TraceRecorder, active_recorder, active_replay
+
+
+class Transport(Protocol):
+    """Delivers requests without HTTP (see ``emulator.DeviceTransport``)"""
+    
+    async def request(self, method: str, path: str, data: Optional[Dict[str, str]],
+                      timeout: float) -> Tuple[int, bytes]:
+        """Send a request and return (status, body)"""
+        ...
+
+
+def config_form(config: Dict[str, Any]) -> Dict[str, str]:
+    """Form fields for POST /api/pomodoro/config, with defaults for missing keys"""
+    return {
+        'workTime': str(config.get('workTime', 1500)),
+        'shortBreakTime': str(config.get('shortBreakTime', 300)),
+        'longBreakTime': str(config.get('longBreakTime', 900)),
+        'workColor': str(config.get('workColor', 'FF0000')).replace('#', ''),
+        'breakColor': str(config.get('breakColor', '00FF00')).replace('#', ''),
+        'workAnimation': str(config.get('workAnimation', False)).lower(),
+        'breakAnimation': str(config.get('breakAnimation', True)).lower(),
+        'brightness': str(config.get('brightness', 128)),
+    }
+
+
+CONFIG_KEYS = tuple(config_form({}))
+
+
+def config_patch(fields: Dict[str, Any]) -> Dict[str, str]:
+    """Form fields for POST /api/pomodoro/config that change only ``fields``
+    
+    The firmware leaves parameters that are not sent as they are.
+    """
+    unknown = set(fields) - set(CONFIG_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown config field(s): {', '.join(sorted(unknown))}")
+    form = config_form(fields)
+    return {key: form[key] for key in fields}
+
+
+def describe_failure(device: str, error: Optional[BaseException], status: Optional[int] = None) -> str:
+    """Explain why a request to ``device`` failed, for people rather than logs
+    
+    Args:
+        device: Device address as given by the user
+        error: The exception the request raised, if any
+        status: The HTTP status it got otherwise
+    """
+    if error is None:
+        if status is None:
+            return f"Could not connect to device at {device}"
+        if status == 202:
+            return f"The gateway at {device} could not reach the device; the command is queued until it is back"
+        return f"Device at {device} answered HTTP {status}"
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return f"Gave up on device at {device}: {error}"
+    if isinstance(error, asyncio.TimeoutError):
+        return f"Device at {device} did not answer in time (busy, asleep or out of range?)"
+    if isinstance(error, aiohttp.ClientConnectorError):
+        if isinstance(error.os_error, socket.gaierror):
+            return f"Could not resolve {device} (check the name, or use its IP address)"
+        if isinstance(error.os_error, ConnectionRefusedError):
+            return f"Could not connect to device at {device}: connection refused (wrong address or port?)"
+        return f"Could not connect to device at {device}: {error.os_error.strerror or error.os_error}"
+    if isinstance(error, (aiohttp.ClientConnectionError, ConnectionError)):
+        return f"Device at {device} dropped the connection"
+    if isinstance(error, ValueError):
+        return f"Device at {device} sent an invalid response"
+    return f"Request to device at {device} failed: {error}"
+
 
 class LEDTomatoClient:
     """Client for communicating with LED Tomato device"""
     
-    def __init__(self, host: str, port: int = 80, timeout: int = 10):
+    def __init__(self, host: str, port: int = 80, timeout: int = 10,
+                 metrics: Optional[MetricsRegistry] = None, transport: Optional[Transport] = None,
+                 recorder: Optional[TraceRecorder] = None, resolver: Optional[MDNSResolver] = None,
+                 session: Optional[aiohttp.ClientSession] = None, resilience: Optional[Resilience] = None,
+                 deadline: Optional[Deadline] = None, report_errors: bool = True):
         """Initialize client
         
         Args:
-            host: Device IP address or hostname
+            host: Device IP address or hostname, optionally with ":port"
             port: Device port (default: 80)
             timeout: Request timeout in seconds
+            metrics: Registry for request timings (default: the active one, if any)
+            transport: Send requests through this instead of HTTP (default: the active replay, if any)
+            recorder: Capture requests and responses (default: the active recorder, if any)
+            resolver: Resolves a .local host (default: the active resolver, if any)
+            session: Reuse this session and its connection pool instead of one session per request
+            resilience: Retries, circuit breakers and hedging (default: the active layer, if any)
+            deadline: Command deadline that caps every request's timeout
+            report_errors: Print failures; otherwise only keep them in ``last_error``
         """
-        self.host = host.replace('http://', '').replace('https://', '')
+        self.host = host.replace('http://', '').replace('https://', '').rstrip('/')
         self.port = port
+        # Accept "host:port" (e.g. an emulated device) as well as a bare host
+        if self.host.count(':') == 1:
+            host_part, port_part = self.host.split(':')
+            if port_part.isdigit():
+                self.host, self.port = host_part, int(port_part)
         self.timeout = timeout
         self.base_url = f"http://{self.host}:{self.port}"
+        self.metrics = metrics if metrics is not None else active_registry()
+        self.transport = transport if transport is not None else active_replay()
+        self.recorder = recorder if recorder is not None else active_recorder()
+        if resolver is None:
+            resolver = active_resolver()
+        self.resolver = resolver if is_mdns_name(self.host) else None
+        self.session = session
+        self.resilience = resilience if resilience is not None else active_resilience()
+        self.deadline = deadline
+        self.report_errors = report_errors
+        self.last_error: Optional[BaseException] = None
+        self.last_status: Optional[int] = None
+        self.config_writer = CoalescingWriter(self._post_config)
+    
+    async def _request(self, method: str, path: str, data: Optional[Dict[str, str]] = None,
+                       timeout: Optional[float] = None, parse_json: bool = False) -> Tuple[int, Any]:
+        """Send one request and return (status, decoded JSON, or the raw body if not ``parse_json``)
+        
+        Connection errors and timeouts propagate to the caller. When metrics
+        are enabled the request is timed phase by phase, and with a recorder
+        the exchange is added to its trace. With a resilience layer, failed
+        attempts may be retried within ``timeout`` and status reads hedged.
+        With a deadline, ``timeout`` is cut to the time the command has left.
+        """
+        self.last_error, self.last_status = None, None
+        timeout = timeout or self.timeout
+        if self.deadline is not None:
+            try:
+                timeout = self.deadline.budget(timeout)
+            except DeadlineExceeded as e:
+                self.last_error = e
+                raise
+        timing = RequestTiming(method, path, f"{self.host}:{self.port}")
+        timing.mark('request')
+        status, body = None, None
+        
+        async def send(attempt: RequestTiming, attempt_timeout: float) -> Tuple[int, bytes]:
+            if self.transport is not None:
+                attempt.status, response = await self.transport.request(method, path, data, attempt_timeout)
+                return attempt.status, response
+            return await self._http_request(method, path, data, attempt_timeout, attempt)
+        
+        try:
+            if self.resilience is not None:
+                status, body = await self.resilience.call(timing.device, method, path, data,
+                                                          timeout, timing, send, self.metrics)
+            else:
+                status, body = await send(timing, timeout)
+            self.last_status = status
+            
+            result = None if parse_json else body
+            if parse_json and status == 200:
+                timing.mark('decode')
+                result = json.loads(body)
+                timing.decode = timing.since('decode')
+            return status, result
+        except Exception as e:
+            timing.error = type(e).__name__
+            self.last_error = e
+            raise
+        finally:
+            timing.total = timing.since('request')
+            if self.metrics is not None:
+                self.metrics.observe(timing)
+            if self.recorder is not None:
+                self.recorder.record(timing.device, method, path, data, status, body,
+                                     timing.total, timing.error)
+    
+    async def _http_request(self, method: str, path: str, data: Optional[Dict[str, str]],
+                            timeout: Optional[float], timing: RequestTiming) -> Tuple[int, bytes]:
+        """Send one request over HTTP and return (status, body)"""
+        base_url, resolve_ms = self.base_url, None
+        if self.resolver is not None:
+            timing.mark('resolve')
+            address = await self.resolver.resolve(self.host, self.port)
+            resolve_ms = timing.since('resolve')
+            if address is not None:
+                base_url = f"http://{address}:{self.port}"
+            # Name resolution spends from the same budget as the request
+            timeout = max((timeout or self.timeout) - resolve_ms / 1000.0, 0.001)
+        
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        if self.session is not None:
+            return await self._send(self.session, method, f"{base_url}{path}", data, client_timeout,
+                                    timing, resolve_ms)
         
+        trace_configs = [self.metrics.trace_config()] if self.metrics is not None else None
+        async with aiohttp.ClientSession(timeout=client_timeout, trace_configs=trace_configs) as session:
+            return await self._send(session, method, f"{base_url}{path}", data, client_timeout,
+                                    timing, resolve_ms)
+    
+    async def _send(self, session: aiohttp.ClientSession, method: str, url: str, data: Optional[Dict[str, str]],
+                    timeout: aiohttp.ClientTimeout, timing: RequestTiming,
+                    resolve_ms: Optional[float]) -> Tuple[int, bytes]:
+        async with session.request(method, url, data=data, timeout=timeout,
+                                   trace_request_ctx=timing) as response:
+            timing.status = response.status
+            timing.mark('body')
+            body = await response.read()
+            timing.body = timing.since('body')
+            if resolve_ms is not None:
+                # Added afterwards so the connect phase does not subtract it
+                timing.dns = (timing.dns or 0.0) + resolve_ms
+            return response.status, body
+    
     async def ping(self) -> bool:
         """Test connection to device"""
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                async with session.get(f"{self.base_url}/api/status") as response:
-                    return response.status == 200
+            status, _ = await self._request('GET', '/api/status', timeout=5)
+            return status == 200
         except Exception:
             return False
     
+    async def fetch(self, method: str, path: str, data: Optional[Dict[str, str]] = None,
+                    timeout: Optional[float] = None) -> Tuple[int, bytes]:
+        """Send any API request and return (status, raw body)
+        
+        Unlike the other methods, errors propagate to the caller.
+        """
+        return await self._request(method, path, data=data, timeout=timeout)
+    
     async def get_status(self) -> Optional[Dict[str, Any]]:
         """Get current device status"""
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.get(f"{self.base_url}/api/status") as response:
-                    if response.status == 200:
-                        return await response.json()
+            _, status = await self._request('GET', '/api/status', parse_json=True)
+            return status
         except Exception as e:
-            print(f"Error getting status: {e}")
+            self._report("Error getting status", e)
         return None
     
     async def get_config(self) -> Optional[Dict[str, Any]]:
         """Get current device configuration"""
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.get(f"{self.base_url}/api/pomodoro/config") as response:
-                    if response.status == 200:
-                        return await response.json()
+            _, config = await self._request('GET', '/api/pomodoro/config', parse_json=True)
+            return config
         except Exception as e:
-            print(f"Error getting config: {e}")
+            self._report("Error getting config", e)
         return None
     
     async def update_config(self, config: Dict[str, Any]) -> bool:
-        """Update device configuration"""
+        """Update device configuration
+        
+        Missing keys are sent with their defaults. Calls made while a config
+        write is in flight are merged into the next one (latest value wins).
+        """
         try:
-            # Convert to form data
-            form_data = aiohttp.FormData()
-            form_data.add_field('workTime', str(config.get('workTime', 1500)))
-            form_data.add_field('shortBreakTime', str(config.get('shortBreakTime', 300)))
-            form_data.add_field('longBreakTime', str(config.get('longBreakTime', 900)))
-            form_data.add_field('workColor', str(config.get('workColor', 'FF0000')).replace('#', ''))
-            form_data.add_field('breakColor', str(config.get('breakColor', '00FF00')).replace('#', ''))
-            form_data.add_field('workAnimation', str(config.get('workAnimation', False)).lower())
-            form_data.add_field('breakAnimation', str(config.get('breakAnimation', True)).lower())
-            form_data.add_field('brightness', str(config.get('brightness', 128)))
-            
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.post(f"{self.base_url}/api/pomodoro/config", data=form_data) as response:
-                    return response.status == 200
+            return await self.config_writer.write(config_form(config))
         except Exception as e:
-            print(f"Error updating config: {e}")
+            self._report("Error updating config", e)
         return False
     
-    async def start_timer(self, timer_type: str) -> bool:
+    async def patch_config(self, fields: Dict[str, Any]) -> bool:
+        """Change only the given config keys (e.g. ``{'brightness': 40}``)
+        
+        Made for sliders and fades: calls made while a config write is in
+        flight are merged into the next one, so the device gets at most one
+        request at a time and ends on the latest values.
+        """
+        try:
+            return await self.config_writer.write(config_patch(fields))
+        except Exception as e:
+            self._report("Error updating config", e)
+        return False
+    
+    async def _post_config(self, form: Dict[str, str]) -> bool:
+        status, _ = await self._request('POST', '/api/pomodoro/config', data=form)
+        return status == 200
+    
+    async def start_timer(self, timer_type: str, start_at: Optional[int] = None) -> bool:
         """Start a timer session
         
         Args:
             timer_type: 'work', 'short_break', or 'long_break'
+            start_at: Device ``uptime`` (ms) to start at instead of now (see ``sync``)
         """
         try:
-            form_data = aiohttp.FormData()
-            form_data.add_field('type', timer_type)
-            
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.post(f"{self.base_url}/api/pomodoro/start", data=form_data) as response:
-                    return response.status == 200
+            form = {'type': timer_type}
+            if start_at is not None:
+                form['start_at'] = str(start_at)
+            status, result = await self._request('POST', '/api/pomodoro/start', data=form,
+                                                 parse_json=start_at is not None)
+            if start_at is not None:
+                # Older firmware ignores start_at and starts immediately
+                return status == 200 and bool(result and result.get('success')) and 'startAt' in result
+            return status == 200
         except Exception as e:
-            print(f"Error starting timer: {e}")
+            self._report("Error starting timer", e)
         return False
     
     async def stop_timer(self) -> bool:
         """Stop the current timer session"""
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.post(f"{self.base_url}/api/pomodoro/stop") as response:
-                    return response.status == 200
+            status, _ = await self._request('POST', '/api/pomodoro/stop')
+            return status == 200
+        except Exception as e:
+            self._report("Error stopping timer", e)
+        return False
+    
+    async def start_schedule(self, schedule: Dict[str, str]) -> bool:
+        """Upload a cycle schedule and start its first session
+        
+        Args:
+            schedule: Form fields from ``CyclePlan.to_form()``
+        
+        Returns False on failure, including firmware without schedule support.
+        """
+        try:
+            status, _ = await self._request('POST', '/api/pomodoro/schedule', data=dict(schedule))
+            return status == 200
         except Exception as e:
-            print(f"Error stopping timer: {e}")
+            self._report("Error uploading schedule", e)
         return False
     
+    async def get_schedule(self) -> Optional[Dict[str, Any]]:
+        """Get the device's schedule progress"""
+        try:
+            _, schedule = await self._request('GET', '/api/pomodoro/schedule', parse_json=True)
+            return schedule
+        except Exception as e:
+            self._report("Error getting schedule", e)
+        return None
+    
+    async def get_multicast_info(self) -> Optional[Dict[str, Any]]:
+        """Get the device's multicast control channel settings (MAC, enabled)"""
+        try:
+            _, info = await self._request('GET', '/api/multicast', parse_json=True)
+            return info
+        except Exception as e:
+            self._report("Error getting multicast settings", e)
+        return None
+    
+    async def set_multicast_key(self, key: str) -> bool:
+        """Provision the shared key for the multicast control channel
+        
+        Args:
+            key: Hex-encoded key (see ``multicast.generate_key``)
+        """
+        try:
+            status, _ = await self._request('POST', '/api/multicast', data={'key': key})
+            return status == 200
+        except Exception as e:
+            self._report("Error setting multicast key", e)
+        return False
+    
+    def _report(self, message: str, error: BaseException) -> None:
+        if self.report_errors:
+            print(f"{message}: {error}")
+    
     async def get_device_info(self) -> Optional[Dict[str, Any]]:
         """Get device information"""
         status = await self.get_status()
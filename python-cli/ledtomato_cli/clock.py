@@ -0,0 +1,91 @@
+"""Time sources for LED Tomato CLI
+
+``TimerManager``, ``Display`` and the device emulator read time and sleep
+through a ``Clock`` instead of calling ``time``/``asyncio`` directly. The
+default ``SystemClock`` is real time; a ``VirtualClock`` advances instantly
+whenever something sleeps on it, so a multi-hour Pomodoro cycle against the
+emulator runs in milliseconds.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+class Clock:
+    """Source of time and sleeping"""
+
+    def time(self) -> float:
+        """Monotonic seconds"""
+        raise NotImplementedError
+
+    def now(self) -> datetime:
+        """Local wall-clock time"""
+        raise NotImplementedError
+
+    async def sleep(self, seconds: float) -> None:
+        """Sleep without blocking the event loop"""
+        raise NotImplementedError
+
+    def sleep_blocking(self, seconds: float) -> None:
+        """Sleep in synchronous code"""
+        raise NotImplementedError
+
+
+class SystemClock(Clock):
+    """Real time"""
+
+    def time(self) -> float:
+        return time.monotonic()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+    def sleep_blocking(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """Simulated time that jumps forward on every sleep
+
+    Sleeping advances the clock by the requested amount and yields to the
+    event loop once. This models one task driving time (a monitor or cycle
+    loop polling a device); concurrent sleepers each push the clock forward
+    by their own delay.
+    """
+
+    def __init__(self, start: float = 0.0, wall_start: Optional[datetime] = None):
+        """Initialize virtual clock
+
+        Args:
+            start: Initial monotonic reading in seconds
+            wall_start: Wall-clock time matching ``start`` (default: now)
+        """
+        self._start = start
+        self._now = start
+        self._wall_start = wall_start or datetime.now()
+        self.sleeps = 0
+
+    def time(self) -> float:
+        return self._now
+
+    def now(self) -> datetime:
+        return self._wall_start + timedelta(seconds=self._now - self._start)
+
+    def advance(self, seconds: float) -> None:
+        """Move time forward"""
+        if seconds > 0:
+            self._now += seconds
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps += 1
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+    def sleep_blocking(self, seconds: float) -> None:
+        self.sleeps += 1
+        self.advance(seconds)
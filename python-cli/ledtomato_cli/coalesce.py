@@ -0,0 +1,73 @@
+"""Latest-wins coalescing of form writes
+
+A brightness slider or a scripted fade calls ``update_config`` many times
+a second. Sent one by one, every step is a POST (and, on older firmware,
+an NVS write), so the device lags seconds behind the slider. A
+``CoalescingWriter`` keeps at most one write in flight: fields written
+meanwhile are merged into one pending form, newer values replacing older
+ones, and sent as a single request when the current one completes. The
+device skips intermediate values but always ends on the latest.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class CoalescingWriter(Generic[T]):
+    """Merges pending form fields and sends them with one request in flight"""
+
+    def __init__(self, send: Callable[[Dict[str, str]], Awaitable[T]], debounce: float = 0.0):
+        """Initialize writer
+
+        Args:
+            send: Sends one merged form and returns its result
+            debounce: Seconds to wait for more fields before each send
+        """
+        self.send = send
+        self.debounce = debounce
+        self.sent = 0
+        self.merged = 0  # writes folded into a form that another write started
+        self._pending: Dict[str, str] = {}
+        self._next: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def write(self, fields: Dict[str, str]) -> T:
+        """Queue fields and wait for the request that carries them
+
+        Returns (or raises) what ``send`` did for that request, which may
+        carry later values of the same fields.
+        """
+        if self._next is None:
+            self._next = asyncio.get_running_loop().create_future()
+        else:
+            self.merged += 1
+        self._pending.update(fields)
+        future = self._next
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._pump())
+        return await asyncio.shield(future)
+
+    @property
+    def busy(self) -> bool:
+        """Whether a request is in flight or about to be sent"""
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> bool:
+        """Whether fields are waiting for the next request (a write now joins them)"""
+        return self._next is not None
+
+    async def _pump(self) -> None:
+        while self._next is not None:
+            if self.debounce:
+                await asyncio.sleep(self.debounce)
+            form, self._pending = self._pending, {}
+            future, self._next = self._next, None
+            self.sent += 1
+            try:
+                future.set_result(await self.send(form))
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # retrieved, so a failure nobody awaits is not logged
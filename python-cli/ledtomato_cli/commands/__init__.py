@@ -0,0 +1,351 @@
+"""CLI subcommands for LED Tomato
+
+Each subcommand lives in its own module and is loaded lazily by
+``ledtomato_cli.main``. Modules here must stay cheap to import: heavy
+dependencies (rich, aiohttp, zeroconf) are imported inside the command
+implementations.
+"""
+
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Dict, List, Optional, TypeVar
+
+import click
+
+if TYPE_CHECKING:
+    from ..client import LEDTomatoClient
+    from ..deadline import Deadline
+    from ..display import Display
+    from ..inventory import Inventory
+
+T = TypeVar('T')
+
+# Subcommands that support --output json/ndjson
+MACHINE_READABLE = ('config', 'discover', 'inventory', 'monitor', 'stats', 'status')
+
+
+def get_display(ctx: click.Context) -> 'Display':
+    """Get the shared display, creating it on first use
+
+    With ``--output json`` or ``ndjson`` this is a ``JsonOutput``, which
+    has the same ``show_*`` methods but never imports rich or colorama.
+    """
+    obj = ctx.ensure_object(dict)
+    if 'display' not in obj:
+        output = obj.get('output', 'text')
+        if output != 'text':
+            from ..output import JsonOutput
+            obj['display'] = JsonOutput(output, verbose=obj.get('verbose', False))
+        else:
+            from ..display import Display
+            obj['display'] = Display(verbose=obj.get('verbose', False))
+    return obj['display']
+
+
+def run_async(ctx: click.Context, coro: Coroutine[Any, Any, T]) -> T:
+    """Run a command coroutine on a fresh event loop
+
+    With ``--metrics`` every device request is timed; the summary is shown
+    afterwards and added to the snapshot read by ``ledtomato metrics``.
+    With ``--profile`` the loop runs in debug mode under ``LoopProfiler``.
+    ``--record`` and ``--replay`` capture requests to, or answer them from,
+    a trace file. ``.local`` device names are resolved over mDNS and cached
+    across runs, and requests go through the retry and circuit breaker
+    layer configured in ``network``. With webhooks or plugins in
+    ``events``, session events are published to them.
+    """
+    import asyncio
+
+    obj = ctx.ensure_object(dict)
+    runner = asyncio.run
+    if obj.get('profile'):
+        runner = _profiled_runner(ctx)
+    runner = _client_runner(ctx, runner)
+    if obj.get('record') or obj.get('replay'):
+        runner = _traffic_runner(ctx, runner)
+    config = obj.get('config')
+    if config is not None and (config.events.webhooks or config.events.plugins):
+        runner = _events_runner(ctx, runner)
+
+    if not obj.get('metrics'):
+        return runner(coro)
+
+    from .. import metrics
+
+    display = get_display(ctx)
+    registry = metrics.activate()
+    registry.subscribe(lambda timing: display.print_verbose(metrics.format_timing(timing)))
+    try:
+        return runner(coro)
+    finally:
+        metrics.deactivate()
+        display.show_request_metrics(registry)
+        config = obj.get('config')
+        if config is not None and registry.requests:
+            try:
+                metrics.accumulate(registry, config.get_metrics_file())
+            except Exception as e:
+                display.print_verbose(f"Could not save metrics: {e}")
+
+
+def _command_name(ctx: click.Context) -> str:
+    """Name of the running subcommand, used to label reports and traces"""
+    return ctx.command_path.split()[-1] if ctx.parent else 'interactive'
+
+
+def _client_runner(ctx: click.Context,
+                   runner: Callable[[Coroutine[Any, Any, T]], T]) -> Callable[[Coroutine[Any, Any, T]], T]:
+    """Wrap a runner with the settings every client of the run shares
+
+    .local names resolve through a cached ``MDNSResolver``; requests go
+    through one ``Resilience`` layer, so circuit breakers see every call.
+    """
+    from .. import resilience, resolver
+
+    config = ctx.obj.get('config')
+    cache_file = config.get_resolver_cache_file() if config is not None else None
+    network = config.network if config is not None else None
+
+    def run(coro: Coroutine[Any, Any, T]) -> T:
+        active = resolver.activate(resolver.MDNSResolver(cache_file=cache_file))
+        if network is not None:
+            resilience.activate(resilience.Resilience(
+                retry=resilience.RetryPolicy(attempts=network.retries + 1), hedge=network.hedge_reads))
+        try:
+            return runner(coro)
+        finally:
+            resilience.deactivate()
+            resolver.deactivate()
+            active.save()
+            active.close()
+
+    return run
+
+
+def _profiled_runner(ctx: click.Context) -> Callable[[Coroutine[Any, Any, T]], T]:
+    """Wrap ``asyncio.run`` in a ``LoopProfiler`` that reports when the run ends"""
+    from ..profiling import LoopProfiler
+
+    obj = ctx.obj
+    profiler = LoopProfiler(
+        obj['config'].get_profile_dir(),
+        name=_command_name(ctx),
+        profiler=obj.get('profiler'),
+    )
+
+    def run(coro: Coroutine[Any, Any, T]) -> T:
+        try:
+            return profiler.run(coro)
+        finally:
+            get_display(ctx).show_profile_report(profiler.report())
+
+    return run
+
+
+def _traffic_runner(ctx: click.Context,
+                    runner: Callable[[Coroutine[Any, Any, T]], T]) -> Callable[[Coroutine[Any, Any, T]], T]:
+    """Wrap a runner so device requests are recorded and/or replayed"""
+    from .. import traffic
+
+    obj = ctx.obj
+    display = get_display(ctx)
+
+    def run(coro: Coroutine[Any, Any, T]) -> T:
+        replay = None
+        if obj.get('replay'):
+            try:
+                trace = traffic.Trace.load(obj['replay'])
+            except (OSError, ValueError) as e:
+                coro.close()
+                raise click.ClickException(f"Could not load trace {obj['replay']}: {e}")
+            replay = traffic.ReplayTransport(trace, speed=obj.get('replay_speed', 1.0))
+        recorder = traffic.TraceRecorder(_command_name(ctx)) if obj.get('record') else None
+
+        traffic.activate(recorder, replay)
+        try:
+            return runner(coro)
+        finally:
+            traffic.deactivate()
+            if replay is not None and replay.unmatched:
+                display.show_warning(f"{replay.unmatched} request(s) had no recorded response")
+            if recorder is not None and recorder.entries:
+                try:
+                    recorder.save(obj['record'])
+                    display.print_verbose(f"Recorded {len(recorder.entries)} request(s) to {obj['record']}")
+                except OSError as e:
+                    display.show_error(f"Could not write trace: {e}")
+
+    return run
+
+
+def _events_runner(ctx: click.Context,
+                   runner: Callable[[Coroutine[Any, Any, T]], T]) -> Callable[[Coroutine[Any, Any, T]], T]:
+    """Wrap a runner so session events reach the configured webhooks and plugins
+
+    The bus lives on the run's event loop; when the command is done, queued
+    events get a few seconds to be delivered before the loop closes.
+    """
+    from .. import events
+
+    config = ctx.obj['config']
+    display = get_display(ctx)
+
+    async def publishing(coro: Coroutine[Any, Any, T]) -> T:
+        try:
+            bus = events.activate(events.build_bus(config.events, config.get_event_spill_dir()))
+        except ValueError as e:
+            display.show_warning(f"Session events are off: {e}")
+            return await coro
+        try:
+            return await coro
+        finally:
+            events.deactivate()
+            await bus.close()
+            for subscription in bus.subscriptions:
+                stats = subscription.stats()
+                lost = stats['failed'] + stats['dropped']
+                if lost:
+                    display.show_warning(f"{lost} event(s) for {stats['handler']} were not delivered: "
+                                         f"{subscription.last_error or 'queue full'}")
+                if stats['pending']:
+                    display.print_verbose(f"{stats['pending']} event(s) for {stats['handler']} "
+                                          f"kept for the next run")
+
+    def run(coro: Coroutine[Any, Any, T]) -> T:
+        return runner(publishing(coro))
+
+    return run
+
+
+def command_deadline(ctx: click.Context) -> 'Deadline':
+    """Get the running command's deadline, starting it on first use"""
+    obj = ctx.ensure_object(dict)
+    if 'deadline' not in obj:
+        from ..deadline import Deadline
+        config = obj.get('config')
+        obj['deadline'] = Deadline(obj.get('timeout') or (config.network.command_timeout if config else 15.0))
+    return obj['deadline']
+
+
+def device_client(ctx: click.Context, device: str) -> 'LEDTomatoClient':
+    """Create a client held to the command's deadline
+
+    There is no preflight ping: the command's first request is its
+    connection check, and failures are explained by ``show_failure``.
+    """
+    from ..client import LEDTomatoClient
+
+    return LEDTomatoClient(device, timeout=ctx.obj['config'].network.request_timeout,
+                           deadline=command_deadline(ctx), report_errors=False)
+
+
+def show_failure(ctx: click.Context, client: 'LEDTomatoClient', device: str, action: str) -> None:
+    """Explain why ``action`` failed on ``device``"""
+    from ..client import describe_failure
+
+    display = get_display(ctx)
+    display.show_error(f"Failed to {action}. {describe_failure(device, client.last_error, client.last_status)}")
+    if client.last_error is not None:
+        display.print_verbose(repr(client.last_error))
+
+
+def get_inventory(ctx: click.Context) -> 'Inventory':
+    """Get the fleet inventory and device cache, loading them on first use (no network I/O)"""
+    obj = ctx.ensure_object(dict)
+    if 'inventory' not in obj:
+        from ..inventory import Inventory
+
+        config = obj['config']
+        try:
+            obj['inventory'] = Inventory.load(config.get_inventory_file(), config.load_device_cache())
+        except (OSError, ValueError) as e:
+            get_display(ctx).show_warning(f"Could not read the inventory: {e}")
+            obj['inventory'] = Inventory(config.get_inventory_file())
+    return obj['inventory']
+
+
+def remember_devices(ctx: click.Context, found: List[Dict[str, Any]]) -> List[str]:
+    """Record discovery results in the device cache and return their addresses"""
+    from ..inventory import found_address
+
+    inventory = get_inventory(ctx)
+    addresses = []
+    for device in found:
+        address = found_address(device)
+        inventory.observe(address, mac=device.get('mac'), hostname=device.get('hostname'),
+                          wifi_connected=device.get('wifi_connected'))
+        addresses.append(address)
+    if found:
+        ctx.obj['config'].save_device_cache(inventory.cache())
+    return addresses
+
+
+async def target_devices(ctx: click.Context, devices: List[str], select: Optional[str]) -> List[str]:
+    """Addresses a fleet command acts on
+
+    ``--select`` picks devices from the inventory and ``--device`` names
+    them (inventory IDs or addresses); both only read local files. With
+    neither, ``network.preferred_devices`` is used, and failing that every
+    device discovery finds.
+    """
+    display = get_display(ctx)
+    inventory = get_inventory(ctx)
+    targets = [inventory.target(device) for device in devices]
+    if select:
+        try:
+            selected = inventory.select(select)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="'--select'")
+        unreachable = [device.id for device in selected if device.target is None]
+        if unreachable:
+            display.show_warning(f"No known address for {', '.join(unreachable)}; run 'ledtomato discover'")
+        targets += [device.target for device in selected if device.target is not None]
+        if not selected:
+            display.show_error(f"No inventory devices match '{select}'")
+    elif not devices:
+        preferred = ctx.obj['config'].network.preferred_devices
+        targets = [inventory.target(device) for device in preferred]
+        if not targets:
+            from ..discovery import DeviceDiscovery
+
+            targets = remember_devices(ctx, await DeviceDiscovery().scan_network())
+            if not targets:
+                display.show_error("No devices found. Use --device or --select to specify them.")
+    return list(dict.fromkeys(targets))
+
+
+async def resolve_device(ctx: click.Context, device: Optional[str]) -> Optional[str]:
+    """Use the given device, the default one, or discover one on the network
+
+    Inventory IDs are turned into the device's address. Discovery may take
+    up to ``network.discovery_timeout`` but leaves the command's request at
+    least its ``request_timeout`` or half of what is left of the deadline,
+    whichever is less.
+    """
+    if device:
+        return get_inventory(ctx).target(device)
+
+    from ..traffic import active_replay
+
+    replay = active_replay()
+    if replay is not None and replay.trace.hosts:
+        # Replaying: talk to the recorded device instead of scanning
+        return replay.trace.hosts[0]
+
+    network = ctx.obj['config'].network
+    if network.default_device:
+        return get_inventory(ctx).target(network.default_device)
+
+    from ..deadline import DeadlineExceeded
+    from ..discovery import DeviceDiscovery
+
+    deadline = command_deadline(ctx)
+    try:
+        budget = deadline.budget(network.discovery_timeout,
+                                 reserve=min(network.request_timeout, deadline.remaining() / 2))
+    except DeadlineExceeded as e:
+        get_display(ctx).show_error(f"No time left to discover devices ({e})")
+        return None
+
+    device = await DeviceDiscovery(timeout=budget).find_device()
+    if not device:
+        get_display(ctx).console.print("[red]❌ No device found. Use --device to specify manually.[/red]")
+    return device
@@ -0,0 +1,63 @@
+"""config command"""
+
+from typing import Optional
+
+import click
+
+from . import device_client, get_display, resolve_device, run_async, show_failure
+
+
+@click.command()
+@click.option('--device', '-d', help='Device IP address or hostname')
+@click.option('--work-time', type=int, help='Work session duration (minutes)')
+@click.option('--short-break', type=int, help='Short break duration (minutes)')
+@click.option('--long-break', type=int, help='Long break duration (minutes)')
+@click.option('--work-color', help='Work session color (hex)')
+@click.option('--break-color', help='Break session color (hex)')
+@click.option('--brightness', type=click.IntRange(0, 255), help='LED brightness (0-255)')
+@click.pass_context
+def config(ctx: click.Context, device: Optional[str], **kwargs) -> None:
+    """Configure timer settings"""
+    run_async(ctx, _configure_device(ctx, device, kwargs))
+
+
+async def _configure_device(ctx: click.Context, device: Optional[str], settings: dict) -> None:
+    """Configure device implementation"""
+    device = await resolve_device(ctx, device)
+    if not device:
+        return
+
+    display = get_display(ctx)
+    client = device_client(ctx, device)
+
+    # Only the given settings are sent; the device keeps the rest
+    fields = {}
+    if settings['work_time']:
+        fields['workTime'] = settings['work_time'] * 60
+    if settings['short_break']:
+        fields['shortBreakTime'] = settings['short_break'] * 60
+    if settings['long_break']:
+        fields['longBreakTime'] = settings['long_break'] * 60
+    if settings['work_color']:
+        fields['workColor'] = settings['work_color'].lstrip('#')
+    if settings['break_color']:
+        fields['breakColor'] = settings['break_color'].lstrip('#')
+    if settings['brightness'] is not None:
+        fields['brightness'] = settings['brightness']
+
+    if not fields:
+        # Nothing to change: show what is there
+        current_config = await client.get_config()
+        if not current_config:
+            show_failure(ctx, client, device, "get current configuration")
+            return
+        display.show_config(current_config)
+        return
+
+    success = await client.patch_config(fields)
+    if success:
+        display.show_success("Configuration updated")
+        if display.machine:
+            display.show_config(fields)
+    else:
+        show_failure(ctx, client, device, "update configuration")
@@ -0,0 +1,58 @@
+"""discover command"""
+
+import click
+
+from . import get_display, get_inventory, remember_devices, run_async
+
+
+@click.command()
+@click.option('--watch', '-w', is_flag=True,
+              help='Keep listening and report devices as they appear, move and disappear')
+@click.pass_context
+def discover(ctx: click.Context, watch: bool) -> None:
+    """Discover LED Tomato devices on the network"""
+    if watch:
+        run_async(ctx, _watch_devices(ctx))
+    else:
+        run_async(ctx, _discover_devices(ctx))
+
+
+async def _discover_devices(ctx: click.Context) -> None:
+    """Discover devices implementation"""
+    from ..discovery import DeviceDiscovery
+
+    display = get_display(ctx)
+    console = display.console
+    console.print("[blue]🔍 Scanning for LED Tomato devices...[/blue]")
+
+    discovery = DeviceDiscovery()
+    devices = await discovery.scan_network()
+    remember_devices(ctx, devices)
+
+    if display.machine:
+        display.show_device_list(devices)
+    elif devices:
+        console.print(f"[green]✅ Found {len(devices)} device(s):[/green]")
+        for device in devices:
+            console.print(f"  • {device['ip']} - {device['hostname']}")
+    else:
+        console.print("[yellow]⚠️  No LED Tomato devices found on network[/yellow]")
+
+
+async def _watch_devices(ctx: click.Context) -> None:
+    """Follow the presence table until interrupted"""
+    from ..presence import ADDED, MOVED, PresenceTracker
+
+    display = get_display(ctx)
+    config = ctx.obj['config']
+    inventory = get_inventory(ctx)
+    key = config.network.multicast_key
+    display.console.print("[blue]👀 Watching for LED Tomato devices (Ctrl+C to stop)...[/blue]")
+
+    async with PresenceTracker(beacon_key=bytes.fromhex(key) if key else None) as tracker:
+        async for event in tracker.table.changes():
+            display.show_presence_event(event)
+            if event.kind in (ADDED, MOVED):
+                device = event.device
+                inventory.observe(device.address, mac=device.mac, hostname=device.hostname)
+                config.save_device_cache(inventory.cache())
@@ -0,0 +1,201 @@
+"""fleet command group"""
+
+from typing import List, Optional, Tuple
+
+import click
+
+from . import get_display, run_async, target_devices
+
+
+@click.group()
+def fleet() -> None:
+    """Control many devices at once"""
+
+
+@fleet.command()
+@click.option('--device', '-d', 'devices', multiple=True,
+              help='Device address or inventory ID (repeatable; default: preferred or discovered devices)')
+@click.option('--select', '-s', help='Inventory selector, e.g. floor=3,team=infra (see ledtomato inventory)')
+@click.option('--type', '-t', type=click.Choice(['work', 'short', 'long']), default='work',
+              help='Timer type (work, short break, long break)')
+@click.option('--lead', type=click.FloatRange(min=0.1), default=1.0, show_default=True,
+              help='Seconds between scheduling and the shared start')
+@click.option('--probes', type=click.IntRange(min=1), default=8, show_default=True,
+              help='Status probes per device for clock offset estimation')
+@click.pass_context
+def start(ctx: click.Context, devices: Tuple[str, ...], select: Optional[str], type: str, lead: float,
+          probes: int) -> None:
+    """Start a session on several devices at the same instant"""
+    run_async(ctx, _start_fleet(ctx, list(devices), select, type, lead, probes))
+
+
+async def _start_fleet(ctx: click.Context, devices: List[str], select: Optional[str], timer_type: str,
+                       lead: float, probes: int) -> None:
+    """Synchronized start implementation"""
+    from ..client import LEDTomatoClient
+    from ..sync import synchronized_start
+
+    display = get_display(ctx)
+    devices = await target_devices(ctx, devices, select)
+    if not devices:
+        return
+
+    timer_map = {'work': 'work', 'short': 'short_break', 'long': 'long_break'}
+    timeout = ctx.obj['config'].network.request_timeout
+    clients = {device: LEDTomatoClient(device, timeout=timeout) for device in devices}
+    results = await synchronized_start(clients, timer_map[timer_type], lead=lead, probes=probes)
+    display.show_sync_report(results)
+
+
+@fleet.command()
+@click.argument('policy', type=click.File('r'))
+@click.option('--device', '-d', 'devices', multiple=True,
+              help='Device address or inventory ID (repeatable; default: preferred or discovered devices)')
+@click.option('--select', '-s', help='Inventory selector, e.g. floor=3,team=infra (see ledtomato inventory)')
+@click.option('--canary', type=click.IntRange(min=0), default=1, show_default=True,
+              help='Devices updated first; any failure among them halts the rollout (0: no canary)')
+@click.option('--wave-size', type=click.IntRange(min=1), default=10, show_default=True,
+              help='Devices updated in parallel per wave after the canary')
+@click.option('--max-failure-rate', type=click.FloatRange(0, 1), default=0.1, show_default=True,
+              help='Halt once this fraction of the updates so far has failed')
+@click.option('--dry-run', is_flag=True, help='Show what would change without writing')
+@click.pass_context
+def apply(ctx: click.Context, policy, devices: Tuple[str, ...], select: Optional[str], canary: int,
+          wave_size: int, max_failure_rate: float, dry_run: bool) -> None:
+    """Roll a config policy out to many devices in waves
+
+    POLICY is a JSON file with the settings to enforce, named as in the
+    "pomodoro" section of the CLI config, e.g. {"work_time": 50,
+    "work_color": "#FF8800"}. Devices that already comply are not written.
+    """
+    import json
+
+    from ..rollout import parse_policy
+
+    try:
+        desired = parse_policy(json.load(policy))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'POLICY'")
+    run_async(ctx, _apply_policy(ctx, desired, list(devices), select, canary, wave_size, max_failure_rate,
+                                 dry_run))
+
+
+async def _apply_policy(ctx: click.Context, policy: dict, devices: List[str], select: Optional[str], canary: int,
+                        wave_size: int, max_failure_rate: float, dry_run: bool) -> None:
+    """Rollout implementation"""
+    from ..client import LEDTomatoClient
+    from ..rollout import plan_rollout, run_rollout
+
+    display = get_display(ctx)
+    devices = await target_devices(ctx, devices, select)
+    if not devices:
+        return
+
+    timeout = ctx.obj['config'].network.request_timeout
+    clients = {device: LEDTomatoClient(device, timeout=timeout, report_errors=False) for device in devices}
+    plan = await plan_rollout(clients, policy)
+    display.show_rollout_plan(plan)
+    if dry_run or not plan.pending:
+        return
+
+    report = await run_rollout(clients, plan, canary=canary, wave_size=wave_size,
+                               max_failure_rate=max_failure_rate, clock=display.clock)
+    display.show_rollout_report(report)
+    if report.halted or report.failed:
+        ctx.exit(1)
+
+
+@fleet.command()
+@click.option('--device', '-d', 'devices', multiple=True,
+              help='Device address or inventory ID (repeatable; default: preferred or discovered devices)')
+@click.option('--select', '-s', help='Inventory selector, e.g. floor=3,team=infra (see ledtomato inventory)')
+@click.option('--rotate', is_flag=True, help='Generate a new key instead of reusing the saved one')
+@click.pass_context
+def key(ctx: click.Context, devices: Tuple[str, ...], select: Optional[str], rotate: bool) -> None:
+    """Share the multicast key with devices"""
+    run_async(ctx, _share_key(ctx, list(devices), select, rotate))
+
+
+async def _share_key(ctx: click.Context, devices: List[str], select: Optional[str], rotate: bool) -> None:
+    """Key provisioning implementation"""
+    import asyncio
+
+    from ..client import LEDTomatoClient
+    from ..multicast import generate_key
+
+    display = get_display(ctx)
+    devices = await target_devices(ctx, devices, select)
+    if not devices:
+        return
+
+    config = ctx.obj['config']
+    if rotate or not config.network.multicast_key:
+        config.network.multicast_key = generate_key()
+        if not config.save():
+            display.show_error("Failed to save the multicast key")
+            return
+
+    timeout = config.network.request_timeout
+    results = await asyncio.gather(*(LEDTomatoClient(device, timeout=timeout).set_multicast_key(
+        config.network.multicast_key) for device in devices))
+    for device, success in zip(devices, results):
+        if success:
+            display.show_success(f"Multicast key set on {device}")
+        else:
+            display.show_error(f"Failed to set the multicast key on {device}")
+
+
+@fleet.command()
+@click.argument('action', type=click.Choice(['start', 'stop']))
+@click.option('--device', '-d', 'devices', multiple=True,
+              help='Device expected to acknowledge (repeatable; default: devices heard in beacons)')
+@click.option('--select', '-s', help='Inventory selector, e.g. floor=3,team=infra (see ledtomato inventory)')
+@click.option('--type', '-t', type=click.Choice(['work', 'short', 'long']), default='work',
+              help='Timer type (work, short break, long break)')
+@click.option('--listen', type=click.FloatRange(min=0), default=6.0, show_default=True,
+              help='Seconds to listen for beacons when no devices are given')
+@click.option('--group', default=None, help='Multicast group, or the address of an emulator channel')
+@click.option('--port', type=click.IntRange(1, 65535), default=None, help='Command port')
+@click.pass_context
+def broadcast(ctx: click.Context, action: str, devices: Tuple[str, ...], select: Optional[str], type: str,
+              listen: float, group: Optional[str], port: Optional[int]) -> None:
+    """Start or stop every device with one multicast packet"""
+    run_async(ctx, _broadcast(ctx, action, list(devices), select, type, listen, group, port))
+
+
+async def _broadcast(ctx: click.Context, action: str, devices: List[str], select: Optional[str],
+                     timer_type: str, listen: float, group: Optional[str], port: Optional[int]) -> None:
+    """Multicast command implementation"""
+    import asyncio
+
+    from ..multicast import COMMAND_PORT, GROUP, MulticastController, parse_key
+
+    display = get_display(ctx)
+    key = ctx.obj['config'].network.multicast_key
+    if not key:
+        display.show_error("No multicast key configured. Run 'ledtomato fleet key' first.")
+        return
+
+    if devices or select:
+        devices = await target_devices(ctx, devices, select)
+        if not devices:
+            return
+
+    timer_map = {'work': 'work', 'short': 'short_break', 'long': 'long_break'}
+    async with MulticastController(parse_key(key), group or GROUP, port or COMMAND_PORT,
+                                   epoch_file=ctx.obj['config'].get_multicast_epoch_file()) as controller:
+        if devices:
+            macs = await asyncio.gather(*(controller.register(device) for device in devices))
+            for device, mac in zip(devices, macs):
+                if mac is None:
+                    display.show_warning(f"{device} has no multicast key; it will not be waited for")
+        else:
+            await controller.listen_beacons(listen)
+            if not controller.devices:
+                display.show_warning("No beacons heard; sending without waiting for acknowledgements")
+
+        if action == 'start':
+            result = await controller.start(timer_map[timer_type])
+        else:
+            result = await controller.stop()
+    display.show_broadcast_result(result, controller.devices)
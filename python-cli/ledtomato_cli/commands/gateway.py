@@ -0,0 +1,81 @@
+"""gateway command"""
+
+from typing import List, Optional, Tuple
+
+import click
+
+from . import get_display, get_inventory, run_async, target_devices
+
+
+@click.command()
+@click.option('--device', '-d', 'devices', multiple=True,
+              help='Device address or inventory ID to serve (repeatable)')
+@click.option('--select', '-s', help='Serve the inventory devices matching a selector, e.g. floor=3')
+@click.option('--discover', 'follow', is_flag=True,
+              help='Also serve devices announced over mDNS or multicast beacons')
+@click.option('--host', default='127.0.0.1', show_default=True, help='Address to listen on')
+@click.option('--port', '-p', type=click.IntRange(0, 65535), default=8787, show_default=True,
+              help='Port to listen on')
+@click.option('--ttl', type=click.FloatRange(min=0), default=0.5, show_default=True,
+              help='Seconds a status or config response is served from cache')
+@click.option('--queue/--no-queue', default=True, show_default=True,
+              help='Queue start, stop and config writes to unreachable devices and send them when they are back')
+@click.pass_context
+def gateway(ctx: click.Context, devices: Tuple[str, ...], select: Optional[str], follow: bool, host: str,
+            port: int, ttl: float, queue: bool) -> None:
+    """Serve the device API to many clients with one connection per device"""
+    run_async(ctx, _serve(ctx, list(devices), select, follow, host, port, ttl, queue))
+
+
+async def _serve(ctx: click.Context, devices: List[str], select: Optional[str], follow: bool, host: str,
+                 port: int, ttl: float, queue: bool) -> None:
+    """Gateway implementation; runs until interrupted"""
+    import asyncio
+
+    from ..config import Config
+    from ..gateway import Gateway
+    from ..outbox import Outbox
+
+    display = get_display(ctx)
+    config = ctx.obj['config']
+    if devices or select:
+        devices = await target_devices(ctx, devices, select)
+    elif config.network.default_device:
+        devices = [get_inventory(ctx).target(config.network.default_device)]
+    if not devices and not follow:
+        display.show_error("No devices to serve. Use --device, --select or --discover.")
+        return
+
+    tracker = None
+    if follow:
+        from ..presence import PresenceTracker
+
+        key = config.network.multicast_key
+        tracker = await PresenceTracker(beacon_key=bytes.fromhex(key) if key else None).start()
+
+    outbox = Outbox.load(config.get_outbox_file()) if queue else None
+    server = Gateway(devices, table=tracker.table if tracker else None,
+                     ttl=ttl, timeout=config.network.request_timeout, outbox=outbox)
+    loop = asyncio.get_running_loop()
+
+    def reload(new_config: Config) -> None:
+        # Settings edited while the gateway runs apply without a restart
+        ctx.obj['config'] = new_config
+        timeout = new_config.network.request_timeout
+        if timeout != server.timeout:
+            server.set_timeout(timeout)
+            display.show_info(f"Reloaded settings: request timeout {timeout:g}s")
+
+    watcher = Config.watch(lambda new_config: loop.call_soon_threadsafe(reload, new_config),
+                           ctx.obj.get('config_path'))
+    try:
+        await server.start(host, port)
+        display.show_success(f"Gateway listening on http://{host}:{server.port}")
+        for device in devices:
+            display.console.print(f"  • http://{host}:{server.port}/devices/{device}/api/status")
+        await asyncio.Event().wait()
+    finally:
+        watcher.stop()
+        await server.stop()
+        if tracker is not None:
+            await tracker.stop()
@@ -0,0 +1,58 @@
+"""inventory command group"""
+
+from typing import Optional, Tuple
+
+import click
+
+from . import get_display, get_inventory
+
+
+@click.group()
+def inventory() -> None:
+    """Name devices and label them for --select"""
+
+
+@inventory.command(name='list')
+@click.option('--select', '-s', help='Only devices matching a selector, e.g. floor=3,team=infra')
+@click.pass_context
+def list_devices(ctx: click.Context, select: Optional[str]) -> None:
+    """List named and discovered devices (no network access)"""
+    fleet = get_inventory(ctx)
+    if select:
+        try:
+            devices = fleet.select(select)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="'--select'")
+    else:
+        devices = sorted(fleet.devices.values(), key=lambda device: (not device.named, device.id))
+    get_display(ctx).show_inventory(devices)
+
+
+@inventory.command(name='set')
+@click.argument('device_id')
+@click.option('--address', '-a', help='Address or hostname (default: where discovery last found it)')
+@click.option('--label', '-l', 'labels', multiple=True, metavar='KEY=VALUE',
+              help='Set a label (repeatable; an empty value removes it)')
+@click.option('--tag', '-t', 'tags', multiple=True, help='Add a tag (repeatable)')
+@click.option('--group', '-g', 'groups', multiple=True, help='Add to a group (repeatable)')
+@click.pass_context
+def set_device(ctx: click.Context, device_id: str, address: Optional[str], labels: Tuple[str, ...],
+               tags: Tuple[str, ...], groups: Tuple[str, ...]) -> None:
+    """Name a device or change its labels, tags and groups"""
+    parsed = {}
+    for label in labels:
+        key, sep, value = label.partition('=')
+        if not sep or not key.strip() or key.strip().lower() in ('id', 'tag', 'group'):
+            raise click.BadParameter(f"'{label}' is not KEY=VALUE with a label key", param_hint="'--label'")
+        parsed[key.strip()] = value.strip()
+
+    display = get_display(ctx)
+    fleet = get_inventory(ctx)
+    fleet.name(device_id, address=address, labels=parsed, tags=tags, groups=groups)
+    try:
+        fleet.save()
+        ctx.obj['config'].save_device_cache(fleet.cache())
+    except OSError as e:
+        display.show_error(f"Could not save the inventory: {e}")
+        return
+    display.show_success(f"Saved {device_id} to {fleet.path}")
@@ -0,0 +1,29 @@
+"""log command group"""
+
+import click
+
+from . import get_display
+
+
+@click.group()
+def log() -> None:
+    """Manage the local session log"""
+
+
+@log.command()
+@click.pass_context
+def compact(ctx: click.Context) -> None:
+    """Compress closed monthly segments and rebuild the log index"""
+    config = ctx.obj['config']
+    console = get_display(ctx).console
+
+    try:
+        result = config.get_session_log().compact()
+    except Exception as e:
+        console.print(f"[red]❌ Could not compact session log: {e}[/red]")
+        return
+
+    if result['migrated']:
+        console.print(f"[blue]ℹ️ Migrated {result['migrated']} entries from legacy sessions.log[/blue]")
+    console.print(f"[green]✅ Session log compacted: {result['segments']} segment(s), "
+                  f"{result['compressed']} newly compressed[/green]")
@@ -0,0 +1,66 @@
+"""metrics command"""
+
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from . import get_display, run_async
+
+
+@click.command()
+@click.option('--format', '-f', 'output_format', type=click.Choice(['table', 'json', 'prometheus']),
+              default='table', help='Output format')
+@click.option('--textfile', type=click.Path(dir_okay=False, path_type=Path),
+              help='Write Prometheus text to a file (node_exporter textfile collector)')
+@click.option('--serve', metavar='[HOST:]PORT',
+              help='Serve Prometheus text at http://HOST:PORT/metrics until interrupted')
+@click.option('--reset', is_flag=True, help='Clear the recorded metrics')
+@click.pass_context
+def metrics(ctx: click.Context, output_format: str, textfile: Optional[Path], serve: Optional[str],
+            reset: bool) -> None:
+    """Show request latency recorded by --metrics runs"""
+    from ..metrics import MetricsRegistry
+
+    config = ctx.obj['config']
+    display = get_display(ctx)
+    metrics_file = config.get_metrics_file()
+
+    if reset:
+        metrics_file.unlink(missing_ok=True)
+        display.show_success("Request metrics cleared")
+        return
+
+    registry = MetricsRegistry.load(metrics_file)
+
+    if textfile:
+        registry.write_textfile(textfile)
+        display.show_success(f"Wrote Prometheus metrics to {textfile}")
+    elif serve:
+        host, _, port = serve.rpartition(':')
+        if not port.isdigit():
+            raise click.BadParameter(f"expected [HOST:]PORT, got {serve!r}", param_hint='--serve')
+        run_async(ctx, _serve(ctx, host or '127.0.0.1', int(port)))
+    elif output_format == 'json':
+        import json
+        click.echo(json.dumps(registry.to_dict(), indent=2))
+    elif output_format == 'prometheus':
+        click.echo(registry.to_prometheus(), nl=False)
+    else:
+        display.show_request_metrics(registry)
+
+
+async def _serve(ctx: click.Context, host: str, port: int) -> None:
+    """Serve the snapshot, re-read on every scrape so other runs show up"""
+    import asyncio
+
+    from ..metrics import MetricsRegistry, serve_prometheus
+
+    metrics_file = ctx.obj['config'].get_metrics_file()
+    server = await serve_prometheus(lambda: MetricsRegistry.load(metrics_file).to_prometheus(), host, port)
+    get_display(ctx).show_info(f"Serving Prometheus metrics at http://{host}:{port}/metrics (Ctrl+C to stop)")
+    try:
+        async with server:
+            await asyncio.Event().wait()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -0,0 +1,145 @@
+"""monitor command"""
+
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import click
+
+from . import get_display, resolve_device, run_async, target_devices
+
+if TYPE_CHECKING:
+    from ..client import LEDTomatoClient
+    from ..clock import Clock
+    from ..timeseries import TimeSeriesStore
+
+Event = Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+@click.command()
+@click.option('--device', '-d', 'devices', multiple=True,
+              help='Device address or inventory ID (repeatable, to follow several at once; default: discover one)')
+@click.option('--select', '-s', help='Follow the inventory devices matching a selector, e.g. floor=3')
+@click.option('--interval', type=click.FloatRange(min=0, min_open=True),
+              help='Seconds between polls (default: display.refresh_interval)')
+@click.option('--ticks/--changes-only', default=True, show_default=True,
+              help='Report every poll, or only state changes and reachability')
+@click.option('--count', type=click.IntRange(min=1), help='Stop after this many polls')
+@click.option('--history', type=click.IntRange(min=1), default=3600, show_default=True,
+              help='Polls kept per device for the trends shown on exit')
+@click.pass_context
+def monitor(ctx: click.Context, devices: Tuple[str, ...], select: Optional[str], interval: Optional[float],
+            ticks: bool, count: Optional[int], history: int) -> None:
+    """Follow the timer state of one or more devices
+
+    With --output ndjson each poll is a "tick" line per device, plus a
+    "state" line whenever a timer changes state and "unreachable" /
+    "reachable" lines when a device stops or resumes answering. On exit,
+    round-trip time, remaining time and missed polls are summarized as
+    sparklines. Session starts, ends and unreachable devices are also
+    published as session events.
+    """
+    run_async(ctx, _monitor(ctx, list(devices), select, interval, ticks, count, history))
+
+
+async def _monitor(ctx: click.Context, devices: List[str], select: Optional[str], interval: Optional[float],
+                   ticks: bool, count: Optional[int], history: int) -> None:
+    """Monitor implementation"""
+    from .. import events
+    from ..client import LEDTomatoClient
+    from ..output import timer_fields
+    from ..timeseries import TimeSeriesStore
+
+    config = ctx.obj['config']
+    display = get_display(ctx)
+    if devices or select:
+        devices = await target_devices(ctx, devices, select)
+        if not devices:
+            return
+    else:
+        device = await resolve_device(ctx, None)
+        if not device:
+            return
+        devices = [device]
+
+    # No command deadline: a monitor runs until interrupted
+    clients = {device: LEDTomatoClient(device, timeout=config.network.request_timeout, report_errors=False)
+               for device in devices}
+    interval = interval or config.display.refresh_interval
+    store = TimeSeriesStore(history)
+    last: Dict[str, Dict[str, Any]] = {}
+
+    try:
+        async for kind, fields, status in _events(clients, interval, display.clock, count, store):
+            if kind == 'state':
+                now = timer_fields(status)
+                for event_type, data in events.session_changes(last.get(fields['device']), now, interval):
+                    events.emit(event_type, fields['device'], **data)
+            elif kind == 'unreachable':
+                events.emit(events.DEVICE_OFFLINE, fields['device'], error=fields['error'])
+                last.pop(fields['device'], None)  # what changed meanwhile is unknown
+            elif kind == 'tick':
+                last[fields['device']] = timer_fields(status)
+            if kind == 'tick' and not ticks:
+                continue
+            if display.machine:
+                display.emit(kind, **fields)
+            elif kind == 'state':
+                to = fields['to'].replace('_', ' ')
+                change = to if fields['from'] is None else f"{fields['from'].replace('_', ' ')} → {to}"
+                display.show_info(f"{fields['device']}: {change}")
+            elif kind == 'unreachable':
+                display.show_warning(fields['error'])
+            elif kind == 'reachable':
+                display.show_success(f"{fields['device']} is answering again")
+            elif len(clients) == 1:
+                display.show_timer_progress(status)
+    finally:
+        if store.devices:
+            display.show_trends(store)
+
+
+async def _events(clients: Dict[str, 'LEDTomatoClient'], interval: float, clock: 'Clock',
+                  count: Optional[int], store: Optional['TimeSeriesStore'] = None) -> AsyncIterator[Event]:
+    """Poll every device each interval and describe what was seen
+
+    Yields (kind, fields, status) with kind one of "tick", "state",
+    "unreachable" and "reachable"; status is the raw response, if any.
+    Every poll, answered or not, is also recorded in ``store``.
+    """
+    import asyncio
+
+    from ..client import describe_failure
+    from ..output import timer_fields
+
+    states: Dict[str, Optional[str]] = {device: None for device in clients}
+    reachable = {device: True for device in clients}
+    async def poll(client: 'LEDTomatoClient') -> Tuple[Optional[Dict[str, Any]], float]:
+        sent = clock.time()
+        status = await client.get_status()
+        return status, (clock.time() - sent) * 1000.0
+
+    polls = 0
+    while count is None or polls < count:
+        started = clock.time()
+        results = await asyncio.gather(*(poll(client) for client in clients.values()))
+        polls += 1
+        for (device, client), (status, rtt_ms) in zip(clients.items(), results):
+            if store is not None:
+                store.record(device, started, rtt_ms, status)
+            if status is None:
+                if reachable[device]:
+                    reachable[device] = False
+                    error = describe_failure(device, client.last_error, client.last_status)
+                    yield 'unreachable', {'device': device, 'error': error}, None
+                continue
+            if not reachable[device]:
+                reachable[device] = True
+                yield 'reachable', {'device': device}, status
+
+            fields = timer_fields(status)
+            if fields['state'] != states[device]:
+                yield 'state', {'device': device, 'from': states[device], 'to': fields['state']}, status
+                states[device] = fields['state']
+            yield 'tick', {'device': device, **fields, 'rtt_ms': round(rtt_ms, 1)}, status
+
+        if count is None or polls < count:
+            await clock.sleep(max(0.0, interval - (clock.time() - started)))
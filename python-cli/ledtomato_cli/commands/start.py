@@ -0,0 +1,61 @@
+"""start command"""
+
+from typing import Optional
+
+import click
+
+from . import device_client, get_display, resolve_device, run_async, show_failure
+
+
+@click.command()
+@click.option('--device', '-d', help='Device IP address or hostname')
+@click.option('--type', '-t', type=click.Choice(['work', 'short', 'long']), default='work',
+              help='Timer type (work, short break, long break)')
+@click.option('--duration', type=int, help='Timer duration in minutes')
+@click.pass_context
+def start(ctx: click.Context, device: Optional[str], type: str, duration: Optional[int]) -> None:
+    """Start a Pomodoro timer session"""
+    run_async(ctx, _start_timer(ctx, device, type, duration))
+
+
+async def _start_timer(ctx: click.Context, device: Optional[str], timer_type: str, duration: Optional[int]) -> None:
+    """Start timer implementation"""
+    from .. import events
+    from ..timer import TimerManager
+
+    config = ctx.obj['config']
+    display = get_display(ctx)
+    console = display.console
+
+    device = await resolve_device(ctx, device)
+    if not device:
+        return
+
+    client = device_client(ctx, device)
+
+    # Map timer type
+    timer_map = {'work': 'work', 'short': 'short_break', 'long': 'long_break'}
+    api_type = timer_map[timer_type]
+
+    # Set custom duration if provided (only that field; the device keeps the rest)
+    if duration:
+        duration_keys = {'work': 'workTime', 'short': 'shortBreakTime', 'long': 'longBreakTime'}
+        if not await client.patch_config({duration_keys[timer_type]: duration * 60}):
+            show_failure(ctx, client, device, "set the duration")
+            return
+
+    # Start timer
+    success = await client.start_timer(api_type)
+    if success:
+        timer_name = timer_type.replace('_', ' ').title()
+        duration_text = f" ({duration} min)" if duration else ""
+        console.print(f"[green]✅ Started {timer_name} session{duration_text}[/green]")
+        events.emit(events.SESSION_STARTED, device, session=api_type,
+                    **({'duration_minutes': duration} if duration else {}))
+
+        # Monitor timer; the deadline covered starting it, not the session itself
+        client.deadline = None
+        timer_manager = TimerManager(client, display, config)
+        await timer_manager.monitor_session()
+    else:
+        show_failure(ctx, client, device, "start timer")
@@ -0,0 +1,20 @@
+"""stats command"""
+
+import click
+
+from . import get_display
+
+
+@click.command()
+@click.pass_context
+def stats(ctx: click.Context) -> None:
+    """Show session statistics from the local log"""
+    display = get_display(ctx)
+
+    try:
+        result = ctx.obj['config'].get_session_log().stats()
+    except Exception as e:
+        display.show_error(f"Could not read session log: {e}")
+        return
+
+    display.show_session_stats(result)
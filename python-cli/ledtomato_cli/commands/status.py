@@ -0,0 +1,29 @@
+"""status command"""
+
+from typing import Optional
+
+import click
+
+from . import device_client, get_display, resolve_device, run_async, show_failure
+
+
+@click.command()
+@click.option('--device', '-d', help='Device IP address or hostname')
+@click.pass_context
+def status(ctx: click.Context, device: Optional[str]) -> None:
+    """Show current timer status"""
+    run_async(ctx, _show_status(ctx, device))
+
+
+async def _show_status(ctx: click.Context, device: Optional[str]) -> None:
+    """Show status implementation"""
+    device = await resolve_device(ctx, device)
+    if not device:
+        return
+
+    client = device_client(ctx, device)
+    status = await client.get_status()
+    if status:
+        get_display(ctx).show_status(status, device)
+    else:
+        show_failure(ctx, client, device, "get status")
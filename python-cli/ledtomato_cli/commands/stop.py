@@ -0,0 +1,32 @@
+"""stop command"""
+
+from typing import Optional
+
+import click
+
+from . import device_client, get_display, resolve_device, run_async, show_failure
+
+
+@click.command()
+@click.option('--device', '-d', help='Device IP address or hostname')
+@click.pass_context
+def stop(ctx: click.Context, device: Optional[str]) -> None:
+    """Stop the current timer session"""
+    run_async(ctx, _stop_timer(ctx, device))
+
+
+async def _stop_timer(ctx: click.Context, device: Optional[str]) -> None:
+    """Stop timer implementation"""
+    from .. import events
+
+    device = await resolve_device(ctx, device)
+    if not device:
+        return
+
+    client = device_client(ctx, device)
+    success = await client.stop_timer()
+    if success:
+        get_display(ctx).console.print("[green]✅ Timer stopped[/green]")
+        events.emit(events.SESSION_STOPPED, device)
+    else:
+        show_failure(ctx, client, device, "stop timer")
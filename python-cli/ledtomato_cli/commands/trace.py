@@ -0,0 +1,42 @@
+"""trace command group"""
+
+from pathlib import Path
+
+import click
+
+from . import get_display
+
+TRACE_FILE = click.Path(exists=True, dir_okay=False, path_type=Path)
+
+
+def _load(path: Path):
+    from ..traffic import Trace
+
+    try:
+        return Trace.load(path)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(f"Could not load trace {path}: {e}")
+
+
+@click.group()
+def trace() -> None:
+    """Inspect traces written by --record"""
+
+
+@trace.command()
+@click.argument('path', type=TRACE_FILE)
+@click.pass_context
+def show(ctx: click.Context, path: Path) -> None:
+    """Show requests and bytes per scenario"""
+    get_display(ctx).show_trace_summary(_load(path).summary(), str(path))
+
+
+@trace.command()
+@click.argument('base', type=TRACE_FILE)
+@click.argument('current', type=TRACE_FILE)
+@click.pass_context
+def diff(ctx: click.Context, base: Path, current: Path) -> None:
+    """Compare round-trips and bytes per scenario between two traces"""
+    from ..traffic import diff_traces
+
+    get_display(ctx).show_trace_diff(diff_traces(_load(base), _load(current)))
@@ -1,12 +1,17 @@
 """Configuration management for LED Tomato CLI"""
 
+import copy
 import json
 import os
+import sys
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Callable, Optional, List, Tuple, TYPE_CHECKING
 from dataclasses import dataclass, asdict
 import appdirs
 
+if TYPE_CHECKING:
+    from .sessionlog import SessionLog
+
 
 @dataclass
 class PomodoroConfig:
@@ -46,14 +51,95 @@ class NetworkConfig:
     """Network configuration"""
     discovery_timeout: int = 10  # seconds
     request_timeout: int = 5  # seconds
-    default_device: Optional[str] = None
-    preferred_devices: list = None
+    command_timeout: float = 15.0  # seconds for a whole command, discovery included
+    default_device: Optional[str] = None  # address or inventory ID for single-device commands
+    preferred_devices: Optional[List[str]] = None  # fleet commands' targets when none are given
+    multicast_key: Optional[str] = None  # hex, shared with devices by `fleet key`
+    retries: int = 2  # extra attempts after a connection failure, within the request timeout
+    hedge_reads: bool = False  # repeat status reads slower than their p95
     
     def __post_init__(self):
         if self.preferred_devices is None:
             self.preferred_devices = []
 
 
+@dataclass
+class EventsConfig:
+    """Session event delivery (see ``ledtomato_cli.events``)"""
+    webhooks: Optional[List[Any]] = None  # URLs, or {"url": ..., "events": [...], "headers": {...}}
+    plugins: Optional[List[str]] = None  # "module:function" called with the event bus
+    queue_size: int = 1000  # events held per webhook before the overflow policy applies
+    overflow: str = "drop-oldest"  # or "spill" (to a file in the cache directory)
+    batch_size: int = 20  # events per POST
+    flush_interval: float = 1.0  # seconds to wait for a batch to fill
+    retries: int = 5  # extra attempts per batch, with backoff
+    
+    def __post_init__(self):
+        if self.webhooks is None:
+            self.webhooks = []
+        if self.plugins is None:
+            self.plugins = []
+
+
+SECTIONS = {
+    'pomodoro': PomodoroConfig,
+    'sound': SoundConfig,
+    'display': DisplayConfig,
+    'network': NetworkConfig,
+    'events': EventsConfig,
+}
+
+
+APP_NAME = "ledtomato-cli"
+
+# Parsed config snapshots keyed by path, valid while (mtime_ns, size) match.
+# Entries are replaced whole, so concurrent readers at worst parse twice.
+_snapshots: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """Get the (mtime_ns, size) signature of a file, or None if missing"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_snapshot(path: Path) -> Optional[Dict[str, Any]]:
+    """Get the parsed, validated sections of a config file
+
+    The parsed result is cached until the file's mtime or size changes, so
+    repeated loads (and reloads triggered by ``ConfigWatcher``) skip JSON
+    parsing and validation when nothing changed.
+    """
+    signature = _file_signature(path)
+    if signature is None:
+        return None
+    
+    key = str(path)
+    cached = _snapshots.get(key)
+    if cached and cached[0] == signature:
+        return cached[1]
+    
+    with open(path, 'r') as f:
+        data = json.load(f)
+    
+    # Validate once per snapshot by building the sections
+    sections = {}
+    for name, section_cls in SECTIONS.items():
+        if name in data:
+            sections[name] = asdict(section_cls(**data[name]))
+    
+    probe = Config()
+    probe._apply_sections(sections)
+    for error in probe.validate():
+        print(f"Warning: Invalid config value: {error}", file=sys.stderr)
+    
+    _snapshots[key] = (signature, sections)
+    return sections
+
+
 class Config:
     """Main configuration class"""
     
@@ -62,19 +148,55 @@ class Config:
         self.sound = SoundConfig()
         self.display = DisplayConfig()
         self.network = NetworkConfig()
+        self.events = EventsConfig()
         
-        # App directories
-        self.app_name = "ledtomato-cli"
-        self.config_dir = Path(appdirs.user_config_dir(self.app_name))
-        self.data_dir = Path(appdirs.user_data_dir(self.app_name))
-        self.cache_dir = Path(appdirs.user_cache_dir(self.app_name))
-        
-        # Ensure directories exist
-        self.config_dir.mkdir(parents=True, exist_ok=True)
-        self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
-        
-        self.config_file = self.config_dir / "config.json"
+        # App directories are resolved on first access and only created
+        # when something is written to them
+        self.app_name = APP_NAME
+        self._dirs: Dict[str, Path] = {}
+    
+    def _app_dir(self, kind: str) -> Path:
+        """Resolve an appdirs directory once per instance"""
+        if kind not in self._dirs:
+            resolver = {
+                'config': appdirs.user_config_dir,
+                'data': appdirs.user_data_dir,
+                'cache': appdirs.user_cache_dir,
+            }[kind]
+            self._dirs[kind] = Path(resolver(self.app_name))
+        return self._dirs[kind]
+    
+    @property
+    def config_dir(self) -> Path:
+        return self._app_dir('config')
+    
+    @property
+    def data_dir(self) -> Path:
+        return self._app_dir('data')
+    
+    @property
+    def cache_dir(self) -> Path:
+        return self._app_dir('cache')
+    
+    @property
+    def config_file(self) -> Path:
+        return self.config_dir / "config.json"
+    
+    @staticmethod
+    def ensure_dir(path: Path) -> Path:
+        """Create a directory (and parents) right before writing into it"""
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    
+    def _apply_sections(self, sections: Dict[str, Dict[str, Any]]) -> None:
+        """Replace config sections from parsed section dicts"""
+        for name, values in sections.items():
+            # Snapshots are cached and shared by every load: copy nested lists and dicts too
+            values = copy.deepcopy(values)
+            if name == 'events':
+                values['webhooks'] = values.get('webhooks') or []
+                values['plugins'] = values.get('plugins') or []
+            setattr(self, name, SECTIONS[name](**values))
     
     @classmethod
     def load(cls, config_path: Optional[str] = None) -> 'Config':
@@ -86,26 +208,21 @@ class Config:
         else:
             config_file = config.config_file
         
-        if config_file.exists():
-            try:
-                with open(config_file, 'r') as f:
-                    data = json.load(f)
-                
-                # Load each section
-                if 'pomodoro' in data:
-                    config.pomodoro = PomodoroConfig(**data['pomodoro'])
-                if 'sound' in data:
-                    config.sound = SoundConfig(**data['sound'])
-                if 'display' in data:
-                    config.display = DisplayConfig(**data['display'])
-                if 'network' in data:
-                    config.network = NetworkConfig(**data['network'])
-                    
-            except Exception as e:
-                print(f"Warning: Could not load config file: {e}")
+        try:
+            sections = _load_snapshot(config_file)
+            if sections:
+                config._apply_sections(sections)
+        except Exception as e:
+            print(f"Warning: Could not load config file: {e}", file=sys.stderr)
         
         return config
     
+    @classmethod
+    def watch(cls, callback: Callable[['Config'], None], config_path: Optional[str] = None,
+              poll_interval: float = 1.0) -> 'ConfigWatcher':
+        """Start watching the config file and call ``callback`` with each reload"""
+        return ConfigWatcher(callback, config_path, poll_interval).start()
+    
     def save(self, config_path: Optional[str] = None) -> bool:
         """Save configuration to file"""
         if config_path:
@@ -120,7 +237,8 @@ class Config:
                 'pomodoro': asdict(self.pomodoro),
                 'sound': asdict(self.sound),
                 'display': asdict(self.display),
-                'network': asdict(self.network)
+                'network': asdict(self.network),
+                'events': asdict(self.events)
             }
             
             with open(config_file, 'w') as f:
@@ -128,17 +246,54 @@ class Config:
             
             return True
         except Exception as e:
-            print(f"Error saving config: {e}")
+            print(f"Error saving config: {e}", file=sys.stderr)
             return False
     
     def get_device_cache_file(self) -> Path:
         """Get path to device cache file"""
         return self.cache_dir / "devices.json"
     
+    def get_inventory_file(self) -> Path:
+        """Get path to the fleet inventory (device names, labels, tags and groups)"""
+        return self.config_dir / "inventory.json"
+    
+    def get_outbox_file(self) -> Path:
+        """Get path to the gateway's queue of commands for unreachable devices"""
+        return self.cache_dir / "outbox.json"
+    
+    def get_multicast_epoch_file(self) -> Path:
+        """Get path to the last multicast epoch used with each key"""
+        return self.cache_dir / "multicast.json"
+    
+    def get_event_spill_dir(self) -> Path:
+        """Get path to the directory webhooks spill undelivered events to"""
+        return self.cache_dir / "events"
+    
+    def get_resolver_cache_file(self) -> Path:
+        """Get path to the cache of resolved .local hostnames"""
+        return self.cache_dir / "hosts.json"
+    
+    def get_metrics_file(self) -> Path:
+        """Get path to the accumulated request metrics snapshot"""
+        return self.cache_dir / "metrics.json"
+    
+    def get_profile_dir(self) -> Path:
+        """Get path to the directory for --profile reports"""
+        return self.cache_dir / "profiles"
+    
     def get_session_log_file(self) -> Path:
-        """Get path to session log file"""
+        """Get path to the legacy (pre-segmentation) session log file"""
         return self.data_dir / "sessions.log"
     
+    def get_session_log_dir(self) -> Path:
+        """Get path to the segmented session log directory"""
+        return self.data_dir / "sessions"
+    
+    def get_session_log(self) -> 'SessionLog':
+        """Get the segmented session log"""
+        from .sessionlog import SessionLog
+        return SessionLog(self.get_session_log_dir(), legacy_file=self.get_session_log_file())
+    
     def load_device_cache(self) -> Dict[str, Any]:
         """Load cached device information"""
         cache_file = self.get_device_cache_file()
@@ -154,6 +309,7 @@ class Config:
         """Save device information to cache"""
         cache_file = self.get_device_cache_file()
         try:
+            self.ensure_dir(cache_file.parent)
             with open(cache_file, 'w') as f:
                 json.dump(devices, f, indent=2)
             return True
@@ -166,7 +322,8 @@ class Config:
             'pomodoro': asdict(self.pomodoro),
             'sound': asdict(self.sound),
             'display': asdict(self.display),
-            'network': asdict(self.network)
+            'network': asdict(self.network),
+            'events': asdict(self.events)
         }
     
     def reset_to_defaults(self) -> None:
@@ -175,6 +332,7 @@ class Config:
         self.sound = SoundConfig()
         self.display = DisplayConfig()
         self.network = NetworkConfig()
+        self.events = EventsConfig()
     
     def validate(self) -> List[str]:
         """Validate configuration and return list of errors"""
@@ -203,5 +361,128 @@ class Config:
             errors.append("Discovery timeout must be positive")
         if self.network.request_timeout <= 0:
             errors.append("Request timeout must be positive")
+        if self.network.command_timeout <= 0:
+            errors.append("Command timeout must be positive")
+        if self.network.retries < 0:
+            errors.append("Retries must not be negative")
+        if not all(isinstance(device, str) and device for device in self.network.preferred_devices):
+            errors.append("Preferred devices must be addresses or inventory IDs")
+        if self.network.multicast_key is not None:
+            try:
+                if len(bytes.fromhex(self.network.multicast_key)) != 16:
+                    errors.append("Multicast key must be 32 hex digits")
+            except ValueError:
+                errors.append("Multicast key must be 32 hex digits")
+        
+        # Validate event settings
+        for webhook in self.events.webhooks:
+            url = webhook.get('url') if isinstance(webhook, dict) else webhook
+            if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+                errors.append("Webhooks must be http(s) URLs or objects with a \"url\"")
+        if self.events.overflow not in ('drop-oldest', 'spill'):
+            errors.append("Event overflow must be drop-oldest or spill")
+        if self.events.queue_size <= 0 or self.events.batch_size <= 0:
+            errors.append("Event queue and batch sizes must be positive")
+        if self.events.flush_interval < 0:
+            errors.append("Event flush interval must not be negative")
+        if self.events.retries < 0:
+            errors.append("Event retries must not be negative")
         
         return errors
+
+
+
+class ConfigWatcher:
+    """Reload the config file in-process when it changes
+    
+    Uses inotify on Linux and mtime polling elsewhere. The callback runs on
+    the watcher thread; asyncio users should hand the new config to their
+    loop with ``loop.call_soon_threadsafe``.
+    """
+    
+    def __init__(self, callback: Callable[[Config], None], config_path: Optional[str] = None,
+                 poll_interval: float = 1.0):
+        import threading
+        
+        self.callback = callback
+        self.config_path = config_path
+        self.config_file = Path(config_path) if config_path else Config().config_file
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional['threading.Thread'] = None
+        self._signature = _file_signature(self.config_file)
+    
+    def start(self) -> 'ConfigWatcher':
+        """Start the watcher thread"""
+        import threading
+        
+        target = self._run_inotify if sys.platform.startswith('linux') else self._run_polling
+        self._thread = threading.Thread(target=target, name="ledtomato-config-watcher", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        """Stop the watcher thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 1)
+    
+    def _check(self) -> None:
+        """Reload and notify if the file signature changed"""
+        signature = _file_signature(self.config_file)
+        if signature == self._signature:
+            return
+        self._signature = signature
+        try:
+            self.callback(Config.load(self.config_path))
+        except Exception as e:
+            print(f"Warning: Config reload callback failed: {e}", file=sys.stderr)
+    
+    def _run_polling(self) -> None:
+        """Poll the file mtime"""
+        while not self._stop.wait(self.poll_interval):
+            self._check()
+    
+    def _run_inotify(self) -> None:
+        """Wait for inotify events on the config directory"""
+        import ctypes
+        import ctypes.util
+        import select
+        
+        IN_MODIFY = 0x002
+        IN_CLOSE_WRITE = 0x008
+        IN_MOVED_TO = 0x080
+        IN_CREATE = 0x100
+        IN_DELETE = 0x200
+        IN_NONBLOCK = 0o4000
+        IN_CLOEXEC = 0o2000000
+        
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            # Watch the directory: editors often replace the file by rename
+            watch_dir = self.config_file.parent
+            while not watch_dir.exists() and watch_dir != watch_dir.parent:
+                watch_dir = watch_dir.parent
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            if libc.inotify_add_watch(fd, str(watch_dir).encode(), mask) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        except Exception:
+            self._run_polling()
+            return
+        
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], self.poll_interval)
+                if ready:
+                    try:
+                        os.read(fd, 4096)
+                    except BlockingIOError:
+                        pass
+                # Also catches the config directory being created later
+                self._check()
+        finally:
+            os.close(fd)
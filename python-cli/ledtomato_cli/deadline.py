@@ -0,0 +1,57 @@
+"""Time budgets for whole CLI commands
+
+A command gets one ``Deadline`` when it starts (``network.command_timeout``
+or ``--timeout``). Each step takes its share from what is left: discovery
+may use up to ``discovery_timeout`` but must leave room for the request,
+and every request is capped by both ``request_timeout`` and the remaining
+time. Retries and name resolution spend from the same budget, so a
+command never runs past its deadline however it fails.
+"""
+
+import asyncio
+from typing import Optional
+
+from .clock import Clock, SystemClock
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised instead of starting a step when the command is out of time"""
+
+
+class Deadline:
+    """The instant a command has to be done by"""
+
+    def __init__(self, seconds: float, clock: Optional[Clock] = None):
+        """Initialize deadline
+
+        Args:
+            seconds: Time allowed from now
+            clock: Time source
+        """
+        self.seconds = seconds
+        self.clock = clock or SystemClock()
+        self.expires = self.clock.time() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        return max(0.0, self.expires - self.clock.time())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def budget(self, limit: Optional[float] = None, reserve: float = 0.0) -> float:
+        """Seconds the next step may take
+
+        Args:
+            limit: The step's own timeout, if it has one
+            reserve: Seconds to leave for the steps after it
+
+        Raises ``DeadlineExceeded`` if nothing is left for the step.
+        """
+        available = self.remaining() - reserve
+        if limit is not None:
+            available = min(available, limit)
+        if available <= 0.0:
+            raise DeadlineExceeded(f"command deadline of {self.seconds:g}s exceeded")
+        return available
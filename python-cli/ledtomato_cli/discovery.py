@@ -1,46 +1,79 @@
 """Device discovery for LED Tomato devices"""
 
 import asyncio
+import ipaddress
 import socket
 import aiohttp
-from typing import List, Dict, Optional, Any
+from typing import Callable, List, Dict, Optional, Any
 from zeroconf import ServiceBrowser, ServiceListener, Zeroconf
 import threading
 import time
 
 
+SERVICE_TYPE = "_http._tcp.local."
+
+
 class LEDTomatoServiceListener(ServiceListener):
-    """mDNS service listener for LED Tomato devices"""
+    """mDNS service listener for LED Tomato devices
     
-    def __init__(self):
-        self.devices = []
+    Devices are kept per service name, so repeated announcements replace
+    rather than duplicate an entry. ``on_change(kind, name, device)`` is
+    called with kind "add", "update" or "remove" from the zeroconf thread.
+    """
+    
+    def __init__(self, on_change: Optional[Callable[[str, str, Dict[str, Any]], None]] = None):
+        self.services: Dict[str, Dict[str, Any]] = {}
         self.found_event = threading.Event()
+        self.on_change = on_change
+    
+    @property
+    def devices(self) -> List[Dict[str, Any]]:
+        """Devices currently announced"""
+        return list(self.services.copy().values())  # copy() is atomic; the dict changes on the zeroconf thread
+    
+    def resolve(self, zc: Zeroconf, type_: str, name: str) -> Optional[Dict[str, Any]]:
+        """Look up a service, returning None if it is gone or not a LED Tomato device"""
+        info = zc.get_service_info(type_, name)
+        if not info or not info.addresses:
+            return None
+        
+        ip = socket.inet_ntoa(info.addresses[0])
+        hostname = info.server.rstrip('.')
+        
+        # Check if this is actually a LED Tomato device
+        if 'ledtomato' not in hostname.lower() and 'tomato' not in name.lower():
+            return None
+        return {
+            'ip': ip,
+            'hostname': hostname,
+            'name': name,
+            'port': info.port,
+            'ttl': info.host_ttl
+        }
     
     def add_service(self, zc: Zeroconf, type_: str, name: str) -> None:
         """Called when a service is discovered"""
-        info = zc.get_service_info(type_, name)
-        if info and info.addresses:
-            ip = socket.inet_ntoa(info.addresses[0])
-            hostname = info.server.rstrip('.')
-            
-            # Check if this is actually a LED Tomato device
-            if 'ledtomato' in hostname.lower() or 'tomato' in name.lower():
-                device = {
-                    'ip': ip,
-                    'hostname': hostname,
-                    'name': name,
-                    'port': info.port
-                }
-                self.devices.append(device)
-                self.found_event.set()
+        self._refresh(zc, type_, name)
     
     def remove_service(self, zc: Zeroconf, type_: str, name: str) -> None:
         """Called when a service is removed"""
-        pass
+        device = self.services.pop(name, None)
+        if device is not None and self.on_change:
+            self.on_change("remove", name, device)
     
     def update_service(self, zc: Zeroconf, type_: str, name: str) -> None:
         """Called when a service is updated"""
-        pass
+        self._refresh(zc, type_, name)
+    
+    def _refresh(self, zc: Zeroconf, type_: str, name: str) -> None:
+        device = self.resolve(zc, type_, name)
+        if device is None:
+            return
+        kind = "update" if name in self.services else "add"
+        self.services[name] = device
+        self.found_event.set()
+        if self.on_change:
+            self.on_change(kind, name, device)
 
 
 class DeviceDiscovery:
@@ -50,10 +83,23 @@ class DeviceDiscovery:
         self.timeout = timeout
     
     async def find_device(self) -> Optional[str]:
-        """Find a single LED Tomato device"""
-        devices = await self.scan_network()
+        """Find a single LED Tomato device
+        
+        Returns as soon as mDNS announces one, and gives up after
+        ``timeout`` seconds in total, subnet scan included.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        devices = await self._mdns_discovery(timeout=self.timeout / 2, first=True)
+        if not devices:
+            try:
+                devices = await asyncio.wait_for(self._network_scan(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                devices = []
         if devices:
-            return devices[0]['ip']
+            device = devices[0]
+            port = device.get('port', 80)
+            return device['ip'] if port == 80 else f"{device['ip']}:{port}"
         return None
     
     async def scan_network(self) -> List[Dict[str, Any]]:
@@ -71,17 +117,29 @@ class DeviceDiscovery:
         
         return devices
     
-    async def _mdns_discovery(self) -> List[Dict[str, Any]]:
-        """Discover devices using mDNS/Bonjour"""
+    async def _mdns_discovery(self, timeout: Optional[float] = None, first: bool = False) -> List[Dict[str, Any]]:
+        """Discover devices using mDNS/Bonjour
+        
+        Args:
+            timeout: Seconds to browse (default: ``self.timeout``)
+            first: Stop as soon as one device is found
+        """
         try:
             zeroconf = Zeroconf()
             listener = LEDTomatoServiceListener()
             
             # Browse for HTTP services
-            browser = ServiceBrowser(zeroconf, "_http._tcp.local.", listener)
+            browser = ServiceBrowser(zeroconf, SERVICE_TYPE, listener)
             
             # Wait for discovery
-            await asyncio.sleep(self.timeout)
+            timeout = self.timeout if timeout is None else timeout
+            if first:
+                loop = asyncio.get_running_loop()
+                until = loop.time() + timeout
+                while not listener.found_event.is_set() and loop.time() < until:
+                    await asyncio.sleep(0.05)
+            else:
+                await asyncio.sleep(timeout)
             
             zeroconf.close()
             return listener.devices
@@ -98,42 +156,67 @@ class DeviceDiscovery:
             # Get local network range
             hostname = socket.gethostname()
             local_ip = socket.gethostbyname(hostname)
-            network_base = '.'.join(local_ip.split('.')[:-1]) + '.'
-            
-            # Create tasks for scanning IP range
-            tasks = []
-            for i in range(1, 255):
-                ip = f"{network_base}{i}"
-                if ip != local_ip:  # Skip our own IP
-                    tasks.append(self._check_device(ip))
-            
-            # Run scans concurrently
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Collect successful results
-            for result in results:
-                if isinstance(result, dict):
-                    devices.append(result)
+            devices = await self.scan_subnet(f"{local_ip}/24", exclude=local_ip)
             
         except Exception as e:
             print(f"Network scan failed: {e}")
         
         return devices
     
-    async def _check_device(self, ip: str) -> Optional[Dict[str, Any]]:
+    async def scan_subnet(self, network: str, port: int = 80, concurrency: int = 128,
+                          exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Probe every host in a subnet for a LED Tomato device
+        
+        Args:
+            network: Network in CIDR notation, e.g. "192.168.1.0/24"
+            port: HTTP port to probe
+            concurrency: Maximum probes in flight
+            exclude: Address to skip (usually our own)
+        """
+        hosts = (str(host) for host in ipaddress.ip_network(network, strict=False).hosts())
+        devices = []
+        
+        # A fixed pool of workers pulls from one host iterator, so even a /16
+        # never has more than `concurrency` tasks or sockets alive
+        timeout = aiohttp.ClientTimeout(total=2)
+        connector = aiohttp.TCPConnector(limit=concurrency, force_close=True)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            async def worker() -> None:
+                for ip in hosts:
+                    if ip == exclude:
+                        continue
+                    device = await self._check_device(ip, port, session)
+                    if device:
+                        devices.append(device)
+            
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        
+        return devices
+    
+    async def _check_device(self, ip: str, port: int = 80,
+                            session: Optional[aiohttp.ClientSession] = None) -> Optional[Dict[str, Any]]:
         """Check if IP address hosts a LED Tomato device"""
         try:
-            timeout = aiohttp.ClientTimeout(total=2)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(f"http://{ip}/api/status") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('hostname') == 'ledtomato':
-                            return {
-                                'ip': ip,
-                                'hostname': data.get('hostname', 'ledtomato'),
-                                'wifi_connected': data.get('wifiConnected', False)
-                            }
+            if session is None:
+                timeout = aiohttp.ClientTimeout(total=2)
+                async with aiohttp.ClientSession(timeout=timeout) as own_session:
+                    return await self._check_device(ip, port, own_session)
+            
+            async with session.get(f"http://{ip}:{port}/api/status") as response:
+                if response.status == 200:
+                    data = await response.json()
+                    if data.get('hostname') == 'ledtomato':
+                        device = {
+                            'ip': ip,
+                            'hostname': data.get('hostname', 'ledtomato'),
+                            'wifi_connected': data.get('wifiConnected', False)
+                        }
+                        if data.get('mac'):
+                            # Keeps the inventory entry when DHCP moves the device
+                            device['mac'] = data['mac']
+                        if port != 80:
+                            device['port'] = port
+                        return device
         except Exception:
             pass
         
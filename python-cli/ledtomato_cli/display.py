@@ -1,7 +1,8 @@
 """Display and UI components for LED Tomato CLI"""
 
-import time
-from typing import Dict, Any, Optional
+import sys
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
@@ -9,19 +10,40 @@ from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRe
 from rich.text import Text
 from rich.align import Align
 from rich.layout import Layout
+from rich.markup import escape
 from rich import box
-import colorama
 
-# Initialize colorama for Windows color support
-colorama.init()
+from .clock import Clock, SystemClock
+
+if TYPE_CHECKING:
+    from .inventory import InventoryDevice
+    from .metrics import MetricsRegistry
+    from .timeseries import TimeSeriesStore
+
+_colorama_initialized = False
+
+
+def _init_colorama() -> None:
+    """Initialize colorama for Windows color support (once, on first display)"""
+    global _colorama_initialized
+    if _colorama_initialized:
+        return
+    _colorama_initialized = True
+    if sys.platform == 'win32':
+        import colorama
+        colorama.init()
 
 
 class Display:
     """Display manager for LED Tomato CLI"""
     
-    def __init__(self, verbose: bool = False):
+    machine = False  # see output.JsonOutput
+    
+    def __init__(self, verbose: bool = False, clock: Optional[Clock] = None):
+        _init_colorama()
         self.console = Console()
         self.verbose = verbose
+        self.clock = clock or SystemClock()
         
         # ASCII art tomato
         self.tomato_art = """
@@ -120,6 +142,8 @@ class Display:
                 TextColumn("•"),
                 TextColumn("[bold]{task.fields[remaining]}"),
                 TimeRemainingColumn(),
+                console=self.console,
+                get_time=self.clock.time,
                 expand=True
             ) as progress_bar:
                 
@@ -131,7 +155,7 @@ class Display:
                     remaining=self._format_time(remaining)
                 )
                 
-                time.sleep(0.1)  # Brief pause to show the bar
+                self.clock.sleep_blocking(0.1)  # Brief pause to show the bar
     
     def show_device_list(self, devices: list) -> None:
         """Show discovered devices"""
@@ -189,6 +213,287 @@ class Display:
         
         self.console.print(table)
     
+    def show_session_stats(self, stats: Dict[str, Any]) -> None:
+        """Show statistics from the local session log"""
+        table = Table(title="📈 Session Statistics", box=box.ROUNDED)
+        table.add_column("Sessions", style="cyan", no_wrap=True)
+        table.add_column("Count", justify="right")
+        
+        table.add_row("Today", str(stats['today_sessions']))
+        table.add_row("This week", str(stats['this_week_sessions']))
+        table.add_row("Work (all time)", str(stats['work_sessions']))
+        table.add_row("Breaks (all time)", str(stats['break_sessions']))
+        table.add_row("Total", str(stats['total_sessions']))
+        
+        hours, minutes = divmod(stats['total_time_minutes'], 60)
+        self.console.print(table)
+        self.console.print(f"[dim]Total time: {hours}h {minutes:02d}m[/dim]")
+    
+    def show_inventory(self, devices: List['InventoryDevice']) -> None:
+        """Show inventory devices with their labels and what was last seen of them"""
+        if not devices:
+            self.console.print("[yellow]⚠️  No devices in the inventory[/yellow]")
+            return
+        
+        table = Table(title="🗂️ Device Inventory", box=box.ROUNDED)
+        table.add_column("ID", style="cyan", no_wrap=True)
+        table.add_column("Address", style="white")
+        table.add_column("Labels", overflow="fold")
+        table.add_column("Tags / Groups", overflow="fold")
+        table.add_column("Last seen", style="dim")
+        
+        for device in devices:
+            labels = ", ".join(f"{key}={value}" for key, value in sorted(device.labels.items()))
+            last_seen = "never"
+            if device.last_seen:
+                last_seen = datetime.fromtimestamp(device.last_seen).strftime('%Y-%m-%d %H:%M')
+            table.add_row(escape(device.id) if device.named else f"[dim]{escape(device.id)}[/dim]",
+                          escape(device.target or "unknown"), escape(labels),
+                          escape(", ".join(device.tags + [f"@{group}" for group in device.groups])), last_seen)
+        
+        self.console.print(table)
+    
+    def show_trends(self, store: 'TimeSeriesStore', width: int = 20) -> None:
+        """Show round-trip time, remaining time and missed polls per device as sparklines"""
+        from .timeseries import sparkline
+        
+        table = Table(title="📉 Trends", box=box.ROUNDED)
+        table.add_column("Device", style="cyan", no_wrap=True)
+        table.add_column("RTT ms", style="white", no_wrap=True)
+        table.add_column("min/avg/max", justify="right", no_wrap=True)
+        table.add_column("Remaining", style="white", no_wrap=True)
+        table.add_column("Missed", justify="right", style="red", no_wrap=True)
+        
+        for device, series in store.devices.items():
+            buckets = min(width, len(series))
+            overall = series.downsample('rtt', 1)[0]
+            summary = "-" if overall is None else f"{overall.min:.0f}/{overall.avg:.0f}/{overall.max:.0f}"
+            rtt = [bucket and bucket.avg for bucket in series.downsample('rtt', buckets)]
+            remaining = [bucket and bucket.avg for bucket in series.downsample('remaining', buckets)]
+            table.add_row(device, sparkline(rtt), summary, sparkline(remaining, low=0),
+                          f"{series.missed}/{series.samples}")
+        self.console.print(table)
+    
+    def show_request_metrics(self, registry: 'MetricsRegistry') -> None:
+        """Show per-endpoint request latency (median per phase, ms)"""
+        if not registry.requests:
+            self.console.print("[yellow]⚠️  No requests recorded[/yellow]")
+            return
+        
+        phases = ('dns', 'connect', 'ttfb', 'body', 'decode', 'total')
+        table = Table(title=f"⏱️ Request Latency in ms (since {registry.since})", box=box.ROUNDED)
+        table.add_column("Endpoint", style="cyan", overflow="fold")
+        table.add_column("Device", style="white", overflow="fold")
+        table.add_column("Reqs", justify="right")
+        table.add_column("Errs", justify="right", style="red")
+        for phase in phases:
+            table.add_column(phase.upper() if phase in ('dns', 'ttfb') else phase.title(), justify="right")
+        table.add_column("p95", justify="right", style="bold")
+        
+        routes: Dict[tuple, list] = {}
+        for (endpoint, device, status), count in registry.requests.items():
+            counts = routes.setdefault((endpoint, device), [0, 0])
+            counts[0] += count
+            if status == 'error' or not status.startswith('2'):
+                counts[1] += count
+        
+        for (endpoint, device), (requests, errors) in sorted(routes.items()):
+            cells = []
+            for phase in phases:
+                histogram = registry.histograms.get((phase, endpoint, device))
+                cells.append("-" if histogram is None else f"{histogram.quantile(0.5):.1f}")
+            total = registry.histograms.get(('total', endpoint, device))
+            cells.append("-" if total is None else f"{total.quantile(0.95):.1f}")
+            table.add_row(endpoint, device, str(requests), str(errors) if errors else "", *cells)
+        
+        self.console.print(table)
+        retried = sum(registry.retries.values())
+        if retried:
+            self.console.print(f"[dim]{retried} retried attempt(s)[/dim]")
+        hedged = sum(registry.hedges.values())
+        if hedged:
+            self.console.print(f"[dim]{hedged} hedged read(s)[/dim]")
+        for device, state in sorted(registry.circuits.items()):
+            style = "green" if state == "closed" else "red" if state == "open" else "yellow"
+            self.console.print(f"[{style}]Circuit {state}: {escape(device)}[/{style}]")
+    
+    def show_profile_report(self, report: Dict[str, Any]) -> None:
+        """Show event loop lag and the slowest blocking callbacks"""
+        lag = report['loop_lag']
+        table = Table(title=f"🐢 Event Loop Profile ({report['elapsed_s']:.1f}s)", box=box.ROUNDED)
+        table.add_column("Metric", style="cyan", no_wrap=True)
+        table.add_column("Value", style="white")
+        
+        if lag['samples']:
+            table.add_row("Loop lag p50 / p95 / p99",
+                          f"{lag['p50_ms']:.1f} / {lag['p95_ms']:.1f} / {lag['p99_ms']:.1f} ms")
+            table.add_row("Loop lag max", f"{lag['max_ms']:.1f} ms")
+        table.add_row("Lag samples", f"{lag['samples']} (every {lag['interval_ms']:.0f} ms)")
+        table.add_row(f"Callbacks > {report['slow_callback_ms']:.0f} ms", str(report['slow_callbacks']))
+        self.console.print(table)
+        
+        if report['blocking']:
+            self.console.print("[bold]Blocking calls on the event loop:[/bold]")
+        for site in report['blocking'][:5]:
+            callers = " < ".join(site['stack'][1:3])
+            self.console.print(f"  [red]{site['max_ms']:.0f} ms max, {site['count']}x[/red] "
+                               f"{escape(site['site'])} [dim]< {escape(callers)}[/dim]",
+                               highlight=False, soft_wrap=True)
+        for path in report['files']:
+            self.console.print(f"[dim]Report written to {path}[/dim]")
+    
+    def show_trace_summary(self, summary: Dict[str, Dict[str, Any]], title: str) -> None:
+        """Show requests, bytes and latency per scenario of a trace"""
+        if not summary:
+            self.console.print("[yellow]⚠️  Trace contains no requests[/yellow]")
+            return
+        
+        table = Table(title=f"📼 {escape(title)}", box=box.ROUNDED)
+        table.add_column("Scenario", style="cyan")
+        table.add_column("Endpoint", style="white", overflow="fold")
+        table.add_column("Reqs", justify="right")
+        table.add_column("Errs", justify="right", style="red")
+        table.add_column("Sent", justify="right")
+        table.add_column("Received", justify="right")
+        table.add_column("Avg ms", justify="right")
+        
+        for scenario, totals in sorted(summary.items()):
+            errors = totals['errors']
+            table.add_row(
+                scenario, "", str(totals['requests']), str(errors) if errors else "",
+                f"{totals['bytes_sent']:,}", f"{totals['bytes_received']:,}",
+                f"{totals['latency_ms'] / totals['requests']:.1f}", style="bold",
+            )
+            for endpoint, count in sorted(totals['endpoints'].items()):
+                table.add_row("", endpoint, str(count), "", "", "", "")
+        self.console.print(table)
+    
+    def show_trace_diff(self, rows: list) -> None:
+        """Show per-scenario request and byte counts of two traces"""
+        if not rows:
+            self.console.print("[yellow]⚠️  Both traces are empty[/yellow]")
+            return
+        
+        def cell(row, key: str) -> str:
+            base, current = row.base.get(key), row.current.get(key)
+            if base is None or current is None:
+                return f"{current:,} (new)" if base is None else f"{base:,} (gone)"
+            change = current - base
+            color = "green" if change < 0 else "red" if change > 0 else "dim"
+            return f"{base:,} → {current:,} [{color}]({change:+,})[/{color}]"
+        
+        table = Table(title="📼 Trace Diff", box=box.ROUNDED)
+        table.add_column("Scenario", style="cyan")
+        table.add_column("Requests", justify="right")
+        table.add_column("Sent", justify="right")
+        table.add_column("Received", justify="right")
+        for row in rows:
+            table.add_row(row.scenario, cell(row, 'requests'), cell(row, 'bytes_sent'), cell(row, 'bytes_received'))
+        self.console.print(table)
+    
+    def show_sync_report(self, results: list) -> None:
+        """Show the clock offset and start skew achieved per device"""
+        table = Table(title="⏱️ Synchronized Start", box=box.ROUNDED)
+        table.add_column("Device", style="cyan", overflow="fold")
+        table.add_column("RTT ms", justify="right")
+        table.add_column("Skew ms", justify="right", style="bold")
+        table.add_column("Result", style="white")
+        
+        for result in results:
+            rtt = "-" if result.rtt_ms is None else f"{result.rtt_ms:.1f}"
+            skew = "-" if result.skew_ms is None else f"{result.skew_ms:+.1f} ± {result.rtt_ms / 2:.1f}"
+            if result.synchronized:
+                outcome = "[green]started[/green]"
+            else:
+                outcome = f"[red]{escape(result.error or 'failed')}[/red]"
+            table.add_row(result.device, rtt, skew, outcome)
+        self.console.print(table)
+        
+        skews = [result.skew_ms for result in results if result.skew_ms is not None]
+        if len(skews) > 1:
+            self.console.print(f"[bold]Spread across {len(skews)} devices: {max(skews) - min(skews):.1f} ms[/bold]")
+    
+    def show_rollout_plan(self, plan) -> None:
+        """Show the per-device diff of a config rollout"""
+        if plan.pending:
+            table = Table(title="📋 Rollout Plan", box=box.ROUNDED)
+            table.add_column("Device", style="cyan", overflow="fold")
+            table.add_column("Changes", style="white", overflow="fold")
+            for device in plan.pending:
+                changes = ", ".join(f"{name} {current} → {desired}"
+                                    for name, (current, desired) in device.changes.items())
+                table.add_row(device.device, escape(changes))
+            self.console.print(table)
+        
+        for device in plan.unreachable:
+            self.console.print(f"[red]❌ {escape(device.error or device.device)}[/red]")
+        self.console.print(f"[bold]{len(plan.pending)} to update, {len(plan.compliant)} already compliant, "
+                           f"{len(plan.unreachable)} unreachable[/bold]")
+    
+    def show_rollout_report(self, report) -> None:
+        """Show per-wave timing and the outcome of a config rollout"""
+        table = Table(title="🚀 Rollout", box=box.ROUNDED)
+        table.add_column("Wave", style="cyan", no_wrap=True)
+        table.add_column("Devices", justify="right")
+        table.add_column("Updated", justify="right", style="green")
+        table.add_column("Failed", justify="right", style="red")
+        table.add_column("Start s", justify="right")
+        table.add_column("Took s", justify="right", style="bold")
+        
+        for wave in report.waves:
+            table.add_row(wave.name, str(len(wave.devices)), str(len(wave.succeeded)), str(len(wave.failed)),
+                          f"{wave.started:.2f}", f"{wave.duration:.2f}")
+        self.console.print(table)
+        
+        for error in report.failed.values():
+            self.console.print(f"[red]❌ {escape(error)}[/red]")
+        if report.halted:
+            self.console.print(f"[red]🛑 Halted: {escape(report.halted)}; "
+                               f"{len(report.skipped)} device(s) not attempted[/red]")
+        style = "green" if not report.halted and not report.failed else "yellow"
+        self.console.print(f"[{style}]{len(report.updated)} updated, {len(report.failed)} failed "
+                           f"in {report.duration:.2f} s[/{style}]")
+    
+    def show_broadcast_result(self, result, devices: dict) -> None:
+        """Show which devices acknowledged a multicast command"""
+        table = Table(title=f"📡 Broadcast {result.command}", box=box.ROUNDED)
+        table.add_column("Device", style="cyan")
+        table.add_column("Address", style="white")
+        table.add_column("Result", style="white")
+        
+        for mac in sorted(set(devices) | set(result.acked) | set(result.stale)):
+            address = devices.get(mac, "-")
+            if mac in result.acked:
+                outcome = "[green]acknowledged[/green]" if result.acked[mac] == 0 else "[red]rejected[/red]"
+            elif mac in result.stale and not result.stale[mac]:
+                outcome = "[red]stale epoch[/red]"
+            elif result.fallback.get(address):
+                outcome = "[yellow]via HTTP[/yellow]"
+            else:
+                outcome = "[red]unreachable[/red]"
+            table.add_row(mac, address, outcome)
+        self.console.print(table)
+        
+        summary = f"{len(result.acked)} acknowledged, {result.retransmits} retransmits"
+        if result.fallback:
+            summary += f", {len(result.fallback)} via HTTP"
+        style = "green" if result.ok else "red"
+        self.console.print(f"[{style}]{summary}[/{style}]")
+    
+    def show_presence_event(self, event) -> None:
+        """Show one change from the device presence feed"""
+        device = event.device
+        name = device.mac or device.hostname or device.address
+        styles = {'added': ('🟢', 'green'), 'moved': ('🔀', 'yellow'), 'updated': ('🔄', 'blue'),
+                  'offline': ('⚫', 'red'), 'removed': ('👋', 'red')}
+        emoji, style = styles.get(event.kind, ('•', 'white'))
+        detail = device.address
+        if event.kind == 'moved' and device.previous_addresses:
+            detail = f"{device.previous_addresses[-1]} → {device.address}"
+        timestamp = self.clock.now().strftime('%H:%M:%S')
+        self.console.print(f"[dim]{timestamp}[/dim] {emoji} [{style}]{event.kind:<8}[/{style}] "
+                           f"[cyan]{escape(name)}[/cyan] {escape(detail)} [dim]({device.source})[/dim]")
+    
     def show_session_complete(self, session_type: str, duration: int) -> None:
         """Show session completion message"""
         if session_type == "work":
@@ -0,0 +1,45 @@
+"""LED Tomato device emulator
+
+Implements the firmware REST API from ``esp32-firmware/src/main.cpp`` on an
+asyncio HTTP server so ``LEDTomatoClient``, ``DeviceDiscovery`` and
+``TimerManager`` can be exercised without hardware. One process can host
+many virtual devices with simulated latency, jitter, loss and connection
+limits::
+
+    async with EmulatorFleet(count=100, conditions=NetworkConditions(latency_ms=20)) as fleet:
+        client = LEDTomatoClient(fleet.servers[0].host, fleet.servers[0].port)
+        await client.start_timer('work')
+
+``DeviceTransport`` skips sockets entirely; with a ``VirtualClock`` shared by
+the device and ``TimerManager`` a multi-hour cycle runs in milliseconds::
+
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    client = LEDTomatoClient("virtual", transport=DeviceTransport(device))
+
+With ``multicast_group`` the fleet also speaks the UDP control channel
+(``ledtomato_cli.multicast``) to a ``MulticastController``.
+
+``WebhookReceiver`` stands in for the chat and time-tracking services
+session events are posted to (``ledtomato_cli.events``).
+
+Run ``python -m ledtomato_cli.emulator --help`` to host devices from a shell.
+"""
+
+from .device import VirtualDevice
+from .fleet import EmulatorFleet, loopback_addresses
+from .receiver import WebhookReceiver
+from .server import DeviceServer, NetworkConditions
+from .transport import DeviceTransport
+from .udp import MulticastEndpoint
+
+__all__ = [
+    'DeviceServer',
+    'DeviceTransport',
+    'EmulatorFleet',
+    'MulticastEndpoint',
+    'NetworkConditions',
+    'VirtualDevice',
+    'WebhookReceiver',
+    'loopback_addresses',
+]
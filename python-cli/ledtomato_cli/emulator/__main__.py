@@ -0,0 +1,73 @@
+"""Run virtual LED Tomato devices from the command line"""
+
+import asyncio
+from typing import Optional
+
+import click
+
+from . import EmulatorFleet, NetworkConditions, WebhookReceiver
+from .. import multicast
+
+
+@click.command()
+@click.option('--devices', '-n', default=1, show_default=True, help='Number of virtual devices')
+@click.option('--host', default='127.0.0.1', show_default=True, help='Bind address (port mode)')
+@click.option('--port', '-p', default=0, show_default=True,
+              help='First port (port mode) or shared port (loopback mode); 0 = ephemeral')
+@click.option('--loopback', is_flag=True, help='Give each device its own 127.0.x.y address')
+@click.option('--latency', default=0.0, show_default=True, help='Response latency (ms)')
+@click.option('--jitter', default=0.0, show_default=True, help='Latency jitter (ms)')
+@click.option('--loss', default=0.0, show_default=True, help='Request drop probability (0-1)')
+@click.option('--max-connections', type=int, help='Concurrent sockets per device')
+@click.option('--keep-alive', is_flag=True, help='Allow HTTP keep-alive (the firmware closes)')
+@click.option('--multicast-key', help='Enable the UDP control channel with this hex key')
+@click.option('--multicast-group', default=multicast.GROUP, show_default=True,
+              help='Group to join (or a unicast address to bind)')
+@click.option('--multicast-port', default=multicast.COMMAND_PORT, show_default=True, help='Command port')
+@click.option('--webhook-port', type=int, help='Also receive session event webhooks on this port and print them')
+def main(devices: int, host: str, port: int, loopback: bool, latency: float, jitter: float,
+         loss: float, max_connections: Optional[int], keep_alive: bool, multicast_key: Optional[str],
+         multicast_group: str, multicast_port: int, webhook_port: Optional[int]) -> None:
+    """🍅 Host virtual LED Tomato devices"""
+    conditions = NetworkConditions(latency, jitter, loss, max_connections)
+    key = None
+    if multicast_key:
+        try:
+            key = multicast.parse_key(multicast_key)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--multicast-key')
+    fleet = EmulatorFleet(
+        devices, host, port, loopback, conditions=conditions, keep_alive=keep_alive,
+        multicast_group=multicast_group if key else None, multicast_port=multicast_port, multicast_key=key,
+        beacon_target=(multicast_group, multicast.BEACON_PORT),
+    )
+    try:
+        receiver = WebhookReceiver(host, webhook_port, verbose=True) if webhook_port is not None else None
+        asyncio.run(_serve(fleet, receiver))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve(fleet: EmulatorFleet, receiver: Optional[WebhookReceiver] = None) -> None:
+    """Start the fleet (and webhook receiver) and serve until interrupted"""
+    await fleet.start()
+    if receiver is not None:
+        await receiver.start()
+        print(f"📨 Webhook receiver at {receiver.url}")
+    for address in fleet.addresses[:20]:
+        print(f"🍅 Virtual device at http://{address}")
+    if len(fleet.addresses) > 20:
+        print(f"... and {len(fleet.addresses) - 20} more")
+    if fleet.multicast is not None:
+        group, port = fleet.multicast.address
+        print(f"📡 Multicast control channel on {group}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if receiver is not None:
+            await receiver.stop()
+        await fleet.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,667 @@
+"""Virtual LED Tomato device
+
+Mirrors the state machine and REST handlers of ``esp32-firmware/src/main.cpp``:
+the routes registered in ``setupRoutes``, form-encoded POST parameters,
+Arduino ``String::toInt``/``strtol`` parsing, ArduinoJson response shapes,
+``updatePomodoroTimer`` expiry (including the blocking completion flash),
+device-side schedules and the multicast control channel.
+"""
+
+import json
+import random
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from .. import multicast
+from ..clock import Clock, SystemClock
+
+# config.h
+LED_BRIGHTNESS = 128
+HOSTNAME = "ledtomato"
+DEFAULT_WORK_TIME = 25 * 60 * 1000
+DEFAULT_SHORT_BREAK = 5 * 60 * 1000
+DEFAULT_LONG_BREAK = 15 * 60 * 1000
+MAX_START_DELAY = 60000
+MAX_START_SKEW = 5000
+CONFIG_FLUSH_DELAY = 2000
+CONFIG_FLUSH_MAX_DELAY = 10000
+
+# PomodoroConfig fields, kept live and as the saved (user) baseline
+CONFIG_ATTRS = ('work_time', 'short_break_time', 'long_break_time', 'work_color', 'break_color',
+                'work_animation', 'break_animation', 'brightness')
+
+# PomodoroState
+IDLE, WORKING, SHORT_BREAK, LONG_BREAK = 0, 1, 2, 3
+
+# updatePomodoroTimer flashes 3 x (200 ms on + 200 ms off) with delay()
+FLASH_MS = 3 * 400
+
+MAX_SEQUENCE_LENGTH = 64
+U32 = 0xFFFFFFFF
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+}
+NOT_FOUND_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+SETUP_PAGE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>LED Tomato Setup</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+</head>
+<body>
+    <div class="container">
+        <h1>🍅 LED Tomato</h1>
+        <form action="/wifi-config" method="post">
+            <input type="text" name="ssid" placeholder="WiFi Network Name" required>
+            <input type="password" name="password" placeholder="WiFi Password" required>
+            <button type="submit">Connect to WiFi</button>
+        </form>
+    </div>
+</body>
+</html>
+"""
+
+CONNECTING_PAGE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>LED Tomato - Connecting</title>
+    <meta http-equiv="refresh" content="15;url=http://ledtomato.local">
+</head>
+<body>
+    <div class="container">
+        <h1>🍅 LED Tomato</h1>
+        <p>Connecting to WiFi...</p>
+    </div>
+</body>
+</html>
+"""
+
+# (status, content type, body, extra headers)
+Response = Tuple[int, str, bytes, Dict[str, str]]
+
+
+def arduino_to_int(value: str) -> int:
+    """Arduino ``String::toInt()``: ``atol`` semantics on a 32-bit long"""
+    text = value.lstrip(" \t\n\r\f\v")
+    sign = 1
+    if text[:1] in ('+', '-'):
+        sign = -1 if text[0] == '-' else 1
+        text = text[1:]
+    digits = 0
+    for ch in text:
+        if not ch.isdigit():
+            break
+        digits = digits * 10 + int(ch)
+    return _to_long(sign * digits)
+
+
+def _to_long(value: int) -> int:
+    """Wrap to a signed 32-bit long"""
+    value &= U32
+    return value - (1 << 32) if value & 0x80000000 else value
+
+
+def _strtoul(value: str) -> int:
+    """C ``strtoul(s, NULL, 10)`` on a 32-bit unsigned long"""
+    text = value.lstrip(" \t\n\r\f\v")
+    negative = text[:1] == '-'
+    if text[:1] in ('+', '-'):
+        text = text[1:]
+    digits = 0
+    for ch in text:
+        if not ch.isdigit():
+            break
+        digits = digits * 10 + int(ch)
+    if digits > U32:
+        return U32
+    return -digits & U32 if negative else digits
+
+
+def _strtol_hex(value: str) -> int:
+    """C ``strtol(s, NULL, 16)`` on a 32-bit long (saturating)"""
+    text = value.lstrip(" \t\n\r\f\v")
+    sign = 1
+    if text[:1] in ('+', '-'):
+        sign = -1 if text[0] == '-' else 1
+        text = text[1:]
+    if text[:2].lower() == '0x' and len(text) > 2 and text[2] in "0123456789abcdefABCDEF":
+        text = text[2:]
+    result = 0
+    for ch in text:
+        if ch not in "0123456789abcdefABCDEF":
+            break
+        result = result * 16 + int(ch, 16)
+    result *= sign
+    return max(-0x80000000, min(0x7FFFFFFF, result))
+
+
+def parse_color(color: str) -> int:
+    """Firmware ``parseColor``: hex string to a packed 0xRRGGBB color"""
+    if color.startswith('#'):
+        color = color[1:]
+    value = _strtol_hex(color) & U32
+    r = (value >> 16) & 0xFF
+    g = (value >> 8) & 0xFF
+    b = value & 0xFF
+    return (r << 16) | (g << 8) | b
+
+
+def _config_json(config: Dict[str, object]) -> Dict[str, object]:
+    """writeConfigJson(): a PomodoroConfig as the config endpoint reports it"""
+    return {
+        'workTime': config['work_time'] // 1000,
+        'shortBreakTime': config['short_break_time'] // 1000,
+        'longBreakTime': config['long_break_time'] // 1000,
+        # String(color, HEX): lowercase, no zero padding
+        'workColor': format(config['work_color'], 'x'),
+        'breakColor': format(config['break_color'], 'x'),
+        'workAnimation': config['work_animation'],
+        'breakAnimation': config['break_animation'],
+        'brightness': config['brightness'],
+    }
+
+
+def _json(doc: object) -> bytes:
+    """Serialize like ArduinoJson's serializeJson (compact, insertion order)"""
+    return json.dumps(doc, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class VirtualDevice:
+    """In-memory model of one LED Tomato ESP32"""
+
+    def __init__(self, ip_address: str = "127.0.0.1", wifi_connected: bool = True,
+                 clock: Optional[Clock] = None, mac: Optional[str] = None):
+        """Initialize a virtual device
+
+        Args:
+            ip_address: Address reported in /api/status
+            wifi_connected: Station mode (True) or setup AP mode (False)
+            clock: Time source for millis(), defaults to real time
+            mac: Station MAC (default: random, locally administered)
+        """
+        self.ip_address = ip_address
+        self.wifi_connected = wifi_connected
+        self.mac = mac or multicast.format_mac(bytes([0x02]) + random.getrandbits(40).to_bytes(5, 'big'))
+        self.http_port = 80  # set by DeviceServer once bound; reported in beacons
+        self.clock = clock or SystemClock()
+        self.nvs: Dict[str, object] = {}
+        self.nvs_writes = 0
+        self.requests: Dict[str, int] = {}
+        self.restarts = 0
+        self._boot()
+
+    def _boot(self) -> None:
+        """Power-on state: setup() with config loaded from NVS"""
+        self.boot_time = self.clock.time()
+        # PomodoroTimer
+        self.state = IDLE
+        self.start_time = 0
+        self.duration = 0
+        self.running = False
+        self.armed = False
+        self.started_at = 0
+        # PomodoroSchedule
+        self.schedule_active = False
+        self.schedule_sequence = ""
+        self.schedule_repeat = 0
+        self.schedule_index = 0
+        self.schedule_round = 0
+        self.schedule_completed = 0
+        # Completion flash in progress (loop() blocked in delay())
+        self._flash_until: Optional[int] = None
+        # MulticastState
+        key = self.nvs.get('mcKey')
+        self.multicast_key: Optional[bytes] = bytes(key) if key else None
+        self.multicast_epoch = self.nvs.get('mcEpoch', 0)  # highest controller epoch seen
+        self.multicast_last_seq = 0  # last sequence number executed in it
+        self.multicast_last_result = multicast.ACK_OK
+        self.beacon_seq = 0
+        # ConfigPersistence: unsaved config changes are lost on reboot
+        self.config_dirty = False
+        self.config_first_change = 0
+        self.config_last_change = 0
+        self.load_config()
+
+    def millis(self) -> int:
+        """Milliseconds since boot, wrapping like the ESP32 counter"""
+        return int((self.clock.time() - self.boot_time) * 1000) & U32
+
+    # Preferences
+
+    def load_config(self) -> None:
+        """loadPomodoroConfig()"""
+        self.work_time = self.nvs.get('workTime', DEFAULT_WORK_TIME)
+        self.short_break_time = self.nvs.get('shortBreak', DEFAULT_SHORT_BREAK)
+        self.long_break_time = self.nvs.get('longBreak', DEFAULT_LONG_BREAK)
+        self.work_color = self.nvs.get('workColor', 0xFF0000)
+        self.break_color = self.nvs.get('breakColor', 0x00FF00)
+        self.work_animation = self.nvs.get('workAnim', False)
+        self.break_animation = self.nvs.get('breakAnim', True)
+        self.brightness = self.nvs.get('brightness', LED_BRIGHTNESS)
+        # savedConfig: the user's config, which schedules never override
+        self.saved_config = {attr: getattr(self, attr) for attr in CONFIG_ATTRS}
+
+    def save_config(self) -> None:
+        """savePomodoroConfig(): writes the user's config, never a schedule's overrides"""
+        saved = self.saved_config
+        self.nvs.update({
+            'workTime': saved['work_time'],
+            'shortBreak': saved['short_break_time'],
+            'longBreak': saved['long_break_time'],
+            'workColor': saved['work_color'],
+            'breakColor': saved['break_color'],
+            'workAnim': saved['work_animation'],
+            'breakAnim': saved['break_animation'],
+            'brightness': saved['brightness'],
+        })
+        self.nvs_writes += 1
+
+    def mark_config_dirty(self) -> None:
+        """markConfigDirty()"""
+        now = self.millis()
+        if not self.config_dirty:
+            self.config_dirty = True
+            self.config_first_change = now
+        self.config_last_change = now
+
+    def flush_config(self, force: bool = False) -> None:
+        """flushPomodoroConfig(): save once changes settle, or CONFIG_FLUSH_MAX_DELAY after the first"""
+        if not self.config_dirty:
+            return
+        now = self.millis()
+        if (force or (now - self.config_last_change) & U32 >= CONFIG_FLUSH_DELAY
+                or (now - self.config_first_change) & U32 >= CONFIG_FLUSH_MAX_DELAY):
+            self.save_config()
+            self.config_dirty = False
+
+    # Timer
+
+    def update(self) -> None:
+        """Catch up on loop() iterations: updatePomodoroTimer(), schedules and config flushes"""
+        self.flush_config()
+        while True:
+            now = self.millis()
+            if self.armed and _to_long(now - self.start_time) >= 0:
+                # loop() shortens its delay() to wake exactly at start_at;
+                # startedAt is millis() whenever this loop() actually ran
+                self.armed = False
+                self.running = True
+                self.started_at = now
+                continue
+            if self._flash_until is not None:
+                if (now - self._flash_until) & U32 >= 0x80000000:
+                    return  # still flashing
+                self._finish_flash(self._flash_until)
+                continue
+            if not self.running:
+                return
+            elapsed = (now - self.start_time) & U32
+            if elapsed < self.duration:
+                return
+            # Timer finished at start + duration; loop() then blocks in the flash
+            finished_at = (self.start_time + self.duration) & U32
+            self.running = False
+            self.state = IDLE
+            self._flash_until = (finished_at + FLASH_MS) & U32
+
+    def _finish_flash(self, at: int) -> None:
+        """End of the completion flash: advance the schedule if one is active"""
+        self._flash_until = None
+        if not self.schedule_active:
+            return
+        self.schedule_completed += 1
+        self.schedule_index += 1
+        if self.schedule_index >= len(self.schedule_sequence):
+            self.schedule_index = 0
+            self.schedule_round += 1
+        if self.schedule_repeat > 0 and self.schedule_round >= self.schedule_repeat:
+            self.end_schedule()
+        else:
+            self.start_scheduled_session(at)
+
+    def start_scheduled_session(self, at: Optional[int] = None) -> None:
+        """startScheduledSession()"""
+        code = self.schedule_sequence[self.schedule_index]
+        self.running = True
+        self.armed = False
+        self.start_time = self.millis() if at is None else at
+        self.started_at = self.millis()
+        if code == 'W':
+            self.state = WORKING
+            self.duration = self.work_time
+        elif code == 'S':
+            self.state = SHORT_BREAK
+            self.duration = self.short_break_time
+        else:
+            self.state = LONG_BREAK
+            self.duration = self.long_break_time
+
+    def end_schedule(self) -> None:
+        """endSchedule(): back to the user's config, unflushed changes included"""
+        self.schedule_active = False
+        for attr, value in self.saved_config.items():
+            setattr(self, attr, value)
+
+    # Routing (setupRoutes)
+
+    def handle(self, method: str, path: str, form: Dict[str, str]) -> Response:
+        """Dispatch a request the way AsyncWebServer would"""
+        self.update()
+        url = path.split('?', 1)[0]
+        routes = (
+            ('/', 'GET', self.handle_root),
+            ('/wifi-config', 'POST', self.handle_wifi_config),
+            ('/api/pomodoro/start', 'POST', self.handle_pomodoro_control),
+            ('/api/pomodoro/stop', 'POST', self.handle_pomodoro_control),
+            ('/api/pomodoro/config', 'GET', self.handle_pomodoro_config),
+            ('/api/pomodoro/config', 'POST', self.handle_pomodoro_config),
+            ('/api/pomodoro/schedule', 'GET', self.handle_pomodoro_schedule),
+            ('/api/pomodoro/schedule', 'POST', self.handle_pomodoro_schedule),
+            ('/api/status', 'GET', self.handle_status),
+            ('/api/multicast', 'GET', self.handle_multicast),
+            ('/api/multicast', 'POST', self.handle_multicast),
+        )
+        for uri, route_method, handler in routes:
+            # AsyncCallbackWebHandler matches the URI exactly or as a "uri/" prefix
+            if route_method == method and (url == uri or url.startswith(uri + '/')):
+                self.requests[uri] = self.requests.get(uri, 0) + 1
+                return handler(method, url, form)
+        self.requests['notFound'] = self.requests.get('notFound', 0) + 1
+        # The second onNotFound registration replaces the OPTIONS handler
+        return (404, 'text/plain', b"Not found", dict(NOT_FOUND_HEADERS))
+
+    def handle_root(self, method: str, url: str, form: Dict[str, str]) -> Response:
+        """handleRoot()"""
+        return (200, 'text/html', SETUP_PAGE.encode('utf-8'), dict(CORS_HEADERS))
+
+    def handle_wifi_config(self, method: str, url: str, form: Dict[str, str]) -> Response:
+        """handleWiFiConfig(): save credentials and restart"""
+        if 'ssid' in form and 'password' in form:
+            self.nvs['ssid'] = form['ssid']
+            self.nvs['password'] = form['password']
+            self.flush_config(force=True)
+            self.restart()
+            return (200, 'text/html', CONNECTING_PAGE.encode('utf-8'), {})
+        return (400, 'text/plain', b"Missing parameters", {})
+
+    def restart(self) -> None:
+        """ESP.restart(): reboot, keeping only NVS"""
+        self.restarts += 1
+        self.wifi_connected = True
+        self._boot()
+
+    def handle_pomodoro_control(self, method: str, url: str, form: Dict[str, str]) -> Response:
+        """handlePomodoroControl()"""
+        action = ""
+        if url == '/api/pomodoro/start':
+            action = 'start'
+        elif url == '/api/pomodoro/stop':
+            action = 'stop'
+
+        doc: Optional[Dict[str, object]] = None
+        if action == 'start':
+            doc = {}
+            now = self.millis()
+            start_at = now
+            start_at_valid = True
+            if 'start_at' in form:
+                # Synchronized start at a device-monotonic instant
+                start_at = _strtoul(form['start_at'])
+                offset = _to_long(start_at - now)
+                start_at_valid = -MAX_START_SKEW <= offset <= MAX_START_DELAY
+
+            if not start_at_valid:
+                doc['success'] = False
+                doc['message'] = "start_at out of range"
+            elif 'type' in form:
+                self.start_pomodoro(form['type'], start_at, now)
+                doc['success'] = True
+                doc['message'] = "Pomodoro armed" if self.armed else "Pomodoro started"
+                doc['startAt'] = start_at
+            else:
+                doc['success'] = False
+                doc['message'] = "Missing type parameter"
+        elif action == 'stop':
+            self.running = False
+            self.armed = False
+            self.state = IDLE
+            if self.schedule_active:
+                self.end_schedule()
+            doc = {'success': True, 'message': "Pomodoro stopped"}
+
+        return (200, 'application/json', _json(doc), dict(CORS_HEADERS))
+
+    def start_pomodoro(self, timer_type: str, start_at: int, now: int) -> None:
+        """startPomodoro(): shared by HTTP and multicast starts"""
+        # A manual start takes over from any uploaded schedule
+        if self.schedule_active:
+            self.end_schedule()
+        # A start_at in the future arms the timer; update() fires it
+        self.armed = _to_long(start_at - now) > 0
+        self.running = not self.armed
+        self.start_time = start_at
+        self.started_at = now
+        if timer_type == 'work':
+            self.state = WORKING
+            self.duration = self.work_time
+        elif timer_type == 'short_break':
+            self.state = SHORT_BREAK
+            self.duration = self.short_break_time
+        elif timer_type == 'long_break':
+            self.state = LONG_BREAK
+            self.duration = self.long_break_time
+
+    def handle_pomodoro_config(self, method: str, url: str, form: Dict[str, str]) -> Response:
+        """handlePomodoroConfig()"""
+        if method == 'GET':
+            doc = self.config_doc()
+        else:
+            self.apply_config(form, user=True)
+            self.mark_config_dirty()
+            doc = {'success': True, 'message': "Configuration updated"}
+        return (200, 'application/json', _json(doc), dict(CORS_HEADERS))
+
+    def config_doc(self) -> Dict[str, object]:
+        """GET /api/pomodoro/config body: the user's config, schedule overrides apart"""
+        doc = _config_json(self.saved_config)
+        if self.schedule_active:
+            doc['schedule'] = _config_json({attr: getattr(self, attr) for attr in CONFIG_ATTRS})
+        return doc
+
+    def apply_config(self, form: Dict[str, str], user: bool = False) -> None:
+        """Apply config form fields to the live config (applyConfigParam)
+
+        With ``user`` they are also the user's config to save
+        (applyUserConfigParam); otherwise they are a schedule's overrides.
+        """
+        values: Dict[str, object] = {}
+        if 'workTime' in form:
+            values['work_time'] = (arduino_to_int(form['workTime']) * 1000) & U32
+        if 'shortBreakTime' in form:
+            values['short_break_time'] = (arduino_to_int(form['shortBreakTime']) * 1000) & U32
+        if 'longBreakTime' in form:
+            values['long_break_time'] = (arduino_to_int(form['longBreakTime']) * 1000) & U32
+        if 'workColor' in form:
+            values['work_color'] = parse_color(form['workColor'])
+        if 'breakColor' in form:
+            values['break_color'] = parse_color(form['breakColor'])
+        if 'workAnimation' in form:
+            values['work_animation'] = form['workAnimation'] == 'true'
+        if 'breakAnimation' in form:
+            values['break_animation'] = form['breakAnimation'] == 'true'
+        if 'brightness' in form:
+            values['brightness'] = arduino_to_int(form['brightness']) & 0xFF
+        for attr, value in values.items():
+            setattr(self, attr, value)
+        if user:
+            self.saved_config.update(values)
+
+    def handle_pomodoro_schedule(self, method: str, url: str, form: Dict[str, str]) -> Response:
+        """handlePomodoroSchedule()"""
+        status = 200
+        if method == 'POST':
+            sequence = form.get('sequence', "")
+            valid = 0 < len(sequence) <= MAX_SEQUENCE_LENGTH and all(c in 'WSL' for c in sequence)
+            if not valid:
+                status = 400
+                doc: Dict[str, object] = {'success': False, 'message': "Invalid sequence"}
+            else:
+                # Save pending config changes first: from here on the live
+                # config holds the schedule's overrides, which never reach NVS
+                self.flush_config(force=True)
+                schedule_form = {k: v for k, v in form.items() if k != 'brightness'}
+                self.apply_config(schedule_form)
+                self.schedule_sequence = sequence
+                self.schedule_repeat = arduino_to_int(form['repeat']) & 0xFFFF if 'repeat' in form else 0
+                self.schedule_index = 0
+                self.schedule_round = 0
+                self.schedule_completed = 0
+                self.schedule_active = True
+                self.start_scheduled_session()
+                doc = {'success': True, 'message': "Schedule started"}
+        else:
+            doc = {
+                'active': self.schedule_active,
+                'sequence': self.schedule_sequence,
+                'repeat': self.schedule_repeat,
+                'index': self.schedule_index,
+                'round': self.schedule_round,
+                'completed': self.schedule_completed,
+            }
+        return (status, 'application/json', _json(doc), dict(CORS_HEADERS))
+
+    def status_doc(self) -> Dict[str, object]:
+        """GET /api/status body"""
+        pomodoro: Dict[str, object] = {'state': self.state, 'running': self.running}
+        doc: Dict[str, object] = {
+            'wifiConnected': self.wifi_connected,
+            'ipAddress': self.ip_address if self.wifi_connected else "192.168.4.1",
+            'hostname': HOSTNAME,
+            'mac': self.mac,
+            'uptime': self.millis(),
+            'pomodoro': pomodoro,
+        }
+        if self.armed:
+            pomodoro['armed'] = True
+            pomodoro['startAt'] = self.start_time
+        if self.running:
+            elapsed = (self.millis() - self.start_time) & U32
+            remaining = self.duration - elapsed if self.duration > elapsed else 0
+            pomodoro['remaining'] = remaining // 1000
+            pomodoro['elapsed'] = elapsed // 1000
+            pomodoro['duration'] = self.duration // 1000
+            pomodoro['startedAt'] = self.started_at
+        if self.schedule_active:
+            doc['schedule'] = {
+                'active': True,
+                'index': self.schedule_index,
+                'length': len(self.schedule_sequence),
+                'round': self.schedule_round,
+                'completed': self.schedule_completed,
+            }
+        return doc
+
+    def handle_status(self, method: str, url: str, form: Dict[str, str]) -> Response:
+        """handleStatus()"""
+        return (200, 'application/json', _json(self.status_doc()), dict(CORS_HEADERS))
+
+    # Multicast control channel
+
+    def handle_multicast(self, method: str, url: str, form: Dict[str, str]) -> Response:
+        """handleMulticast(): provision the shared key"""
+        status = 200
+        if method == 'POST':
+            try:
+                key = multicast.parse_key(form.get('key', ''))
+            except ValueError:
+                status = 400
+                doc: Dict[str, object] = {'success': False, 'message': "Invalid key"}
+            else:
+                self.nvs['mcKey'] = key
+                self.multicast_key = key
+                # Epochs count per key
+                self.multicast_epoch = self.multicast_last_seq = 0
+                self.nvs['mcEpoch'] = 0
+                self.nvs_writes += 1
+                doc = {'success': True, 'message': "Multicast key saved"}
+        else:
+            doc = {
+                'enabled': self.multicast_key is not None,
+                'mac': self.mac,
+                'group': multicast.GROUP,
+                'port': multicast.COMMAND_PORT,
+            }
+        return (status, 'application/json', _json(doc), dict(CORS_HEADERS))
+
+    def handle_datagram(self, data: bytes) -> Optional[bytes]:
+        """handleMulticastPacket(): execute a command and return the ACK, if any"""
+        if self.multicast_key is None or not self.wifi_connected:
+            return None
+        packet = multicast.decode_packet(self.multicast_key, data)
+        if packet is None or packet.type not in (multicast.PACKET_START, multicast.PACKET_STOP,
+                                                 multicast.PACKET_CONFIG):
+            return None
+        self.update()
+        self.requests['multicast'] = self.requests.get('multicast', 0) + 1
+        if packet.session < self.multicast_epoch:
+            # An older controller run, or a replay of one
+            result = multicast.ACK_STALE
+        elif packet.session == self.multicast_epoch and _to_long(packet.seq - self.multicast_last_seq) <= 0:
+            # Retransmission of a command already executed: acknowledge again
+            result = self.multicast_last_result
+        else:
+            if packet.session > self.multicast_epoch:
+                self.multicast_epoch = packet.session
+                self.nvs['mcEpoch'] = packet.session
+                self.nvs_writes += 1
+            result = self._execute_multicast(packet)
+            self.multicast_last_seq = packet.seq
+            self.multicast_last_result = result
+        payload = multicast.ACK_PAYLOAD.pack(bytes.fromhex(self.mac.replace(':', '')), result,
+                                             self.multicast_epoch)
+        return multicast.encode_packet(self.multicast_key, multicast.PACKET_ACK, packet.session,
+                                       packet.seq, payload)
+
+    def _execute_multicast(self, packet: multicast.Packet) -> int:
+        """executeMulticastCommand()"""
+        if packet.type == multicast.PACKET_START:
+            if len(packet.payload) < 1 or packet.payload[0] >= len(multicast.TIMER_TYPES):
+                return multicast.ACK_REJECTED
+            now = self.millis()
+            self.start_pomodoro(multicast.TIMER_TYPES[packet.payload[0]], now, now)
+        elif packet.type == multicast.PACKET_STOP:
+            self.running = False
+            self.armed = False
+            self.state = IDLE
+            if self.schedule_active:
+                self.end_schedule()
+        else:
+            form = dict(parse_qsl(packet.payload.decode('latin-1'), keep_blank_values=True))
+            self.apply_config(form, user=True)
+            self.mark_config_dirty()
+        return multicast.ACK_OK
+
+    def beacon(self) -> Optional[bytes]:
+        """sendBeacon(): the periodic status datagram, if multicast is enabled"""
+        if self.multicast_key is None or not self.wifi_connected:
+            return None
+        self.update()
+        remaining = 0
+        if self.running:
+            elapsed = (self.millis() - self.start_time) & U32
+            remaining = (self.duration - elapsed if self.duration > elapsed else 0) // 1000
+        beacon = multicast.Beacon(
+            self.mac, self.ip_address, self.http_port, self.state, self.running, self.armed,
+            self.schedule_active, remaining, self.millis(), self.schedule_completed & 0xFFFF,
+        )
+        self.beacon_seq = (self.beacon_seq + 1) & U32
+        return multicast.encode_packet(self.multicast_key, multicast.PACKET_BEACON, 0, self.beacon_seq,
+                                       beacon.to_payload())
@@ -0,0 +1,110 @@
+"""Many virtual devices in one process"""
+
+import asyncio
+import ipaddress
+from typing import Iterator, List, Optional, Tuple
+
+from ..clock import Clock
+from .device import VirtualDevice
+from .server import DeviceServer, NetworkConditions
+from .udp import MulticastEndpoint
+
+
+def loopback_addresses(count: int, network: str = "127.0.0.0/16", skip: int = 2) -> Iterator[str]:
+    """Yield distinct loopback addresses (Linux routes all of 127.0.0.0/8 to lo)"""
+    hosts = ipaddress.ip_network(network).hosts()
+    for _ in range(skip - 1):
+        next(hosts)
+    for _ in range(count):
+        yield str(next(hosts))
+
+
+class EmulatorFleet:
+    """Hosts virtual devices on separate ports or loopback addresses
+
+    With ``loopback=False`` every device listens on ``host`` with its own port
+    (``base_port + i``, or an ephemeral port when ``base_port`` is 0). With
+    ``loopback=True`` every device gets its own 127.0.x.y address on the same
+    port, which is what subnet scans expect.
+
+    With ``multicast_group`` set the fleet also answers the UDP control
+    channel on ``multicast_port`` (see ``MulticastEndpoint``); devices are
+    provisioned with ``multicast_key``.
+    """
+
+    def __init__(self, count: int = 1, host: str = "127.0.0.1", base_port: int = 0,
+                 loopback: bool = False, loopback_network: str = "127.0.0.0/16",
+                 conditions: Optional[NetworkConditions] = None, keep_alive: bool = False,
+                 clock: Optional[Clock] = None, seed: Optional[int] = None,
+                 multicast_group: Optional[str] = None, multicast_port: int = 0,
+                 multicast_key: Optional[bytes] = None, beacon_target: Optional[Tuple[str, int]] = None,
+                 beacon_interval: float = 5.0):
+        self.count = count
+        self.host = host
+        self.base_port = base_port
+        self.loopback = loopback
+        self.loopback_network = loopback_network
+        self.conditions = conditions or NetworkConditions()
+        self.keep_alive = keep_alive
+        self.clock = clock
+        self.seed = seed
+        self.servers: List[DeviceServer] = []
+        self.multicast_group = multicast_group
+        self.multicast_port = multicast_port
+        self.multicast_key = multicast_key
+        self.beacon_target = beacon_target
+        self.beacon_interval = beacon_interval
+        self.multicast: Optional[MulticastEndpoint] = None
+
+    @property
+    def devices(self) -> List[VirtualDevice]:
+        return [server.device for server in self.servers]
+
+    @property
+    def addresses(self) -> List[str]:
+        """host:port of every device"""
+        return [server.address for server in self.servers]
+
+    async def start(self) -> 'EmulatorFleet':
+        """Create and bind all devices"""
+        if self.loopback:
+            hosts = list(loopback_addresses(self.count, self.loopback_network))
+            ports = [self.base_port or 80] * self.count
+        else:
+            hosts = [self.host] * self.count
+            ports = [self.base_port + i if self.base_port else 0 for i in range(self.count)]
+
+        for i, (host, port) in enumerate(zip(hosts, ports)):
+            device = VirtualDevice(ip_address=host, clock=self.clock)
+            seed = None if self.seed is None else self.seed + i
+            self.servers.append(DeviceServer(device, host, port, self.conditions, self.keep_alive, seed))
+
+        await asyncio.gather(*(server.start() for server in self.servers))
+
+        if self.multicast_group is not None:
+            if self.multicast_key is not None:
+                for device in self.devices:
+                    device.nvs['mcKey'] = self.multicast_key
+                    device.multicast_key = self.multicast_key
+            self.multicast = MulticastEndpoint(
+                self.devices, self.multicast_group, self.multicast_port, self.conditions,
+                self.beacon_target, self.beacon_interval, self.seed,
+            )
+            await self.multicast.start()
+        return self
+
+    async def stop(self) -> None:
+        """Stop every device"""
+        if self.multicast is not None:
+            await self.multicast.stop()
+        await asyncio.gather(*(server.stop() for server in self.servers))
+
+    async def __aenter__(self) -> 'EmulatorFleet':
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def total_requests(self) -> int:
+        """Requests handled across the fleet"""
+        return sum(server.request_count for server in self.servers)
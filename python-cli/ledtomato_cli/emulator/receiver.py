@@ -0,0 +1,100 @@
+"""Local webhook receiver standing in for chat and time-tracking services
+
+Accepts the ``{"events": [...]}`` batches ``WebhookSink`` posts and keeps
+them, so event delivery can be tested, or watched from a shell, without a
+real service. It can be told to fail the next few batches, answer slowly,
+or go away and come back on the same port::
+
+    async with WebhookReceiver() as receiver:
+        receiver.fail_next(2, status=503)
+        bus.subscribe(WebhookSink(receiver.url))
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+class WebhookReceiver:
+    """Collects posted event batches on host:port"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, path: str = "/hooks/events",
+                 delay: float = 0.0, verbose: bool = False):
+        """Initialize receiver
+
+        Args:
+            host, port: Where to listen (port 0: ephemeral, fixed once started)
+            path: URL path batches are posted to
+            delay: Seconds to wait before answering each batch
+            verbose: Print every event received
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.delay = delay
+        self.verbose = verbose
+        self.batches: List[List[Dict[str, Any]]] = []
+        self.requests = 0
+        self.rejected = 0
+        self._failures: List[int] = []
+        self._connections = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}{self.path}"
+
+    @property
+    def events(self) -> List[Dict[str, Any]]:
+        """Every event accepted, in arrival order"""
+        return [event for batch in self.batches for event in batch]
+
+    @property
+    def connections(self) -> int:
+        """TCP connections batches arrived on (1 when the sender reuses its connection)"""
+        return len(self._connections)
+
+    def fail_next(self, count: int = 1, status: int = 503) -> None:
+        """Answer the next ``count`` batches with ``status`` instead of accepting them"""
+        self._failures += [status] * count
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port, reuse_address=True)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> 'WebhookReceiver':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self._connections.add(request.transport.get_extra_info('peername'))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self._failures:
+            self.rejected += 1
+            return web.json_response({'error': "failing on request"}, status=self._failures.pop(0))
+        try:
+            events = (await request.json())['events']
+        except (ValueError, KeyError, TypeError):
+            return web.json_response({'error': "expected {\"events\": [...]}"}, status=400)
+        self.batches.append(events)
+        if self.verbose:
+            for event in events:
+                print(f"📨 {json.dumps(event)}")
+        return web.json_response({'accepted': len(events)})
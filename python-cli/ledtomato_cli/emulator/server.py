@@ -0,0 +1,166 @@
+"""Asyncio HTTP front end for virtual devices
+
+A deliberately small HTTP/1.1 server: it parses the request line, headers
+and a form-encoded body, hands them to a ``VirtualDevice`` and writes the
+response. Like ESPAsyncWebServer it closes the connection after every
+response unless keep-alive is enabled. ``NetworkConditions`` injects latency,
+jitter, packet loss and a connection limit per device.
+"""
+
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+from .device import VirtualDevice
+
+MAX_HEADER_LINES = 64
+MAX_BODY = 16 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large"}
+
+
+@dataclass
+class NetworkConditions:
+    """Simulated link and device limits"""
+    latency_ms: float = 0.0  # added before every response
+    jitter_ms: float = 0.0  # uniform +/- around latency
+    loss: float = 0.0  # probability a request is dropped (connection reset)
+    max_connections: Optional[int] = None  # concurrent sockets before refusing
+
+    def delay(self, rng: random.Random) -> float:
+        """Get the response delay in seconds"""
+        delay = self.latency_ms
+        if self.jitter_ms:
+            delay += rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, delay) / 1000.0
+
+
+class DeviceServer:
+    """Serves one virtual device on one host:port"""
+
+    def __init__(self, device: VirtualDevice, host: str = "127.0.0.1", port: int = 0,
+                 conditions: Optional[NetworkConditions] = None, keep_alive: bool = False,
+                 seed: Optional[int] = None):
+        self.device = device
+        self.host = host
+        self.port = port
+        self.conditions = conditions or NetworkConditions()
+        self.keep_alive = keep_alive
+        self.rng = random.Random(seed)
+        self.connections = 0
+        self.refused = 0
+        self.dropped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def address(self) -> str:
+        """host:port for LEDTomatoClient"""
+        return f"{self.host}:{self.port}"
+
+    @property
+    def request_count(self) -> int:
+        """Total requests handled by the device"""
+        return sum(self.device.requests.values())
+
+    async def start(self) -> None:
+        """Bind and start serving"""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, reuse_address=True, backlog=128
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.device.http_port = self.port
+
+    async def stop(self) -> None:
+        """Stop serving and close the listening socket"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve requests on one TCP connection"""
+        limit = self.conditions.max_connections
+        if limit is not None and self.connections >= limit:
+            # AsyncTCP out of sockets: the connection is reset
+            self.refused += 1
+            writer.transport.abort()
+            return
+
+        self.connections += 1
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+
+                if self.conditions.loss and self.rng.random() < self.conditions.loss:
+                    self.dropped += 1
+                    writer.transport.abort()
+                    return
+
+                delay = self.conditions.delay(self.rng)
+                if delay:
+                    await asyncio.sleep(delay)
+
+                form: Dict[str, str] = {}
+                if method == 'POST' and 'urlencoded' in headers.get('content-type', ''):
+                    form = dict(parse_qsl(body.decode('utf-8', errors='replace'), keep_blank_values=True))
+                status, content_type, payload, extra = self.device.handle(method, path, form)
+
+                keep_alive = self.keep_alive and headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, content_type, payload, extra, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            if not writer.is_closing():
+                writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Read one request, or None when the client closed the connection"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        self.bytes_in += len(request_line)
+        parts = request_line.decode('latin-1').split()
+        if len(parts) < 2:
+            return None
+        method, path = parts[0].upper(), parts[1]
+
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            self.bytes_in += len(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        length = int(headers.get('content-length', '0') or 0)
+        if 0 < length <= MAX_BODY:
+            body = await reader.readexactly(length)
+            self.bytes_in += length
+        return method, path, headers, body
+
+    def _write_response(self, writer: asyncio.StreamWriter, status: int, content_type: str,
+                        payload: bytes, extra: Dict[str, str], keep_alive: bool) -> None:
+        """Write status line, headers and body"""
+        lines = [
+            f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in extra.items())
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        writer.write(head + payload)
+        self.bytes_out += len(head) + len(payload)
@@ -0,0 +1,35 @@
+"""In-process transport from LEDTomatoClient to a VirtualDevice"""
+
+import random
+from typing import Dict, Optional, Tuple
+
+from ..clock import Clock, SystemClock
+from .device import VirtualDevice
+from .server import NetworkConditions
+
+
+class DeviceTransport:
+    """Delivers client requests straight to a ``VirtualDevice``, no sockets
+
+    Pair it with a ``VirtualClock`` shared by the device and ``TimerManager``
+    to run whole cycles in simulated time. Latency and loss from
+    ``NetworkConditions`` are applied on the clock.
+    """
+
+    def __init__(self, device: VirtualDevice, conditions: Optional[NetworkConditions] = None,
+                 clock: Optional[Clock] = None, seed: Optional[int] = None):
+        self.device = device
+        self.conditions = conditions or NetworkConditions()
+        self.clock = clock or device.clock or SystemClock()
+        self.rng = random.Random(seed)
+
+    async def request(self, method: str, path: str, data: Optional[Dict[str, str]] = None,
+                      timeout: Optional[float] = None) -> Tuple[int, bytes]:
+        """Handle one request and return (status, body)"""
+        if self.conditions.loss and self.rng.random() < self.conditions.loss:
+            raise ConnectionResetError("Connection reset by emulated device")
+        delay = self.conditions.delay(self.rng)
+        # Always yield to the loop, like a real request would
+        await self.clock.sleep(delay)
+        status, _, body, _ = self.device.handle(method.upper(), path, dict(data or {}))
+        return status, body
@@ -0,0 +1,106 @@
+"""Multicast control channel for a fleet of virtual devices
+
+One UDP socket stands in for the LAN segment: every datagram it receives
+is offered to every hosted device, as a multicast packet would be, and each
+device's ACK is sent back to the sender. Loss and latency from
+``NetworkConditions`` apply per device. Beacons from all devices are sent
+to ``beacon_target`` every ``beacon_interval`` seconds.
+
+Bound to the real group (``multicast.GROUP``) the fleet answers
+``MulticastController`` like hardware would; bound to a unicast address
+(e.g. ``127.0.0.1`` with an ephemeral port) it works where multicast
+routing is unavailable, such as CI containers.
+"""
+
+import asyncio
+import random
+from typing import List, Optional, Tuple
+
+from .. import multicast
+from .device import VirtualDevice
+from .server import NetworkConditions
+
+
+class MulticastEndpoint(asyncio.DatagramProtocol):
+    """Receives control datagrams for many virtual devices"""
+
+    def __init__(self, devices: List[VirtualDevice], group: str = multicast.GROUP,
+                 port: int = multicast.COMMAND_PORT, conditions: Optional[NetworkConditions] = None,
+                 beacon_target: Optional[Tuple[str, int]] = None, beacon_interval: float = 5.0,
+                 seed: Optional[int] = None):
+        """Initialize endpoint
+
+        Args:
+            devices: Devices that receive every command
+            group: Multicast group to join, or a unicast address to bind
+            port: Command port (0 = ephemeral)
+            conditions: Per-device loss and ACK latency
+            beacon_target: (host, port) for status beacons; None disables them
+            beacon_interval: Seconds between beacons
+        """
+        self.devices = devices
+        self.group = group
+        self.port = port
+        self.conditions = conditions or NetworkConditions()
+        self.beacon_target = beacon_target
+        self.beacon_interval = beacon_interval
+        self.rng = random.Random(seed)
+        self.received = 0
+        self.dropped = 0
+        self.acks = 0
+        self.beacons = 0
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._beacon_task: Optional[asyncio.Task] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """(group, port) for ``MulticastController``"""
+        return self.group, self.port
+
+    async def start(self) -> None:
+        """Bind the socket and start beaconing"""
+        loop = asyncio.get_running_loop()
+        sock = multicast.open_multicast_socket(self.group, self.port)
+        self.port = sock.getsockname()[1]
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: self, sock=sock)
+        if self.beacon_target is not None:
+            self._beacon_task = asyncio.create_task(self._beacon_loop())
+
+    async def stop(self) -> None:
+        if self._beacon_task is not None:
+            self._beacon_task.cancel()
+            try:
+                await self._beacon_task
+            except asyncio.CancelledError:
+                pass
+        if self._transport is not None:
+            self._transport.close()
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self.received += 1
+        loop = asyncio.get_running_loop()
+        for device in self.devices:
+            if self.conditions.loss and self.rng.random() < self.conditions.loss:
+                self.dropped += 1
+                continue
+            ack = device.handle_datagram(data)
+            if ack is not None:
+                self.acks += 1
+                loop.call_later(self.conditions.delay(self.rng), self._send, ack, addr)
+
+    def _send(self, data: bytes, addr: Tuple[str, int]) -> None:
+        if self._transport is not None and not self._transport.is_closing():
+            self._transport.sendto(data, addr)
+
+    def send_beacons(self) -> None:
+        """Send one beacon per device to ``beacon_target``"""
+        for device in self.devices:
+            beacon = device.beacon()
+            if beacon is not None:
+                self.beacons += 1
+                self._send(beacon, self.beacon_target)
+
+    async def _beacon_loop(self) -> None:
+        while True:
+            self.send_beacons()
+            await asyncio.sleep(self.beacon_interval)
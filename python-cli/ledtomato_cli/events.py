@@ -0,0 +1,478 @@
+"""Session lifecycle events for chat, time tracking and plugins
+
+``TimerManager``, ``start``, ``stop`` and ``monitor`` report what they see
+as ``Event``s:
+
+- ``session.started`` a work session or break began
+- ``session.completed`` it ran to the end
+- ``session.stopped`` it was stopped before the end
+- ``device.offline`` the device stopped answering
+
+``emit`` only appends to in-memory queues and returns, so a slow or
+unreachable receiver never holds up a timer transition. Every
+``Subscription`` on the ``EventBus`` has its own bounded queue and worker
+task, which hands events to its handler in batches: up to ``batch_size``
+events, or whatever arrived within ``flush_interval`` of the first. When a
+queue is full the subscription's overflow policy applies:
+
+- ``drop-oldest`` discards the oldest queued event
+- ``spill`` appends new events to an NDJSON file, which is read back in
+  order once the queue has drained (and on the next run, if it had not)
+
+With ``spill``, a batch whose receiver stays unavailable past its retries
+goes back to the front of the file, followed by the events queued behind
+it; delivery resumes with the next event or the next run.
+
+``WebhookSink`` is a handler that POSTs each batch as
+``{"events": [...]}`` over one kept-alive session, retrying connection
+errors, timeouts, 429 and 5xx answers with jittered exponential backoff.
+Once the retries are used up it raises ``ReceiverUnavailable``. Any other
+answer means the batch will never be accepted, so it is dropped.
+
+Plugins are ``module:function`` names in the ``events`` config section;
+each function is called with the bus and subscribes what it needs.
+
+Commands activate one bus per run (see ``activate``); without one,
+``emit`` does nothing.
+"""
+
+import asyncio
+import hashlib
+import importlib
+import json
+import random
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Collection, Deque, Dict, List, Optional, Tuple
+
+from .clock import Clock, SystemClock
+from .resilience import RetryPolicy
+
+if TYPE_CHECKING:
+    from .config import EventsConfig
+
+SESSION_STARTED = 'session.started'
+SESSION_COMPLETED = 'session.completed'
+SESSION_STOPPED = 'session.stopped'
+DEVICE_OFFLINE = 'device.offline'
+EVENT_TYPES = (SESSION_STARTED, SESSION_COMPLETED, SESSION_STOPPED, DEVICE_OFFLINE)
+
+DROP_OLDEST, SPILL = 'drop-oldest', 'spill'
+OVERFLOW_POLICIES = (DROP_OLDEST, SPILL)
+
+DEFAULT_QUEUE_SIZE = 1000  # events per subscription
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds
+DEFAULT_CLOSE_TIMEOUT = 5.0  # seconds to deliver what is queued when a run ends
+WEBHOOK_RETRY = RetryPolicy(attempts=6, base_delay=0.5, max_delay=30.0)
+
+SESSIONS = {1: 'work', 2: 'short_break', 3: 'long_break'}  # pomodoro state -> session
+
+Handler = Callable[[List['Event']], Awaitable[None]]
+
+
+@dataclass
+class Event:
+    """Something that happened to a session or device"""
+    type: str  # one of EVENT_TYPES
+    device: str
+    time: str  # ISO 8601, local wall clock
+    data: Dict[str, Any] = field(default_factory=dict)  # e.g. session, duration_minutes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class WebhookError(Exception):
+    """A webhook answered with a status other than 2xx"""
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f"{url} answered {status}")
+        self.status = status
+
+
+class ReceiverUnavailable(Exception):
+    """A handler's receiver could not take a batch now; it may later"""
+
+    def __init__(self, url: str, error: BaseException):
+        super().__init__(f"{url} unavailable: {error}")
+        self.error = error
+
+
+class Subscription:
+    """A handler with its own bounded queue and delivery task"""
+
+    def __init__(self, handler: Handler, types: Optional[Collection[str]] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, overflow: str = DROP_OLDEST,
+                 spill_path: Optional[Path] = None):
+        """Initialize subscription
+
+        Args:
+            handler: Called with each batch; raising counts the batch as failed,
+                except ``ReceiverUnavailable`` with ``spill``, which keeps it
+            types: Event types to receive (default: all)
+            queue_size: Events held in memory before the overflow policy applies
+            batch_size: Most events handed to the handler at once
+            flush_interval: Seconds to wait for a batch to fill (0: hand over at once)
+            overflow: ``drop-oldest`` or ``spill``
+            spill_path: NDJSON file for spilled events (required with ``spill``)
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}'")
+        if overflow == SPILL and spill_path is None:
+            raise ValueError("The spill policy needs a spill file")
+        if queue_size < 1 or batch_size < 1:
+            raise ValueError("Queue and batch sizes must be positive")
+        self.handler = handler
+        self.types = frozenset(types) if types else None
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.spill_path = Path(spill_path) if spill_path is not None else None
+        self.queue: Deque[Event] = deque()
+        self.delivered = 0
+        self.failed = 0  # events in batches the handler raised on
+        self.dropped = 0
+        self.spilled = 0  # events written to the spill file, in total
+        self.last_error: Optional[BaseException] = None
+        self._unspilled = self._count_spilled()  # events waiting in the spill file
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._filled: Optional[asyncio.Event] = None
+        self._closing = False
+
+    def wants(self, event: Event) -> bool:
+        return self.types is None or event.type in self.types
+
+    def offer(self, event: Event) -> None:
+        """Queue an event without waiting; must be called on the event loop"""
+        if self._unspilled or len(self.queue) >= self.queue_size:
+            if self.overflow == SPILL:
+                # Once spilling, later events go to the file too so order is kept
+                self._spill([event])
+            else:
+                self.queue.popleft()
+                self.dropped += 1
+                self.queue.append(event)
+        else:
+            self.queue.append(event)
+        self._start()
+        self._wake.set()
+        if len(self.queue) >= self.batch_size:
+            self._filled.set()
+
+    @property
+    def pending(self) -> int:
+        """Events not yet handed to the handler, spilled ones included"""
+        return len(self.queue) + self._unspilled
+
+    def _start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._filled = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            if not self.queue and self._unspilled:
+                self._unspill()
+            if not self.queue:
+                if self._closing:
+                    return
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            if len(self.queue) < self.batch_size and self.flush_interval > 0 and not self._closing:
+                self._filled.clear()
+                try:
+                    await asyncio.wait_for(self._filled.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+            try:
+                await self.handler(batch)
+                self.delivered += len(batch)
+            except asyncio.CancelledError:
+                self.queue.extendleft(reversed(batch))  # closed mid-delivery: keep it for close()
+                raise
+            except ReceiverUnavailable as e:
+                self.last_error = e
+                if self.overflow != SPILL:
+                    self.failed += len(batch)
+                    continue
+                # Keep the batch, and what queued up behind it, in order for a later attempt
+                self._spill(batch + list(self.queue), front=True)
+                self.queue.clear()
+                if self._closing:
+                    return
+                self._wake.clear()
+                await self._wake.wait()
+            except Exception as e:
+                self.failed += len(batch)
+                self.last_error = e
+
+    async def close(self, timeout: float = DEFAULT_CLOSE_TIMEOUT) -> None:
+        """Deliver what is queued within ``timeout``, then stop
+
+        Events still queued after that are spilled (``spill``) or dropped.
+        """
+        self._closing = True
+        if self._task is None and self._unspilled:
+            self._start()  # left over from an earlier run
+        if self._task is not None:
+            self._wake.set()
+            self._filled.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+        if self.queue:
+            if self.overflow == SPILL:
+                self._spill(list(self.queue), front=True)
+            else:
+                self.dropped += len(self.queue)
+            self.queue.clear()
+        close = getattr(self.handler, 'close', None)
+        if close is not None:
+            await close()
+
+    # Spill file
+
+    def _count_spilled(self) -> int:
+        if self.spill_path is None or not self.spill_path.exists():
+            return 0
+        with open(self.spill_path, 'r') as f:
+            return sum(1 for line in f if line.strip())
+
+    def _spill(self, events: List[Event], front: bool = False) -> None:
+        """Append events to the spill file (or put them before what it holds)"""
+        lines = [json.dumps(event.to_dict(), separators=(',', ':')) + "\n" for event in events]
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        if front and self._unspilled:
+            with open(self.spill_path, 'r') as f:
+                lines += f.readlines()
+            self._rewrite(lines)
+        else:
+            with open(self.spill_path, 'a') as f:
+                f.writelines(lines)
+        self.spilled += len(events)
+        self._unspilled += len(events)
+
+    def _unspill(self) -> None:
+        """Move the oldest spilled events back into the queue"""
+        with open(self.spill_path, 'r') as f:
+            lines = [line for line in f if line.strip()]
+        for line in lines[:self.queue_size]:
+            try:
+                self.queue.append(Event(**json.loads(line)))
+            except (ValueError, TypeError):
+                self.dropped += 1
+        self._rewrite(lines[self.queue_size:])
+        self._unspilled = len(lines[self.queue_size:])
+
+    def _rewrite(self, lines: List[str]) -> None:
+        if not lines:
+            self.spill_path.unlink(missing_ok=True)
+            return
+        tmp = self.spill_path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            f.writelines(lines)
+        tmp.replace(self.spill_path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'handler': getattr(self.handler, 'name', repr(self.handler)), 'delivered': self.delivered,
+                'pending': self.pending, 'failed': self.failed, 'dropped': self.dropped, 'spilled': self.spilled}
+
+
+class WebhookSink:
+    """Handler that POSTs event batches to one URL"""
+
+    def __init__(self, url: str, timeout: float = 10.0, retry: RetryPolicy = WEBHOOK_RETRY,
+                 headers: Optional[Dict[str, str]] = None, clock: Optional[Clock] = None,
+                 seed: Optional[int] = None):
+        """Initialize sink
+
+        Args:
+            url: Receiver URL
+            timeout: Seconds per POST attempt
+            retry: Attempts and backoff for retryable failures
+            headers: Extra request headers (e.g. an Authorization token)
+            clock: Time source for backoff sleeps (default: real time)
+            seed: Seed for the backoff jitter
+        """
+        self.url = url
+        self.name = url
+        self.timeout = timeout
+        self.retry = retry
+        self.headers = dict(headers or {})
+        self.clock = clock or SystemClock()
+        self.rng = random.Random(seed)
+        self.posts = 0
+        self.retries = 0
+        self._session = None
+
+    def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            # One session per sink: batches reuse its kept-alive connections
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=2),
+                timeout=aiohttp.ClientTimeout(total=self.timeout), headers=self.headers)
+        return self._session
+
+    async def __call__(self, events: List[Event]) -> None:
+        import aiohttp
+
+        body = {'events': [event.to_dict() for event in events]}
+        error: BaseException = WebhookError(self.url, 0)
+        for attempt in range(self.retry.attempts):
+            if attempt:
+                self.retries += 1
+                await self.clock.sleep(self.retry.backoff(attempt - 1, self.rng))
+            try:
+                async with self._get_session().post(self.url, json=body) as response:
+                    await response.read()
+                    self.posts += 1
+                    if response.status < 300:
+                        return
+                    error = WebhookError(self.url, response.status)
+                    if response.status != 429 and response.status < 500:
+                        raise error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+        raise ReceiverUnavailable(self.url, error) from error
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class EventBus:
+    """Fans events out to subscriptions without waiting on any of them"""
+
+    def __init__(self, clock: Optional[Clock] = None):
+        self.clock = clock or SystemClock()
+        self.subscriptions: List[Subscription] = []
+        self.emitted = 0
+
+    def subscribe(self, handler: Handler, types: Optional[Collection[str]] = None,
+                  **options: Any) -> Subscription:
+        """Deliver events to ``handler`` in batches; options as for ``Subscription``"""
+        subscription = Subscription(handler, types, **options)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def emit(self, type: str, device: str, **data: Any) -> Event:
+        """Create an event stamped with the current time and publish it"""
+        event = Event(type, device, self.clock.now().isoformat(timespec='seconds'), data)
+        self.publish(event)
+        return event
+
+    def publish(self, event: Event) -> None:
+        self.emitted += 1
+        for subscription in self.subscriptions:
+            if subscription.wants(event):
+                subscription.offer(event)
+
+    async def close(self, timeout: float = DEFAULT_CLOSE_TIMEOUT) -> None:
+        """Flush every subscription (within ``timeout``) and close its handler"""
+        await asyncio.gather(*(subscription.close(timeout) for subscription in self.subscriptions))
+
+    def stats(self) -> Dict[str, Any]:
+        return {'emitted': self.emitted,
+                'subscriptions': [subscription.stats() for subscription in self.subscriptions]}
+
+
+def build_bus(settings: 'EventsConfig', spill_dir: Optional[Path] = None,
+              clock: Optional[Clock] = None) -> EventBus:
+    """An event bus with a ``WebhookSink`` per configured webhook and the plugins loaded
+
+    Raises ``ValueError`` for a spill policy without ``spill_dir`` or a
+    plugin that cannot be loaded.
+    """
+    bus = EventBus(clock)
+    retry = RetryPolicy(settings.retries + 1, WEBHOOK_RETRY.base_delay, WEBHOOK_RETRY.max_delay)
+    for webhook in settings.webhooks:
+        if not isinstance(webhook, dict):
+            webhook = {'url': webhook}
+        url = webhook['url']
+        spill_path = None
+        if settings.overflow == SPILL and spill_dir is not None:
+            spill_path = spill_dir / f"{hashlib.sha1(url.encode()).hexdigest()[:16]}.ndjson"
+        bus.subscribe(WebhookSink(url, retry=retry, headers=webhook.get('headers')), webhook.get('events'),
+                      queue_size=settings.queue_size, batch_size=settings.batch_size,
+                      flush_interval=settings.flush_interval, overflow=settings.overflow, spill_path=spill_path)
+    load_plugins(bus, settings.plugins)
+    return bus
+
+
+def session_changes(before: Optional[Dict[str, Any]], after: Dict[str, Any],
+                    interval: float) -> List[Tuple[str, Dict[str, Any]]]:
+    """Lifecycle events between two polls of a device, as (type, data)
+
+    ``before`` and ``after`` are ``output.timer_fields`` of consecutive
+    status responses taken ``interval`` seconds apart. A session that
+    ends with no more than one interval left is taken as completed, any
+    earlier end as stopped.
+    """
+    if before is None or before['state'] == after['state']:
+        return []
+    changes = []
+    if before['state'] in SESSIONS.values():
+        ended = SESSION_COMPLETED if before['remaining'] <= interval + 1 else SESSION_STOPPED
+        changes.append((ended, {'session': before['state'], 'duration_minutes': before['duration'] // 60}))
+    if after['state'] in SESSIONS.values() and after['running']:
+        changes.append((SESSION_STARTED, {'session': after['state'], 'duration_minutes': after['duration'] // 60}))
+    return changes
+
+
+def load_plugins(bus: EventBus, names: List[str]) -> None:
+    """Call each ``module:function`` (default function: ``register``) with the bus
+
+    Raises ``ValueError`` when a plugin cannot be imported or found.
+    """
+    for name in names:
+        module_name, _, attr = name.partition(':')
+        try:
+            register = getattr(importlib.import_module(module_name), attr or 'register')
+        except (ImportError, AttributeError) as e:
+            raise ValueError(f"Could not load event plugin '{name}': {e}") from e
+        register(bus)
+
+
+# The bus events are published to; None disables them
+_active: Optional[EventBus] = None
+
+
+def activate(bus: Optional[EventBus] = None) -> EventBus:
+    """Start publishing events to ``bus``"""
+    global _active
+    _active = bus or EventBus()
+    return _active
+
+
+def deactivate() -> None:
+    """Stop publishing events"""
+    global _active
+    _active = None
+
+
+def active_bus() -> Optional[EventBus]:
+    """Get the bus events are published to, if any"""
+    return _active
+
+
+def emit(type: str, device: str, **data: Any) -> Optional[Event]:
+    """Publish an event to the active bus, if there is one"""
+    if _active is None:
+        return None
+    return _active.emit(type, device, **data)
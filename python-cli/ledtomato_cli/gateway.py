@@ -0,0 +1,399 @@
+"""Caching gateway between many clients and a few LED Tomato devices
+
+The ESP32's AsyncWebServer copes with a handful of sockets at most, yet
+the Windows app, CLIs and status pages all poll it directly. The gateway
+serves the device REST API on the host instead:
+
+- ``/devices/{device}/api/...`` proxies to one device (``{device}`` is its
+  address, e.g. ``192.168.1.50`` or ``127.0.0.1:8080``); ``/api/...`` goes
+  to the default device
+- GET responses are cached for a micro TTL, and concurrent misses for the
+  same resource share one upstream request, so the upstream rate per
+  device is bounded by the TTL however many clients poll
+- writes are serialized per device and invalidate its cached reads;
+  config writes that arrive while one is in flight are merged into the
+  next (latest value per field wins), so a slider dragged in the Windows
+  app costs the device two requests rather than one per step
+- each device is reached through one session limited to one connection
+- with an ``Outbox``, start/stop/config writes to a device that cannot be
+  reached are queued (``202 Accepted``) and delivered in order when it
+  answers again; see ``outbox``
+- ``/fleet/status``, ``/fleet/start``, ``/fleet/stop`` and
+  ``/fleet/config`` act on every device; ``/gateway/stats`` reports
+  downstream and upstream counts
+
+Devices are given up front, or followed from a presence ``DeviceTable``.
+"""
+
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from .client import LEDTomatoClient
+from .coalesce import CoalescingWriter
+from .clock import Clock, SystemClock
+from .metrics import active_registry
+from .outbox import Outbox
+from .presence import DeviceTable
+
+CORS = {'Access-Control-Allow-Origin': '*'}
+
+# Errors after which a write certainly or probably did not reach the device
+UNDELIVERED = (aiohttp.ClientConnectionError, ConnectionError, asyncio.TimeoutError)
+
+CONFIG_PATH = '/api/pomodoro/config'
+
+RETRY_INTERVAL = 2.0  # seconds before the first redelivery attempt
+MAX_RETRY_INTERVAL = 30.0
+
+
+@dataclass
+class UpstreamStats:
+    """Counters for one device"""
+    downstream: int = 0
+    upstream: int = 0
+    cache_hits: int = 0
+    collapsed: int = 0
+    writes: int = 0
+    coalesced: int = 0
+    errors: int = 0
+    queued: int = 0
+    replayed: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+@dataclass
+class _CacheEntry:
+    status: int
+    body: bytes
+    expires: float
+
+
+class DeviceUpstream:
+    """The gateway's single way to one device"""
+
+    def __init__(self, address: str, ttl: float, timeout: float, clock: Clock, outbox: Optional[Outbox] = None,
+                 retry_interval: float = RETRY_INTERVAL):
+        self.address = address
+        self.ttl = ttl
+        self.clock = clock
+        self.outbox = outbox
+        self.retry_interval = retry_interval
+        registry = active_registry()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=1),
+            trace_configs=[registry.trace_config()] if registry is not None else None)
+        self.client = LEDTomatoClient(address, timeout=timeout, metrics=registry, session=self.session)
+        self.stats = UpstreamStats()
+        self._cache: Dict[str, _CacheEntry] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation = 0  # bumped by every write; reads older than it are not cached
+        self._write_lock = asyncio.Lock()
+        self._config_writer = CoalescingWriter(lambda form: self._write(CONFIG_PATH, form))
+        self._drain_task: Optional[asyncio.Task] = None
+        self._answered = asyncio.Event()
+
+    async def read(self, path: str) -> Tuple[int, bytes]:
+        """GET through the cache, collapsing concurrent misses"""
+        self.stats.downstream += 1
+        entry = self._cache.get(path)
+        if entry is not None and self.clock.time() < entry.expires:
+            self.stats.cache_hits += 1
+            return entry.status, entry.body
+
+        inflight = self._inflight.get(path)
+        if inflight is not None:
+            self.stats.collapsed += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[path] = future
+        generation = self._generation
+        try:
+            status, body = await self._upstream('GET', path)
+            self._answered.set()
+            if status == 200 and generation == self._generation:
+                self._cache[path] = _CacheEntry(status, body, self.clock.time() + self.ttl)
+            future.set_result((status, body))
+            return status, body
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here, so waiterless failures are not logged
+            raise
+        finally:
+            if self._inflight.get(path) is future:
+                del self._inflight[path]
+
+    async def write(self, path: str, form: Dict[str, str]) -> Tuple[int, bytes]:
+        """POST one at a time, then drop cached reads
+
+        Queueable writes go to the outbox while it holds commands for the
+        device (so they stay in order) or when the device cannot be reached.
+        Config writes made while one is in flight are merged into the next,
+        and every caller merged into a request gets its response.
+        """
+        self.stats.downstream += 1
+        if path == CONFIG_PATH:
+            if self._config_writer.pending:
+                self.stats.coalesced += 1
+            return await self._config_writer.write(form)
+        return await self._write(path, form)
+
+    async def _write(self, path: str, form: Dict[str, str]) -> Tuple[int, bytes]:
+        queueable = self.outbox is not None and self.outbox.queueable(path)
+        if queueable and self.draining:
+            return self._queue(path, form)
+        async with self._write_lock:
+            self.stats.writes += 1
+            try:
+                return await self._upstream('POST', path, form)
+            except UNDELIVERED:
+                if not queueable:
+                    raise
+                return self._queue(path, form)
+            finally:
+                self._invalidate()
+
+    def _invalidate(self) -> None:
+        """Forget cached and in-flight reads, which may predate a write"""
+        self._generation += 1
+        self._cache.clear()
+        self._inflight.clear()
+
+    @property
+    def draining(self) -> bool:
+        """Whether queued commands are waiting for the device"""
+        return self._drain_task is not None and not self._drain_task.done()
+
+    def _queue(self, path: str, form: Dict[str, str]) -> Tuple[int, bytes]:
+        pending = self.outbox.put(self.address, path, form)
+        self.stats.queued += 1
+        self.start_draining()
+        body = {'success': True, 'queued': True, 'pending': pending,
+                'message': f"{self.address} is unreachable; the command will be sent when it is back"}
+        return 202, json.dumps(body).encode()
+
+    def start_draining(self) -> None:
+        """Deliver the device's queued commands in the background"""
+        if not self.draining:
+            self._drain_task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self) -> None:
+        """Retry until the device takes its queued commands
+
+        The oldest command doubles as the liveness probe, so a device coming
+        back gets its (coalesced) commands and nothing else. The first delay
+        is jittered so devices returning from the same outage are not all
+        retried at once; a read that gets an answer retries immediately.
+        """
+        delay = self.retry_interval * random.uniform(0.5, 1.0)
+        while True:
+            self._answered.clear()
+            try:
+                await asyncio.wait_for(self._answered.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            async with self._write_lock:
+                while True:
+                    command = self.outbox.take(self.address)
+                    if command is None:
+                        return
+                    try:
+                        await self._upstream('POST', command.path, command.form)
+                    except UNDELIVERED:
+                        self.outbox.restore(self.address, command)
+                        break
+                    finally:
+                        self._invalidate()
+                    self.stats.replayed += 1
+            delay = min(delay * 2, MAX_RETRY_INTERVAL)
+
+    async def _upstream(self, method: str, path: str,
+                        form: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        self.stats.upstream += 1
+        try:
+            return await self.client.fetch(method, path, data=form)
+        except Exception:
+            self.stats.errors += 1
+            raise
+
+    async def close(self) -> None:
+        if self._drain_task is not None:
+            self._drain_task.cancel()
+            await asyncio.gather(self._drain_task, return_exceptions=True)
+        await self.session.close()
+
+
+class Gateway:
+    """aiohttp application proxying the device API"""
+
+    def __init__(self, devices: Optional[List[str]] = None, table: Optional[DeviceTable] = None,
+                 default_device: Optional[str] = None, ttl: float = 0.5, timeout: float = 5.0,
+                 clock: Optional[Clock] = None, outbox: Optional[Outbox] = None,
+                 retry_interval: float = RETRY_INTERVAL):
+        """Initialize gateway
+
+        Args:
+            devices: Device addresses served from the start
+            table: Presence table whose online devices are served as well
+            default_device: Device behind the bare ``/api/...`` routes (default: the only one)
+            ttl: Seconds a GET response is served from cache
+            timeout: Upstream request timeout in seconds
+            clock: Time source for cache expiry
+            outbox: Queue for writes to unreachable devices (None: such writes fail with 502)
+            retry_interval: Seconds before queued commands are first retried
+        """
+        self.static_devices = list(devices or [])
+        self.table = table
+        self.default_device = default_device
+        self.ttl = ttl
+        self.timeout = timeout
+        self.clock = clock or SystemClock()
+        self.outbox = outbox
+        self.retry_interval = retry_interval
+        self.upstreams: Dict[str, DeviceUpstream] = {}
+        self.app = web.Application()
+        self.app.router.add_route('*', '/api/{tail:.*}', self.handle_default)
+        self.app.router.add_route('*', '/devices/{device}/api/{tail:.*}', self.handle_device)
+        self.app.router.add_get('/fleet/devices', self.handle_fleet_devices)
+        self.app.router.add_get('/fleet/status', self.handle_fleet_status)
+        self.app.router.add_post('/fleet/start', self.handle_fleet_write)
+        self.app.router.add_post('/fleet/stop', self.handle_fleet_write)
+        self.app.router.add_post('/fleet/config', self.handle_fleet_write)
+        self.app.router.add_get('/gateway/stats', self.handle_stats)
+        self.app.on_cleanup.append(self._close_upstreams)
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+    @property
+    def devices(self) -> List[str]:
+        """Addresses currently served"""
+        devices = list(self.static_devices)
+        if self.table is not None:
+            devices += [device.address for device in self.table.online() if device.address not in devices]
+        return devices
+
+    def upstream(self, address: str) -> DeviceUpstream:
+        upstream = self.upstreams.get(address)
+        if upstream is None:
+            upstream = self.upstreams[address] = DeviceUpstream(address, self.ttl, self.timeout, self.clock,
+                                                                self.outbox, self.retry_interval)
+        return upstream
+
+    def set_timeout(self, timeout: float) -> None:
+        """Change the upstream request timeout, for devices already served too"""
+        self.timeout = timeout
+        for upstream in self.upstreams.values():
+            upstream.client.timeout = timeout
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8787) -> 'Gateway':
+        """Serve on host:port (0 = ephemeral)"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        if self.outbox is not None:
+            # Commands queued before a restart
+            for device in list(self.outbox.queues):
+                if self.outbox.pending(device):
+                    self.upstream(device).start_draining()
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self) -> 'Gateway':
+        return await self.start(port=0)
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _close_upstreams(self, app: web.Application) -> None:
+        await asyncio.gather(*(upstream.close() for upstream in self.upstreams.values()))
+
+    # Per-device API
+
+    async def handle_default(self, request: web.Request) -> web.Response:
+        device = self.default_device
+        if device is None:
+            devices = self.devices
+            if len(devices) != 1:
+                return _json({'error': 'No default device; use /devices/{device}/api/...',
+                              'devices': devices}, status=404)
+            device = devices[0]
+        return await self._proxy(request, device)
+
+    async def handle_device(self, request: web.Request) -> web.Response:
+        device = request.match_info['device']
+        if device not in self.devices:
+            return _json({'error': f'Unknown device {device}'}, status=404)
+        return await self._proxy(request, device)
+
+    async def _proxy(self, request: web.Request, device: str) -> web.Response:
+        path = '/api/' + request.match_info['tail']
+        upstream = self.upstream(device)
+        try:
+            if request.method == 'GET':
+                status, body = await upstream.read(path)
+            elif request.method == 'POST':
+                status, body = await upstream.write(path, dict(await request.post()))
+            elif request.method == 'OPTIONS':
+                return web.Response(headers={**CORS, 'Access-Control-Allow-Methods': 'GET, POST'})
+            else:
+                return _json({'error': 'Method not allowed'}, status=405)
+        except Exception as e:
+            return _json({'error': f'{device} unreachable: {type(e).__name__}'}, status=502)
+        return web.Response(status=status, body=body, content_type='application/json', headers=CORS)
+
+    # Fleet API
+
+    async def handle_fleet_devices(self, request: web.Request) -> web.Response:
+        return _json({'devices': self.devices})
+
+    async def handle_fleet_status(self, request: web.Request) -> web.Response:
+        devices = self.devices
+        results = await asyncio.gather(*(self.upstream(device).read('/api/status') for device in devices),
+                                       return_exceptions=True)
+        return _json({'devices': {device: _decode(result) for device, result in zip(devices, results)}})
+
+    async def handle_fleet_write(self, request: web.Request) -> web.Response:
+        paths = {'start': '/api/pomodoro/start', 'stop': '/api/pomodoro/stop', 'config': '/api/pomodoro/config'}
+        path = paths[request.path.rsplit('/', 1)[-1]]
+        form = dict(await request.post())
+        devices = self.devices
+        results = await asyncio.gather(*(self.upstream(device).write(path, form) for device in devices),
+                                       return_exceptions=True)
+        decoded = {device: _decode(result) for device, result in zip(devices, results)}
+        ok = all(not isinstance(result, BaseException) and result[0] in (200, 202) for result in results)
+        return _json({'success': ok, 'devices': decoded}, status=200 if ok else 207)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        stats = {'ttl': self.ttl, 'timeout': self.timeout,
+                 'devices': {address: upstream.stats.to_dict() for address, upstream in self.upstreams.items()}}
+        if self.outbox is not None:
+            stats['outbox'] = self.outbox.stats()
+        return _json(stats)
+
+
+def _decode(result: Any) -> Any:
+    """JSON body of an upstream (status, body) result, or an error object"""
+    if isinstance(result, BaseException):
+        return {'error': type(result).__name__}
+    status, body = result
+    try:
+        return json.loads(body)
+    except ValueError:
+        return {'error': f'HTTP {status}'}
+
+
+def _json(data: Any, status: int = 200) -> web.Response:
+    return web.json_response(data, status=status, headers=CORS)
@@ -0,0 +1,296 @@
+"""Fleet inventory: named devices with labels, tags and groups
+
+The inventory file (``inventory.json`` in the config directory) names
+devices and describes where they are. Edit it by hand or with
+``ledtomato inventory set``::
+
+    {
+      "devices": {
+        "desk-12": {"address": "192.168.1.50", "mac": "24:6f:28:aa:bb:cc",
+                    "labels": {"floor": "3", "room": "301", "team": "infra"},
+                    "tags": ["quiet"]}
+      },
+      "groups": {"standup": ["desk-12", "desk-13"]}
+    }
+
+What was last seen of each device (address, hostname, MAC, time, Wi-Fi)
+lives in the device cache (``devices.json`` in the cache directory) and
+is refreshed from discovery, so addresses can be left out of the file and
+devices discovered but never named are still known by address.
+
+``Inventory`` keeps an index from every (key, value) pair to device IDs,
+so a selector such as ``floor=3,team=infra`` is resolved by intersecting
+sets, without reading the network. Selector terms, joined by commas, must
+all match:
+
+- ``key=value`` a label (``value|other`` matches either)
+- ``group=name`` membership of a group, ``id=name`` one device
+- ``name`` a tag
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+Selector = List[Tuple[str, FrozenSet[str]]]
+
+GENERIC_HOSTNAMES = ('ledtomato', 'ledtomato.local')  # the firmware default, shared by every device
+
+
+@dataclass
+class InventoryDevice:
+    """One device: how it is named and what was last seen of it"""
+    id: str
+    address: Optional[str] = None  # "ip" or "ip:port", as written in the inventory file
+    seen_address: Optional[str] = None  # where discovery last found it
+    mac: Optional[str] = None
+    hostname: Optional[str] = None
+    labels: Dict[str, str] = field(default_factory=dict)
+    tags: List[str] = field(default_factory=list)
+    groups: List[str] = field(default_factory=list)
+    last_seen: Optional[float] = None  # wall-clock seconds
+    wifi_connected: Optional[bool] = None
+    named: bool = True  # listed in the inventory file, not only discovered
+
+    @property
+    def target(self) -> Optional[str]:
+        """What to connect to: the last seen address, the configured one, or a hostname"""
+        if self.seen_address or self.address:
+            return self.seen_address or self.address
+        if self.hostname and self.hostname.lower() not in GENERIC_HOSTNAMES:
+            return self.hostname
+        return None
+
+
+def parse_selector(text: str) -> Selector:
+    """Parse ``floor=3,team=infra|ops,quiet`` into (key, values) terms
+
+    Raises ``ValueError`` on empty terms, keys or values.
+    """
+    terms: Selector = []
+    for term in text.split(','):
+        term = term.strip()
+        key, sep, value = term.partition('=')
+        if not sep:
+            key, value = 'tag', term
+        key = key.strip().lower()
+        values = frozenset(v.strip() for v in value.split('|'))
+        if not key or not term or '' in values:
+            raise ValueError(f"Invalid selector term '{term}' in '{text}'")
+        terms.append((key, values))
+    return terms
+
+
+def found_address(found: Dict[str, Any]) -> str:
+    """Address of a discovery result, with its port unless it is 80"""
+    port = found.get('port', 80)
+    return found['ip'] if port == 80 else f"{found['ip']}:{port}"
+
+
+class Inventory:
+    """Indexed devices from the inventory file and the device cache"""
+
+    def __init__(self, path: Optional[Path] = None, groups: Optional[Dict[str, List[str]]] = None):
+        self.path = path
+        self.groups: Dict[str, List[str]] = {name: list(ids) for name, ids in (groups or {}).items()}
+        self._groups_of: Dict[str, List[str]] = {}
+        for name in sorted(self.groups):
+            for device_id in self.groups[name]:
+                self._groups_of.setdefault(device_id, []).append(name)
+        self.devices: Dict[str, InventoryDevice] = {}
+        self._index: Dict[Tuple[str, str], Set[str]] = {}
+        self._by_address: Dict[str, str] = {}
+        self._by_mac: Dict[str, str] = {}
+        self._by_hostname: Dict[str, Set[str]] = {}
+
+    # Loading and saving
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None, cache: Optional[Dict[str, Any]] = None) -> 'Inventory':
+        """Read the inventory file (if any) and merge in the device cache"""
+        data: Dict[str, Any] = {}
+        if path is not None and path.exists():
+            with open(path, 'r') as f:
+                data = json.load(f)
+
+        inventory = cls(path, data.get('groups'))
+        for device_id, entry in data.get('devices', {}).items():
+            labels = {str(key).lower(): str(value) for key, value in entry.get('labels', {}).items()}
+            inventory.add(InventoryDevice(
+                id=device_id, address=entry.get('address'), mac=_normalize_mac(entry.get('mac')),
+                hostname=entry.get('hostname'), labels=labels, tags=list(entry.get('tags', []))))
+
+        for device_id, seen in ((cache or {}).get('devices') or {}).items():
+            device = inventory.devices.get(device_id)
+            if device is None:
+                device = inventory.add(InventoryDevice(id=device_id, named=False))
+            inventory._update(device, seen.get('address'), _normalize_mac(seen.get('mac')), seen.get('hostname'))
+            device.last_seen = seen.get('last_seen')
+            device.wifi_connected = seen.get('wifi_connected')
+        return inventory
+
+    def save(self) -> None:
+        """Write the named devices and groups back to the inventory file"""
+        devices = {}
+        for device in self.devices.values():
+            if not device.named:
+                continue
+            entry: Dict[str, Any] = {}
+            for key in ('address', 'mac', 'hostname'):
+                if getattr(device, key):
+                    entry[key] = getattr(device, key)
+            if device.labels:
+                entry['labels'] = device.labels
+            if device.tags:
+                entry['tags'] = device.tags
+            devices[device.id] = entry
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({'devices': devices, 'groups': self.groups}, f, indent=2)
+
+    def cache(self) -> Dict[str, Any]:
+        """What was last seen of each device, for the device cache"""
+        return {'version': 1, 'devices': {
+            device.id: {'address': device.seen_address, 'mac': device.mac, 'hostname': device.hostname,
+                        'last_seen': device.last_seen, 'wifi_connected': device.wifi_connected}
+            for device in self.devices.values() if device.last_seen is not None}}
+
+    # Index
+
+    def add(self, device: InventoryDevice) -> InventoryDevice:
+        """Add or replace a device and index it"""
+        if device.id in self.devices:
+            self._unindex(self.devices[device.id])
+        device.groups = list(self._groups_of.get(device.id, []))
+        self.devices[device.id] = device
+        for pair in self._pairs(device):
+            self._index.setdefault(pair, set()).add(device.id)
+        for address in (device.address, device.seen_address):
+            if address:
+                self._by_address[address] = device.id
+        if device.mac:
+            self._by_mac[device.mac] = device.id
+        if device.hostname:
+            self._by_hostname.setdefault(device.hostname.lower(), set()).add(device.id)
+        return device
+
+    def name(self, device_id: str, address: Optional[str] = None, labels: Optional[Dict[str, str]] = None,
+             tags: Iterable[str] = (), groups: Iterable[str] = ()) -> InventoryDevice:
+        """Create or update a named device; an empty label value removes the label
+
+        A device discovered but never named at ``address`` becomes this one.
+        """
+        device = self.devices.get(device_id) or InventoryDevice(id=device_id)
+        self._unindex(device)
+        device.named = True
+        device.address = address or device.address
+        owner = self.devices.get(self._by_address.get(address or '', ''))
+        if owner is not None and owner is not device and not owner.named:
+            # Naming a device that was only known by the address discovery found it at
+            self._unindex(owner)
+            del self.devices[owner.id]
+            device.seen_address = device.seen_address or owner.seen_address
+            device.mac = device.mac or owner.mac
+            device.hostname = device.hostname or owner.hostname
+            device.last_seen = device.last_seen or owner.last_seen
+            device.wifi_connected = owner.wifi_connected if device.wifi_connected is None else device.wifi_connected
+        for key, value in (labels or {}).items():
+            if value:
+                device.labels[key.lower()] = value
+            else:
+                device.labels.pop(key.lower(), None)
+        device.tags += [tag for tag in dict.fromkeys(tags) if tag not in device.tags]
+        for group in groups:
+            members = self.groups.setdefault(group, [])
+            if device_id not in members:
+                members.append(device_id)
+                self._groups_of.setdefault(device_id, []).append(group)
+        return self.add(device)
+
+    def _unindex(self, device: InventoryDevice) -> None:
+        for pair in self._pairs(device):
+            self._index.get(pair, set()).discard(device.id)
+        for address in (device.address, device.seen_address):
+            if address and self._by_address.get(address) == device.id:
+                del self._by_address[address]
+        if device.mac and self._by_mac.get(device.mac) == device.id:
+            del self._by_mac[device.mac]
+        if device.hostname:
+            self._by_hostname.get(device.hostname.lower(), set()).discard(device.id)
+
+    @staticmethod
+    def _pairs(device: InventoryDevice) -> Iterable[Tuple[str, str]]:
+        yield 'id', device.id
+        yield from device.labels.items()
+        for tag in device.tags:
+            yield 'tag', tag
+        for group in device.groups:
+            yield 'group', group
+
+    def _update(self, device: InventoryDevice, address: Optional[str], mac: Optional[str],
+                hostname: Optional[str]) -> None:
+        """Re-index a device under what was seen of it"""
+        self._unindex(device)
+        device.seen_address = address or device.seen_address
+        device.mac = mac or device.mac
+        device.hostname = hostname or device.hostname
+        self.add(device)
+
+    # Lookups
+
+    def select(self, selector: str) -> List[InventoryDevice]:
+        """Devices matching every term of a selector, by ID"""
+        sets = []
+        for key, values in parse_selector(selector):
+            matches: Set[str] = set()
+            for value in values:
+                matches |= self._index.get((key, value), set())
+            sets.append(matches)
+        sets.sort(key=len)
+        ids = set(sets[0]).intersection(*sets[1:])
+        return [self.devices[device_id] for device_id in sorted(ids)]
+
+    def target(self, name: str) -> str:
+        """Address to use for a device ID, or ``name`` itself if it is not one"""
+        device = self.devices.get(name)
+        return (device.target if device is not None else None) or name
+
+    def observe(self, address: str, mac: Optional[str] = None, hostname: Optional[str] = None,
+                wifi_connected: Optional[bool] = None, now: Optional[float] = None) -> InventoryDevice:
+        """Record a device seen on the network, matching it to a known one if possible
+
+        Matches by MAC, then a hostname only one device has, then address;
+        an unknown device is added under its address.
+        """
+        mac = _normalize_mac(mac)
+        device = None
+        if mac:
+            device = self.devices.get(self._by_mac.get(mac, ''))
+        if device is None and hostname and hostname.lower() not in GENERIC_HOSTNAMES:
+            ids = self._by_hostname.get(hostname.lower(), set())
+            device = self.devices[next(iter(ids))] if len(ids) == 1 else None
+        if device is None:
+            device = self.devices.get(self._by_address.get(address, ''))
+        if device is None:
+            device = self.add(InventoryDevice(id=address, named=False))
+
+        previous = self.devices.get(self._by_address.get(address, ''))
+        if previous is not None and previous is not device and previous.seen_address == address:
+            # Another device's last known address now belongs to this one
+            self._unindex(previous)
+            if previous.named:
+                previous.seen_address = None
+                self.add(previous)
+            else:
+                del self.devices[previous.id]
+        self._update(device, address, mac, hostname)
+        device.last_seen = time.time() if now is None else now
+        if wifi_connected is not None:
+            device.wifi_connected = wifi_connected
+        return device
+
+
+def _normalize_mac(mac: Optional[str]) -> Optional[str]:
+    return mac.lower().replace('-', ':') if mac else None
@@ -0,0 +1,41 @@
+"""Lazy-loading click group for LED Tomato CLI"""
+
+import importlib
+from typing import Dict, List, Optional
+
+import click
+
+
+class LazyGroup(click.Group):
+    """Click group that imports subcommands only when they are resolved
+
+    Subcommands are given as ``{"name": "package.module.attribute"}``. The
+    module is imported the first time click asks for the command, so startup
+    only pays for the command that actually runs.
+    """
+
+    def __init__(self, *args, lazy_subcommands: Optional[Dict[str, str]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+        self._loaded: Dict[str, click.Command] = {}
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        """List eager and lazy subcommand names"""
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        """Resolve a subcommand, importing its module on first use"""
+        if cmd_name in self.lazy_subcommands:
+            return self._lazy_load(cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def _lazy_load(self, cmd_name: str) -> click.Command:
+        """Import and cache a lazy subcommand"""
+        if cmd_name not in self._loaded:
+            import_path = self.lazy_subcommands[cmd_name]
+            module_name, attr_name = import_path.rsplit('.', 1)
+            command = getattr(importlib.import_module(module_name), attr_name)
+            if not isinstance(command, click.Command):
+                raise ValueError(f"Lazy loading of {import_path} did not return a click command")
+            self._loaded[cmd_name] = command
+        return self._loaded[cmd_name]
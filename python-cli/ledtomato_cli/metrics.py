@@ -0,0 +1,420 @@
+"""Request timing metrics for LED Tomato CLI
+
+``LEDTomatoClient`` reports one ``RequestTiming`` per HTTP request with the
+time spent in each phase: DNS, TCP connect, time to first byte (the ESP32
+handler), body read and JSON decode. A ``MetricsRegistry`` aggregates them
+into fixed-bucket histograms per phase, endpoint and device and can render
+them in Prometheus text format.
+
+Collection is off unless a registry is activated (``--metrics``); without
+one the client adds no trace hooks at all.
+"""
+
+import json
+import os
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Upper bounds in milliseconds; a final +Inf bucket is implicit
+BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+PHASES = ('dns', 'connect', 'ttfb', 'body', 'decode', 'total')
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class RequestTiming:
+    """Timing of one request, phases in milliseconds (None = did not happen)"""
+    method: str
+    endpoint: str
+    device: str
+    status: Optional[int] = None
+    dns: Optional[float] = None
+    connect: Optional[float] = None
+    ttfb: Optional[float] = None
+    body: Optional[float] = None
+    decode: Optional[float] = None
+    total: Optional[float] = None
+    retries: int = 0
+    hedged: bool = False
+    error: Optional[str] = None
+    # perf_counter stamps filled in by the aiohttp trace hooks
+    _marks: Dict[str, float] = field(default_factory=dict, repr=False)
+
+    def mark(self, name: str) -> None:
+        self._marks[name] = time.perf_counter()
+
+    def since(self, name: str) -> Optional[float]:
+        """Milliseconds since a mark, or None if it was never set"""
+        if name not in self._marks:
+            return None
+        return (time.perf_counter() - self._marks[name]) * 1000.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'method': self.method,
+            'endpoint': self.endpoint,
+            'device': self.device,
+            'status': self.status,
+            'dns': self.dns,
+            'connect': self.connect,
+            'ttfb': self.ttfb,
+            'body': self.body,
+            'decode': self.decode,
+            'total': self.total,
+            'retries': self.retries,
+            'hedged': self.hedged,
+            'error': self.error,
+        }
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.sum += value_ms
+
+    def merge(self, other: 'Histogram') -> None:
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS_MS[i - 1] if i > 0 else 0.0
+                if i == len(BUCKETS_MS):
+                    return lower  # +Inf bucket: report its lower bound
+                return lower + (BUCKETS_MS[i] - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS_MS[-1]
+
+
+class MetricsRegistry:
+    """Aggregates request timings into histograms and counters"""
+
+    def __init__(self):
+        self.since = datetime.now().isoformat(timespec='seconds')
+        # (phase, endpoint, device) -> Histogram
+        self.histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        # (endpoint, device, status) -> count; status "error" for failures
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        # (endpoint, device) -> retried attempts
+        self.retries: Dict[Tuple[str, str], int] = {}
+        # (endpoint, device) -> requests sent a second time by hedging
+        self.hedges: Dict[Tuple[str, str], int] = {}
+        # device -> last circuit breaker state seen this run (not persisted)
+        self.circuits: Dict[str, str] = {}
+        self._listeners: List[Callable[[RequestTiming], None]] = []
+        self._trace_config = None
+
+    def subscribe(self, callback: Callable[[RequestTiming], None]) -> None:
+        """Receive every ``RequestTiming`` as it is recorded"""
+        self._listeners.append(callback)
+
+    def observe(self, timing: RequestTiming) -> None:
+        """Record a finished request"""
+        for phase in PHASES:
+            value = getattr(timing, phase)
+            if value is not None:
+                key = (phase, timing.endpoint, timing.device)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.observe(value)
+
+        status = 'error' if timing.error else str(timing.status)
+        request_key = (timing.endpoint, timing.device, status)
+        self.requests[request_key] = self.requests.get(request_key, 0) + 1
+        if timing.retries:
+            retry_key = (timing.endpoint, timing.device)
+            self.retries[retry_key] = self.retries.get(retry_key, 0) + timing.retries
+        if timing.hedged:
+            hedge_key = (timing.endpoint, timing.device)
+            self.hedges[hedge_key] = self.hedges.get(hedge_key, 0) + 1
+
+        for listener in self._listeners:
+            listener(timing)
+
+    def record_circuit(self, device: str, state: str) -> None:
+        """Note a circuit breaker state change"""
+        self.circuits[device] = state
+
+    def trace_config(self):
+        """aiohttp TraceConfig that fills in DNS, connect and TTFB times"""
+        if self._trace_config is None:
+            import aiohttp
+
+            async def on_request_start(session, ctx, params):
+                ctx.trace_request_ctx.mark('start')
+
+            async def on_dns_start(session, ctx, params):
+                ctx.trace_request_ctx.mark('dns')
+
+            async def on_dns_end(session, ctx, params):
+                ctx.trace_request_ctx.dns = ctx.trace_request_ctx.since('dns')
+
+            async def on_dns_cache_hit(session, ctx, params):
+                ctx.trace_request_ctx.dns = 0.0
+
+            async def on_connection_start(session, ctx, params):
+                ctx.trace_request_ctx.mark('connect')
+
+            async def on_connection_end(session, ctx, params):
+                timing = ctx.trace_request_ctx
+                # Connection creation includes name resolution
+                timing.connect = max(0.0, timing.since('connect') - (timing.dns or 0.0))
+                timing.mark('connected')
+
+            async def on_request_end(session, ctx, params):
+                # Fired once the response headers have been parsed
+                timing = ctx.trace_request_ctx
+                timing.ttfb = timing.since('connected') if 'connected' in timing._marks else timing.since('start')
+                timing.mark('headers')
+
+            trace_config = aiohttp.TraceConfig(trace_config_ctx_factory=_trace_context)
+            trace_config.on_request_start.append(on_request_start)
+            trace_config.on_dns_resolvehost_start.append(on_dns_start)
+            trace_config.on_dns_resolvehost_end.append(on_dns_end)
+            trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+            trace_config.on_connection_create_start.append(on_connection_start)
+            trace_config.on_connection_create_end.append(on_connection_end)
+            trace_config.on_request_end.append(on_request_end)
+            self._trace_config = trace_config
+        return self._trace_config
+
+    # Persistence
+
+    def merge(self, other: 'MetricsRegistry') -> None:
+        """Add another registry's data into this one"""
+        for key, histogram in other.histograms.items():
+            self.histograms.setdefault(key, Histogram()).merge(histogram)
+        for key, count in other.requests.items():
+            self.requests[key] = self.requests.get(key, 0) + count
+        for key, count in other.retries.items():
+            self.retries[key] = self.retries.get(key, 0) + count
+        for key, count in other.hedges.items():
+            self.hedges[key] = self.hedges.get(key, 0) + count
+        self.circuits.update(other.circuits)
+        self.since = min(self.since, other.since)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': SNAPSHOT_VERSION,
+            'since': self.since,
+            'buckets_ms': list(BUCKETS_MS),
+            'histograms': [
+                {'phase': phase, 'endpoint': endpoint, 'device': device,
+                 'counts': histogram.counts, 'sum': histogram.sum}
+                for (phase, endpoint, device), histogram in sorted(self.histograms.items())
+            ],
+            'requests': [
+                {'endpoint': endpoint, 'device': device, 'status': status, 'count': count}
+                for (endpoint, device, status), count in sorted(self.requests.items())
+            ],
+            'retries': [
+                {'endpoint': endpoint, 'device': device, 'count': count}
+                for (endpoint, device), count in sorted(self.retries.items())
+            ],
+            'hedges': [
+                {'endpoint': endpoint, 'device': device, 'count': count}
+                for (endpoint, device), count in sorted(self.hedges.items())
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MetricsRegistry':
+        registry = cls()
+        if data.get('version') != SNAPSHOT_VERSION or data.get('buckets_ms') != list(BUCKETS_MS):
+            return registry  # incompatible snapshot: start over
+        registry.since = data.get('since', registry.since)
+        for item in data.get('histograms', []):
+            histogram = Histogram()
+            histogram.counts = list(item['counts'])
+            histogram.sum = item['sum']
+            registry.histograms[(item['phase'], item['endpoint'], item['device'])] = histogram
+        for item in data.get('requests', []):
+            registry.requests[(item['endpoint'], item['device'], item['status'])] = item['count']
+        for item in data.get('retries', []):
+            registry.retries[(item['endpoint'], item['device'])] = item['count']
+        for item in data.get('hedges', []):
+            registry.hedges[(item['endpoint'], item['device'])] = item['count']
+        return registry
+
+    @classmethod
+    def load(cls, path: Path) -> 'MetricsRegistry':
+        """Load a saved snapshot, or an empty registry"""
+        try:
+            with open(path, 'r') as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+    def save(self, path: Path) -> None:
+        """Atomically write a snapshot"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp_file, path)
+
+    # Prometheus
+
+    def to_prometheus(self) -> str:
+        """Render in the Prometheus text exposition format (version 0.0.4)"""
+        lines = [
+            "# HELP ledtomato_request_phase_seconds Time spent in each phase of a device request",
+            "# TYPE ledtomato_request_phase_seconds histogram",
+        ]
+        for (phase, endpoint, device), histogram in sorted(self.histograms.items()):
+            labels = f'phase="{phase}",endpoint="{_escape(endpoint)}",device="{_escape(device)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS_MS, histogram.counts):
+                cumulative += count
+                lines.append(f'ledtomato_request_phase_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+            cumulative += histogram.counts[-1]
+            lines.append(f'ledtomato_request_phase_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'ledtomato_request_phase_seconds_sum{{{labels}}} {histogram.sum / 1000:.6f}')
+            lines.append(f'ledtomato_request_phase_seconds_count{{{labels}}} {cumulative}')
+
+        lines.append("# HELP ledtomato_requests_total Device requests by response status")
+        lines.append("# TYPE ledtomato_requests_total counter")
+        for (endpoint, device, status), count in sorted(self.requests.items()):
+            lines.append(f'ledtomato_requests_total{{endpoint="{_escape(endpoint)}",'
+                         f'device="{_escape(device)}",status="{status}"}} {count}')
+
+        lines.append("# HELP ledtomato_request_retries_total Retried request attempts")
+        lines.append("# TYPE ledtomato_request_retries_total counter")
+        for (endpoint, device), count in sorted(self.retries.items()):
+            lines.append(f'ledtomato_request_retries_total{{endpoint="{_escape(endpoint)}",'
+                         f'device="{_escape(device)}"}} {count}')
+
+        lines.append("# HELP ledtomato_request_hedges_total Requests sent a second time after exceeding p95")
+        lines.append("# TYPE ledtomato_request_hedges_total counter")
+        for (endpoint, device), count in sorted(self.hedges.items()):
+            lines.append(f'ledtomato_request_hedges_total{{endpoint="{_escape(endpoint)}",'
+                         f'device="{_escape(device)}"}} {count}')
+
+        lines.append("# HELP ledtomato_circuit_open Whether requests to a device are being short-circuited")
+        lines.append("# TYPE ledtomato_circuit_open gauge")
+        for device, state in sorted(self.circuits.items()):
+            lines.append(f'ledtomato_circuit_open{{device="{_escape(device)}"}} {int(state == "open")}')
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path) -> None:
+        """Write Prometheus text for node_exporter's textfile collector"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_name(path.name + '.tmp')
+        with open(tmp_file, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_file, path)
+
+
+def format_timing(timing: RequestTiming) -> str:
+    """One-line description of a request for verbose output"""
+    outcome = timing.error or str(timing.status)
+    phases = " ".join(
+        f"{phase}={getattr(timing, phase):.1f}ms"
+        for phase in PHASES if getattr(timing, phase) is not None
+    )
+    retries = f" retries={timing.retries}" if timing.retries else ""
+    hedged = " hedged" if timing.hedged else ""
+    return f"{timing.method} {timing.device}{timing.endpoint} -> {outcome} {phases}{retries}{hedged}"
+
+
+def accumulate(registry: MetricsRegistry, path: Path) -> MetricsRegistry:
+    """Merge ``registry`` into the snapshot at ``path`` and save it"""
+    stored = MetricsRegistry.load(path)
+    stored.merge(registry)
+    stored.save(path)
+    return stored
+
+
+class _TraceContext:
+    """Per-request aiohttp trace context carrying our ``RequestTiming``"""
+
+    def __init__(self, trace_request_ctx: Optional[RequestTiming] = None):
+        self.trace_request_ctx = trace_request_ctx or RequestTiming('', '', '')
+
+
+def _trace_context(trace_request_ctx: Optional[RequestTiming] = None) -> _TraceContext:
+    return _TraceContext(trace_request_ctx)
+
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+async def serve_prometheus(render: Callable[[], str], host: str = "127.0.0.1", port: int = 9464):
+    """Serve ``render()`` at ``/metrics`` over plain HTTP
+
+    Returns the asyncio server; every scrape calls ``render`` again.
+    """
+    import asyncio
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[1].split('?')[0] == '/metrics':
+                status, body = "200 OK", render().encode('utf-8')
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+# The registry requests are reported to; None disables collection
+_active: Optional[MetricsRegistry] = None
+
+
+def activate(registry: Optional[MetricsRegistry] = None) -> MetricsRegistry:
+    """Start collecting request metrics into ``registry``"""
+    global _active
+    _active = registry or MetricsRegistry()
+    return _active
+
+
+def deactivate() -> None:
+    """Stop collecting request metrics"""
+    global _active
+    _active = None
+
+
+def active_registry() -> Optional[MetricsRegistry]:
+    """Get the registry collecting metrics, if any"""
+    return _active
@@ -0,0 +1,405 @@
+"""UDP multicast control channel for LED Tomato fleets
+
+HTTP fan-out costs one TCP handshake and one request per device. Devices
+that have been given a shared key (``POST /api/multicast``) also listen on
+a multicast group, so one datagram can start, stop or configure a whole
+floor. Each device acknowledges a command by unicast; commands that are
+not acknowledged in time are retransmitted with the same sequence number,
+and devices that still stay silent are reached over HTTP.
+
+Packets are little-endian::
+
+    offset  size  field
+    0       2     magic "LT"
+    2       1     version (1)
+    3       1     type: 1 start, 2 stop, 3 config, 4 ack, 5 beacon
+    4       4     session: the controller's epoch
+    8       4     sequence number
+    12      2     payload length
+    14      n     payload
+    14+n    8     HMAC-SHA256(key, bytes 0..14+n) truncated to 8 bytes
+
+Payloads: start carries the timer type (0 work, 1 short break, 2 long
+break); stop is empty; config is the form body of ``POST
+/api/pomodoro/config``; an ack echoes the command's session and sequence
+number and carries the device MAC, a result byte (0 ok, 1 rejected,
+2 stale) and the device's epoch.
+
+Replay protection: the session field is an epoch, a counter per key that
+each controller run raises and keeps in a cache file. Devices keep the
+highest epoch they have seen in NVS and never execute a command from an
+older one; within the current epoch they execute each sequence number
+once and re-acknowledge retransmissions. A controller whose epoch is
+behind (lost cache file, another machine) is answered "stale", reaches
+those devices over HTTP and continues past the highest epoch reported.
+
+Every few seconds each device also multicasts a 24-byte status beacon to
+``BEACON_PORT``: MAC, IPv4 address, HTTP port, timer state, flags
+(running, armed, schedule active), remaining seconds, uptime and
+completed schedule sessions.
+"""
+
+import asyncio
+import hmac
+import ipaddress
+import json
+import secrets
+import socket
+import struct
+from dataclasses import dataclass, field
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+GROUP = "239.255.77.77"
+COMMAND_PORT = 4210
+BEACON_PORT = 4211
+
+MAGIC = b'LT'
+VERSION = 1
+KEY_SIZE = 16
+TAG_SIZE = 8
+HEADER = struct.Struct('<2sBBIIH')
+BEACON = struct.Struct('<6s4sHBBIIH')
+ACK_PAYLOAD = struct.Struct('<6sBI')
+
+PACKET_START, PACKET_STOP, PACKET_CONFIG, PACKET_ACK, PACKET_BEACON = 1, 2, 3, 4, 5
+ACK_OK, ACK_REJECTED, ACK_STALE = 0, 1, 2
+TIMER_TYPES = ('work', 'short_break', 'long_break')
+
+FLAG_RUNNING, FLAG_ARMED, FLAG_SCHEDULE = 0x01, 0x02, 0x04
+
+
+def generate_key() -> str:
+    """New random key, hex-encoded"""
+    return secrets.token_hex(KEY_SIZE)
+
+
+def parse_key(key: str) -> bytes:
+    """Decode a hex key, raising ValueError if it is not KEY_SIZE bytes"""
+    raw = bytes.fromhex(key)
+    if len(raw) != KEY_SIZE:
+        raise ValueError(f"multicast key must be {KEY_SIZE * 2} hex digits")
+    return raw
+
+
+def key_id(key: bytes) -> str:
+    """Fingerprint naming a key in the epoch file without storing the key"""
+    return sha256(key).hexdigest()[:16]
+
+
+def load_epoch(path: Path, key: bytes) -> int:
+    """Last epoch used with ``key``, 0 if none is recorded"""
+    try:
+        epochs = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return 0
+    epoch = epochs.get(key_id(key), 0) if isinstance(epochs, dict) else 0
+    return epoch if isinstance(epoch, int) else 0
+
+
+def save_epoch(path: Path, key: bytes, epoch: int) -> None:
+    """Record the epoch used with ``key``"""
+    try:
+        epochs = json.loads(path.read_text())
+    except (OSError, ValueError):
+        epochs = {}
+    if not isinstance(epochs, dict):
+        epochs = {}
+    epochs[key_id(key)] = epoch
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(epochs, indent=2))
+
+
+def format_mac(mac: bytes) -> str:
+    return ":".join(f"{byte:02X}" for byte in mac)
+
+
+@dataclass
+class Packet:
+    """A decoded, authenticated packet"""
+    type: int
+    session: int
+    seq: int
+    payload: bytes = b''
+
+
+def encode_packet(key: bytes, packet_type: int, session: int, seq: int, payload: bytes = b'') -> bytes:
+    """Build and sign a packet"""
+    body = HEADER.pack(MAGIC, VERSION, packet_type, session, seq, len(payload)) + payload
+    return body + hmac.new(key, body, sha256).digest()[:TAG_SIZE]
+
+
+def decode_packet(key: bytes, data: bytes) -> Optional[Packet]:
+    """Parse a packet, or None if it is malformed or not signed with ``key``"""
+    if len(data) < HEADER.size + TAG_SIZE:
+        return None
+    magic, version, packet_type, session, seq, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or len(data) != HEADER.size + length + TAG_SIZE:
+        return None
+    body, tag = data[:-TAG_SIZE], data[-TAG_SIZE:]
+    if not hmac.compare_digest(hmac.new(key, body, sha256).digest()[:TAG_SIZE], tag):
+        return None
+    return Packet(packet_type, session, seq, body[HEADER.size:])
+
+
+@dataclass
+class Beacon:
+    """Periodic device status"""
+    mac: str
+    ip: str
+    port: int
+    state: int
+    running: bool
+    armed: bool
+    schedule_active: bool
+    remaining: int  # seconds
+    uptime: int  # device millis()
+    completed: int  # schedule sessions
+
+    @property
+    def address(self) -> str:
+        """HTTP address for ``LEDTomatoClient``"""
+        return self.ip if self.port == 80 else f"{self.ip}:{self.port}"
+
+    def to_payload(self) -> bytes:
+        flags = ((FLAG_RUNNING if self.running else 0) | (FLAG_ARMED if self.armed else 0)
+                 | (FLAG_SCHEDULE if self.schedule_active else 0))
+        return BEACON.pack(bytes.fromhex(self.mac.replace(':', '')), socket.inet_aton(self.ip), self.port,
+                           self.state, flags, self.remaining, self.uptime, self.completed)
+
+    @classmethod
+    def from_payload(cls, payload: bytes) -> Optional['Beacon']:
+        if len(payload) != BEACON.size:
+            return None
+        mac, ip, port, state, flags, remaining, uptime, completed = BEACON.unpack(payload)
+        return cls(format_mac(mac), socket.inet_ntoa(ip), port, state, bool(flags & FLAG_RUNNING),
+                   bool(flags & FLAG_ARMED), bool(flags & FLAG_SCHEDULE), remaining, uptime, completed)
+
+
+def open_multicast_socket(group: str, port: int) -> socket.socket:
+    """UDP socket bound to ``port`` that receives ``group`` (if it is a multicast address)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    if ipaddress.ip_address(group).is_multicast:
+        sock.bind(('', port))
+        membership = socket.inet_aton(group) + socket.inet_aton('0.0.0.0')
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    else:
+        sock.bind((group, port))
+    sock.setblocking(False)
+    return sock
+
+
+class _DatagramCollector(asyncio.DatagramProtocol):
+    """Hands authenticated packets to a callback"""
+
+    def __init__(self, key: bytes, callback: Callable[[Packet, Tuple[str, int]], None]):
+        self.key = key
+        self.callback = callback
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        packet = decode_packet(self.key, data)
+        if packet is not None:
+            self.callback(packet, addr)
+
+
+async def listen_beacons(key: bytes, callback: Callable[[Beacon, Tuple[str, int]], None],
+                         group: str = GROUP, port: int = BEACON_PORT) -> asyncio.DatagramTransport:
+    """Call ``callback`` for every authenticated beacon until the returned transport is closed"""
+    def on_packet(packet: Packet, addr: Tuple[str, int]) -> None:
+        beacon = Beacon.from_payload(packet.payload) if packet.type == PACKET_BEACON else None
+        if beacon is not None:
+            callback(beacon, addr)
+
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _DatagramCollector(key, on_packet), sock=open_multicast_socket(group, port))
+    return transport
+
+
+@dataclass
+class BroadcastResult:
+    """Outcome of one broadcast command"""
+    command: str
+    seq: int
+    acked: Dict[str, int] = field(default_factory=dict)  # MAC -> ack result
+    retransmits: int = 0
+    fallback: Dict[str, bool] = field(default_factory=dict)  # HTTP address -> success
+    stale: Dict[str, bool] = field(default_factory=dict)  # MAC -> reached over HTTP instead
+
+    @property
+    def ok(self) -> bool:
+        return (all(self.fallback.values()) and all(self.stale.values())
+                and all(result == ACK_OK for result in self.acked.values()))
+
+
+class MulticastController:
+    """Sends authenticated multicast commands and tracks acknowledgements
+
+    Devices expected to answer are registered by MAC with their HTTP
+    address, either from beacons (``listen_beacons``) or over HTTP
+    (``register``); only those get retransmissions and the HTTP fallback.
+    """
+
+    def __init__(self, key: bytes, group: str = GROUP, port: int = COMMAND_PORT,
+                 ack_timeout: float = 0.25, retries: int = 2, ttl: int = 1,
+                 epoch_file: Optional[Path] = None):
+        """Initialize controller
+
+        Args:
+            key: Shared key (``parse_key``)
+            group: Multicast group (or a unicast address, e.g. an emulator)
+            port: Command port devices listen on
+            ack_timeout: Seconds to wait for acknowledgements per attempt
+            retries: Retransmissions before falling back to HTTP
+            ttl: Multicast hop limit; 1 keeps commands on the local network
+            epoch_file: Where the last epoch per key is kept; without one
+                every run starts at epoch 1 and resyncs from stale acks
+        """
+        self.key = key
+        self.group = group
+        self.port = port
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.ttl = ttl
+        self.devices: Dict[str, str] = {}  # MAC -> HTTP address
+        self.beacons: Dict[str, Beacon] = {}
+        self.epoch_file = epoch_file
+        self.session = 0
+        self.seq = 0
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._acks: Dict[int, Dict[str, Tuple[int, int]]] = {}  # seq -> MAC -> (result, device epoch)
+        self._advance_epoch((load_epoch(epoch_file, key) if epoch_file else 0) + 1)
+        self._ack_event: Optional[asyncio.Event] = None
+
+    async def open(self) -> 'MulticastController':
+        """Bind the command socket"""
+        loop = asyncio.get_running_loop()
+        self._ack_event = asyncio.Event()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        sock.bind(('', 0))
+        sock.setblocking(False)
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramCollector(self.key, self._on_packet), sock=sock)
+        return self
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def __aenter__(self) -> 'MulticastController':
+        return await self.open()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def _advance_epoch(self, epoch: int) -> None:
+        self.session = epoch & 0xFFFFFFFF
+        if self.epoch_file is not None:
+            save_epoch(self.epoch_file, self.key, self.session)
+
+    def _on_packet(self, packet: Packet, addr: Tuple[str, int]) -> None:
+        if packet.type != PACKET_ACK or packet.session != self.session or packet.seq not in self._acks:
+            return
+        if len(packet.payload) != ACK_PAYLOAD.size:
+            return
+        mac, result, epoch = ACK_PAYLOAD.unpack(packet.payload)
+        self._acks[packet.seq][format_mac(mac)] = (result, epoch)
+        self._ack_event.set()
+
+    async def register(self, address: str) -> Optional[str]:
+        """Look up a device's MAC over HTTP and expect its acknowledgements"""
+        from .client import LEDTomatoClient
+
+        info = await LEDTomatoClient(address).get_multicast_info()
+        if not info or not info.get('enabled'):
+            return None
+        self.devices[info['mac']] = address
+        return info['mac']
+
+    async def listen_beacons(self, duration: float, group: Optional[str] = None,
+                             port: int = BEACON_PORT) -> Dict[str, Beacon]:
+        """Collect status beacons for ``duration`` seconds and register their senders"""
+        def on_beacon(beacon: Beacon, addr: Tuple[str, int]) -> None:
+            self.beacons[beacon.mac] = beacon
+            self.devices[beacon.mac] = beacon.address
+
+        transport = await listen_beacons(self.key, on_beacon, group or self.group, port)
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            transport.close()
+        return dict(self.beacons)
+
+    async def start(self, timer_type: str) -> BroadcastResult:
+        """Start a session on every device"""
+        payload = bytes([TIMER_TYPES.index(timer_type)])
+        return await self._broadcast('start', PACKET_START, payload,
+                                     lambda client: client.start_timer(timer_type))
+
+    async def stop(self) -> BroadcastResult:
+        """Stop every device"""
+        return await self._broadcast('stop', PACKET_STOP, b'', lambda client: client.stop_timer())
+
+    async def configure(self, config: Dict[str, Any]) -> BroadcastResult:
+        """Apply a configuration (``update_config`` keys) to every device"""
+        from urllib.parse import urlencode
+
+        from .client import config_form
+
+        payload = urlencode(config_form(config)).encode('ascii')
+        return await self._broadcast('config', PACKET_CONFIG, payload,
+                                     lambda client: client.update_config(config))
+
+    async def _broadcast(self, command: str, packet_type: int, payload: bytes,
+                         fallback: Callable[[Any], Awaitable[bool]]) -> BroadcastResult:
+        """Send a command, retransmit to silent devices, then fall back to HTTP"""
+        if self._transport is None:
+            raise RuntimeError("MulticastController is not open")
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        result = BroadcastResult(command, self.seq)
+        acks = self._acks[self.seq] = {}
+        packet = encode_packet(self.key, packet_type, self.session, self.seq, payload)
+        loop = asyncio.get_running_loop()
+
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    result.retransmits += 1
+                self._transport.sendto(packet, (self.group, self.port))
+                deadline = loop.time() + self.ack_timeout
+                # Without registered devices there is nothing to wait for but the timeout
+                while not self.devices or not set(self.devices) <= set(acks):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    self._ack_event.clear()
+                    try:
+                        await asyncio.wait_for(self._ack_event.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if self.devices and set(self.devices) <= set(acks):
+                    break
+        finally:
+            del self._acks[self.seq]
+
+        result.acked = {mac: outcome for mac, (outcome, _) in acks.items() if outcome != ACK_STALE}
+        stale = {mac: epoch for mac, (outcome, epoch) in acks.items() if outcome == ACK_STALE}
+        if stale:
+            # Later commands continue past every epoch these devices have seen
+            self._advance_epoch(max(stale.values()) + 1)
+        silent = [mac for mac in self.devices if mac not in result.acked]
+        if silent:
+            from .client import LEDTomatoClient
+
+            addresses = [self.devices[mac] for mac in silent]
+            outcomes = await asyncio.gather(*(fallback(LEDTomatoClient(address)) for address in addresses))
+            result.fallback = dict(zip(addresses, outcomes))
+        result.stale = {mac: result.fallback.get(self.devices.get(mac), False) for mac in stale}
+        return result
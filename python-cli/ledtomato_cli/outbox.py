@@ -0,0 +1,166 @@
+"""Persistent per-device queue of commands for unreachable devices
+
+A device that drops off Wi-Fi for a few seconds used to turn every
+``start``, ``stop`` or config write into an error. The gateway instead
+puts such writes in an ``Outbox``, answers ``202 Accepted``, and delivers
+them once the device answers again.
+
+Queued commands are coalesced as they arrive, so a long outage leaves a
+short queue rather than a backlog:
+
+- a config is merged into any config still queued (its fields win, and
+  it takes the later expiry)
+- a start replaces a queued start
+- a stop cancels a queued start (start then stop is nothing) and is
+  dropped if a stop is already queued
+
+Each command expires after a TTL that depends on what it does (a start
+is only worth delivering soon after it was asked for; a config stays
+valid for a day). The queue is saved to a JSON file after every change,
+so a gateway restart does not lose it.
+"""
+
+import json
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Device endpoint -> command kind; other writes are never queued
+COMMANDS = {
+    '/api/pomodoro/start': 'start',
+    '/api/pomodoro/stop': 'stop',
+    '/api/pomodoro/config': 'config',
+}
+
+DEFAULT_TTL = {'start': 60.0, 'stop': 600.0, 'config': 86400.0}  # seconds
+
+
+@dataclass
+class QueuedCommand:
+    """One write waiting for its device"""
+    kind: str  # start, stop or config
+    path: str
+    form: Dict[str, str]
+    queued_at: float  # wall-clock seconds
+    expires: float  # wall-clock seconds
+
+
+def coalesce(queue: List[QueuedCommand], command: QueuedCommand) -> List[QueuedCommand]:
+    """The queue after ``command`` arrives, with superseded commands removed"""
+    if command.kind == 'config':
+        # A config POST only changes the fields it sends, so queued ones still
+        # count; the merged config keeps the queued one's place, so a start
+        # queued after it still runs with it
+        for index, queued in enumerate(queue):
+            if queued.kind == 'config':
+                merged = QueuedCommand('config', command.path, {**queued.form, **command.form},
+                                       max(queued.queued_at, command.queued_at),
+                                       max(queued.expires, command.expires))
+                return queue[:index] + [merged] + queue[index + 1:]
+        return queue + [command]
+
+    timer = [queued for queued in queue if queued.kind in ('start', 'stop')]
+    last = timer[-1] if timer else None
+    if command.kind == 'stop':
+        if last is not None and last.kind == 'start':
+            return [queued for queued in queue if queued is not last]
+        if last is not None and last.kind == 'stop':
+            return queue
+        return queue + [command]
+    if last is not None and last.kind == 'start':
+        queue = [queued for queued in queue if queued is not last]
+    return queue + [command]
+
+
+class Outbox:
+    """Commands per device, coalesced, expiring and saved to disk"""
+
+    def __init__(self, path: Optional[Path] = None, ttl: Optional[Dict[str, float]] = None):
+        """Initialize outbox
+
+        Args:
+            path: JSON file the queue is saved to (None: memory only)
+            ttl: Seconds each kind of command stays deliverable (default: ``DEFAULT_TTL``)
+        """
+        self.path = path
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.queues: Dict[str, List[QueuedCommand]] = {}
+        self.expired = 0
+        self.coalesced = 0
+
+    @classmethod
+    def load(cls, path: Path, ttl: Optional[Dict[str, float]] = None) -> 'Outbox':
+        """Read a saved queue; a missing or unreadable file is an empty one"""
+        outbox = cls(path, ttl)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            for device, commands in data.get('devices', {}).items():
+                outbox.queues[device] = [QueuedCommand(**command) for command in commands]
+        except (OSError, ValueError, TypeError):
+            pass
+        return outbox
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        data = {'version': 1, 'devices': {device: [asdict(command) for command in queue]
+                                          for device, queue in self.queues.items() if queue}}
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(self.path).with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        tmp.replace(self.path)
+
+    @staticmethod
+    def queueable(path: str) -> bool:
+        return path in COMMANDS
+
+    def put(self, device: str, path: str, form: Dict[str, str], now: Optional[float] = None) -> int:
+        """Queue a write for a device; returns how many commands it now has pending"""
+        now = time.time() if now is None else now
+        kind = COMMANDS[path]
+        command = QueuedCommand(kind, path, dict(form), now, now + self.ttl[kind])
+        queue = self.pending(device, now)
+        updated = coalesce(queue, command)
+        self.coalesced += len(queue) + 1 - len(updated)
+        self.queues[device] = updated
+        self.save()
+        return len(updated)
+
+    def pending(self, device: str, now: Optional[float] = None) -> List[QueuedCommand]:
+        """Commands still deliverable to a device, oldest first (expired ones are dropped)"""
+        now = time.time() if now is None else now
+        queue = self.queues.get(device, [])
+        live = [command for command in queue if command.expires > now]
+        if len(live) != len(queue):
+            self.expired += len(queue) - len(live)
+            self.queues[device] = live
+            self.save()
+        return list(live)
+
+    def take(self, device: str, now: Optional[float] = None) -> Optional[QueuedCommand]:
+        """Remove and return the oldest deliverable command of a device
+
+        A command being delivered is out of the queue, so commands that
+        arrive meanwhile are not coalesced against it.
+        """
+        queue = self.pending(device, now)
+        if not queue:
+            return None
+        self.queues[device] = queue[1:]
+        self.save()
+        return queue[0]
+
+    def restore(self, device: str, command: QueuedCommand) -> None:
+        """Put back a command that could not be delivered, ahead of the rest"""
+        queue: List[QueuedCommand] = []
+        for queued in [command] + self.queues.get(device, []):
+            queue = coalesce(queue, queued)
+        self.queues[device] = queue
+        self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'pending': {device: len(queue) for device, queue in self.queues.items() if queue},
+                'expired': self.expired, 'coalesced': self.coalesced}
@@ -0,0 +1,165 @@
+"""Machine-readable output for LED Tomato CLI
+
+With ``--output json`` or ``--output ndjson`` commands write through a
+``JsonOutput`` instead of the rich ``Display``. Every document is one
+compact JSON object on its own line with an ``event`` field, ready for
+``jq`` or a log shipper:
+
+- ``json``: stdout carries results only (a status, the device list, a
+  config, statistics, monitor events); messages go to stderr
+- ``ndjson``: messages are events on stdout as well, in order with results
+
+Nothing here imports rich or colorama, so a long-running monitor costs a
+JSON encode per event and no rendering.
+"""
+
+import json
+import re
+import sys
+from dataclasses import asdict
+from typing import IO, TYPE_CHECKING, Any, Dict, Optional
+
+from .clock import Clock, SystemClock
+
+if TYPE_CHECKING:
+    from .metrics import MetricsRegistry
+    from .timeseries import TimeSeriesStore
+
+TEXT, JSON, NDJSON = 'text', 'json', 'ndjson'
+FORMATS = (TEXT, JSON, NDJSON)
+
+STATE_NAMES = {0: 'idle', 1: 'work', 2: 'short_break', 3: 'long_break'}
+
+_MARKUP = re.compile(r'\[/?[a-z][a-z0-9 #._-]*\]')
+
+
+def timer_fields(status: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten the timer part of a status response"""
+    pomodoro = status.get('pomodoro', {})
+    return {
+        'state': STATE_NAMES.get(pomodoro.get('state', 0), 'unknown'),
+        'running': bool(pomodoro.get('running')),
+        'remaining': pomodoro.get('remaining', 0),
+        'elapsed': pomodoro.get('elapsed', 0),
+        'duration': pomodoro.get('duration', 0),
+    }
+
+
+class _MessageConsole:
+    """Stands in for ``rich.Console`` so plain ``console.print`` calls become messages"""
+
+    def __init__(self, output: 'JsonOutput'):
+        self.output = output
+
+    def print(self, *objects: Any, **kwargs: Any) -> None:
+        text = _MARKUP.sub('', ' '.join(str(obj) for obj in objects)).strip()
+        if text:
+            self.output.message('info', text)
+
+
+class JsonOutput:
+    """Display replacement that writes JSON documents instead of rendering"""
+
+    machine = True
+
+    def __init__(self, mode: str = JSON, verbose: bool = False, clock: Optional[Clock] = None,
+                 stream: Optional[IO[str]] = None, errors: Optional[IO[str]] = None):
+        """Initialize output
+
+        Args:
+            mode: ``json`` or ``ndjson``
+            verbose: Also write debug messages
+            clock: Time source for event timestamps
+            stream: Where documents go (default: stdout)
+            errors: Where ``json`` mode sends messages (default: stderr)
+        """
+        self.mode = mode
+        self.verbose = verbose
+        self.clock = clock or SystemClock()
+        self.stream = stream or sys.stdout
+        self.errors = errors or sys.stderr
+        self.console = _MessageConsole(self)
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Write one document to stdout"""
+        self._write(self.stream, event, fields)
+
+    def message(self, level: str, text: str) -> None:
+        """Write a human-oriented message: an event in ndjson mode, stderr otherwise"""
+        if self.mode == NDJSON:
+            self.emit(level, message=text)
+        else:
+            self.errors.write(f"{level}: {text}\n")
+            self.errors.flush()
+
+    def _side(self, event: str, **fields: Any) -> None:
+        """Write a report that is not the command's result"""
+        self._write(self.stream if self.mode == NDJSON else self.errors, event, fields)
+
+    def _write(self, stream: IO[str], event: str, fields: Dict[str, Any]) -> None:
+        document = {'event': event, 'time': self.clock.now().isoformat(timespec='milliseconds'), **fields}
+        stream.write(json.dumps(document, separators=(',', ':'), default=str) + '\n')
+        stream.flush()
+
+    # Results
+
+    def show_status(self, status: Dict[str, Any], device_ip: str) -> None:
+        self.emit('status', device=device_ip, status=status)
+
+    def show_device_list(self, devices: list) -> None:
+        self.emit('devices', devices=devices)
+
+    def show_config(self, config: Dict[str, Any]) -> None:
+        self.emit('config', config=config)
+
+    def show_session_stats(self, stats: Dict[str, Any]) -> None:
+        self.emit('stats', **stats)
+
+    def show_inventory(self, devices: list) -> None:
+        self.emit('inventory', devices=[asdict(device) for device in devices])
+
+    def show_timer_progress(self, status: Dict[str, Any]) -> None:
+        self.emit('tick', **timer_fields(status))
+
+    def show_presence_event(self, event) -> None:
+        device = event.device
+        self.emit('presence', kind=event.kind, key=device.key, address=device.address,
+                  hostname=device.hostname, mac=device.mac, source=device.source, online=device.online,
+                  previous_addresses=device.previous_addresses)
+
+    # Reports
+
+    def show_request_metrics(self, registry: 'MetricsRegistry') -> None:
+        self._side('metrics', **registry.to_dict())
+
+    def show_trends(self, store: 'TimeSeriesStore', width: int = 20) -> None:
+        trends = {}
+        for device, series in store.devices.items():
+            trends[device] = {'samples': series.samples, 'missed': series.missed}
+            for metric in ('rtt', 'remaining'):
+                trends[device][metric] = [None if bucket is None else
+                                          {'min': round(bucket.min, 3), 'avg': round(bucket.avg, 3),
+                                           'max': round(bucket.max, 3)}
+                                          for bucket in series.downsample(metric, min(width, len(series)))]
+        self._side('trends', devices=trends)
+
+    def show_profile_report(self, report: Dict[str, Any]) -> None:
+        self._side('profile', **report)
+
+    # Messages
+
+    def show_info(self, message: str) -> None:
+        self.message('info', message)
+
+    def show_success(self, message: str) -> None:
+        self.message('success', message)
+
+    def show_warning(self, message: str) -> None:
+        self.message('warning', message)
+
+    def show_error(self, message: str) -> None:
+        self.message('error', message)
+
+    def print_verbose(self, message: str) -> None:
+        if self.verbose:
+            self.message('debug', message)
@@ -0,0 +1,285 @@
+"""Passive presence tracking for LED Tomato devices
+
+``DeviceTable`` is an in-memory inventory maintained from events instead
+of scans: mDNS add/update/remove callbacks and multicast status beacons.
+Each entry keeps the device's current address (and the ones it had
+before), when it was first and last seen, and when it expires. An entry
+that is not refreshed within its TTL goes offline; an mDNS goodbye
+removes it. Consumers follow the table through ``changes()``, an async
+feed of ``PresenceEvent`` that starts with a snapshot of current entries.
+
+``PresenceTracker`` wires the table to a zeroconf browser, a beacon
+listener and a periodic expiry sweep.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .clock import Clock, SystemClock
+
+ADDED, UPDATED, MOVED, OFFLINE, REMOVED = 'added', 'updated', 'moved', 'offline', 'removed'
+
+MDNS_TTL = 120.0  # firmware host record TTL, used when zeroconf reports none
+BEACON_TTL = 15.0  # three missed beacons
+
+
+@dataclass
+class DevicePresence:
+    """What is known about one device"""
+    key: str  # MAC when known, otherwise the mDNS hostname
+    address: str  # host[:port], as LEDTomatoClient accepts it
+    hostname: Optional[str] = None
+    mac: Optional[str] = None
+    service: Optional[str] = None  # mDNS service name
+    source: str = 'mdns'  # what refreshed it last: mdns, beacon or scan
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+    expires: float = 0.0
+    online: bool = True
+    previous_addresses: List[str] = field(default_factory=list)
+    beacon: Optional[Any] = None  # latest multicast.Beacon
+
+
+@dataclass
+class PresenceEvent:
+    """One change to the table"""
+    kind: str  # added, updated, moved, offline or removed
+    device: DevicePresence
+
+
+class DeviceTable:
+    """Device inventory keyed by MAC or hostname, with an async change feed
+
+    Not thread-safe: call it from the event loop (``PresenceTracker``
+    forwards zeroconf callbacks with ``call_soon_threadsafe``).
+    """
+
+    def __init__(self, clock: Optional[Clock] = None):
+        self.clock = clock or SystemClock()
+        self.devices: Dict[str, DevicePresence] = {}
+        self._subscribers: List[asyncio.Queue] = []
+
+    def observe(self, address: str, hostname: Optional[str] = None, mac: Optional[str] = None,
+                service: Optional[str] = None, ttl: float = MDNS_TTL, source: str = 'mdns',
+                beacon: Optional[Any] = None) -> Optional[PresenceEvent]:
+        """Record a sighting, returning the change it caused (None if only timestamps moved)
+
+        Args:
+            address: Device address (host or host:port)
+            hostname: mDNS hostname, if known
+            mac: MAC address, if known
+            service: mDNS service name, if known
+            ttl: Seconds the sighting stays valid
+            source: What saw the device (mdns, beacon or scan)
+            beacon: Beacon payload, for beacon sightings
+        """
+        now = self.clock.time()
+        device = self._match(address, hostname, mac)
+        kind = None
+
+        if device is None:
+            device = DevicePresence(key=mac or hostname or address, address=address, first_seen=now)
+            self.devices[device.key] = device
+            kind = ADDED
+        else:
+            if mac and device.key != mac:
+                # First beacon from a device known by hostname: key it by MAC from now on
+                del self.devices[device.key]
+                device.key = mac
+                self.devices[mac] = device
+            if device.address != address:
+                device.previous_addresses.append(device.address)
+                device.address = address
+                kind = MOVED
+            elif not device.online:
+                kind = ADDED
+            elif (hostname and hostname != device.hostname) or (mac and mac != device.mac):
+                kind = UPDATED
+
+        device.hostname = hostname or device.hostname
+        device.mac = mac or device.mac
+        device.service = service or device.service
+        device.source = source
+        device.last_seen = now
+        # A short-lived sighting (a beacon) must not cut a longer one (mDNS) short
+        device.expires = max(device.expires, now + ttl) if device.online else now + ttl
+        device.online = True
+        if beacon is not None:
+            device.beacon = beacon
+
+        if kind is None:
+            return None
+        return self._publish(kind, device)
+
+    def remove(self, hostname: Optional[str] = None, service: Optional[str] = None) -> Optional[PresenceEvent]:
+        """Drop a device that said goodbye"""
+        for device in list(self.devices.values()):
+            if (service and device.service == service) or (hostname and device.hostname == hostname):
+                del self.devices[device.key]
+                device.online = False
+                return self._publish(REMOVED, device)
+        return None
+
+    def expired(self) -> List[DevicePresence]:
+        """Online devices whose TTL has run out"""
+        now = self.clock.time()
+        return [device for device in self.devices.values() if device.online and device.expires <= now]
+
+    def mark_offline(self, key: str) -> Optional[PresenceEvent]:
+        device = self.devices.get(key)
+        if device is None or not device.online:
+            return None
+        device.online = False
+        return self._publish(OFFLINE, device)
+
+    def expire(self) -> List[PresenceEvent]:
+        """Take every device past its TTL offline"""
+        return [self.mark_offline(device.key) for device in self.expired()]
+
+    def online(self) -> List[DevicePresence]:
+        """Devices currently believed reachable, oldest first"""
+        return sorted((device for device in self.devices.values() if device.online),
+                      key=lambda device: device.first_seen)
+
+    async def changes(self, snapshot: bool = True) -> AsyncIterator[PresenceEvent]:
+        """Follow the table: current entries as "added" events (if ``snapshot``), then every change"""
+        queue: asyncio.Queue = asyncio.Queue()
+        if snapshot:
+            for device in self.online():
+                queue.put_nowait(PresenceEvent(ADDED, device))
+        self._subscribers.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.remove(queue)
+
+    def _match(self, address: str, hostname: Optional[str], mac: Optional[str]) -> Optional[DevicePresence]:
+        """Find the entry for a sighting: by MAC, then hostname, then address"""
+        if mac and mac in self.devices:
+            return self.devices[mac]
+        for device in self.devices.values():
+            if hostname and device.hostname == hostname:
+                return device
+        for device in self.devices.values():
+            # An address only identifies entries that do not carry a conflicting MAC
+            if device.address == address and not (mac and device.mac and device.mac != mac):
+                return device
+        return None
+
+    def _publish(self, kind: str, device: DevicePresence) -> PresenceEvent:
+        event = PresenceEvent(kind, device)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+        return event
+
+
+class PresenceTracker:
+    """Keeps a ``DeviceTable`` current from mDNS and multicast beacons"""
+
+    def __init__(self, table: Optional[DeviceTable] = None, mdns: bool = True,
+                 beacon_key: Optional[bytes] = None, beacon_group: Optional[str] = None,
+                 beacon_port: Optional[int] = None, sweep_interval: float = 1.0):
+        """Initialize tracker
+
+        Args:
+            table: Table to maintain (default: a new one)
+            mdns: Browse for mDNS announcements
+            beacon_key: Multicast key; enables the beacon listener
+            beacon_group: Beacon group (default: ``multicast.GROUP``)
+            beacon_port: Beacon port (default: ``multicast.BEACON_PORT``)
+            sweep_interval: Seconds between expiry checks
+        """
+        self.table = table or DeviceTable()
+        self.mdns = mdns
+        self.beacon_key = beacon_key
+        self.beacon_group = beacon_group
+        self.beacon_port = beacon_port
+        self.sweep_interval = sweep_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._zeroconf = None
+        self._browser = None
+        self._listener = None
+        self._beacons: Optional[asyncio.DatagramTransport] = None
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def start(self) -> 'PresenceTracker':
+        self._loop = asyncio.get_running_loop()
+        if self.mdns:
+            from zeroconf import ServiceBrowser, Zeroconf
+            from .discovery import SERVICE_TYPE, LEDTomatoServiceListener
+
+            self._zeroconf = Zeroconf()
+            self._listener = LEDTomatoServiceListener(on_change=self._on_service)
+            self._browser = ServiceBrowser(self._zeroconf, SERVICE_TYPE, self._listener)
+        if self.beacon_key is not None:
+            from . import multicast
+
+            self._beacons = await multicast.listen_beacons(
+                self.beacon_key, self._on_beacon, self.beacon_group or multicast.GROUP,
+                self.beacon_port or multicast.BEACON_PORT)
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+        return self
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+        if self._beacons is not None:
+            self._beacons.close()
+        if self._zeroconf is not None:
+            await self._loop.run_in_executor(None, self._zeroconf.close)
+
+    async def __aenter__(self) -> 'PresenceTracker':
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def _on_service(self, kind: str, name: str, device: Dict[str, Any]) -> None:
+        """zeroconf thread: hand the change to the event loop"""
+        self._loop.call_soon_threadsafe(self._apply_service, kind, name, device)
+
+    def _apply_service(self, kind: str, name: str, device: Dict[str, Any]) -> None:
+        if kind == "remove":
+            self.table.remove(hostname=device['hostname'], service=name)
+            return
+        port = device.get('port', 80)
+        address = device['ip'] if port == 80 else f"{device['ip']}:{port}"
+        self.table.observe(address, hostname=device['hostname'], service=name,
+                           ttl=device.get('ttl') or MDNS_TTL, source='mdns')
+
+    def _on_beacon(self, beacon, addr) -> None:
+        self.table.observe(beacon.address, mac=beacon.mac, ttl=BEACON_TTL, source='beacon', beacon=beacon)
+
+    async def sweep(self) -> None:
+        """Take expired devices offline, re-resolving mDNS ones first
+
+        zeroconf keeps records fresh while a device keeps answering, so a
+        resolve that still succeeds at expiry means the device is alive.
+        """
+        expired = self.table.expired()
+        if not expired:
+            return
+
+        async def revalidate(device: DevicePresence) -> None:
+            if device.source == 'mdns' and device.service and self._zeroconf is not None:
+                from .discovery import SERVICE_TYPE
+
+                found = await self._loop.run_in_executor(
+                    None, self._listener.resolve, self._zeroconf, SERVICE_TYPE, device.service)
+                if found is not None:
+                    self._apply_service("update", device.service, found)
+                    return
+            self.table.mark_offline(device.key)
+
+        await asyncio.gather(*(revalidate(device) for device in expired))
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
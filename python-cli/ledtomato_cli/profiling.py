@@ -0,0 +1,312 @@
+"""Event loop profiling for LED Tomato CLI
+
+``--profile`` runs a command with asyncio debug mode, reports callbacks that
+held the loop longer than ``slow_callback`` and samples loop lag: how late a
+periodic ``asyncio.sleep`` wakes up compared to when it should have. Any
+blocking call on the loop (``time.sleep``, ``input()``, synchronous I/O)
+shows up as lag, and a watchdog thread records the stack that was running
+while the loop was stalled.
+
+Optionally the run is also wrapped in cProfile or a sampling stack profiler
+that writes collapsed stacks (flamegraph.pl / speedscope format).
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Coroutine, Dict, List, Optional, TypeVar
+
+from .metrics import Histogram
+
+T = TypeVar('T')
+
+PROFILERS = ('cprofile', 'sampling')
+MAX_SLOW_CALLBACKS = 50  # slowest callbacks kept for the report
+
+
+class LoopLagSampler:
+    """Measures event loop scheduling delay"""
+
+    def __init__(self, interval: float = 0.01):
+        """Initialize sampler
+
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.histogram = Histogram()
+        self.max_lag = 0.0
+        # time.monotonic() of the last tick, read by BlockingWatchdog
+        self.heartbeat = time.monotonic()
+
+    async def run(self) -> None:
+        """Sample until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.heartbeat = time.monotonic()
+            lag = max(0.0, loop.time() - expected) * 1000.0
+            self.histogram.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def summary(self) -> Dict[str, Any]:
+        """Lag percentiles in milliseconds"""
+        return {
+            'samples': self.histogram.count,
+            'interval_ms': self.interval * 1000.0,
+            'p50_ms': self.histogram.quantile(0.5),
+            'p95_ms': self.histogram.quantile(0.95),
+            'p99_ms': self.histogram.quantile(0.99),
+            'max_ms': self.max_lag,
+        }
+
+
+def _frame_names(frame: Any, limit: int) -> List[str]:
+    """Innermost-first "file:line function" names of a stack, import machinery skipped"""
+    names = []
+    while frame is not None and len(names) < limit:
+        code = frame.f_code
+        if not code.co_filename.startswith('<frozen'):
+            names.append(f"{Path(code.co_filename).name}:{frame.f_lineno} {code.co_name}")
+        frame = frame.f_back
+    return names
+
+
+class BlockingWatchdog:
+    """Captures the main thread's stack whenever the event loop stalls
+
+    The loop-lag sampler ticks every few milliseconds; when its heartbeat is
+    older than ``threshold`` something is holding the loop, and the main
+    thread's stack at that moment names the blocking call itself (e.g.
+    ``display.py:145 show_timer_progress``).
+    """
+
+    def __init__(self, sampler: LoopLagSampler, threshold: float = 0.05, depth: int = 8):
+        self.sampler = sampler
+        self.threshold = threshold
+        self.depth = depth
+        self.sites: Dict[str, Dict[str, Any]] = {}
+        self._thread_id = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="ledtomato-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        stalled_beat = None
+        site = None
+        while not self._stop.wait(self.threshold / 4):
+            beat = self.sampler.heartbeat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold:
+                continue
+            if beat != stalled_beat:
+                # A new stall: the stack tells us who is blocking
+                stack = _frame_names(sys._current_frames().get(self._thread_id), self.depth)
+                if not stack:
+                    continue
+                stalled_beat = beat
+                site = self.sites.setdefault(stack[0], {
+                    'site': stack[0], 'stack': stack, 'count': 0, 'max_ms': 0.0, 'total_ms': 0.0,
+                })
+                site['count'] += 1
+                site['_current'] = 0.0
+            # Keep extending the stall until the loop ticks again
+            stalled_ms = stalled * 1000.0
+            site['total_ms'] += stalled_ms - site['_current']
+            site['_current'] = stalled_ms
+            site['max_ms'] = max(site['max_ms'], stalled_ms)
+
+    def worst(self) -> List[Dict[str, Any]]:
+        """Blocking sites, most total blocked time first"""
+        sites = [{key: value for key, value in site.items() if not key.startswith('_')}
+                 for site in self.sites.values()]
+        return sorted(sites, key=lambda site: site['total_ms'], reverse=True)
+
+
+class SlowCallbackCollector(logging.Handler):
+    """Collects asyncio debug-mode "Executing ... took N seconds" warnings"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+        self.callbacks: List[Dict[str, Any]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not record.msg.startswith("Executing") or not isinstance(record.args, tuple) or len(record.args) != 2:
+            return
+        handle, seconds = record.args
+        text = str(handle)
+        self.count += 1
+        self.callbacks.append({
+            'callback': text if len(text) <= 300 else text[:297] + "...",
+            'duration_ms': seconds * 1000.0,
+        })
+        if len(self.callbacks) > MAX_SLOW_CALLBACKS * 2:
+            self._trim()
+
+    def _trim(self) -> None:
+        self.callbacks.sort(key=lambda item: item['duration_ms'], reverse=True)
+        del self.callbacks[MAX_SLOW_CALLBACKS:]
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        self._trim()
+        return list(self.callbacks)
+
+
+class StackSampler:
+    """Samples the main thread's Python stack from a background thread"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._thread_id = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="ledtomato-stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if names:
+                stack = ";".join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+
+    def write_folded(self, path: Path) -> None:
+        """Write collapsed stacks, one "frame;frame;frame count" per line"""
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+
+class LoopProfiler:
+    """Runs a coroutine with loop-lag sampling, slow-callback capture and an optional profiler"""
+
+    def __init__(self, output_dir: Path, name: str = "run", profiler: Optional[str] = None,
+                 slow_callback: float = 0.05, lag_interval: float = 0.01):
+        """Initialize profiler
+
+        Args:
+            output_dir: Directory for reports
+            name: Label used in report file names (usually the command)
+            profiler: None, 'cprofile' or 'sampling'
+            slow_callback: Seconds a callback may hold the loop before it is reported
+            lag_interval: Seconds between loop-lag samples
+        """
+        if profiler not in (None,) + PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler!r}")
+        self.output_dir = output_dir
+        self.name = name
+        self.profiler = profiler
+        self.slow_callback = slow_callback
+        self.sampler = LoopLagSampler(lag_interval)
+        self.watchdog = BlockingWatchdog(self.sampler, slow_callback)
+        self.collector = SlowCallbackCollector()
+        self.files: List[Path] = []
+        self.elapsed = 0.0
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run ``coro`` in a fresh debug-mode event loop, like ``asyncio.run``"""
+        async def main() -> T:
+            asyncio.get_running_loop().slow_callback_duration = self.slow_callback
+            sampler = asyncio.create_task(self.sampler.run())
+            try:
+                return await coro
+            finally:
+                sampler.cancel()
+                try:
+                    await sampler
+                except asyncio.CancelledError:
+                    pass
+
+        asyncio_logger = logging.getLogger('asyncio')
+        asyncio_logger.addHandler(self.collector)
+        stack_sampler = None
+        cprofile = None
+        if self.profiler == 'sampling':
+            stack_sampler = StackSampler()
+            stack_sampler.start()
+        elif self.profiler == 'cprofile':
+            import cProfile
+            cprofile = cProfile.Profile()
+            cprofile.enable()
+
+        started = time.perf_counter()
+        self.sampler.heartbeat = time.monotonic()
+        self.watchdog.start()
+        try:
+            return asyncio.run(main(), debug=True)
+        finally:
+            self.watchdog.stop()
+            self.elapsed = time.perf_counter() - started
+            if cprofile is not None:
+                cprofile.disable()
+            if stack_sampler is not None:
+                stack_sampler.stop()
+            asyncio_logger.removeHandler(self.collector)
+            self._write_reports(cprofile, stack_sampler)
+
+    def report(self) -> Dict[str, Any]:
+        """Lag percentiles, blocking call sites, slow callbacks and written files"""
+        return {
+            'name': self.name,
+            'elapsed_s': self.elapsed,
+            'slow_callback_ms': self.slow_callback * 1000.0,
+            'loop_lag': self.sampler.summary(),
+            'blocking': self.watchdog.worst(),
+            'slow_callbacks': self.collector.count,
+            'slowest': self.collector.slowest(),
+            'files': [str(path) for path in self.files],
+        }
+
+    def _write_reports(self, cprofile, stack_sampler: Optional[StackSampler]) -> None:
+        """Write the lag report and any profiler output to ``output_dir``"""
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            stem = self.output_dir / f"{datetime.now():%Y%m%d-%H%M%S}-{self.name}"
+
+            if cprofile is not None:
+                import pstats
+                cprofile.dump_stats(f"{stem}.pstats")
+                with open(f"{stem}.txt", 'w') as f:
+                    stats = pstats.Stats(cprofile, stream=f)
+                    stats.sort_stats('cumulative').print_stats(40)
+                self.files += [Path(f"{stem}.pstats"), Path(f"{stem}.txt")]
+            if stack_sampler is not None:
+                stack_sampler.write_folded(Path(f"{stem}.folded"))
+                self.files.append(Path(f"{stem}.folded"))
+
+            self.files.append(Path(f"{stem}.json"))
+            with open(f"{stem}.json", 'w') as f:
+                json.dump(self.report(), f, indent=2)
+        except OSError as e:
+            print(f"Could not write profile report: {e}")
@@ -0,0 +1,266 @@
+"""Retries, circuit breakers and hedged reads for device requests
+
+``Resilience`` wraps every request of a ``LEDTomatoClient``:
+
+- transient failures (connection refused or reset, timeouts) are retried
+  with jittered exponential backoff, but only when repeating the request
+  cannot do harm: reads and idempotent writes (stop, config, a start with
+  ``start_at``) always, other writes only if the connection never opened.
+  All attempts share the request's timeout, so retrying never makes a
+  call slower than a single timed-out attempt
+- a per-device circuit breaker opens after ``failure_threshold`` failed
+  calls in a row; while open, calls fail at once with
+  ``CircuitOpenError`` instead of waiting on a dead device. After
+  ``reset_timeout`` one trial call decides whether it closes again
+- with ``hedge`` enabled, a status read still unanswered after the
+  observed p95 latency is sent a second time and the first answer wins
+
+Commands activate one instance per run (see ``activate``); library users
+pass one to ``LEDTomatoClient`` or go without.
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .clock import Clock, SystemClock
+from .metrics import Histogram, MetricsRegistry, RequestTiming
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+# Writes that leave the device in the same state however often they arrive
+IDEMPOTENT_POSTS = ('/api/pomodoro/stop', '/api/pomodoro/config', '/api/multicast')
+HEDGED_PATHS = ('/api/status',)
+
+Send = Callable[[RequestTiming, float], Awaitable[Tuple[int, bytes]]]
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of contacting a device whose circuit is open"""
+
+
+@dataclass
+class RetryPolicy:
+    """How often and how patiently to retry"""
+    attempts: int = 3  # including the first
+    base_delay: float = 0.05  # seconds
+    max_delay: float = 1.0
+
+    def backoff(self, retry: int, rng: random.Random) -> float:
+        """Full-jitter delay before retry number ``retry`` (0-based)"""
+        return rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+class CircuitBreaker:
+    """Tracks whether a device is worth contacting"""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0,
+                 clock: Optional[Clock] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock or SystemClock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if self.clock.time() - self.opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; half-open lets a single trial through"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """End a trial call that neither succeeded nor failed (e.g. it was cancelled)"""
+        self._trial = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock.time()
+        self._trial = False
+
+
+def is_idempotent(method: str, path: str, form: Optional[Dict[str, str]]) -> bool:
+    """Whether sending the request twice has the same effect as once"""
+    if method == 'GET':
+        return True
+    if path == '/api/pomodoro/start':
+        return bool(form) and 'start_at' in form  # both copies arm the same instant
+    return path in IDEMPOTENT_POSTS
+
+
+def classify(error: BaseException) -> Tuple[bool, bool]:
+    """(transient, maybe delivered) for a failed attempt"""
+    import aiohttp
+
+    if isinstance(error, aiohttp.ClientConnectorError):
+        return True, False  # the connection never opened
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, ConnectionError)):
+        return True, True
+    return False, True
+
+
+class Resilience:
+    """Retry, circuit breaker and hedging state shared by the clients of one run"""
+
+    def __init__(self, retry: Optional[RetryPolicy] = None, failure_threshold: int = 3,
+                 reset_timeout: float = 15.0, hedge: bool = False, hedge_min_samples: int = 20,
+                 clock: Optional[Clock] = None, seed: Optional[int] = None):
+        """Initialize resilience layer
+
+        Args:
+            retry: Retry policy (default: 3 attempts, 50 ms base backoff)
+            failure_threshold: Failed calls in a row that open a device's circuit
+            reset_timeout: Seconds before an open circuit allows a trial call
+            hedge: Send a second status read when the first exceeds the p95 latency
+            hedge_min_samples: Latencies to observe per device before hedging
+            clock: Time source for circuit breakers
+            seed: Seed for backoff jitter
+        """
+        self.retry = retry or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.clock = clock or SystemClock()
+        self.rng = random.Random(seed)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+
+    def breaker(self, device: str) -> CircuitBreaker:
+        breaker = self.breakers.get(device)
+        if breaker is None:
+            breaker = self.breakers[device] = CircuitBreaker(self.failure_threshold, self.reset_timeout,
+                                                             self.clock)
+        return breaker
+
+    def hedge_delay(self, device: str, path: str) -> Optional[float]:
+        """Seconds to wait before hedging a read, or None if it should not be hedged"""
+        if not self.hedge or path not in HEDGED_PATHS:
+            return None
+        histogram = self.latency.get((device, path))
+        if histogram is None or sum(histogram.counts) < self.hedge_min_samples:
+            return None
+        return histogram.quantile(0.95) / 1000.0
+
+    async def call(self, device: str, method: str, path: str, form: Optional[Dict[str, str]],
+                   timeout: float, timing: RequestTiming, send: Send,
+                   registry: Optional[MetricsRegistry] = None) -> Tuple[int, bytes]:
+        """Send a request through retries, the device's breaker and hedging
+
+        Args:
+            device: Device address, the breaker key
+            method: HTTP method
+            path: Request path
+            form: Form body, if any
+            timeout: Seconds for the whole call, all attempts included
+            timing: Timing of the call; ``retries`` and ``hedged`` are filled in
+            send: Sends one attempt with the given timeout
+            registry: Metrics registry told about circuit state changes
+        """
+        breaker = self.breaker(device)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{device} is unavailable (circuit open after repeated failures)")
+        before = breaker.state
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        idempotent = is_idempotent(method, path, form)
+        retry = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    result = await self._attempt(device, path, deadline - loop.time(), timing, send)
+                except Exception as e:
+                    transient, delivered = classify(e)
+                    if not transient:
+                        breaker.record_success()  # the device answered, just not usefully
+                        raise
+                    delay = self.retry.backoff(retry, self.rng)
+                    if (retry + 1 >= self.retry.attempts or (delivered and not idempotent)
+                            or loop.time() + delay >= deadline):
+                        breaker.record_failure()
+                        raise
+                    retry += 1
+                    timing.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+                breaker.record_success()
+                key = (device, path)
+                self.latency.setdefault(key, Histogram()).observe((time.perf_counter() - started) * 1000.0)
+                return result
+        finally:
+            if before == HALF_OPEN:
+                breaker.release()
+            if breaker.state != before and registry is not None:
+                registry.record_circuit(device, breaker.state)
+
+    async def _attempt(self, device: str, path: str, remaining: float, timing: RequestTiming,
+                       send: Send) -> Tuple[int, bytes]:
+        """One attempt, hedged if the read is slower than usual"""
+        hedge_after = self.hedge_delay(device, path)
+        if hedge_after is None or hedge_after >= remaining:
+            return await send(timing, remaining)
+
+        first = asyncio.ensure_future(send(timing, remaining))
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        timing.hedged = True
+        shadow = RequestTiming(timing.method, timing.endpoint, timing.device)
+        pending = {first, asyncio.ensure_future(send(shadow, remaining - hedge_after))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+_active: Optional[Resilience] = None
+
+
+def activate(resilience: Optional[Resilience] = None) -> Resilience:
+    """Send new clients' requests through ``resilience``"""
+    global _active
+    _active = resilience or Resilience()
+    return _active
+
+
+def deactivate() -> None:
+    """New clients send every request exactly once again"""
+    global _active
+    _active = None
+
+
+def active_resilience() -> Optional[Resilience]:
+    """Get the resilience layer in use, if any"""
+    return _active
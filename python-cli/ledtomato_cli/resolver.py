@@ -0,0 +1,227 @@
+"""Client-side resolution of .local hostnames
+
+Without nss-mdns the OS resolver cannot answer ``ledtomato.local`` (or
+takes seconds to give up), and every client request pays for the lookup.
+``MDNSResolver`` asks the network directly with a zeroconf address query
+and caches the answer for its record TTL:
+
+- a fresh entry is returned immediately; past ``refresh_fraction`` of its
+  TTL a background query renews it, so callers never wait on expiry
+- an expired entry is re-queried; if nothing answers, the last known
+  address is still used as long as the device accepts connections there
+- entries can be persisted (``cache_file``) so the next CLI run starts warm
+
+As with metrics and traffic capture, commands activate a resolver for
+their run and ``LEDTomatoClient`` picks it up for ``.local`` hosts.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from .clock import Clock, SystemClock
+
+DEFAULT_TTL = 120.0  # the firmware's host record TTL
+
+Query = Callable[[str], Awaitable[Optional[Tuple[str, float]]]]
+
+
+def is_mdns_name(host: str) -> bool:
+    """Whether ``host`` is a .local name the resolver should handle"""
+    return host.lower().rstrip('.').endswith('.local')
+
+
+@dataclass
+class ResolvedHost:
+    """Cached answer for one hostname"""
+    address: str
+    ttl: float
+    expires: float  # clock.time()
+
+
+class MDNSResolver:
+    """Resolves .local hostnames with direct mDNS queries and caches the answers"""
+
+    def __init__(self, cache_file: Optional[Path] = None, clock: Optional[Clock] = None,
+                 query: Optional[Query] = None, timeout: float = 1.5, refresh_fraction: float = 0.8,
+                 probe_timeout: float = 1.0):
+        """Initialize resolver
+
+        Args:
+            cache_file: JSON file to load entries from and ``save`` them to
+            clock: Time source for TTLs (default: the system clock)
+            query: Coroutine returning (address, ttl) for a hostname (default: zeroconf)
+            timeout: Seconds to wait for an mDNS answer
+            refresh_fraction: Part of the TTL after which a background refresh starts
+            probe_timeout: Seconds to wait when checking a last known address
+        """
+        self.cache_file = cache_file
+        self.clock = clock or SystemClock()
+        self.query = query or self._mdns_query
+        self.timeout = timeout
+        self.refresh_fraction = refresh_fraction
+        self.probe_timeout = probe_timeout
+        self.entries: Dict[str, ResolvedHost] = {}
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self._loaded = cache_file is None
+        self._dirty = False
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._zeroconf = None
+        self._zeroconf_lock = threading.Lock()
+
+    async def resolve(self, hostname: str, port: int = 80) -> Optional[str]:
+        """IPv4 address for ``hostname``, or None to leave it to the OS resolver
+
+        Args:
+            hostname: A .local name
+            port: Port the device serves on, used to check a last known address
+        """
+        name = hostname.lower().rstrip('.')
+        self._load()
+        entry = self.entries.get(name)
+        now = self.clock.time()
+
+        if entry is not None and now < entry.expires:
+            self.hits += 1
+            if now >= entry.expires - entry.ttl * (1.0 - self.refresh_fraction):
+                self._refresh_in_background(name)
+            return entry.address
+
+        self.misses += 1
+        if entry is None:
+            return await self._lookup(name)
+
+        # Expired: ask again, and meanwhile check whether the device is still where it was
+        address, reachable = await asyncio.gather(self._lookup(name), self._answers(entry.address, port))
+        if address is not None:
+            return address
+        if reachable:
+            self.fallbacks += 1
+            # Keep using it, but ask again on the next request
+            entry.expires = now
+            return entry.address
+        return None
+
+    async def _lookup(self, name: str) -> Optional[str]:
+        """Query the network and cache the answer"""
+        try:
+            answer = await self.query(name)
+        except Exception:
+            answer = None
+        if answer is None:
+            return None
+        address, ttl = answer
+        self.entries[name] = ResolvedHost(address, ttl, self.clock.time() + ttl)
+        self._dirty = True
+        return address
+
+    def _refresh_in_background(self, name: str) -> None:
+        if name in self._refreshing:
+            return
+        self._refreshing.add(name)
+        task = asyncio.create_task(self._lookup(name))
+        self._tasks.add(task)
+
+        def done(task: asyncio.Task) -> None:
+            self._tasks.discard(task)
+            self._refreshing.discard(name)
+
+        task.add_done_callback(done)
+
+    async def _answers(self, address: str, port: int) -> bool:
+        """Whether a TCP connection to address:port succeeds"""
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), self.probe_timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    async def _mdns_query(self, name: str) -> Optional[Tuple[str, float]]:
+        """Ask for the A record of ``name`` over multicast DNS"""
+        try:
+            from zeroconf import AddressResolverIPv4, IPVersion, Zeroconf
+        except ImportError:  # zeroconf < 0.131 has no address resolver
+            return None
+
+        def query() -> Optional[Tuple[str, float]]:
+            with self._zeroconf_lock:
+                if self._zeroconf is None:
+                    self._zeroconf = Zeroconf()
+            resolver = AddressResolverIPv4(f"{name}.")
+            if not resolver.request(self._zeroconf, int(self.timeout * 1000)):
+                return None
+            records = resolver.dns_addresses(version=IPVersion.V4Only)
+            if not records:
+                return None
+            return resolver.parsed_addresses(version=IPVersion.V4Only)[0], float(records[0].ttl or DEFAULT_TTL)
+
+        return await asyncio.get_running_loop().run_in_executor(None, query)
+
+    def _load(self) -> None:
+        """Read persisted entries once, converting wall-clock expiry to clock time"""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            data = json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return
+        offset = self.clock.time() - time.time()
+        for name, entry in data.get('hosts', {}).items():
+            try:
+                self.entries.setdefault(name, ResolvedHost(entry['address'], float(entry['ttl']),
+                                                           float(entry['expires']) + offset))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def save(self) -> bool:
+        """Persist entries to ``cache_file`` if anything changed"""
+        if self.cache_file is None or not self._dirty:
+            return False
+        offset = time.time() - self.clock.time()
+        data = {'hosts': {name: {'address': entry.address, 'ttl': entry.ttl, 'expires': entry.expires + offset}
+                          for name, entry in self.entries.items()}}
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_file.write_text(json.dumps(data, indent=2))
+        except OSError:
+            return False
+        self._dirty = False
+        return True
+
+    def close(self) -> None:
+        """Release the zeroconf instance, if one was started"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._zeroconf is not None:
+            self._zeroconf.close()
+            self._zeroconf = None
+
+
+_active: Optional[MDNSResolver] = None
+
+
+def activate(resolver: Optional[MDNSResolver] = None) -> MDNSResolver:
+    """Resolve .local names of new clients through ``resolver``"""
+    global _active
+    _active = resolver or MDNSResolver()
+    return _active
+
+
+def deactivate() -> None:
+    """Leave .local names to the OS resolver again"""
+    global _active
+    _active = None
+
+
+def active_resolver() -> Optional[MDNSResolver]:
+    """Get the resolver in use, if any"""
+    return _active
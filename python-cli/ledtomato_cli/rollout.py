@@ -0,0 +1,264 @@
+"""Config rollouts across a fleet
+
+A policy is a partial ``PomodoroConfig`` (``{"work_time": 50,
+"work_color": "#FF8800"}``): only the fields it names are enforced. A
+rollout first reads every device's config concurrently and diffs it
+against the policy, so compliant devices cost one GET and no write.
+Devices that need changes are then updated in waves: a small canary wave
+first, which halts the rollout on any failure, then waves of a fixed size
+whose devices are written in parallel. After each wave the failure rate
+so far is checked against a threshold, and the rollout stops before the
+next wave once it is crossed, leaving the rest of the fleet untouched.
+
+Each write sends only the policy fields (``patch_config``); the firmware
+keeps the fields it is not sent, so changes made on a device between
+planning and its wave are left alone.
+"""
+
+import asyncio
+import re
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional, Tuple
+
+from .client import LEDTomatoClient, describe_failure
+from .clock import Clock, SystemClock
+from .config import PomodoroConfig
+
+DEFAULT_CANARY = 1
+DEFAULT_WAVE_SIZE = 10
+DEFAULT_MAX_FAILURE_RATE = 0.1
+DEFAULT_CONCURRENCY = 32  # config reads in flight while planning
+
+_HEX_COLOR = re.compile(r'#?[0-9a-fA-F]{6}')
+
+
+def _color(value: str) -> str:
+    """``#RRGGBB`` for any hex color, including the firmware's unpadded lowercase"""
+    return f"#{int(str(value).lstrip('#'), 16):06X}"
+
+
+def _minutes(seconds: Any) -> int:
+    return int(seconds) // 60
+
+
+# Policy field -> (device config key, device value -> policy value)
+_DEVICE_FIELDS = {
+    'work_time': ('workTime', _minutes),
+    'short_break': ('shortBreakTime', _minutes),
+    'long_break': ('longBreakTime', _minutes),
+    'work_color': ('workColor', _color),
+    'break_color': ('breakColor', _color),
+    'brightness': ('brightness', int),
+    'work_animation': ('workAnimation', bool),
+    'break_animation': ('breakAnimation', bool),
+}
+
+
+def parse_policy(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a policy document and normalize its values
+
+    Accepts the fields of ``PomodoroConfig`` at the top level or under a
+    ``pomodoro`` key (so a CLI config file works as a policy). Raises
+    ``ValueError`` on unknown fields and invalid values.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Policy must be a JSON object")
+    if isinstance(data.get('pomodoro'), dict):
+        data = data['pomodoro']
+    unknown = sorted(set(data) - {f.name for f in fields(PomodoroConfig)})
+    if unknown:
+        raise ValueError(f"Unknown policy field(s): {', '.join(unknown)}")
+    if not data:
+        raise ValueError("Policy sets no fields")
+
+    policy: Dict[str, Any] = {}
+    for name, value in data.items():
+        if name in ('work_color', 'break_color'):
+            if not isinstance(value, str) or not _HEX_COLOR.fullmatch(value):
+                raise ValueError(f"{name} must be a hex color such as #FF8800, not {value!r}")
+            policy[name] = _color(value)
+        elif name in ('work_animation', 'break_animation'):
+            if not isinstance(value, bool):
+                raise ValueError(f"{name} must be true or false")
+            policy[name] = value
+        else:
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"{name} must be an integer")
+            if name == 'brightness' and not 0 <= value <= 255:
+                raise ValueError("brightness must be between 0 and 255")
+            if name != 'brightness' and value <= 0:
+                raise ValueError(f"{name} must be positive (minutes)")
+            policy[name] = value
+    return policy
+
+
+def config_diff(config: Dict[str, Any], policy: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    """Policy fields whose value on the device differs: name -> (current, desired)"""
+    changes = {}
+    for name, desired in policy.items():
+        key, convert = _DEVICE_FIELDS[name]
+        try:
+            current = convert(config[key]) if key in config else None
+        except (TypeError, ValueError):
+            current = config.get(key)
+        if current != desired:
+            changes[name] = (current, desired)
+    return changes
+
+
+def policy_fields(policy: Dict[str, Any]) -> Dict[str, Any]:
+    """The policy as device config fields, in device units"""
+    device_fields = {}
+    for name, value in policy.items():
+        key = _DEVICE_FIELDS[name][0]
+        if name in ('work_time', 'short_break', 'long_break'):
+            value = value * 60
+        elif name in ('work_color', 'break_color'):
+            value = value.lstrip('#')
+        device_fields[key] = value
+    return device_fields
+
+
+@dataclass
+class DevicePlan:
+    """What a rollout would change on one device"""
+    device: str
+    changes: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)
+    config: Optional[Dict[str, Any]] = None  # as read, None if unreachable
+    error: Optional[str] = None
+
+
+@dataclass
+class RolloutPlan:
+    """Per-device diffs against a policy"""
+    policy: Dict[str, Any]
+    devices: List[DevicePlan]
+
+    @property
+    def pending(self) -> List[DevicePlan]:
+        return [plan for plan in self.devices if plan.config is not None and plan.changes]
+
+    @property
+    def compliant(self) -> List[DevicePlan]:
+        return [plan for plan in self.devices if plan.config is not None and not plan.changes]
+
+    @property
+    def unreachable(self) -> List[DevicePlan]:
+        return [plan for plan in self.devices if plan.config is None]
+
+
+@dataclass
+class WaveResult:
+    """Outcome of one wave of writes"""
+    name: str  # "canary" or "wave N"
+    devices: List[str]
+    failed: Dict[str, str]  # device -> why
+    started: float  # seconds since the rollout began
+    duration: float  # seconds
+
+    @property
+    def succeeded(self) -> List[str]:
+        return [device for device in self.devices if device not in self.failed]
+
+
+@dataclass
+class RolloutReport:
+    """What a rollout did"""
+    plan: RolloutPlan
+    waves: List[WaveResult] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)  # pending devices not attempted after a halt
+    halted: Optional[str] = None  # why the rollout stopped early
+    duration: float = 0.0  # seconds, planning excluded
+
+    @property
+    def updated(self) -> List[str]:
+        return [device for wave in self.waves for device in wave.succeeded]
+
+    @property
+    def failed(self) -> Dict[str, str]:
+        return {device: error for wave in self.waves for device, error in wave.failed.items()}
+
+
+def plan_waves(devices: List[str], canary: int = DEFAULT_CANARY,
+               wave_size: int = DEFAULT_WAVE_SIZE) -> List[Tuple[str, List[str]]]:
+    """Split devices into a canary wave (if ``canary`` > 0) and waves of ``wave_size``"""
+    waves = []
+    if canary > 0 and devices:
+        waves.append(('canary', devices[:canary]))
+        devices = devices[canary:]
+    for number, index in enumerate(range(0, len(devices), wave_size), start=1):
+        waves.append((f"wave {number}", devices[index:index + wave_size]))
+    return waves
+
+
+async def plan_rollout(clients: Dict[str, LEDTomatoClient], policy: Dict[str, Any],
+                       concurrency: int = DEFAULT_CONCURRENCY) -> RolloutPlan:
+    """Read every device's config concurrently and diff it against the policy
+
+    Args:
+        clients: Clients keyed by device address
+        policy: Output of ``parse_policy``
+        concurrency: Config reads in flight at once
+    """
+    limit = asyncio.Semaphore(concurrency)
+
+    async def read(device: str, client: LEDTomatoClient) -> DevicePlan:
+        async with limit:
+            config = await client.get_config()
+        if config is None:
+            return DevicePlan(device, error=describe_failure(device, client.last_error, client.last_status))
+        return DevicePlan(device, config_diff(config, policy), config)
+
+    plans = await asyncio.gather(*(read(device, client) for device, client in clients.items()))
+    return RolloutPlan(policy, list(plans))
+
+
+async def run_rollout(clients: Dict[str, LEDTomatoClient], plan: RolloutPlan, canary: int = DEFAULT_CANARY,
+                      wave_size: int = DEFAULT_WAVE_SIZE, max_failure_rate: float = DEFAULT_MAX_FAILURE_RATE,
+                      clock: Optional[Clock] = None) -> RolloutReport:
+    """Write the policy to every device that needs it, wave by wave
+
+    Args:
+        clients: Clients keyed by device address
+        plan: Output of ``plan_rollout``; only its pending devices are written
+        canary: Devices in the first wave, which halts the rollout on any failure (0: none)
+        wave_size: Devices written in parallel per wave after the canary
+        max_failure_rate: Failed fraction of the writes so far above which the rollout halts
+        clock: Time source for the report (default: real time)
+    """
+    clock = clock or SystemClock()
+    report = RolloutReport(plan)
+    pending = {device_plan.device: device_plan for device_plan in plan.pending}
+    began = clock.time()
+
+    patch = policy_fields(plan.policy)
+
+    async def write(device: str) -> Optional[str]:
+        client = clients[device]
+        if await client.patch_config(patch):
+            return None
+        return describe_failure(device, client.last_error, client.last_status)
+
+    waves = plan_waves(list(pending), canary, wave_size)
+    for index, (name, devices) in enumerate(waves):
+        started = clock.time()
+        errors = await asyncio.gather(*(write(device) for device in devices))
+        report.waves.append(WaveResult(name, devices, {device: error for device, error in zip(devices, errors)
+                                                       if error is not None},
+                                       started - began, clock.time() - started))
+
+        if index + 1 == len(waves):
+            break
+        attempted = sum(len(wave.devices) for wave in report.waves)
+        failures = len(report.failed)
+        if name == 'canary' and failures:
+            report.halted = f"canary failed on {failures} of {len(devices)} device(s)"
+        elif failures / attempted > max_failure_rate:
+            report.halted = (f"failure rate {failures}/{attempted} ({failures / attempted:.0%}) "
+                             f"above {max_failure_rate:.0%}")
+        if report.halted:
+            report.skipped = [device for _, rest in waves[index + 1:] for device in rest]
+            break
+
+    report.duration = clock.time() - began
+    return report
@@ -0,0 +1,86 @@
+"""Device-side Pomodoro cycle schedules
+
+A ``CyclePlan`` describes a whole cycle (session sequence, durations and
+colors) in one compact document. It is uploaded once to
+``/api/pomodoro/schedule`` and the device advances sessions by itself, so
+the client sends no requests per transition.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .config import PomodoroConfig
+
+SESSION_CODES = {'work': 'W', 'short': 'S', 'long': 'L'}
+CODE_SESSIONS = {code: session for session, code in SESSION_CODES.items()}
+MAX_SEQUENCE_LENGTH = 64  # firmware limit
+
+
+@dataclass
+class CyclePlan:
+    """Compiled cycle schedule"""
+    sequence: str  # 'W' work, 'S' short break, 'L' long break
+    repeat: int = 0  # passes over the sequence, 0 = until stopped
+    work_time: int = 1500  # seconds
+    short_break: int = 300  # seconds
+    long_break: int = 900  # seconds
+    work_color: str = "FF0000"
+    break_color: str = "00FF00"
+    work_animation: bool = True
+    break_animation: bool = True
+
+    @classmethod
+    def compile(cls, long_break_every: int = 3, repeat: int = 0,
+                durations: Optional[Dict[str, int]] = None,
+                pomodoro: Optional[PomodoroConfig] = None) -> 'CyclePlan':
+        """Compile a work/break cycle with a long break every N work sessions
+
+        Args:
+            long_break_every: Work sessions per long break
+            repeat: Passes over the sequence, 0 = until stopped
+            durations: Session lengths in seconds keyed by 'work', 'short', 'long'
+            pomodoro: Local config supplying colors and fallback durations
+        """
+        if long_break_every < 1:
+            raise ValueError("long_break_every must be at least 1")
+        sequence = "WS" * (long_break_every - 1) + "WL"
+        if len(sequence) > MAX_SEQUENCE_LENGTH:
+            raise ValueError(f"Sequence longer than {MAX_SEQUENCE_LENGTH} sessions")
+
+        pomodoro = pomodoro or PomodoroConfig()
+        durations = durations or {}
+        return cls(
+            sequence=sequence,
+            repeat=repeat,
+            work_time=durations.get('work', pomodoro.work_time * 60),
+            short_break=durations.get('short', pomodoro.short_break * 60),
+            long_break=durations.get('long', pomodoro.long_break * 60),
+            work_color=pomodoro.work_color.lstrip('#').upper(),
+            break_color=pomodoro.break_color.lstrip('#').upper(),
+        )
+
+    def session_at(self, index: int) -> str:
+        """Get the session type ('work', 'short', 'long') at a sequence position"""
+        return CODE_SESSIONS[self.sequence[index % len(self.sequence)]]
+
+    def duration_of(self, session_type: str) -> int:
+        """Get the length of a session type in seconds"""
+        return {
+            'work': self.work_time,
+            'short': self.short_break,
+            'long': self.long_break,
+        }[session_type]
+
+    def to_form(self) -> Dict[str, str]:
+        """Encode the plan as form fields for the firmware"""
+        return {
+            'sequence': self.sequence,
+            'repeat': str(self.repeat),
+            'workTime': str(self.work_time),
+            'shortBreakTime': str(self.short_break),
+            'longBreakTime': str(self.long_break),
+            'workColor': self.work_color,
+            'breakColor': self.break_color,
+            'workAnimation': str(self.work_animation).lower(),
+            'breakAnimation': str(self.break_animation).lower(),
+        }
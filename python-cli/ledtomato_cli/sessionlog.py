@@ -0,0 +1,409 @@
+"""Segmented session log storage for LED Tomato CLI
+
+Sessions are stored as JSON lines in monthly segments (``2026-10.jsonl``).
+Once a month is over its segment is closed and compressed with zstd (when
+the ``zstandard`` package is installed) or gzip. A small ``index.json`` keeps
+per-segment summaries and sparse ``(timestamp, offset)`` points so queries
+only open the segments that overlap the requested time range and can seek
+close to the first matching entry. A pre-segmentation ``sessions.log`` is
+merged into the segments the first time the log is used.
+"""
+
+import ast
+import gzip
+import heapq
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+INDEX_FILE = "index.json"
+INDEX_VERSION = 2
+INDEX_STRIDE = 64  # entries between sparse index points
+SEGMENT_SUFFIX = ".jsonl"
+COMPRESSED_SUFFIXES = (".jsonl.zst", ".jsonl.gz")
+
+
+def _segment_key(timestamp: datetime) -> str:
+    """Get the monthly segment key for a timestamp"""
+    return timestamp.strftime("%Y-%m")
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse an ISO timestamp from a log entry"""
+    return datetime.fromisoformat(value)
+
+
+def _empty_summary(file_name: str) -> Dict[str, Any]:
+    """Create an empty segment summary"""
+    return {
+        'file': file_name,
+        'size': 0,  # bytes on disk, to notice segments changed behind the index
+        'first': None,
+        'last': None,
+        'count': 0,
+        'work': 0,
+        'break': 0,
+        'minutes': 0,
+        'sparse': [],
+    }
+
+
+def _open_segment(path: Path, offset: int = 0) -> IO[str]:
+    """Open a segment for streaming reads starting at an uncompressed offset"""
+    if path.name.endswith(".zst"):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError(f"zstandard is required to read {path.name}")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        # zstd streams only seek forward by reading, so skip in chunks
+        remaining = offset
+        while remaining > 0:
+            chunk = stream.read(min(remaining, 1 << 16))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+    elif path.name.endswith(".gz"):
+        stream = gzip.open(path, 'rb')
+        stream.seek(offset)
+    else:
+        stream = open(path, 'rb')
+        stream.seek(offset)
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+
+class SessionLog:
+    """Monthly segmented, indexed session log"""
+
+    def __init__(self, log_dir: Path, legacy_file: Optional[Path] = None):
+        """Initialize session log
+
+        Args:
+            log_dir: Directory holding segments and the index
+            legacy_file: Pre-segmentation ``sessions.log`` to migrate on first use
+        """
+        self.log_dir = Path(log_dir)
+        self.legacy_file = legacy_file
+        self.index_file = self.log_dir / INDEX_FILE
+        self._index: Optional[Dict[str, Any]] = None
+
+    # Index handling
+
+    def _load_index(self) -> Dict[str, Any]:
+        """Load the segment index, rebuilding it if missing or stale
+
+        The index is stale when the segment files on disk no longer match
+        its summaries: a segment added, removed, swapped for its compressed
+        form or resized by another writer.
+        """
+        if self._index is not None:
+            return self._index
+
+        migrated = self._migrate_legacy()
+        index = None
+        if not migrated and self.index_file.exists():
+            try:
+                with open(self.index_file, 'r') as f:
+                    index = json.load(f)
+                if index.get('version') != INDEX_VERSION or self._is_stale(index):
+                    index = None
+            except Exception:
+                index = None
+
+        if index is None:
+            index = self._build_index()
+            if index['segments']:
+                self._write_index(index)
+
+        self._index = index
+        return index
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        """Atomically write the segment index"""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_file, self.index_file)
+
+    def _is_stale(self, index: Dict[str, Any]) -> bool:
+        """Check the index summaries against the segment files on disk"""
+        files = self._segment_files()
+        if set(files) != set(index['segments']):
+            return True
+        for key, path in files.items():
+            summary = index['segments'][key]
+            if summary['file'] != path.name or summary['size'] != path.stat().st_size:
+                return True
+        return False
+
+    def _segment_files(self) -> Dict[str, Path]:
+        """Map segment keys to their files on disk"""
+        files: Dict[str, Path] = {}
+        if not self.log_dir.exists():
+            return files
+        for path in self.log_dir.iterdir():
+            name = path.name
+            for suffix in COMPRESSED_SUFFIXES + (SEGMENT_SUFFIX,):
+                if name.endswith(suffix):
+                    key = name[:-len(suffix)]
+                    # Prefer an uncompressed segment if both exist mid-compaction
+                    if key not in files or suffix == SEGMENT_SUFFIX:
+                        files[key] = path
+                    break
+        return files
+
+    def _build_index(self) -> Dict[str, Any]:
+        """Rebuild the index by scanning every segment"""
+        segments = {}
+        for key, path in sorted(self._segment_files().items()):
+            segments[key] = self._scan_segment(path)
+        return {'version': INDEX_VERSION, 'segments': segments}
+
+    def _scan_segment(self, path: Path) -> Dict[str, Any]:
+        """Compute the summary and sparse points for a segment"""
+        summary = _empty_summary(path.name)
+        offset = 0
+        with _open_segment(path) as f:
+            for line in f:
+                line_offset = offset
+                offset += len(line.encode('utf-8'))
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._add_to_summary(summary, entry, line_offset)
+        summary['size'] = path.stat().st_size
+        return summary
+
+    def _add_to_summary(self, summary: Dict[str, Any], entry: Dict[str, Any], offset: int) -> None:
+        """Account for one entry in a segment summary"""
+        timestamp = entry['timestamp']
+        if summary['count'] % INDEX_STRIDE == 0:
+            summary['sparse'].append([timestamp, offset])
+        if summary['first'] is None:
+            summary['first'] = timestamp
+        summary['last'] = timestamp
+        summary['count'] += 1
+        summary['minutes'] += entry.get('duration_minutes', 0)
+        if entry.get('type') == 'work':
+            summary['work'] += 1
+        else:
+            summary['break'] += 1
+
+    # Writing
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Append an entry to the segment for its month"""
+        timestamp = _parse_timestamp(entry['timestamp'])
+        key = _segment_key(timestamp)
+        index = self._load_index()
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        segment_file = self.log_dir / f"{key}{SEGMENT_SUFFIX}"
+        summary = index['segments'].get(key)
+        if summary is None or summary['file'] != segment_file.name:
+            if summary is not None:
+                # Writing into a month that was already closed: reopen it
+                self._decompress_segment(key, summary)
+            summary = index['segments'].setdefault(key, _empty_summary(segment_file.name))
+
+        line = json.dumps(entry, separators=(',', ':')) + "\n"
+        with open(segment_file, 'ab') as f:
+            offset = f.tell()
+            f.write(line.encode('utf-8'))
+            summary['size'] = f.tell()
+
+        self._add_to_summary(summary, entry, offset)
+        self._rotate(index, current_key=key)
+        self._write_index(index)
+
+    def _rotate(self, index: Dict[str, Any], current_key: str) -> int:
+        """Compress every uncompressed segment older than the current month"""
+        closed = 0
+        for key, summary in sorted(index['segments'].items()):
+            if key < current_key and summary['file'].endswith(SEGMENT_SUFFIX):
+                self._compress_segment(key, summary)
+                closed += 1
+        return closed
+
+    def _compress_segment(self, key: str, summary: Dict[str, Any]) -> None:
+        """Compress a closed segment in place"""
+        source = self.log_dir / summary['file']
+        if ZSTD_AVAILABLE:
+            target = self.log_dir / f"{key}.jsonl.zst"
+            with open(source, 'rb') as src, open(target, 'wb') as dst:
+                zstandard.ZstdCompressor(level=10).copy_stream(src, dst)
+        else:
+            target = self.log_dir / f"{key}.jsonl.gz"
+            with open(source, 'rb') as src, gzip.open(target, 'wb', compresslevel=9) as dst:
+                while True:
+                    chunk = src.read(1 << 16)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+        summary['file'] = target.name
+        summary['size'] = target.stat().st_size
+        source.unlink()
+
+    def _decompress_segment(self, key: str, summary: Dict[str, Any]) -> None:
+        """Turn a compressed segment back into an appendable one"""
+        source = self.log_dir / summary['file']
+        target = self.log_dir / f"{key}{SEGMENT_SUFFIX}"
+        with _open_segment(source) as src, open(target, 'w', encoding='utf-8') as dst:
+            for line in src:
+                dst.write(line)
+        summary['file'] = target.name
+        summary['size'] = target.stat().st_size
+        source.unlink()
+
+    # Reading
+
+    def iter_entries(self, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Stream entries in ``[since, until]`` without loading segments into memory"""
+        index = self._load_index()
+        for key in sorted(index['segments']):
+            summary = index['segments'][key]
+            if summary['count'] == 0:
+                continue
+            if since is not None and _parse_timestamp(summary['last']) < since:
+                continue
+            if until is not None and _parse_timestamp(summary['first']) > until:
+                break
+
+            # Jump to the last sparse point at or before `since`
+            start_offset = 0
+            if since is not None:
+                for point_ts, point_offset in summary['sparse']:
+                    if _parse_timestamp(point_ts) > since:
+                        break
+                    start_offset = point_offset
+
+            path = self.log_dir / summary['file']
+            with _open_segment(path, start_offset) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        timestamp = _parse_timestamp(entry['timestamp'])
+                    except (ValueError, KeyError):
+                        continue  # Skip malformed entries
+                    if since is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp > until:
+                        return
+                    yield entry
+
+    def stats(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Compute session statistics
+
+        Totals come from the index summaries; only segments overlapping the
+        current week are opened.
+        """
+        index = self._load_index()
+        stats = {
+            'total_sessions': 0,
+            'work_sessions': 0,
+            'break_sessions': 0,
+            'total_time_minutes': 0,
+            'today_sessions': 0,
+            'this_week_sessions': 0
+        }
+
+        for summary in index['segments'].values():
+            stats['total_sessions'] += summary['count']
+            stats['work_sessions'] += summary['work']
+            stats['break_sessions'] += summary['break']
+            stats['total_time_minutes'] += summary['minutes']
+
+        now = now or datetime.now()
+        today = now.date()
+        week_start = datetime.combine(today - timedelta(days=today.weekday()), datetime.min.time())
+
+        for entry in self.iter_entries(since=week_start):
+            stats['this_week_sessions'] += 1
+            if _parse_timestamp(entry['timestamp']).date() == today:
+                stats['today_sessions'] += 1
+
+        return stats
+
+    # Maintenance
+
+    def compact(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Migrate the legacy log, compress closed segments and rebuild the index"""
+        result = {'migrated': self._migrate_legacy(), 'compressed': 0, 'segments': 0}
+
+        self._index = None
+        index = self._build_index()
+        result['compressed'] = self._rotate(index, current_key=_segment_key(now or datetime.now()))
+        result['segments'] = len(index['segments'])
+        if index['segments']:
+            self._write_index(index)
+        self._index = index
+        return result
+
+    def _migrate_legacy(self) -> int:
+        """Merge entries from the pre-segmentation ``sessions.log`` into segments
+
+        Each affected month is rewritten with the legacy entries merged in
+        timestamp order, so segments stay sorted for ``iter_entries``.
+        """
+        if not self.legacy_file or not self.legacy_file.exists():
+            return 0
+
+        entries: List[Dict[str, Any]] = []
+        with open(self.legacy_file, 'r') as f:
+            for line in f:
+                try:
+                    entry = ast.literal_eval(line.strip())
+                    _parse_timestamp(entry['timestamp'])
+                    entries.append(entry)
+                except Exception:
+                    continue  # Skip malformed entries
+
+        entries.sort(key=lambda entry: _parse_timestamp(entry['timestamp']))
+        months: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            months.setdefault(_segment_key(_parse_timestamp(entry['timestamp'])), []).append(entry)
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        existing_files = self._segment_files()
+        for key, month_entries in months.items():
+            existing = existing_files.get(key)
+            target = self.log_dir / f"{key}{SEGMENT_SUFFIX}"
+            tmp_file = self.log_dir / f"{key}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as dst:
+                current: List[Dict[str, Any]] = []
+                if existing is not None:
+                    with _open_segment(existing) as src:
+                        current = list(self._read_entries(src))
+                merged = heapq.merge(month_entries, current,
+                                     key=lambda entry: _parse_timestamp(entry['timestamp']))
+                for entry in merged:
+                    dst.write(json.dumps(entry, separators=(',', ':')) + "\n")
+            os.replace(tmp_file, target)
+            if existing is not None and existing != target:
+                existing.unlink()
+
+        self._index = None
+        self.legacy_file.rename(self.legacy_file.with_suffix('.log.migrated'))
+        return len(entries)
+
+    @staticmethod
+    def _read_entries(f: IO[str]) -> Iterator[Dict[str, Any]]:
+        """Parse the well-formed entries of a segment"""
+        for line in f:
+            try:
+                entry = json.loads(line)
+                _parse_timestamp(entry['timestamp'])
+            except (ValueError, KeyError):
+                continue
+            yield entry
@@ -0,0 +1,150 @@
+"""Synchronized starts across many devices
+
+Starting a floor of devices with one ``start_timer`` call each leaves them
+seconds apart. Instead, each device's clock offset is estimated NTP-style:
+``/api/status`` reports ``uptime`` (the device's ``millis()``), and a probe
+that took ``rtt`` ms pins the device reading to the midpoint of the round
+trip within ``rtt / 2``. Of several probes the one with the smallest RTT is
+kept, since queueing only ever adds delay. Every device is then asked to
+start at the same local instant, translated into its own ``uptime`` through
+``start_at``, and probed again afterwards to measure the skew achieved.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .client import LEDTomatoClient
+from .clock import Clock, SystemClock
+
+U32 = 0xFFFFFFFF
+
+DEFAULT_PROBES = 8
+DEFAULT_LEAD = 1.0  # seconds between scheduling and the shared start
+
+
+def _wrap_diff(later: float, earlier: float) -> float:
+    """Difference of two 32-bit millisecond counters, allowing for wrap-around"""
+    diff = (later - earlier) % (U32 + 1)
+    return diff - (U32 + 1) if diff >= 0x80000000 else diff
+
+
+@dataclass
+class OffsetEstimate:
+    """Device clock relative to the local clock"""
+    offset_ms: float  # device uptime minus local clock (ms) at the same instant
+    rtt_ms: float  # round trip of the sample used; the offset is good to rtt / 2
+    samples: int
+    status: Dict[str, Any]  # /api/status of the sample used
+
+    def to_device(self, local_ms: float) -> int:
+        """Translate a local clock reading to device uptime"""
+        return int(round(local_ms + self.offset_ms)) & U32
+
+
+@dataclass
+class SyncResult:
+    """Outcome of a synchronized start on one device"""
+    device: str
+    offset_ms: Optional[float] = None
+    rtt_ms: Optional[float] = None
+    start_at: Optional[int] = None
+    skew_ms: Optional[float] = None  # measured start minus the shared instant
+    error: Optional[str] = None
+
+    @property
+    def synchronized(self) -> bool:
+        return self.error is None and self.start_at is not None
+
+
+async def estimate_offset(client: LEDTomatoClient, probes: int = DEFAULT_PROBES,
+                          clock: Optional[Clock] = None) -> Optional[OffsetEstimate]:
+    """Estimate a device's clock offset from repeated status probes
+
+    Args:
+        client: Device to probe
+        probes: Number of status requests; the lowest-RTT one is used
+        clock: Local time source (default: real time)
+
+    Returns None if the device is unreachable or does not report ``uptime``.
+    """
+    clock = clock or SystemClock()
+    best = None
+    samples = 0
+    for _ in range(probes):
+        sent = clock.time() * 1000.0
+        status = await client.get_status()
+        received = clock.time() * 1000.0
+        if not status:
+            continue
+        if 'uptime' not in status:
+            return None  # firmware without a device clock
+        samples += 1
+        rtt = received - sent
+        if best is None or rtt < best.rtt_ms:
+            offset = status['uptime'] - (sent + received) / 2.0
+            best = OffsetEstimate(offset, rtt, 0, status)
+    if best is not None:
+        best.samples = samples
+    return best
+
+
+async def synchronized_start(clients: Dict[str, LEDTomatoClient], timer_type: str,
+                             lead: float = DEFAULT_LEAD, probes: int = DEFAULT_PROBES,
+                             clock: Optional[Clock] = None) -> List[SyncResult]:
+    """Start a timer on many devices at one shared instant
+
+    Args:
+        clients: Clients keyed by device address
+        timer_type: 'work', 'short_break', or 'long_break'
+        lead: Seconds from scheduling to the start; must cover the slowest request
+        probes: Status probes per device for the offset estimate
+        clock: Local time source (default: real time)
+
+    Returns one result per device, in the order given. Devices whose
+    firmware has no ``uptime`` are reported with an error and not started.
+    """
+    clock = clock or SystemClock()
+    devices = list(clients)
+    estimates = await asyncio.gather(*(estimate_offset(clients[device], probes, clock) for device in devices))
+
+    results = {device: SyncResult(device) for device in devices}
+    synced = {}
+    for device, estimate in zip(devices, estimates):
+        if estimate is None:
+            results[device].error = "no clock offset (unreachable or firmware without uptime)"
+            continue
+        results[device].offset_ms = estimate.offset_ms
+        results[device].rtt_ms = estimate.rtt_ms
+        synced[device] = estimate
+    if not synced:
+        return list(results.values())
+
+    # The slowest device must still hear about the start before it happens
+    lead_ms = max(lead * 1000.0, 2 * max(estimate.rtt_ms for estimate in synced.values()))
+    target = clock.time() * 1000.0 + lead_ms
+    for device, estimate in synced.items():
+        results[device].start_at = estimate.to_device(target)
+
+    started = await asyncio.gather(*(
+        clients[device].start_timer(timer_type, start_at=results[device].start_at) for device in synced
+    ))
+    for device, ok in zip(synced, started):
+        if not ok:
+            results[device].error = "start_at rejected or not supported"
+            results[device].start_at = None
+
+    # Measure what happened: re-estimate offsets once everyone should have started
+    await clock.sleep(max(0.0, target / 1000.0 - clock.time()))
+    armed = [device for device in synced if results[device].start_at is not None]
+    after = await asyncio.gather(*(estimate_offset(clients[device], min(probes, 4), clock) for device in armed))
+    for device, estimate in zip(armed, after):
+        started_at = estimate.status.get('pomodoro', {}).get('startedAt') if estimate else None
+        if started_at is None:
+            continue
+        # When it started on the device clock, mapped back to local time with the fresh offset
+        late = _wrap_diff(started_at, results[device].start_at)
+        drift = _wrap_diff(estimate.offset_ms, synced[device].offset_ms)
+        results[device].skew_ms = late - drift
+
+    return list(results.values())
@@ -4,7 +4,7 @@ import asyncio
 import time
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, Any, Optional
 
 # Platform-specific imports
@@ -19,25 +19,38 @@ else:
     except ImportError:
         pass  # Might be running on a non-Unix-like platform without these modules
 
+from . import events
+from .audio import AudioPlayer
 from .client import LEDTomatoClient
+from .clock import Clock
 from .display import Display
 from .config import Config
-try:
-    from playsound import playsound
-    SOUND_AVAILABLE = True
-except ImportError:
-    SOUND_AVAILABLE = False
+from .schedule import CyclePlan
+
+# Consecutive failed status polls before a monitor gives up on the device
+MISSED_POLLS = 3
+
+# Session names used here -> as shown to the user
+SESSION_NAMES = {'work': "Work", 'short': "Short Break", 'long': "Long Break"}
+
+# Session names used here -> the API's, as reported in events
+EVENT_SESSIONS = {'short': 'short_break', 'long': 'long_break',
+                  'short break': 'short_break', 'long break': 'long_break'}
 
 
 class TimerManager:
     """Manages timer operations and monitoring"""
     
-    def __init__(self, client: LEDTomatoClient, display: Display, config: Config):
+    def __init__(self, client: LEDTomatoClient, display: Display, config: Config,
+                 clock: Optional[Clock] = None):
         self.client = client
         self.display = display
         self.config = config
+        # Share the display's clock unless told otherwise
+        self.clock = clock or display.clock
         self.running = False
         self.last_state = None
+        self.audio = AudioPlayer(config.sound, log=display.print_verbose)
     
     def _kbhit(self) -> bool:
         """Platform-agnostic way to check for a keypress"""
@@ -160,6 +173,7 @@ class TimerManager:
         if success:
             timer_name = timer_type.replace('_', ' ').title()
             self.display.show_success(f"Started {timer_name} session")
+            self._emit(events.SESSION_STARTED, api_type)
             
             # Play start sound
             self._play_sound('start', timer_type)
@@ -174,6 +188,7 @@ class TimerManager:
         """Interactive timer stop with breathing yellow animation"""
         success = await self.client.stop_timer()
         if success:
+            self._emit(events.SESSION_STOPPED)
             # Set breathing yellow animation for stopped state
             await self._set_breathing_yellow()
             self.display.show_success("Timer stopped (breathing yellow)")
@@ -245,9 +260,10 @@ class TimerManager:
                         return
                 
                 # Get the current status
-                status = await self.client.get_status()
+                status = await self._poll_status()
                 if not status:
                     self.display.show_error("Lost connection to device")
+                    self._emit(events.DEVICE_OFFLINE)
                     break
                 
                 pomodoro = status.get('pomodoro', {})
@@ -273,10 +289,11 @@ class TimerManager:
                     
                     self.display.show_session_complete(session_type, duration)
                     self._play_sound('end', session_type)
+                    self._emit(events.SESSION_COMPLETED, session_type, duration_minutes=duration)
                     break
                 
                 # Short sleep to avoid high CPU usage
-                await asyncio.sleep(self.config.display.refresh_interval)
+                await self.clock.sleep(self.config.display.refresh_interval)
                 
         except Exception as e:
             self.display.show_error(f"Monitoring error: {e}")
@@ -304,6 +321,8 @@ class TimerManager:
         state_name = state_names.get(new_state, "unknown")
         
         self.display.show_info(f"Timer state changed to: {state_name}")
+        if new_state in events.SESSIONS:
+            self._emit(events.SESSION_STARTED, events.SESSIONS[new_state])
         
         # Play transition sound
         if new_state == 1:  # Work started
@@ -311,11 +330,15 @@ class TimerManager:
         elif new_state in [2, 3]:  # Break started
             self._play_sound('start', 'break')
     
+    def _emit(self, event_type: str, session: Optional[str] = None, **data: Any) -> None:
+        """Publish a lifecycle event; returns at once however slow its receivers are"""
+        if session is not None:
+            data['session'] = EVENT_SESSIONS.get(session, session)
+        device = self.client.host if self.client.port == 80 else f"{self.client.host}:{self.client.port}"
+        events.emit(event_type, device, **data)
+    
     def _play_sound(self, sound_type: str, session_type: str) -> None:
-        """Play notification sound"""
-        if not self.config.sound.enabled or not SOUND_AVAILABLE:
-            return
-        
+        """Queue a notification sound without blocking the event loop"""
         sound_file = None
         
         if sound_type == 'start':
@@ -326,87 +349,55 @@ class TimerManager:
         elif sound_type == 'end':
             sound_file = self.config.sound.session_end_sound
         
-        if sound_file and sound_file.exists():
-            try:
-                playsound(str(sound_file))
-            except Exception as e:
-                self.display.print_verbose(f"Could not play sound: {e}")
+        self.audio.play(sound_file)
     
     def log_session(self, session_type: str, duration: int, completed: bool) -> None:
         """Log completed session"""
-        log_file = self.config.get_session_log_file()
-        
         try:
-            timestamp = datetime.now().isoformat()
             log_entry = {
-                'timestamp': timestamp,
+                'timestamp': self.clock.now().isoformat(),
                 'type': session_type,
                 'duration_minutes': duration,
                 'completed': completed
             }
-            
-            # Append to log file
-            with open(log_file, 'a') as f:
-                f.write(f"{log_entry}\n")                
+            self.config.get_session_log().append(log_entry)
         except Exception as e:
             self.display.print_verbose(f"Could not log session: {e}")
     
     async def get_session_stats(self) -> Dict[str, Any]:
         """Get session statistics"""
-        log_file = self.config.get_session_log_file()
-        stats = {
-            'total_sessions': 0,
-            'work_sessions': 0,
-            'break_sessions': 0,
-            'total_time_minutes': 0,
-            'today_sessions': 0,
-            'this_week_sessions': 0
-        }
-        
-        if not log_file.exists():
-            return stats
-        
         try:
-            today = datetime.now().date()
-            week_start = today - timedelta(days=today.weekday())
-            
-            with open(log_file, 'r') as f:
-                for line in f:
-                    try:
-                        entry = eval(line.strip())  # Simple eval for dict parsing
-                        session_date = datetime.fromisoformat(entry['timestamp']).date()
-                        
-                        stats['total_sessions'] += 1
-                        stats['total_time_minutes'] += entry['duration_minutes']
-                        
-                        if entry['type'] == 'work':
-                            stats['work_sessions'] += 1
-                        else:
-                            stats['break_sessions'] += 1
-                        
-                        if session_date == today:
-                            stats['today_sessions'] += 1
-                        
-                        if session_date >= week_start:
-                            stats['this_week_sessions'] += 1
-                            
-                    except Exception:
-                        continue  # Skip malformed entries
-                        
+            return self.config.get_session_log().stats(self.clock.now())
         except Exception as e:
             self.display.print_verbose(f"Could not read session log: {e}")
-        
-        return stats
+            return {
+                'total_sessions': 0,
+                'work_sessions': 0,
+                'break_sessions': 0,
+                'total_time_minutes': 0,
+                'today_sessions': 0,
+                'this_week_sessions': 0
+            }
     
-    async def start_pomodoro_cycle(self) -> None:
-        """Start a continuous Pomodoro cycle with automatic transitions"""
+    async def start_pomodoro_cycle(self, custom_durations: Optional[Dict[str, int]] = None,
+                                   max_sessions: Optional[int] = None, interactive: bool = True) -> None:
+        """Start a continuous Pomodoro cycle with automatic transitions
+        
+        Args:
+            custom_durations: Minutes keyed by 'work', 'short', 'long'
+            max_sessions: Stop after this many sessions (default: run until stopped)
+            interactive: Prompt for custom durations
+        """
         self.display.show_info("🔄 Setting up continuous Pomodoro cycle")
         
         # Ask user if they want to use custom durations
-        use_custom = self.display.prompt_confirm("Use custom durations for cycle?", False)
+        use_custom = bool(custom_durations)
+        ask_durations = False
+        if interactive and not use_custom:
+            use_custom = ask_durations = self.display.prompt_confirm("Use custom durations for cycle?", False)
+            custom_durations = {}
         
-        custom_durations = {}
-        if use_custom:
+        if ask_durations:
             try:
                 # Format prompt with table
                 self.display.console.print("[cyan]Please enter custom durations in minutes:[/cyan]")
@@ -446,23 +437,12 @@ class TimerManager:
                     'long': long_break_duration
                 }
                 
-                # Update device configuration with custom durations
-                config = await self.client.get_config()
-                if config:
-                    config['workTime'] = custom_durations['work'] * 60
-                    config['shortBreakTime'] = custom_durations['short'] * 60
-                    config['longBreakTime'] = custom_durations['long'] * 60
-                    await self.client.update_config(config)
-                    
-                    # Create a visual confirmation
-                    self.display.console.print("\n[bold green]✅ Custom Pomodoro durations set:[/bold green]")
-                    self.display.console.print(f"  🔴 Work: [bold]{work_duration}[/bold] minutes")
-                    self.display.console.print(f"  🟢 Short Break: [bold]{short_break_duration}[/bold] minutes")
-                    self.display.console.print(f"  🟢 Long Break: [bold]{long_break_duration}[/bold] minutes")
-                    self.display.console.print()
-                else:
-                    self.display.show_error("Failed to get configuration")
-                    return
+                # Create a visual confirmation
+                self.display.console.print("\n[bold green]✅ Custom Pomodoro durations set:[/bold green]")
+                self.display.console.print(f"  🔴 Work: [bold]{work_duration}[/bold] minutes")
+                self.display.console.print(f"  🟢 Short Break: [bold]{short_break_duration}[/bold] minutes")
+                self.display.console.print(f"  🟢 Long Break: [bold]{long_break_duration}[/bold] minutes")
+                self.display.console.print()
             except KeyboardInterrupt:
                 self.display.show_warning("Custom duration setup cancelled")
                 return
@@ -475,15 +455,27 @@ class TimerManager:
         self.display.console.print("[dim]A long break will be taken after every 3 work sessions[/dim]")
         self.display.console.print("[dim]Press 'q' during any session to stop the cycle and return to menu[/dim]\n")
         
-        work_sessions = 0
         try:
-            while True:
+            # Upload the whole cycle so the device advances sessions by itself
+            plan = await self._compile_cycle_plan(custom_durations if use_custom else None, max_sessions)
+            if await self.client.start_schedule(plan.to_form()):
+                await self._observe_schedule(plan, max_sessions)
+                return
+            
+            # Older firmware without schedule support: drive transitions from here
+            self.display.print_verbose("Device does not support schedules, driving the cycle from the client")
+            work_sessions = 0
+            sessions = 0
+            while max_sessions is None or sessions < max_sessions:
                 # Start work session
                 await self._start_and_monitor('work', custom_durations if use_custom else None)
                 work_sessions += 1
+                sessions += 1
                 
                 # After work session, show progress
                 self.display.console.print(f"[bold]Completed {work_sessions} work sessions[/bold]")
+                if max_sessions is not None and sessions >= max_sessions:
+                    break
                 
                 # After 3 work sessions, take a long break
                 if work_sessions % 3 == 0:
@@ -492,18 +484,112 @@ class TimerManager:
                 else:
                     self.display.console.print("[cyan]Taking a short break...[/cyan]")
                     await self._start_and_monitor('short', custom_durations if use_custom else None)
+                sessions += 1
         except KeyboardInterrupt as e:
             # Check if this is our custom interruption from pressing 'q'
             if str(e) == "User requested to stop cycle with 'q' key":
-                # Already handled in _start_and_monitor
+                # Already handled in _start_and_monitor / _observe_schedule
                 pass
             else:
                 # This is an actual Ctrl+C
                 self.display.console.print("\n[yellow]Stopped Pomodoro cycle with Ctrl+C[/yellow]")
                 await self.client.stop_timer()
+                self._emit(events.SESSION_STOPPED)
                 # Set breathing yellow for stopped state
                 await self._set_breathing_yellow()
 
+    async def _compile_cycle_plan(self, custom_durations: Optional[dict] = None,
+                                  max_sessions: Optional[int] = None) -> CyclePlan:
+        """Compile the cycle schedule from custom or device durations"""
+        durations = {}
+        if custom_durations:
+            durations = {session: minutes * 60 for session, minutes in custom_durations.items()}
+        else:
+            device_config = await self.client.get_config()
+            if device_config:
+                durations = {
+                    'work': device_config.get('workTime', 1500),
+                    'short': device_config.get('shortBreakTime', 300),
+                    'long': device_config.get('longBreakTime', 900),
+                }
+        plan = CyclePlan.compile(long_break_every=3, durations=durations, pomodoro=self.config.pomodoro)
+        if max_sessions:
+            # Let the device end the schedule itself after enough passes
+            plan.repeat = -(-max_sessions // len(plan.sequence))
+        return plan
+
+    async def _observe_schedule(self, plan: CyclePlan, max_sessions: Optional[int] = None) -> None:
+        """Follow a device-side schedule; transitions need no requests from here"""
+        session_type = None
+        session_name = None
+        last_session = None
+        work_sessions = 0
+        while True:
+            # Check for 'q' keypress to exit monitoring (non-blocking)
+            if self._kbhit():
+                key = self._getch()
+                if key == 'q':
+                    self.display.console.print("\n[yellow]Session stopped early[/yellow]")
+                    # Stopping the timer also ends the schedule on the device
+                    await self.client.stop_timer()
+                    self._emit(events.SESSION_STOPPED, session_type)
+                    await self._set_breathing_yellow()
+                    raise KeyboardInterrupt("User requested to stop cycle with 'q' key")
+            
+            status = await self._poll_status()
+            if not status:
+                self.display.show_error("Lost connection to device (the cycle keeps running on the device)")
+                self._emit(events.DEVICE_OFFLINE)
+                return
+            
+            schedule = status.get('schedule', {})
+            reached_limit = max_sessions is not None and schedule.get('completed', 0) >= max_sessions
+            if reached_limit and schedule.get('active'):
+                # The device would carry on with the next pass; end it here
+                await self.client.stop_timer()
+            if reached_limit or not schedule.get('active'):
+                if session_name:
+                    self.display.show_info(f"{session_name} complete!")
+                    self._play_sound('end', session_type)
+                    self._emit(events.SESSION_COMPLETED, session_type)
+                self.display.show_info("Pomodoro cycle finished")
+                return
+            
+            pomodoro = status.get('pomodoro', {})
+            session_key = schedule.get('completed')
+            if pomodoro.get('running') and session_key != last_session:
+                if session_name:
+                    self.display.show_info(f"{session_name} complete!")
+                    self._play_sound('end', session_type)
+                    self._emit(events.SESSION_COMPLETED, session_type)
+                    if session_type == 'work':
+                        work_sessions += 1
+                        self.display.console.print(f"[bold]Completed {work_sessions} work sessions[/bold]")
+                session_type = plan.session_at(schedule.get('index', 0))
+                session_name = SESSION_NAMES[session_type]
+                self.display.show_success(f"Started {session_name} session")
+                self._play_sound('start', session_type)
+                self._emit(events.SESSION_STARTED, session_type)
+                last_session = session_key
+            
+            if pomodoro.get('running'):
+                self.display.show_timer_progress(status)
+            await self.clock.sleep(self.config.display.refresh_interval)
+
+    async def _poll_status(self) -> Optional[Dict[str, Any]]:
+        """Get the status for a monitor loop, riding out a few failed polls
+        
+        Returns None only after MISSED_POLLS polls in a row have failed.
+        """
+        for missed in range(1, MISSED_POLLS + 1):
+            status = await self.client.get_status()
+            if status:
+                return status
+            self.display.print_verbose(f"Status poll failed ({missed}/{MISSED_POLLS})")
+            if missed < MISSED_POLLS:
+                await self.clock.sleep(self.config.display.refresh_interval)
+        return None
+    
     async def _start_and_monitor(self, session_type: str, custom_durations: dict = None) -> None:
         """Start a session (work/short/long) and monitor until it ends"""
         # Restore correct color before starting
@@ -522,9 +608,10 @@ class TimerManager:
         if not success:
             self.display.show_error(f"Failed to start {session_type} session")
             return
-        session_name = session_type.replace('_', ' ').title()
+        session_name = SESSION_NAMES[session_type]
         self.display.show_success(f"Started {session_name} session")
         self._play_sound('start', session_type)
+        self._emit(events.SESSION_STARTED, session_type)
         
         # Monitor session
         self.display.console.print("[dim]Press 'q' to stop this session and cycle[/dim]")
@@ -536,19 +623,22 @@ class TimerManager:
                     self.display.console.print("\n[yellow]Session stopped early[/yellow]")
                     # Stop the timer
                     await self.client.stop_timer()
+                    self._emit(events.SESSION_STOPPED, session_type)
                     # Set breathing yellow for stopped state
                     await self._set_breathing_yellow()
                     # Re-raise KeyboardInterrupt to stop the cycle
                     raise KeyboardInterrupt("User requested to stop cycle with 'q' key")
             
-            status = await self.client.get_status()
+            status = await self._poll_status()
             if not status:
                 self.display.show_error("Lost connection to device")
+                self._emit(events.DEVICE_OFFLINE)
                 return
             pomodoro = status.get('pomodoro', {})
             if not pomodoro.get('running'):
                 self.display.show_info(f"{session_name} complete!")
                 self._play_sound('end', session_type)
+                self._emit(events.SESSION_COMPLETED, session_type)
                 break
             self.display.show_timer_progress(status)
-            await asyncio.sleep(self.config.display.refresh_interval)
+            await self.clock.sleep(self.config.display.refresh_interval)
@@ -0,0 +1,207 @@
+"""Bounded time series of device status samples
+
+``monitor`` polls devices every second or so and used to drop each status
+once it was shown. A ``TimeSeriesStore`` keeps the recent ones instead, one
+``DeviceSeries`` per device, so trends (round-trip time, timer state,
+remaining time, uptime, missed polls) can be shown without an external
+database.
+
+Each metric is a ``RingBuffer``: a preallocated ``array`` of fixed
+capacity written in place, so an append is O(1) and never allocates, and a
+device costs 21 bytes per sample of capacity however long it is followed
+(1000 devices at the default capacity of 3600 samples is about 75 MB, and
+stays there). Once full, the oldest sample is overwritten.
+
+``downsample`` reduces a series to min/max/avg per time bucket, which is
+what ``sparkline`` draws.
+"""
+
+import math
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+DEFAULT_CAPACITY = 3600  # samples per device: an hour at one poll per second
+MISSED = -1  # state recorded for a poll that got no answer
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+METRICS = ('rtt', 'state', 'remaining', 'uptime', 'missed')
+
+
+class RingBuffer:
+    """Fixed-capacity numeric array; appending to a full buffer overwrites the oldest value"""
+
+    __slots__ = ('capacity', '_data', '_next', '_size')
+
+    def __init__(self, capacity: int, typecode: str = 'd'):
+        if capacity < 1:
+            raise ValueError("Capacity must be positive")
+        self.capacity = capacity
+        self._data = array(typecode, [0]) * capacity
+        self._next = 0
+        self._size = 0
+
+    def append(self, value: float) -> None:
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> float:
+        """Value by age order: 0 is the oldest kept, -1 the newest"""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("RingBuffer index out of range")
+        return self._data[(self._next - self._size + index) % self.capacity]
+
+    def __iter__(self) -> Iterator[float]:
+        return iter(self.values())
+
+    def values(self) -> List[float]:
+        """Every kept value, oldest first"""
+        if self._size < self.capacity:
+            return self._data[:self._size].tolist()
+        return self._data[self._next:].tolist() + self._data[:self._next].tolist()
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.itemsize * self.capacity
+
+
+@dataclass
+class Bucket:
+    """Summary of the samples that fell in one time slice"""
+    start: float  # seconds, on the clock the samples were recorded with
+    min: float
+    max: float
+    avg: float
+    count: int
+
+
+class DeviceSeries:
+    """Recent status samples of one device, one ring buffer per metric"""
+
+    __slots__ = ('time', 'rtt', 'state', 'remaining', 'uptime', 'samples', 'missed')
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.time = RingBuffer(capacity, 'd')  # seconds
+        self.rtt = RingBuffer(capacity, 'f')  # ms, NaN for a missed poll
+        self.state = RingBuffer(capacity, 'b')  # pomodoro state, MISSED for a missed poll
+        self.remaining = RingBuffer(capacity, 'i')  # seconds
+        self.uptime = RingBuffer(capacity, 'I')  # device millis(), wraps at 2^32
+        self.samples = 0  # polls recorded, including ones since overwritten
+        self.missed = 0
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def record(self, time: float, rtt_ms: float, status: Dict[str, Any]) -> None:
+        """Append a successful poll"""
+        pomodoro = status.get('pomodoro', {})
+        self._append(time, rtt_ms, pomodoro.get('state', 0), pomodoro.get('remaining', 0),
+                     status.get('uptime', 0))
+
+    def record_miss(self, time: float) -> None:
+        """Append a poll the device did not answer"""
+        self.missed += 1
+        self._append(time, math.nan, MISSED, 0, self.uptime[-1] if len(self.uptime) else 0)
+
+    def _append(self, time: float, rtt_ms: float, state: int, remaining: int, uptime: int) -> None:
+        self.samples += 1
+        self.time.append(time)
+        self.rtt.append(rtt_ms)
+        self.state.append(state)
+        self.remaining.append(remaining)
+        self.uptime.append(uptime & 0xFFFFFFFF)
+
+    def downsample(self, metric: str, buckets: int, start: Optional[float] = None,
+                   end: Optional[float] = None) -> List[Optional[Bucket]]:
+        """Min/max/avg of a metric over ``buckets`` equal time slices
+
+        Args:
+            metric: One of ``METRICS``; ``missed`` is 1 per missed poll, so
+                its avg is the miss rate
+            buckets: Number of slices
+            start, end: Time range (default: the samples kept)
+
+        Missed polls are left out of every metric but ``missed``. A slice
+        with no samples is None.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}'")
+        times = self.time.values()
+        if not times:
+            return [None] * buckets
+        start = times[0] if start is None else start
+        end = times[-1] if end is None else end
+        width = (end - start) / buckets or 1.0
+        states = self.state.values()
+        values = states if metric == 'missed' else getattr(self, metric).values()
+
+        sums = [0.0] * buckets
+        counts = [0] * buckets
+        lows = [math.inf] * buckets
+        highs = [-math.inf] * buckets
+        for time, value, state in zip(times, values, states):
+            if not start <= time <= end:
+                continue
+            if metric == 'missed':
+                value = 1.0 if state == MISSED else 0.0
+            elif state == MISSED:
+                continue
+            index = min(int((time - start) / width), buckets - 1)
+            sums[index] += value
+            counts[index] += 1
+            lows[index] = min(lows[index], value)
+            highs[index] = max(highs[index], value)
+        return [Bucket(start + index * width, lows[index], highs[index], sums[index] / counts[index], counts[index])
+                if counts[index] else None for index in range(buckets)]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in (self.time, self.rtt, self.state, self.remaining, self.uptime))
+
+
+class TimeSeriesStore:
+    """One ``DeviceSeries`` per device, created on first sample"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.devices: Dict[str, DeviceSeries] = {}
+
+    def series(self, device: str) -> DeviceSeries:
+        if device not in self.devices:
+            self.devices[device] = DeviceSeries(self.capacity)
+        return self.devices[device]
+
+    def record(self, device: str, time: float, rtt_ms: Optional[float], status: Optional[Dict[str, Any]]) -> None:
+        """Append one poll of a device; a None status is a missed poll"""
+        if status is None:
+            self.series(device).record_miss(time)
+        else:
+            self.series(device).record(time, rtt_ms if rtt_ms is not None else math.nan, status)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(series.nbytes for series in self.devices.values())
+
+
+def sparkline(values: Sequence[Optional[float]], low: Optional[float] = None, high: Optional[float] = None) -> str:
+    """One block character per value, scaled between ``low`` and ``high`` (default: the values' range)
+
+    None (an empty bucket) is drawn as a space.
+    """
+    present = [value for value in values if value is not None]
+    if not present:
+        return ' ' * len(values)
+    low = min(present) if low is None else low
+    high = max(present) if high is None else high
+    span = high - low
+    top = len(SPARK_CHARS) - 1
+    return ''.join(' ' if value is None else
+                   SPARK_CHARS[0 if span <= 0 else max(0, min(top, round((value - low) / span * top)))]
+                   for value in values)
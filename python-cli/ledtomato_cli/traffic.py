@@ -0,0 +1,300 @@
+"""Traffic capture and replay for LED Tomato CLI
+
+``--record FILE`` writes every device request the client makes (method,
+path, form body, status, response body, latency and errors) to a trace
+file; ``--replay FILE`` answers requests from such a trace instead of the
+network. Recording real sessions once and replaying them after a client
+change shows whether the change actually saves round-trips and bytes
+(``ledtomato trace diff``).
+
+Trace files are JSON lines, gzip-compressed when the name ends in ``.gz``.
+The first line of each recording is a header; every other line is one
+request::
+
+    {"format": 1, "created": "2026-10-19T09:30:00"}
+    {"t": 0.0, "sc": "start", "h": "192.168.1.50:80", "m": "GET", "p": "/api/status",
+     "s": 200, "b": "{...}", "l": 41.7}
+
+Short keys keep traces of long monitoring sessions small.
+"""
+
+import asyncio
+import base64
+import contextlib
+import gzip
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+
+TRACE_FORMAT = 1
+
+
+@dataclass
+class TraceEntry:
+    """One recorded request and its response"""
+    t: float  # seconds since the recording started
+    scenario: str
+    host: str
+    method: str
+    path: str
+    form: Dict[str, str] = field(default_factory=dict)
+    status: Optional[int] = None
+    body: bytes = b''
+    latency_ms: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.method} {self.path}"
+
+    @property
+    def bytes_sent(self) -> int:
+        """Size of the form-encoded request body"""
+        return len(urlencode(self.form)) if self.form else 0
+
+    @property
+    def bytes_received(self) -> int:
+        return len(self.body)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            't': round(self.t, 4), 'sc': self.scenario, 'h': self.host,
+            'm': self.method, 'p': self.path,
+        }
+        if self.form:
+            data['f'] = self.form
+        data['s'] = self.status
+        if self.body:
+            try:
+                data['b'] = self.body.decode('utf-8')
+            except UnicodeDecodeError:
+                data['b64'] = base64.b64encode(self.body).decode('ascii')
+        data['l'] = round(self.latency_ms, 2)
+        if self.error:
+            data['e'] = self.error
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TraceEntry':
+        if 'b64' in data:
+            body = base64.b64decode(data['b64'])
+        else:
+            body = data.get('b', '').encode('utf-8')
+        return cls(
+            t=data.get('t', 0.0), scenario=data.get('sc', 'default'), host=data.get('h', ''),
+            method=data['m'], path=data['p'], form=data.get('f', {}), status=data.get('s'),
+            body=body, latency_ms=data.get('l', 0.0), error=data.get('e'),
+        )
+
+
+def _open_trace(path: Path, mode: str) -> IO[str]:
+    if path.suffix == '.gz':
+        # Appending adds a gzip member; gzip.open reads them back as one stream
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class TraceRecorder:
+    """Collects requests made by ``LEDTomatoClient``"""
+
+    def __init__(self, scenario: str = 'default'):
+        """Initialize recorder
+
+        Args:
+            scenario: Label for requests recorded outside ``in_scenario``
+        """
+        self.scenario = scenario
+        self.entries: List[TraceEntry] = []
+        self._started = time.monotonic()
+
+    @contextlib.contextmanager
+    def in_scenario(self, name: str) -> Iterator[None]:
+        """Label requests made inside the block with ``name``"""
+        previous, self.scenario = self.scenario, name
+        try:
+            yield
+        finally:
+            self.scenario = previous
+
+    def record(self, host: str, method: str, path: str, form: Optional[Dict[str, str]],
+               status: Optional[int], body: Optional[bytes], latency_ms: float,
+               error: Optional[str] = None) -> TraceEntry:
+        """Record one request"""
+        entry = TraceEntry(
+            t=time.monotonic() - self._started - latency_ms / 1000.0,
+            scenario=self.scenario, host=host, method=method, path=path,
+            form={key: str(value) for key, value in (form or {}).items()},
+            status=status, body=body or b'', latency_ms=latency_ms, error=error,
+        )
+        self.entries.append(entry)
+        return entry
+
+    def save(self, path: Path, append: bool = True) -> None:
+        """Write the recorded requests to a trace file
+
+        Args:
+            path: Trace file (gzip-compressed if it ends in ``.gz``)
+            append: Add to an existing trace instead of replacing it
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with _open_trace(path, 'a' if append else 'w') as f:
+            header = {'format': TRACE_FORMAT, 'created': datetime.now().isoformat(timespec='seconds')}
+            f.write(json.dumps(header) + "\n")
+            for entry in self.entries:
+                f.write(json.dumps(entry.to_dict(), separators=(',', ':')) + "\n")
+
+
+class Trace:
+    """Requests loaded from a trace file"""
+
+    def __init__(self, entries: List[TraceEntry]):
+        self.entries = entries
+
+    @classmethod
+    def load(cls, path: Path) -> 'Trace':
+        """Load a trace file written by ``TraceRecorder.save``"""
+        entries = []
+        with _open_trace(path, 'r') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if 'format' in data:
+                    if data['format'] != TRACE_FORMAT:
+                        raise ValueError(f"{path}:{number}: unsupported trace format {data['format']}")
+                    continue
+                entries.append(TraceEntry.from_dict(data))
+        return cls(entries)
+
+    @property
+    def hosts(self) -> List[str]:
+        """Devices in the order they were first contacted"""
+        return list(dict.fromkeys(entry.host for entry in self.entries))
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Requests, bytes, errors and latency per scenario"""
+        scenarios: Dict[str, Dict[str, Any]] = {}
+        for entry in self.entries:
+            totals = scenarios.setdefault(entry.scenario, {
+                'requests': 0, 'bytes_sent': 0, 'bytes_received': 0, 'errors': 0,
+                'latency_ms': 0.0, 'endpoints': {},
+            })
+            totals['requests'] += 1
+            totals['bytes_sent'] += entry.bytes_sent
+            totals['bytes_received'] += entry.bytes_received
+            totals['latency_ms'] += entry.latency_ms
+            if entry.error or entry.status is None or entry.status >= 400:
+                totals['errors'] += 1
+            endpoints = totals['endpoints']
+            endpoints[entry.endpoint] = endpoints.get(entry.endpoint, 0) + 1
+        return scenarios
+
+
+class ReplayTransport:
+    """Answers client requests from a recorded trace
+
+    Requests are matched by method and path, in recorded order. When a
+    client asks an endpoint more often than the recording did (e.g. it
+    polls status for longer) the last recorded response is repeated;
+    endpoints the trace never saw get a 404. Pacing between requests is
+    up to the client, so only each request's latency is reproduced.
+    """
+
+    def __init__(self, trace: Trace, speed: float = 1.0, clock=None):
+        """Initialize replay
+
+        Args:
+            trace: Recorded requests
+            speed: Latency divisor; 1.0 replays original timing, 0 answers immediately
+            clock: ``Clock`` to sleep on (default: real time)
+        """
+        self.trace = trace
+        self.speed = speed
+        self.clock = clock
+        self.served = 0
+        self.unmatched = 0
+        self._queues: Dict[Tuple[str, str], List[TraceEntry]] = {}
+        for entry in trace.entries:
+            self._queues.setdefault((entry.method, entry.path), []).append(entry)
+        self._positions: Dict[Tuple[str, str], int] = {}
+
+    def _next(self, method: str, path: str) -> Optional[TraceEntry]:
+        key = (method.upper(), path)
+        queue = self._queues.get(key)
+        if not queue:
+            return None
+        position = self._positions.get(key, 0)
+        self._positions[key] = position + 1
+        return queue[min(position, len(queue) - 1)]
+
+    async def request(self, method: str, path: str, data: Optional[Dict[str, str]] = None,
+                      timeout: Optional[float] = None) -> Tuple[int, bytes]:
+        """Replay the recorded response to this request"""
+        entry = self._next(method, path)
+        delay = entry.latency_ms / 1000.0 / self.speed if entry and self.speed > 0 else 0.0
+        if self.clock is not None:
+            await self.clock.sleep(delay)
+        else:
+            await asyncio.sleep(delay)
+
+        if entry is None:
+            self.unmatched += 1
+            return 404, b'Not found'
+        self.served += 1
+        if entry.error or entry.status is None:
+            raise ConnectionError(f"Replayed failure: {entry.error or 'no response'}")
+        return entry.status, entry.body
+
+
+@dataclass
+class TraceDiff:
+    """One scenario compared between two traces"""
+    scenario: str
+    base: Dict[str, Any]
+    current: Dict[str, Any]
+
+    def change(self, key: str) -> Optional[int]:
+        """Difference in a counter, or None if the scenario is missing from either trace"""
+        if not self.base or not self.current:
+            return None
+        return self.current[key] - self.base[key]
+
+
+def diff_traces(base: Trace, current: Trace) -> List[TraceDiff]:
+    """Compare request counts and bytes per scenario"""
+    base_summary = base.summary()
+    current_summary = current.summary()
+    return [
+        TraceDiff(scenario, base_summary.get(scenario, {}), current_summary.get(scenario, {}))
+        for scenario in sorted(set(base_summary) | set(current_summary))
+    ]
+
+
+_recorder: Optional[TraceRecorder] = None
+_replay: Optional[ReplayTransport] = None
+
+
+def activate(recorder: Optional[TraceRecorder] = None, replay: Optional[ReplayTransport] = None) -> None:
+    """Record requests into ``recorder`` and/or answer them from ``replay``"""
+    global _recorder, _replay
+    _recorder = recorder
+    _replay = replay
+
+
+def deactivate() -> None:
+    """Stop recording and replaying"""
+    activate(None, None)
+
+
+def active_recorder() -> Optional[TraceRecorder]:
+    """Get the recorder capturing requests, if any"""
+    return _recorder
+
+
+def active_replay() -> Optional[ReplayTransport]:
+    """Get the trace answering requests, if any"""
+    return _replay
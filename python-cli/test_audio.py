@@ -0,0 +1,85 @@
+"""Tests for non-blocking audio playback"""
+
+import io
+import threading
+import time
+
+from rich.console import Console
+
+from ledtomato_cli.audio import AudioPlayer
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.config import Config, SoundConfig
+from ledtomato_cli.display import Display
+from ledtomato_cli.timer import TimerManager
+
+
+class FakeAudioPlayer(AudioPlayer):
+    """Records what would be played; each cue plays until ``release`` is set"""
+
+    def __init__(self, sound_config):
+        super().__init__(sound_config)
+        self.played = []
+        self.playing = threading.Event()
+        self.release = threading.Event()
+
+    def _play(self, sound):
+        self.played.append(sound.path.name)
+        self.playing.set()
+        self.release.wait(5)
+
+
+def sounds(tmp_path, count):
+    paths = []
+    for number in range(count):
+        path = tmp_path / f"cue{number}.mp3"
+        path.write_bytes(b'')
+        paths.append(str(path))
+    return paths
+
+
+def test_play_sound_returns_while_the_cue_plays(tmp_path):
+    config = Config()
+    config.sound.session_end_sound = sounds(tmp_path, 1)[0]
+    display = Display()
+    display.console = Console(file=io.StringIO(), width=100)
+    timer_manager = TimerManager(LEDTomatoClient('virtual'), display, config)
+    player = timer_manager.audio = FakeAudioPlayer(config.sound)
+
+    started = time.perf_counter()
+    timer_manager._play_sound('end', 'work')
+    assert time.perf_counter() - started < 0.05
+    assert player.playing.wait(5) and player.played == ['cue0.mp3']
+    player.release.set()
+    player.close()
+
+
+def burst(player, first, rest):
+    """Play ``first``, then ``rest`` while it is still playing; returns queue depths"""
+    player.play(first)
+    assert player.playing.wait(5)
+    depths = []
+    for sound_file in rest:
+        player.play(sound_file)
+        depths.append(player._queue.qsize())
+    return depths
+
+
+def test_burst_collapses_to_the_latest_cue_and_the_queue_stays_bounded(tmp_path):
+    first, *rest = sounds(tmp_path, 20)
+    player = FakeAudioPlayer(SoundConfig())
+    assert max(burst(player, first, rest)) <= AudioPlayer.QUEUE_SIZE
+    player.release.set()
+    deadline = time.monotonic() + 5
+    while len(player.played) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    player.close()
+    player._thread.join(5)
+    assert player.played == ['cue0.mp3', 'cue19.mp3']
+
+    # Closing with the queue full still stops the worker, skipping pending cues
+    player = FakeAudioPlayer(SoundConfig())
+    burst(player, first, rest)
+    player.close()
+    player.release.set()
+    player._thread.join(5)
+    assert not player._thread.is_alive() and player.played == ['cue0.mp3']
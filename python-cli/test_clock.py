@@ -0,0 +1,52 @@
+"""Tests for running Pomodoro cycles in virtual time"""
+
+import asyncio
+import io
+import time
+
+from rich.console import Console
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.config import Config
+from ledtomato_cli.display import Display
+from ledtomato_cli.emulator import DeviceTransport, VirtualDevice
+from ledtomato_cli.timer import TimerManager
+
+
+def run_cycle(sessions, schedules=True):
+    """Run a non-interactive cycle against an in-process device"""
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    if not schedules:
+        # Firmware from before device-side schedules
+        device.handle_pomodoro_schedule = lambda method, url, form: (404, 'text/plain', b'Not found', {})
+    client = LEDTomatoClient('virtual', transport=DeviceTransport(device))
+    display = Display(clock=clock)
+    display.console = Console(file=io.StringIO(), width=100)
+    config = Config()
+    config.sound.enabled = False
+    config.display.refresh_interval = 120.0
+
+    started = time.perf_counter()
+    asyncio.run(TimerManager(client, display, config).start_pomodoro_cycle(max_sessions=sessions, interactive=False))
+    return clock, device, display, time.perf_counter() - started
+
+
+def test_full_cycle_runs_in_virtual_time():
+    clock, device, display, elapsed = run_cycle(16)
+    output = display.console.file.getvalue()
+    assert elapsed < 1.0
+    # Long break after every 3 work sessions: 8 work, 6 short and 2 long breaks
+    assert clock.time() >= (8 * 25 + 6 * 5 + 2 * 15) * 60
+    assert device.schedule_completed >= 16 and not device.schedule_active
+    assert "Pomodoro cycle finished" in output
+    assert "Completed 8 work sessions" in output
+
+
+def test_cycle_without_device_schedules():
+    clock, device, display, elapsed = run_cycle(4, schedules=False)
+    output = display.console.file.getvalue()
+    assert elapsed < 1.0
+    assert clock.time() >= (2 * 25 + 2 * 5) * 60
+    assert "Completed 2 work sessions" in output
@@ -0,0 +1,85 @@
+"""Tests for coalesced config writes and the device's deferred NVS flush"""
+
+import asyncio
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.coalesce import CoalescingWriter
+from ledtomato_cli.emulator import DeviceTransport, VirtualDevice
+from ledtomato_cli.schedule import CyclePlan
+
+
+def test_writes_during_a_request_are_merged_into_the_next():
+    async def scenario():
+        sent = []
+        release = asyncio.Event()
+
+        async def send(form):
+            sent.append(form)
+            await release.wait()
+            return len(sent)
+
+        writer = CoalescingWriter(send)
+        first = asyncio.ensure_future(writer.write({'brightness': '0'}))
+        while not sent:
+            await asyncio.sleep(0)
+        rest = [asyncio.ensure_future(writer.write({'brightness': str(value)})) for value in range(1, 20)]
+        rest.append(asyncio.ensure_future(writer.write({'workTime': '1500'})))
+        release.set()
+        results = await asyncio.gather(first, *rest)
+        return writer, sent, results
+
+    writer, sent, results = asyncio.run(scenario())
+    assert sent == [{'brightness': '0'}, {'brightness': '19', 'workTime': '1500'}]
+    assert results == [1] + [2] * 20
+    assert writer.sent == 2 and writer.merged == 19 and not writer.busy
+
+
+def test_slider_patches_one_field_and_device_saves_once_settled():
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    device.work_time = 50 * 60
+    client = LEDTomatoClient('virtual', transport=DeviceTransport(device))
+
+    async def slide():
+        return await asyncio.gather(*(client.patch_config({'brightness': value}) for value in range(10, 210, 10)))
+
+    assert all(asyncio.run(slide()))
+    assert device.requests['/api/pomodoro/config'] == 1
+    assert device.brightness == 200 and device.work_time == 50 * 60  # only the patched field changed
+    assert device.nvs_writes == 0
+
+    device.update()
+    assert device.nvs_writes == 0  # still within CONFIG_FLUSH_DELAY of the change
+    clock.advance(2.5)
+    device.update()
+    assert device.nvs_writes == 1 and device.nvs['brightness'] == 200
+
+
+def test_pending_change_is_flushed_before_a_schedule_overrides_it():
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    plan = CyclePlan.compile(long_break_every=2, repeat=1, durations={'work': 60, 'short': 10, 'long': 20})
+    device.handle('POST', '/api/pomodoro/config', {'brightness': '40'})
+    device.handle('POST', '/api/pomodoro/schedule', plan.to_form())
+    assert device.nvs_writes == 1  # flushed ahead of the overrides, not after them
+    clock.advance(3)
+    device.update()
+    assert device.nvs_writes == 1
+    assert device.nvs['brightness'] == 40 and device.nvs['workTime'] == 25 * 60 * 1000
+
+
+def test_change_during_schedule_survives_a_quick_stop():
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    plan = CyclePlan.compile(long_break_every=2, repeat=1, durations={'work': 60, 'short': 10, 'long': 20})
+    device.handle('POST', '/api/pomodoro/schedule', plan.to_form())
+    device.handle('POST', '/api/pomodoro/config', {'breakColor': '0000FF'})
+    clock.advance(1)
+    device.handle('POST', '/api/pomodoro/stop', {})
+    assert device.break_color == 0x0000FF  # still live after the schedule ended
+    assert device.nvs_writes == 0
+    clock.advance(2)
+    device.update()
+    assert device.nvs_writes == 1 and device.nvs['breakColor'] == 0x0000FF
+    assert device.nvs['workTime'] == 25 * 60 * 1000
@@ -0,0 +1,93 @@
+"""Tests for per-command deadlines"""
+
+import asyncio
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from click.testing import CliRunner
+
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.deadline import Deadline, DeadlineExceeded
+from ledtomato_cli.emulator import EmulatorFleet, NetworkConditions
+from ledtomato_cli.main import cli
+
+
+@contextmanager
+def emulated_device(conditions=None):
+    """An emulated device served from its own thread, for CLI runs"""
+    loop = asyncio.new_event_loop()
+    fleet = EmulatorFleet(count=1, conditions=conditions)
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(fleet.__aenter__())
+        started.set()
+        loop.run_forever()
+        loop.run_until_complete(fleet.__aexit__(None, None, None))
+        pending = asyncio.all_tasks(loop)  # handlers still sleeping on a slow response
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    assert started.wait(5)
+    try:
+        yield fleet
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+
+
+def run(tmp_path, monkeypatch, *args):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    return CliRunner().invoke(cli, ['--config', str(tmp_path / 'config.json'), *args])
+
+
+def test_budget_is_split_and_exhausted():
+    clock = VirtualClock()
+    deadline = Deadline(10, clock=clock)
+    assert deadline.budget(8, reserve=5) == 5
+    clock.advance(7)
+    assert deadline.budget(5) == 3
+    clock.advance(3)
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        deadline.budget()
+
+
+def test_healthy_command_is_one_round_trip(tmp_path, monkeypatch):
+    with emulated_device() as fleet:
+        result = run(tmp_path, monkeypatch, 'status', '-d', fleet.addresses[0])
+        assert result.exit_code == 0, result.output
+        assert dict(fleet.devices[0].requests) == {'/api/status': 1}
+
+        result = run(tmp_path, monkeypatch, 'stop', '-d', fleet.addresses[0])
+        assert 'Timer stopped' in result.output
+        assert fleet.devices[0].requests['/api/pomodoro/stop'] == 1
+
+        fleet.devices[0].handle('POST', '/api/pomodoro/config', {'workTime': '3000'})
+        fleet.devices[0].requests.clear()
+        result = run(tmp_path, monkeypatch, 'config', '-d', fleet.addresses[0], '--brightness', '40')
+        assert 'Configuration updated' in result.output
+        assert fleet.devices[0].requests['/api/pomodoro/config'] == 1  # no read before the write
+        assert fleet.devices[0].brightness == 40 and fleet.devices[0].work_time == 50 * 60 * 1000
+
+
+def test_failures_are_explained_within_the_deadline(tmp_path, monkeypatch):
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+    result = run(tmp_path, monkeypatch, 'status', '-d', f'127.0.0.1:{port}')
+    assert 'connection refused' in result.output
+
+    with emulated_device(NetworkConditions(latency_ms=5000)) as fleet:
+        started = time.perf_counter()
+        result = run(tmp_path, monkeypatch, '--timeout', '1', 'stop', '-d', fleet.addresses[0])
+        assert time.perf_counter() - started < 2.5
+    assert 'did not answer in time' in result.output
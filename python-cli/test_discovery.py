@@ -0,0 +1,27 @@
+"""Tests for device discovery against emulated devices"""
+
+import asyncio
+
+from ledtomato_cli.discovery import DeviceDiscovery
+from ledtomato_cli.emulator import EmulatorFleet
+
+
+def test_scan_subnet_finds_loopback_devices():
+    async def scenario():
+        async with EmulatorFleet(count=5, base_port=8471, loopback=True,
+                                 loopback_network='127.0.0.0/24') as fleet:
+            devices = await DeviceDiscovery().scan_subnet('127.0.0.0/24', port=8471, concurrency=32)
+            assert sorted(device['ip'] for device in devices) == sorted(s.host for s in fleet.servers)
+            assert all(device['port'] == 8471 for device in devices)
+            assert {device['ip']: device['mac'] for device in devices} == \
+                {server.host: server.device.mac for server in fleet.servers}
+
+            discovery = DeviceDiscovery()
+
+            async def no_mdns(**kwargs):
+                return await discovery.scan_subnet('127.0.0.0/29', port=8471)
+
+            discovery._mdns_discovery = no_mdns
+            assert await discovery.find_device() == f"{fleet.servers[0].host}:8471"
+
+    asyncio.run(scenario())
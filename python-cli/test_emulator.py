@@ -0,0 +1,120 @@
+"""Tests for the device emulator against the real client"""
+
+import asyncio
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.emulator import DeviceTransport, EmulatorFleet, NetworkConditions, VirtualDevice
+from ledtomato_cli.emulator.device import parse_color
+from ledtomato_cli.schedule import CyclePlan
+
+
+def test_client_round_trip():
+    async def scenario():
+        async with EmulatorFleet(count=3) as fleet:
+            client = LEDTomatoClient(fleet.addresses[1])
+            assert await client.ping()
+            assert await client.start_timer('short_break')
+            status = await client.get_status()
+            assert status['pomodoro']['state'] == 2 and status['pomodoro']['running']
+            assert status['pomodoro']['duration'] == 300
+            assert 299 <= status['pomodoro']['remaining'] <= 300
+            assert status['ipAddress'] == fleet.servers[1].host
+
+            config = await client.get_config()
+            config['brightness'] = 200
+            config['workColor'] = '#0000FF'
+            assert await client.update_config(config)
+            config = await client.get_config()
+            assert config['brightness'] == 200
+            assert config['workColor'] == 'ff'  # String(color, HEX) drops leading zeros
+
+            assert await client.stop_timer()
+            assert fleet.servers[1].device.requests['/api/pomodoro/config'] == 3
+            assert fleet.servers[0].request_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_unknown_routes_and_methods_are_not_found():
+    device = VirtualDevice()
+    assert device.handle('GET', '/api/pomodoro/start', {})[0] == 404
+    assert device.handle('OPTIONS', '/api/status', {})[0] == 404
+    assert device.handle('GET', '/api/status/extra', {})[0] == 200
+    assert device.handle('POST', '/wifi-config', {'ssid': 'x'})[0] == 400
+
+
+def test_timer_expiry_and_schedule():
+    clock = VirtualClock(start=1000.0)
+    device = VirtualDevice(clock=clock)
+    plan = CyclePlan.compile(long_break_every=2, repeat=1, durations={'work': 60, 'short': 10, 'long': 20})
+    assert device.handle('POST', '/api/pomodoro/schedule', plan.to_form())[0] == 200
+
+    states = []
+    for _ in range(200):
+        device.update()
+        states.append((device.state, device.schedule_active))
+        clock.advance(1)
+    assert (1, True) in states and (2, True) in states and (3, True) in states
+    assert not device.schedule_active
+    # Schedule overrides are live only: the saved config is back
+    assert device.work_time == 25 * 60 * 1000
+
+
+def test_connection_limit_and_loss():
+    async def scenario():
+        conditions = NetworkConditions(latency_ms=50, max_connections=1)
+        async with EmulatorFleet(count=1, conditions=conditions) as fleet:
+            client = LEDTomatoClient(fleet.addresses[0])
+            results = await asyncio.gather(*(client.ping() for _ in range(4)))
+            assert results.count(True) >= 1
+            assert fleet.servers[0].refused >= 1
+
+        async with EmulatorFleet(count=1, conditions=NetworkConditions(loss=1.0)) as fleet:
+            assert not await LEDTomatoClient(fleet.addresses[0]).ping()
+            assert fleet.servers[0].dropped >= 1
+
+    asyncio.run(scenario())
+
+
+def test_parse_color_matches_strtol():
+    assert parse_color('#FF8000') == 0xFF8000
+    assert parse_color('zz') == 0
+    assert parse_color('FFFFFFFFFF') == 0xFFFFFF  # strtol saturates at LONG_MAX
+
+
+def test_config_post_during_schedule_saves_only_posted_fields():
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    plan = CyclePlan.compile(long_break_every=2, repeat=1, durations={'work': 60, 'short': 10, 'long': 20})
+    device.handle('POST', '/api/pomodoro/schedule', plan.to_form())
+    device.handle('POST', '/api/pomodoro/config', {'brightness': '40'})
+    clock.advance(3)
+    device.update()
+    device.handle('POST', '/api/pomodoro/stop', {})
+
+    assert device.nvs_writes == 1
+    assert device.nvs['brightness'] == 40
+    assert device.nvs['workTime'] == 25 * 60 * 1000  # not the schedule's 60 s
+    assert device.work_time == 25 * 60 * 1000 and device.brightness == 40
+
+
+def test_config_read_back_during_schedule_is_the_users():
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    client = LEDTomatoClient('virtual', transport=DeviceTransport(device))
+    plan = CyclePlan.compile(long_break_every=2, repeat=1, durations={'work': 600, 'short': 10, 'long': 20})
+    device.handle('POST', '/api/pomodoro/schedule', plan.to_form())
+
+    async def set_brightness():
+        config = await client.get_config()
+        config['brightness'] = 40
+        return config, await client.update_config(config)
+
+    config, updated = asyncio.run(set_brightness())
+    assert updated and config['workTime'] == 25 * 60 and config['schedule']['workTime'] == 600
+    device.handle('POST', '/api/pomodoro/stop', {})
+    clock.advance(3)
+    device.update()
+    assert device.saved_config['work_time'] == device.nvs['workTime'] == device.work_time == 25 * 60 * 1000
+    assert device.saved_config['brightness'] == device.nvs['brightness'] == 40
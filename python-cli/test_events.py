@@ -0,0 +1,167 @@
+"""Tests for session events and webhook delivery"""
+
+import asyncio
+import io
+import json
+import time
+
+from rich.console import Console
+
+from ledtomato_cli import events
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.config import Config
+from ledtomato_cli.display import Display
+from ledtomato_cli.emulator import DeviceTransport, EmulatorFleet, VirtualDevice, WebhookReceiver
+from ledtomato_cli.resilience import RetryPolicy
+from ledtomato_cli.timer import TimerManager
+from test_output import run_cli
+
+FAST_RETRY = RetryPolicy(attempts=4, base_delay=0.01, max_delay=0.01)
+
+
+def test_webhook_batches_retry_on_one_connection():
+    async def scenario():
+        async with WebhookReceiver() as receiver:
+            receiver.fail_next(2, status=503)
+            bus = events.EventBus()
+            sink = events.WebhookSink(receiver.url, retry=FAST_RETRY)
+            bus.subscribe(sink, batch_size=3, flush_interval=0.05)
+            started = time.perf_counter()
+            for number in range(7):
+                bus.emit(events.SESSION_STARTED, 'desk', session='work', number=number)
+            emitted = time.perf_counter() - started
+            await bus.close()
+            return receiver, sink, bus, emitted
+
+    receiver, sink, bus, emitted = asyncio.run(scenario())
+    assert emitted < 0.05  # emitting never waits on the receiver
+    assert [event['data']['number'] for event in receiver.events] == list(range(7))
+    assert [len(batch) for batch in receiver.batches] == [3, 3, 1]
+    assert sink.retries == 2 and receiver.rejected == 2
+    assert receiver.connections == 1  # every POST reused the kept-alive connection
+    assert bus.stats()['subscriptions'][0]['delivered'] == 7
+
+
+def test_full_queue_drops_oldest_or_spills_for_the_next_run(tmp_path):
+    async def stuck(batch):
+        await asyncio.Event().wait()
+
+    async def overflow(policy):
+        bus = events.EventBus()
+        subscription = bus.subscribe(stuck, queue_size=3, batch_size=2, flush_interval=0, overflow=policy,
+                                     spill_path=tmp_path / 'spill.ndjson')
+        for number in range(10):
+            bus.emit(events.SESSION_COMPLETED, 'desk', number=number)
+        kept = [event.data['number'] for event in subscription.queue]
+        await bus.close(timeout=0.05)
+        return subscription, kept
+
+    dropped, kept = asyncio.run(overflow(events.DROP_OLDEST))
+    assert kept == [7, 8, 9]
+    assert dropped.dropped == 10 and dropped.delivered == 0  # the newest 3 were still stuck at close
+
+    spilled, kept = asyncio.run(overflow(events.SPILL))
+    assert kept == [0, 1, 2]
+    assert spilled.dropped == 0 and spilled.pending == 10
+
+    received = []
+
+    async def deliver():
+        async def handler(batch):
+            received.extend(event.data['number'] for event in batch)
+
+        subscription = events.Subscription(handler, queue_size=3, flush_interval=0, overflow=events.SPILL,
+                                           spill_path=tmp_path / 'spill.ndjson')
+        await subscription.close()
+        return subscription
+
+    resumed = asyncio.run(deliver())
+    assert received == list(range(10)) and resumed.pending == 0
+    assert not (tmp_path / 'spill.ndjson').exists()
+
+
+def test_spill_keeps_batches_a_receiver_could_not_take(tmp_path):
+    async def scenario():
+        async with WebhookReceiver() as receiver:
+            receiver.fail_next(FAST_RETRY.attempts, status=503)  # down past the retry budget
+            bus = events.EventBus()
+            sink = events.WebhookSink(receiver.url, retry=FAST_RETRY)
+            subscription = bus.subscribe(sink, batch_size=3, flush_interval=0.05, overflow=events.SPILL,
+                                         spill_path=tmp_path / 'spill.ndjson')
+            for number in range(3):
+                bus.emit(events.SESSION_STARTED, 'desk', number=number)
+            for _ in range(100):
+                if subscription.spilled or subscription.failed:
+                    break
+                await asyncio.sleep(0.01)
+            assert subscription.pending == 3 and subscription.failed == 0
+
+            for number in range(3, 5):  # the receiver is back
+                bus.emit(events.SESSION_STARTED, 'desk', number=number)
+            await bus.close()
+
+            receiver.fail_next(1, status=400)  # never accepted: dropped, not spilled
+            rejected = events.Subscription(events.WebhookSink(receiver.url, retry=FAST_RETRY),
+                                           flush_interval=0, overflow=events.SPILL,
+                                           spill_path=tmp_path / 'rejected.ndjson')
+            rejected.offer(events.Event(events.SESSION_STOPPED, 'desk', '2026-10-19T09:00:00'))
+            await rejected.close()
+            return receiver, subscription, rejected
+
+    receiver, subscription, rejected = asyncio.run(scenario())
+    assert [event['data']['number'] for event in receiver.events] == list(range(5))
+    assert subscription.delivered == 5 and subscription.failed == 0 and subscription.pending == 0
+    assert not (tmp_path / 'spill.ndjson').exists()
+    assert rejected.failed == 1 and rejected.spilled == 0 and rejected.pending == 0
+
+
+def test_commands_post_to_configured_webhooks(tmp_path):
+    async def scenario():
+        async with EmulatorFleet(count=1) as fleet, WebhookReceiver() as receiver:
+            (tmp_path / 'config.json').write_text(json.dumps({'events': {
+                'webhooks': [{'url': receiver.url, 'events': [events.SESSION_STOPPED]}],
+                'flush_interval': 0}}))
+            code, _, _ = await run_cli(tmp_path, 'stop', '-d', fleet.addresses[0])
+            return code, receiver.events, fleet.addresses[0]
+
+    code, received, address = asyncio.run(scenario())
+    assert code == 0
+    assert [(event['type'], event['device']) for event in received] == [(events.SESSION_STOPPED, address)]
+
+
+def test_cycle_publishes_lifecycle_events():
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    client = LEDTomatoClient('virtual', transport=DeviceTransport(device))
+    display = Display(clock=clock)
+    display.console = Console(file=io.StringIO(), width=100)
+    config = Config()
+    config.sound.enabled = False
+    config.display.refresh_interval = 60.0
+    received = []
+
+    async def handler(batch):
+        received.extend((event.type, event.data.get('session')) for event in batch)
+
+    async def cycle():
+        bus = events.activate(events.EventBus(clock))
+        bus.subscribe(handler, flush_interval=0)
+        try:
+            await TimerManager(client, display, config).start_pomodoro_cycle(max_sessions=3, interactive=False)
+        finally:
+            events.deactivate()
+            await bus.close()
+
+    asyncio.run(cycle())
+    output = display.console.file.getvalue()
+    assert "Started Short Break session" in output and "Short Break complete!" in output
+    assert received == [
+        (events.SESSION_STARTED, 'work'), (events.SESSION_COMPLETED, 'work'),
+        (events.SESSION_STARTED, 'short_break'), (events.SESSION_COMPLETED, 'short_break'),
+        (events.SESSION_STARTED, 'work'), (events.SESSION_COMPLETED, 'work'),
+    ]
+    assert events.session_changes(
+        {'state': 'work', 'running': True, 'remaining': 600, 'duration': 1500},
+        {'state': 'idle', 'running': False, 'remaining': 0, 'duration': 0}, 1.0,
+    ) == [(events.SESSION_STOPPED, {'session': 'work', 'duration_minutes': 25})]
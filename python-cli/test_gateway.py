@@ -0,0 +1,177 @@
+"""Tests for the caching gateway"""
+
+import asyncio
+import json
+import os
+import sys
+
+import aiohttp
+
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.emulator import EmulatorFleet, NetworkConditions
+from ledtomato_cli.gateway import DeviceUpstream, Gateway
+from ledtomato_cli.outbox import Outbox
+from test_output import CLI_DIR
+
+
+def test_reads_are_cached_and_collapsed():
+    async def scenario():
+        clock = VirtualClock()
+        async with EmulatorFleet(count=2, conditions=NetworkConditions(latency_ms=20)) as fleet:
+            async with Gateway(fleet.addresses, ttl=0.5, clock=clock) as gateway, aiohttp.ClientSession() as session:
+                base = f"http://127.0.0.1:{gateway.port}"
+                first = fleet.addresses[0]
+
+                async def get(path):
+                    async with session.get(base + path) as response:
+                        return response.status, await response.json()
+
+                results = await asyncio.gather(*(get(f"/devices/{first}/api/status") for _ in range(40)))
+                assert all(status == 200 and body['hostname'] == 'ledtomato' for status, body in results)
+                await get(f"/devices/{first}/api/status")
+                assert fleet.devices[0].requests['/api/status'] == 1
+
+                clock.advance(0.5)
+                await get(f"/devices/{first}/api/status")
+                assert fleet.devices[0].requests['/api/status'] == 2
+
+                assert (await get("/api/status"))[0] == 404  # two devices, no default
+                assert (await get("/devices/10.9.9.9/api/status"))[0] == 404
+
+                fleet_status = (await get("/fleet/status"))[1]['devices']
+                assert set(fleet_status) == set(fleet.addresses)
+                stats = (await get("/gateway/stats"))[1]['devices'][first]
+                return stats
+
+    stats = asyncio.run(scenario())
+    # 43 reads of the first device, 2 upstream: the fleet status came from cache too
+    assert stats['upstream'] == 2 and stats['collapsed'] + stats['cache_hits'] == 41
+
+
+def test_writes_are_serialized_and_invalidate():
+    async def scenario():
+        async with EmulatorFleet(count=2) as fleet:
+            async with Gateway(fleet.addresses[:1], ttl=60) as gateway, aiohttp.ClientSession() as session:
+                base = f"http://127.0.0.1:{gateway.port}"
+
+                async with session.get(f"{base}/api/status") as response:
+                    assert (await response.json())['pomodoro']['running'] is False
+                posts = [session.post(f"{base}/api/pomodoro/start", data={'type': 'work'}) for _ in range(5)]
+                for response in await asyncio.gather(*posts):
+                    assert response.status == 200
+                    response.release()
+                async with session.get(f"{base}/api/status") as response:
+                    assert (await response.json())['pomodoro']['running'] is True
+
+                gateway.static_devices = list(fleet.addresses)
+                async with session.post(f"{base}/fleet/start", data={'type': 'short_break'}) as response:
+                    result = await response.json()
+                assert result['success'] and set(result['devices']) == set(fleet.addresses)
+                return fleet.devices, gateway.upstreams[fleet.addresses[0]].stats
+
+    devices, stats = asyncio.run(scenario())
+    assert all(device.running and device.state == 2 for device in devices)
+    assert stats.writes == 6 and stats.upstream == 8
+
+
+def test_read_in_flight_during_a_write_is_not_cached():
+    async def scenario():
+        upstream = DeviceUpstream('10.0.0.5', ttl=60, timeout=1, clock=VirtualClock())
+        state = {'running': False}
+        release = asyncio.Event()
+        calls = []
+
+        async def fake_upstream(method, path, form=None):
+            calls.append(method)
+            if method == 'POST':
+                state['running'] = True
+                return 200, b'{"success":true}'
+            body = json.dumps(state).encode()  # the device answers before the write lands...
+            if len(calls) == 1:
+                await release.wait()  # ...but the response is slow to arrive
+            return 200, body
+
+        upstream._upstream = fake_upstream
+        try:
+            slow_read = asyncio.create_task(upstream.read('/api/status'))
+            await asyncio.sleep(0)
+            await upstream.write('/api/pomodoro/start', {'type': 'work'})
+            fresh = asyncio.create_task(upstream.read('/api/status'))  # must not join the older read
+            await asyncio.sleep(0)
+            release.set()
+            assert json.loads((await slow_read)[1]) == {'running': False}
+            assert json.loads((await fresh)[1]) == {'running': True}
+            assert json.loads((await upstream.read('/api/status'))[1]) == {'running': True}
+            return calls
+        finally:
+            await upstream.close()
+
+    assert asyncio.run(scenario()) == ['GET', 'POST', 'GET']
+
+
+def test_writes_to_an_unreachable_device_are_queued_and_replayed(tmp_path):
+    async def scenario():
+        async with EmulatorFleet(count=1) as fleet:
+            server, device = fleet.servers[0], fleet.devices[0]
+            outbox = Outbox(tmp_path / 'outbox.json')
+            async with Gateway(fleet.addresses, timeout=1, outbox=outbox, retry_interval=0.05) as gateway, \
+                    aiohttp.ClientSession() as session:
+                base = f"http://127.0.0.1:{gateway.port}"
+                await server.stop()
+
+                async def post(path, form):
+                    async with session.post(base + path, data=form) as response:
+                        return response.status, await response.json()
+
+                for brightness in ('10', '20', '30'):
+                    assert (await post("/api/pomodoro/config", {'brightness': brightness}))[0] == 202
+                await post("/api/pomodoro/start", {'type': 'work'})
+                status, body = await post("/api/pomodoro/stop", {})
+                assert status == 202 and body['queued'] and body['pending'] == 1  # only the last config
+                assert len(Outbox.load(tmp_path / 'outbox.json').pending(fleet.addresses[0])) == 1
+
+                await server.start()
+                while gateway.upstreams[fleet.addresses[0]].draining:
+                    await asyncio.sleep(0.01)
+                async with session.get(f"{base}/gateway/stats") as response:
+                    return device, (await response.json())
+
+    device, stats = asyncio.run(scenario())
+    assert device.requests == {'/api/pomodoro/config': 1} and device.brightness == 30 and not device.running
+    assert stats['outbox'] == {'pending': {}, 'expired': 0, 'coalesced': 4}
+    assert stats['devices'][next(iter(stats['devices']))]['replayed'] == 1
+
+
+def test_gateway_reloads_settings_when_the_config_file_changes(tmp_path):
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps({'network': {'request_timeout': 5}}))
+
+    async def read_until(process, text):
+        while True:
+            line = (await asyncio.wait_for(process.stdout.readline(), 10)).decode()
+            assert line, f"gateway exited before printing {text!r}"
+            if text in line:
+                return line
+
+    async def scenario():
+        async with EmulatorFleet(count=1) as fleet:
+            env = dict(os.environ, XDG_CACHE_HOME=str(tmp_path / 'cache'), PYTHONUNBUFFERED='1')
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'ledtomato_cli.main', '--config', str(config_file),
+                'gateway', '-d', fleet.addresses[0], '--port', '0', '--no-queue',
+                cwd=CLI_DIR, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+            try:
+                url = (await read_until(process, 'Gateway listening on')).split()[-1]
+                config_file.write_text(json.dumps({'network': {'request_timeout': 12}}))
+                reloaded = await read_until(process, 'Reloaded settings')
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(f"{url}/gateway/stats") as response:
+                        stats = await response.json()
+            finally:
+                process.terminate()
+                await process.wait()
+            return reloaded, stats
+
+    reloaded, stats = asyncio.run(scenario())
+    assert 'request timeout 12s' in reloaded
+    assert stats['timeout'] == 12
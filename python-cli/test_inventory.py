@@ -0,0 +1,69 @@
+"""Tests for the fleet inventory and --select"""
+
+import asyncio
+import json
+
+import pytest
+
+from ledtomato_cli.emulator import EmulatorFleet
+from ledtomato_cli.inventory import Inventory, InventoryDevice, parse_selector
+from test_output import run_cli
+
+
+def test_selectors_intersect_labels_tags_and_groups():
+    inventory = Inventory(groups={'standup': ['desk-1', 'desk-3']})
+    inventory.add(InventoryDevice('desk-1', labels={'floor': '3', 'team': 'infra'}, tags=['quiet']))
+    inventory.add(InventoryDevice('desk-2', labels={'floor': '3', 'team': 'ops'}))
+    inventory.add(InventoryDevice('desk-3', labels={'floor': '4', 'team': 'infra'}))
+
+    def ids(selector):
+        return [device.id for device in inventory.select(selector)]
+
+    assert ids('floor=3,team=infra') == ['desk-1']
+    assert ids('floor=3|4,team=infra') == ['desk-1', 'desk-3']
+    assert ids('group=standup,floor=4') == ['desk-3']
+    assert ids('quiet') == ['desk-1']
+    assert ids('floor=5') == []
+    with pytest.raises(ValueError):
+        parse_selector('floor=3,,team=infra')
+
+
+def test_observed_devices_are_matched_and_cached(tmp_path):
+    path = tmp_path / 'inventory.json'
+    named = Inventory(path)
+    named.add(InventoryDevice('desk-1', mac='24:6f:28:aa:bb:01', labels={'floor': '3'}))
+    named.add(InventoryDevice('desk-2', hostname='desk-2.local'))
+    named.save()
+
+    inventory = Inventory.load(path)
+    assert inventory.target('desk-1') == 'desk-1'  # never seen: the name is all there is
+    assert inventory.observe('10.0.0.5', mac='24-6F-28-AA-BB-01', hostname='ledtomato', now=1.0).id == 'desk-1'
+    assert inventory.observe('10.0.0.6', hostname='desk-2.local', now=1.0).id == 'desk-2'
+    assert inventory.observe('10.0.0.7', hostname='ledtomato', now=1.0).id == '10.0.0.7'
+    # desk-1 moves to the stranger's address; the stranger's stale entry goes
+    inventory.observe('10.0.0.7', mac='24:6f:28:aa:bb:01', now=2.0)
+    assert '10.0.0.7' not in inventory.devices and inventory.target('desk-1') == '10.0.0.7'
+
+    reloaded = Inventory.load(path, inventory.cache())
+    assert reloaded.target('desk-1') == '10.0.0.7' and reloaded.target('desk-2') == '10.0.0.6'
+    assert [device.id for device in reloaded.select('floor=3')] == ['desk-1']
+    assert json.loads(path.read_text())['devices']['desk-1'] == {'mac': '24:6f:28:aa:bb:01', 'labels': {'floor': '3'}}
+
+
+def test_select_only_contacts_matching_devices(tmp_path):
+    async def scenario():
+        async with EmulatorFleet(count=2) as fleet:
+            first, second = fleet.addresses
+            inventory = tmp_path / 'config' / 'ledtomato-cli' / 'inventory.json'
+            inventory.parent.mkdir(parents=True)
+            inventory.write_text(json.dumps({'devices': {
+                'desk-1': {'address': first, 'labels': {'floor': '3'}},
+                'desk-2': {'address': second, 'labels': {'floor': '4'}}}}))
+            result = await run_cli(tmp_path, '-o', 'ndjson', 'monitor', '--select', 'floor=3', '--count', '1')
+            return fleet, result
+
+    fleet, (code, lines, _) = asyncio.run(scenario())
+    assert code == 0
+    ticks = [json.loads(line) for line in lines if json.loads(line)['event'] == 'tick']
+    assert [tick['device'] for tick in ticks] == [fleet.addresses[0]]
+    assert fleet.devices[1].requests == {}
@@ -0,0 +1,53 @@
+"""Tests for request metrics"""
+
+import asyncio
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.emulator import EmulatorFleet
+from ledtomato_cli.metrics import Histogram, MetricsRegistry
+
+
+def test_client_records_request_phases():
+    async def scenario():
+        registry = MetricsRegistry()
+        events = []
+        registry.subscribe(events.append)
+        async with EmulatorFleet(count=1) as fleet:
+            client = LEDTomatoClient(fleet.addresses[0], metrics=registry)
+            assert await client.get_status()
+            assert await client.stop_timer()
+            fleet.servers[0].conditions.loss = 1.0
+            assert await client.get_config() is None
+        return registry, events, fleet.addresses[0]
+
+    registry, events, device = asyncio.run(scenario())
+    assert [event.endpoint for event in events] == ['/api/status', '/api/pomodoro/stop', '/api/pomodoro/config']
+    status = events[0]
+    assert status.status == 200 and status.error is None
+    assert all(getattr(status, phase) is not None for phase in ('connect', 'ttfb', 'body', 'decode', 'total'))
+    assert events[1].decode is None  # POST responses are not decoded
+    assert events[2].error and events[2].status is None
+
+    assert registry.requests[('/api/status', device, '200')] == 1
+    assert registry.requests[('/api/pomodoro/config', device, 'error')] == 1
+    text = registry.to_prometheus()
+    assert f'ledtomato_request_phase_seconds_count{{phase="ttfb",endpoint="/api/status",device="{device}"}} 1' in text
+
+
+def test_histogram_quantiles_and_snapshot_round_trip(tmp_path):
+    histogram = Histogram()
+    for value in (0.2, 3, 4, 7, 20000):
+        histogram.observe(value)
+    assert histogram.count == 5
+    assert 2.5 < histogram.quantile(0.5) <= 5
+    assert histogram.quantile(1.0) == 10000  # +Inf bucket reports its lower bound
+
+    registry = MetricsRegistry()
+    registry.histograms[('total', '/api/status', 'd')] = histogram
+    registry.requests[('/api/status', 'd', '200')] = 5
+    registry.save(tmp_path / 'metrics.json')
+
+    loaded = MetricsRegistry.load(tmp_path / 'metrics.json')
+    loaded.merge(registry)
+    assert loaded.requests[('/api/status', 'd', '200')] == 10
+    assert loaded.histograms[('total', '/api/status', 'd')].count == 10
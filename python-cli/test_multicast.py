@@ -0,0 +1,136 @@
+"""Tests for the UDP multicast control channel"""
+
+import asyncio
+import socket
+
+from ledtomato_cli import multicast
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.emulator import EmulatorFleet, NetworkConditions, VirtualDevice
+from ledtomato_cli.multicast import Beacon, MulticastController
+
+KEY = bytes(range(16))
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_packet_authentication():
+    packet = multicast.encode_packet(KEY, multicast.PACKET_START, 7, 42, b'\x01')
+    decoded = multicast.decode_packet(KEY, packet)
+    assert (decoded.type, decoded.session, decoded.seq, decoded.payload) == (1, 7, 42, b'\x01')
+    assert multicast.decode_packet(bytes(16), packet) is None
+    tampered = packet[:14] + b'\x02' + packet[15:]
+    assert multicast.decode_packet(KEY, tampered) is None
+
+    beacon = Beacon('02:00:00:00:00:01', '10.0.0.9', 80, 1, True, False, True, 1499, 123456, 3)
+    assert Beacon.from_payload(beacon.to_payload()) == beacon
+    assert len(beacon.to_payload()) == 24 and beacon.address == '10.0.0.9'
+
+
+def test_device_executes_each_sequence_once():
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    start = multicast.encode_packet(KEY, multicast.PACKET_START, 9, 1, b'\x00')
+    assert device.handle_datagram(start) is None  # no key provisioned yet
+    device.handle('POST', '/api/multicast', {'key': KEY.hex()})
+
+    ack = multicast.decode_packet(KEY, device.handle_datagram(start))
+    assert (ack.type, ack.seq) == (multicast.PACKET_ACK, 1)
+    assert multicast.ACK_PAYLOAD.unpack(ack.payload)[1:] == (multicast.ACK_OK, 9)
+    started = device.start_time
+    clock.advance(5)
+    assert device.handle_datagram(start) is not None  # retransmission: re-acknowledged
+    assert device.start_time == started
+
+    rejected = multicast.encode_packet(KEY, multicast.PACKET_START, 9, 2, b'\x07')
+    ack = multicast.decode_packet(KEY, device.handle_datagram(rejected))
+    assert multicast.ACK_PAYLOAD.unpack(ack.payload)[1] == multicast.ACK_REJECTED
+
+
+def test_replayed_epoch_does_not_restart_a_stopped_device():
+    device = VirtualDevice(clock=VirtualClock())
+    device.handle('POST', '/api/multicast', {'key': KEY.hex()})
+    start_a = multicast.encode_packet(KEY, multicast.PACKET_START, 1, 1, b'\x00')
+    stop_b = multicast.encode_packet(KEY, multicast.PACKET_STOP, 2, 1)
+    device.handle_datagram(start_a)
+    device.handle_datagram(stop_b)
+    assert not device.running
+
+    for epoch in range(3, 20):
+        device.handle_datagram(multicast.encode_packet(KEY, multicast.PACKET_STOP, epoch, 1))
+    ack = multicast.decode_packet(KEY, device.handle_datagram(start_a))  # however many epochs later
+    mac, result, epoch = multicast.ACK_PAYLOAD.unpack(ack.payload)
+    assert (result, epoch) == (multicast.ACK_STALE, 19) and not device.running
+
+    device.restart()
+    device.handle_datagram(start_a)  # the epoch is kept in NVS
+    assert not device.running and device.multicast_epoch == 19
+
+    device.handle('POST', '/api/multicast', {'key': bytes(16).hex()})  # epochs count per key
+    restart = multicast.encode_packet(bytes(16), multicast.PACKET_START, 1, 1, b'\x00')
+    device.handle_datagram(restart)
+    assert device.running
+
+
+def test_controller_epoch_persists_and_resyncs(tmp_path):
+    epoch_file = tmp_path / 'multicast.json'
+    assert MulticastController(KEY, epoch_file=epoch_file).session == 1
+    assert MulticastController(KEY, epoch_file=epoch_file).session == 2
+    assert MulticastController(bytes(16), epoch_file=epoch_file).session == 1
+    assert KEY.hex() not in epoch_file.read_text()
+
+    async def scenario():
+        fleet = EmulatorFleet(count=2, multicast_group='127.0.0.1', multicast_key=KEY, seed=5)
+        async with fleet:
+            for device in fleet.devices:
+                device.multicast_epoch = 40  # e.g. driven from another machine
+            group, port = fleet.multicast.address
+            async with MulticastController(KEY, group, port, ack_timeout=0.2,
+                                           epoch_file=epoch_file) as controller:
+                for address in fleet.addresses:
+                    await controller.register(address)
+                stale = await controller.start('work')
+                assert stale.ok and not stale.acked and all(stale.stale.values())
+                assert len(stale.fallback) == 2 and controller.session == 41
+                stopped = await controller.stop()
+                assert stopped.ok and len(stopped.acked) == 2 and not stopped.fallback
+                return fleet.devices
+
+    devices = asyncio.run(scenario())
+    assert not any(device.running for device in devices)
+    assert MulticastController(KEY, epoch_file=epoch_file).session == 42
+
+
+def test_broadcast_acks_retransmits_and_falls_back():
+    async def scenario():
+        beacon_port = free_udp_port()
+        fleet = EmulatorFleet(count=5, multicast_group='127.0.0.1', multicast_key=KEY,
+                              beacon_target=('127.0.0.1', beacon_port), beacon_interval=0.05, seed=3)
+        async with fleet:
+            group, port = fleet.multicast.address
+            async with MulticastController(KEY, group, port, ack_timeout=0.2) as controller:
+                beacons = await controller.listen_beacons(0.2, port=beacon_port)
+                assert set(beacons) == {device.mac for device in fleet.devices}
+                assert set(controller.devices.values()) == set(fleet.addresses)
+
+                started = await controller.start('short_break')
+                assert started.ok and len(started.acked) == 5 and started.retransmits == 0
+                assert all(device.running and device.state == 2 for device in fleet.devices)
+
+                # Lossy link: retransmissions reach most devices, HTTP the rest
+                fleet.multicast.conditions = NetworkConditions(loss=0.6)
+                stopped = await controller.stop()
+                assert stopped.ok and stopped.retransmits == controller.retries
+                assert len(stopped.acked) + len(stopped.fallback) == 5
+                assert not any(device.running for device in fleet.devices)
+
+                fleet.multicast.conditions = NetworkConditions(loss=1.0)
+                configured = await controller.configure({'workTime': 1800, 'brightness': 40})
+                assert configured.ok and len(configured.fallback) == 5
+                return fleet.devices
+
+    devices = asyncio.run(scenario())
+    assert all(device.work_time == 1800 * 1000 and device.brightness == 40 for device in devices)
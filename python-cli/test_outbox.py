@@ -0,0 +1,53 @@
+"""Tests for the offline command queue"""
+
+from ledtomato_cli.outbox import Outbox
+
+START, STOP, CONFIG = '/api/pomodoro/start', '/api/pomodoro/stop', '/api/pomodoro/config'
+
+
+def test_commands_coalesce_and_expire():
+    outbox = Outbox(ttl={'start': 10.0})
+
+    def kinds(now=0.0):
+        return [(command.kind, command.form) for command in outbox.pending('desk', now)]
+
+    outbox.put('desk', STOP, {}, now=0)
+    outbox.put('desk', START, {'type': 'work'}, now=0)
+    outbox.put('desk', START, {'type': 'short_break'}, now=0)
+    assert kinds() == [('stop', {}), ('start', {'type': 'short_break'})]  # a restart; the latest start wins
+    outbox.put('desk', STOP, {}, now=1)
+    outbox.put('desk', STOP, {}, now=1)
+    assert kinds() == [('stop', {})]
+
+    outbox.put('desk', START, {'type': 'work'}, now=2)
+    assert kinds(now=11.0) == [('stop', {}), ('start', {'type': 'work'})]
+    assert kinds(now=12.0) == [('stop', {})] and outbox.expired == 1
+
+    # A stop that arrives while the start is being delivered is queued, not
+    # coalesced; if the start then fails, putting it back cancels both
+    outbox.put('desk', START, {'type': 'work'}, now=20)
+    assert outbox.take('desk', now=20).kind == 'stop'
+    started = outbox.take('desk', now=20)
+    outbox.put('desk', STOP, {}, now=20)
+    assert kinds(now=20) == [('stop', {})]
+    outbox.restore('desk', started)
+    assert kinds(now=20) == []
+
+
+def test_queued_configs_merge_fields():
+    outbox = Outbox()
+    outbox.put('desk', CONFIG, {'brightness': '50'}, now=0)
+    outbox.put('desk', CONFIG, {'workColor': '00FF00'}, now=5)
+    outbox.put('desk', CONFIG, {'brightness': '80'}, now=6)
+    [command] = outbox.pending('desk', now=6)
+    assert command.form == {'brightness': '80', 'workColor': '00FF00'}
+    assert command.queued_at == 6 and command.expires == 6 + outbox.ttl['config']
+
+
+def test_merged_config_keeps_its_place_before_a_start():
+    outbox = Outbox()
+    outbox.put('desk', CONFIG, {'workTime': '3000'}, now=0)
+    outbox.put('desk', START, {'type': 'work'}, now=1)
+    outbox.put('desk', CONFIG, {'brightness': '40'}, now=2)
+    assert [(command.kind, command.form) for command in outbox.pending('desk', now=2)] == [
+        ('config', {'workTime': '3000', 'brightness': '40'}), ('start', {'type': 'work'})]
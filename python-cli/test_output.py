@@ -0,0 +1,63 @@
+"""Tests for --output json/ndjson"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.emulator import EmulatorFleet
+
+CLI_DIR = Path(__file__).parent
+
+
+async def run_cli(tmp_path, *args):
+    """Run the CLI in a fresh interpreter; returns (exit code, stdout lines, imported modules)"""
+    env = dict(os.environ, XDG_CACHE_HOME=str(tmp_path / 'cache'), XDG_CONFIG_HOME=str(tmp_path / 'config'))
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-X', 'importtime', '-m', 'ledtomato_cli.main',
+        '--config', str(tmp_path / 'config.json'), *args,
+        cwd=CLI_DIR, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await process.communicate()
+    modules = set(re.findall(r'^import time:.*\|\s+([\w.]+)$', stderr.decode(), re.M))
+    return process.returncode, stdout.decode().splitlines(), modules
+
+
+def test_status_and_stats_are_single_documents(tmp_path):
+    async def scenario():
+        async with EmulatorFleet(count=1) as fleet:
+            return await run_cli(tmp_path, '--output', 'json', 'status', '-d', fleet.addresses[0])
+
+    code, lines, modules = asyncio.run(scenario())
+    assert code == 0 and len(lines) == 1
+    document = json.loads(lines[0])
+    assert document['event'] == 'status' and document['status']['hostname'] == 'ledtomato'
+    assert 'rich' not in modules and 'colorama' not in modules
+
+    code, lines, _ = asyncio.run(run_cli(tmp_path, '-o', 'json', 'stats'))
+    assert code == 0 and json.loads(lines[0])['total_sessions'] == 0
+
+    code, lines, _ = asyncio.run(run_cli(tmp_path, '-o', 'json', 'start'))
+    assert code == 2 and lines == []  # not machine-readable
+
+
+def test_monitor_streams_ndjson(tmp_path):
+    async def scenario():
+        async with EmulatorFleet(count=2) as fleet:
+            first, second = fleet.addresses
+            assert await LEDTomatoClient(first).start_timer('work')
+            return fleet.addresses, await run_cli(tmp_path, '--output', 'ndjson', 'monitor', '-d', first,
+                                                  '-d', second, '--interval', '0.05', '--count', '3')
+
+    (first, second), (code, lines, modules) = asyncio.run(scenario())
+    assert code == 0
+    events = [json.loads(line) for line in lines]
+    ticks = [event for event in events if event['event'] == 'tick']
+    assert len(ticks) == 6 and all(tick['running'] == (tick['device'] == first) for tick in ticks)
+    states = {(event['device'], event['from'], event['to']) for event in events if event['event'] == 'state'}
+    assert states == {(first, None, 'work'), (second, None, 'idle')}
+    trends = [event['devices'] for event in events if event['event'] == 'trends']
+    assert len(trends) == 1 and trends[0][first]['samples'] == 3 and trends[0][second]['missed'] == 0
+    assert 'rich' not in modules and 'colorama' not in modules
@@ -0,0 +1,87 @@
+"""Tests for passive device presence tracking"""
+
+import asyncio
+import socket
+from types import SimpleNamespace
+
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.discovery import LEDTomatoServiceListener
+from ledtomato_cli.emulator import EmulatorFleet
+from ledtomato_cli.presence import DeviceTable, PresenceTracker
+
+KEY = bytes(range(16))
+
+
+def test_listener_deduplicates_and_forgets():
+    info = SimpleNamespace(addresses=[socket.inet_aton('10.0.0.5')], server='ledtomato.local.', port=80, host_ttl=120)
+    zc = SimpleNamespace(get_service_info=lambda type_, name: info)
+    changes = []
+    listener = LEDTomatoServiceListener(on_change=lambda kind, name, device: changes.append((kind, device['ip'])))
+
+    listener.add_service(zc, '_http._tcp.local.', 'LED Tomato._http._tcp.local.')
+    listener.add_service(zc, '_http._tcp.local.', 'LED Tomato._http._tcp.local.')
+    info.addresses = [socket.inet_aton('10.0.0.6')]
+    listener.update_service(zc, '_http._tcp.local.', 'LED Tomato._http._tcp.local.')
+    assert [device['ip'] for device in listener.devices] == ['10.0.0.6']
+
+    listener.remove_service(zc, '_http._tcp.local.', 'LED Tomato._http._tcp.local.')
+    assert listener.devices == []
+    assert changes == [('add', '10.0.0.5'), ('update', '10.0.0.5'), ('update', '10.0.0.6'), ('remove', '10.0.0.6')]
+
+
+def test_table_tracks_moves_expiry_and_goodbyes():
+    async def scenario():
+        clock = VirtualClock(start=50.0)
+        table = DeviceTable(clock=clock)
+        table.observe('10.0.0.5', hostname='ledtomato.local', service='a', ttl=120)
+        feed = table.changes()
+        events = [await feed.__anext__()]  # snapshot
+
+        # A beacon from the same address attaches the MAC; later ones move it
+        table.observe('10.0.0.5', mac='02:00:00:00:00:01', ttl=15, source='beacon')
+        assert list(table.devices) == ['02:00:00:00:00:01']
+        clock.advance(10)
+        assert table.observe('10.0.0.5', mac='02:00:00:00:00:01', ttl=15, source='beacon') is None
+        table.observe('10.0.0.9', mac='02:00:00:00:00:01', ttl=15, source='beacon')
+
+        clock.advance(100)
+        assert table.expire() == []  # the mDNS TTL still holds
+        clock.advance(20)
+        table.expire()
+        assert table.online() == []
+        table.observe('10.0.0.9', hostname='ledtomato.local', service='a')
+        table.remove(service='a')
+        while len(events) < 6:
+            events.append(await feed.__anext__())
+        await feed.aclose()
+        return table, events
+
+    table, events = asyncio.run(scenario())
+    assert [event.kind for event in events] == ['added', 'updated', 'moved', 'offline', 'added', 'removed']
+    device = events[-1].device
+    assert device.previous_addresses == ['10.0.0.5'] and device.first_seen == 50.0
+    assert table.devices == {}
+
+
+def test_tracker_follows_beacons():
+    async def scenario():
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(('127.0.0.1', 0))
+            beacon_port = sock.getsockname()[1]
+        fleet = EmulatorFleet(count=3, multicast_group='127.0.0.1', multicast_key=KEY,
+                              beacon_target=('127.0.0.1', beacon_port), beacon_interval=0.05)
+        async with fleet:
+            async with PresenceTracker(mdns=False, beacon_key=KEY, beacon_group='127.0.0.1',
+                                       beacon_port=beacon_port, sweep_interval=0.05) as tracker:
+                feed = tracker.table.changes()
+                added = {(await feed.__anext__()).device.address for _ in range(3)}
+                assert added == set(fleet.addresses)
+
+                fleet.devices[0].multicast_key = None  # stops beaconing
+                tracker.table.devices[fleet.devices[0].mac].expires = 0
+                event = await asyncio.wait_for(feed.__anext__(), 1)
+                await feed.aclose()
+                assert (event.kind, event.device.mac) == ('offline', fleet.devices[0].mac)
+                assert len(tracker.table.online()) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,30 @@
+"""Tests for the event loop profiler"""
+
+import asyncio
+import json
+import time
+
+from ledtomato_cli.profiling import LoopProfiler
+
+
+async def _blocks_the_loop():
+    await asyncio.sleep(0.05)
+    time.sleep(0.2)
+    await asyncio.sleep(0.05)
+    return 'done'
+
+
+def test_profiler_reports_blocking_call(tmp_path):
+    profiler = LoopProfiler(tmp_path, name='test', profiler='sampling')
+    assert profiler.run(_blocks_the_loop()) == 'done'
+
+    report = profiler.report()
+    assert report['loop_lag']['max_ms'] >= 150
+    assert report['slow_callbacks'] >= 1
+    sites = report['blocking']
+    assert sites and sites[0]['site'].startswith('test_profiling.py:')
+    assert '_blocks_the_loop' in sites[0]['site']
+
+    saved = json.loads((tmp_path / [p for p in report['files'] if p.endswith('.json')][0]).read_text())
+    assert saved['blocking'][0]['site'] == sites[0]['site']
+    assert any(path.endswith('.folded') for path in report['files'])
@@ -0,0 +1,86 @@
+"""Tests for retries, circuit breakers and hedged reads"""
+
+import asyncio
+import time
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.emulator import DeviceTransport, NetworkConditions, VirtualDevice
+from ledtomato_cli.metrics import MetricsRegistry
+from ledtomato_cli.resilience import CircuitOpenError, Resilience
+
+
+def test_retries_only_what_is_safe_to_repeat():
+    async def scenario():
+        registry = MetricsRegistry()
+        device = VirtualDevice()
+        transport = DeviceTransport(device, NetworkConditions(loss=0.4), seed=5)
+        client = LEDTomatoClient('virtual', metrics=registry, transport=transport,
+                                 resilience=Resilience(seed=1, failure_threshold=100))
+        statuses = [await client.get_status() for _ in range(20)]
+        starts = [await client.start_timer('work') for _ in range(20)]
+        return registry, statuses, starts, device
+
+    registry, statuses, starts, device = asyncio.run(scenario())
+    # Resets are retried for reads; a start that may have arrived is not repeated
+    assert sum(status is not None for status in statuses) >= 18
+    assert registry.retries[('/api/status', 'virtual:80')] > 0
+    assert ('/api/pomodoro/start', 'virtual:80') not in registry.retries
+    assert device.requests['/api/pomodoro/start'] == sum(starts)
+
+
+def test_circuit_opens_and_recovers():
+    async def scenario():
+        clock = VirtualClock()
+        registry = MetricsRegistry()
+        conditions = NetworkConditions(loss=1.0)
+        resilience = Resilience(failure_threshold=3, reset_timeout=15, clock=clock)
+        client = LEDTomatoClient('virtual', metrics=registry, resilience=resilience,
+                                 transport=DeviceTransport(VirtualDevice(), conditions))
+        for _ in range(3):
+            assert not await client.ping()
+        assert registry.circuits == {'virtual:80': 'open'}
+        try:
+            await client._request('GET', '/api/status')
+            raise AssertionError("expected the open circuit to short-circuit")
+        except CircuitOpenError:
+            pass
+
+        conditions.loss = 0.0
+        clock.advance(15)  # half-open: one trial call closes it again
+        assert await client.ping()
+        return registry
+
+    registry = asyncio.run(scenario())
+    assert registry.circuits == {'virtual:80': 'closed'}
+    assert registry.requests[('/api/status', 'virtual:80', 'error')] == 4
+    assert 'ledtomato_circuit_open{device="virtual:80"} 0' in registry.to_prometheus()
+
+
+class StallingTransport:
+    """Answers at once, except every ``stall_every``-th request hangs for a second"""
+
+    def __init__(self, stall_every):
+        self.stall_every = stall_every
+        self.requests = 0
+
+    async def request(self, method, path, data, timeout):
+        self.requests += 1
+        await asyncio.sleep(1.0 if self.requests % self.stall_every == 0 else 0.002)
+        return 200, b'{"pomodoro": {"running": false}}'
+
+
+def test_slow_status_reads_are_hedged():
+    async def scenario():
+        registry = MetricsRegistry()
+        client = LEDTomatoClient('virtual', metrics=registry, transport=StallingTransport(stall_every=11),
+                                 resilience=Resilience(hedge=True, hedge_min_samples=10))
+        for _ in range(10):
+            await client.get_status()
+        started = time.perf_counter()
+        assert await client.get_status() is not None  # the 11th request stalls, the hedge answers
+        return registry, time.perf_counter() - started
+
+    registry, elapsed = asyncio.run(scenario())
+    assert elapsed < 0.5
+    assert registry.hedges == {('/api/status', 'virtual:80'): 1}
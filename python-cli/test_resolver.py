@@ -0,0 +1,66 @@
+"""Tests for the .local hostname resolver cache"""
+
+import asyncio
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.emulator import EmulatorFleet
+from ledtomato_cli.resolver import MDNSResolver
+
+
+def test_cache_refreshes_ahead_and_falls_back():
+    async def scenario():
+        answers = {'ledtomato.local': ('127.0.0.1', 100.0)}
+        queries = []
+
+        async def query(name):
+            queries.append(name)
+            return answers.get(name)
+
+        clock = VirtualClock()
+        resolver = MDNSResolver(clock=clock, query=query)
+        assert await resolver.resolve('LEDTomato.local.') == '127.0.0.1'
+        clock.advance(50)
+        assert await resolver.resolve('ledtomato.local') == '127.0.0.1'
+        assert len(queries) == 1  # served from cache
+
+        clock.advance(35)  # past 80% of the TTL: answered from cache, renewed in the background
+        answers['ledtomato.local'] = ('127.0.0.1', 100.0)
+        assert await resolver.resolve('ledtomato.local') == '127.0.0.1'
+        await asyncio.sleep(0)
+        assert len(queries) == 2 and resolver.entries['ledtomato.local'].expires == 185.0
+
+        # Expired and silent on mDNS: the last known address is used only while it answers
+        async with EmulatorFleet(count=1) as fleet:
+            port = int(fleet.addresses[0].split(':')[1])
+            del answers['ledtomato.local']
+            clock.advance(200)
+            assert await resolver.resolve('ledtomato.local', port) == '127.0.0.1'
+        assert await resolver.resolve('ledtomato.local', port) is None
+        return resolver
+
+    resolver = asyncio.run(scenario())
+    assert (resolver.hits, resolver.misses, resolver.fallbacks) == (2, 3, 1)
+
+
+def test_client_uses_resolved_address(tmp_path):
+    async def scenario():
+        async def query(name):
+            return '127.0.0.1', 120.0
+
+        async with EmulatorFleet(count=1) as fleet:
+            port = int(fleet.addresses[0].split(':')[1])
+            resolver = MDNSResolver(cache_file=tmp_path / 'hosts.json', query=query)
+            client = LEDTomatoClient(f'ledtomato.local:{port}', resolver=resolver)
+            assert (await client.get_status())['hostname'] == 'ledtomato'
+            assert resolver.save()
+
+            async def silent(name):
+                return None
+
+            # A new process starts from the persisted entry without querying
+            warm = MDNSResolver(cache_file=tmp_path / 'hosts.json', query=silent)
+            assert await LEDTomatoClient(f'ledtomato.local:{port}', resolver=warm).ping()
+            assert warm.hits == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+"""Tests for wave-based config rollouts"""
+
+import asyncio
+import socket
+
+import pytest
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.emulator import EmulatorFleet
+from ledtomato_cli.rollout import DevicePlan, RolloutPlan, config_diff, parse_policy, plan_rollout, run_rollout
+
+
+def test_policy_diff_normalizes_device_values():
+    policy = parse_policy({'pomodoro': {'work_time': 50, 'break_color': '00ff00', 'brightness': 128}})
+    assert policy == {'work_time': 50, 'break_color': '#00FF00', 'brightness': 128}
+    # Firmware colors are lowercase and unpadded; times are seconds
+    device = {'workTime': 1500, 'breakColor': 'ff00', 'brightness': 128}
+    assert config_diff(device, policy) == {'work_time': (25, 50)}
+    for bad in ({'work_time': 0}, {'work_color': 'red'}, {'volume': 1}, {}):
+        with pytest.raises(ValueError):
+            parse_policy(bad)
+
+
+def test_rollout_skips_compliant_devices_and_runs_waves():
+    async def scenario():
+        async with EmulatorFleet(count=6) as fleet:
+            clients = {address: LEDTomatoClient(address) for address in fleet.addresses}
+            policy = parse_policy({'work_time': 50, 'work_color': '#FF8800'})
+            assert await clients[fleet.addresses[0]].update_config({'workTime': 3000, 'workColor': 'ff8800'})
+            fleet.devices[0].requests.clear()
+
+            plan = await plan_rollout(clients, policy)
+            report = await run_rollout(clients, plan, canary=1, wave_size=2)
+            configs = [await client.get_config() for client in clients.values()]
+            return fleet, plan, report, configs
+
+    fleet, plan, report, configs = asyncio.run(scenario())
+    assert [device.device for device in plan.compliant] == [fleet.addresses[0]]
+    assert fleet.devices[0].requests == {'/api/pomodoro/config': 2}  # the plan's read and the check above
+    assert [(wave.name, len(wave.devices)) for wave in report.waves] == [('canary', 1), ('wave 1', 2),
+                                                                         ('wave 2', 2)]
+    assert len(report.updated) == 5 and not report.failed and report.halted is None
+    assert all(config['workTime'] == 3000 and config['workColor'] == 'ff8800' for config in configs)
+    assert all(config['breakColor'] == 'ff00' for config in configs)  # fields outside the policy kept
+
+
+def test_rollout_writes_only_policy_fields():
+    async def scenario():
+        async with EmulatorFleet(count=1) as fleet:
+            client = LEDTomatoClient(fleet.addresses[0])
+            plan = await plan_rollout({fleet.addresses[0]: client}, parse_policy({'work_time': 50}))
+            assert await client.patch_config({'brightness': 40})  # changed after planning
+            report = await run_rollout({fleet.addresses[0]: client}, plan)
+            return report, await client.get_config()
+
+    report, config = asyncio.run(scenario())
+    assert report.updated and config['workTime'] == 3000 and config['brightness'] == 40
+
+
+def test_rollout_halts_above_failure_rate():
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        dead = f"127.0.0.1:{closed.getsockname()[1]}"
+
+    async def scenario():
+        async with EmulatorFleet(count=3) as fleet:
+            first, second, third = fleet.addresses
+            order = [first, dead, second, third]
+            clients = {address: LEDTomatoClient(address, report_errors=False) for address in order}
+            plan = RolloutPlan({'brightness': 10}, [DevicePlan(address, {'brightness': (128, 10)}, {})
+                                                    for address in order])
+            report = await run_rollout(clients, plan, canary=1, wave_size=2, max_failure_rate=0.25)
+            return fleet, report
+
+    fleet, report = asyncio.run(scenario())
+    assert [wave.name for wave in report.waves] == ['canary', 'wave 1']
+    assert list(report.failed) == [dead] and 'refused' in report.failed[dead]
+    assert report.skipped == [fleet.addresses[2]] and 'above 25%' in report.halted
+    assert fleet.devices[2].requests == {}
@@ -0,0 +1,97 @@
+"""Tests for the segmented session log"""
+
+import json
+from datetime import datetime, timedelta
+
+from ledtomato_cli.sessionlog import SessionLog
+
+
+def _entry(timestamp, session_type='work', minutes=25):
+    return {
+        'timestamp': timestamp.isoformat(),
+        'type': session_type,
+        'duration_minutes': minutes,
+        'completed': True
+    }
+
+
+def test_rotation_compresses_closed_months(tmp_path):
+    log = SessionLog(tmp_path / "sessions")
+    log.append(_entry(datetime(2026, 9, 30, 9, 0)))
+    log.append(_entry(datetime(2026, 10, 1, 9, 0)))
+
+    names = sorted(p.name for p in (tmp_path / "sessions").iterdir())
+    assert "2026-10.jsonl" in names
+    assert any(name.startswith("2026-09.jsonl.") for name in names)
+
+
+def test_range_queries_and_stats(tmp_path):
+    log = SessionLog(tmp_path / "sessions")
+    start = datetime(2026, 8, 1, 8, 0)
+    for i in range(300):
+        log.append(_entry(start + timedelta(hours=6 * i), 'work' if i % 2 == 0 else 'short break'))
+
+    since = datetime(2026, 9, 10)
+    until = datetime(2026, 9, 20)
+    entries = list(log.iter_entries(since=since, until=until))
+    assert entries
+    assert all(since <= datetime.fromisoformat(e['timestamp']) <= until for e in entries)
+    assert len(entries) == 40
+
+    # A fresh instance reads the persisted index
+    stats = SessionLog(tmp_path / "sessions").stats(now=datetime(2026, 10, 14, 12, 0))
+    assert stats['total_sessions'] == 300
+    assert stats['work_sessions'] == 150
+    assert stats['today_sessions'] == 4
+    assert stats['this_week_sessions'] == 13
+
+
+def test_compact_migrates_legacy_log(tmp_path):
+    legacy = tmp_path / "sessions.log"
+    with open(legacy, 'w') as f:
+        f.write(f"{_entry(datetime(2026, 1, 5, 9, 0))}\n")
+        f.write("not a dict\n")
+        f.write(f"{_entry(datetime(2026, 2, 5, 9, 0), 'long break', 15)}\n")
+
+    log = SessionLog(tmp_path / "sessions", legacy_file=legacy)
+    result = log.compact(now=datetime(2026, 10, 1))
+    assert result['migrated'] == 2
+    assert result['compressed'] == 2
+    assert not legacy.exists()
+
+    stats = log.stats(now=datetime(2026, 10, 1))
+    assert stats['total_sessions'] == 2
+    assert stats['total_time_minutes'] == 40
+
+
+def test_legacy_log_is_merged_in_order_on_first_use(tmp_path):
+    log = SessionLog(tmp_path / "sessions")
+    log.append(_entry(datetime(2026, 9, 20, 9, 0)))
+    log.append(_entry(datetime(2026, 10, 2, 9, 0)))
+
+    legacy = tmp_path / "sessions.log"
+    with open(legacy, 'w') as f:
+        f.write(f"{_entry(datetime(2026, 9, 25, 9, 0), 'short break', 5)}\n")
+        f.write(f"{_entry(datetime(2026, 9, 10, 9, 0))}\n")
+        f.write(f"{_entry(datetime(2026, 10, 1, 9, 0))}\n")
+
+    log = SessionLog(tmp_path / "sessions", legacy_file=legacy)
+    stats = log.stats(now=datetime(2026, 10, 2, 12, 0))
+    assert stats['total_sessions'] == 5
+    assert stats['total_time_minutes'] == 105
+    assert stats['today_sessions'] == 1 and stats['this_week_sessions'] == 2
+    assert not legacy.exists()
+
+    timestamps = [entry['timestamp'] for entry in log.iter_entries()]
+    assert timestamps == sorted(timestamps) and len(timestamps) == 5
+    since = datetime(2026, 9, 15)
+    assert len(list(log.iter_entries(since=since))) == 4
+
+
+def test_index_rebuilt_when_segments_change_behind_it(tmp_path):
+    log = SessionLog(tmp_path / "sessions")
+    log.append(_entry(datetime(2026, 10, 1, 9, 0)))
+    with open(tmp_path / "sessions" / "2026-10.jsonl", 'a') as f:
+        f.write(json.dumps(_entry(datetime(2026, 10, 3, 9, 0))) + "\n")
+
+    assert SessionLog(tmp_path / "sessions").stats(now=datetime(2026, 10, 3))['total_sessions'] == 2
@@ -0,0 +1,94 @@
+"""Cold-start budget for the CLI entry point
+
+Runs ``python -X importtime`` in a fresh interpreter and fails if importing
+``ledtomato_cli.main`` regresses past the budget, or if help output pulls in
+the heavy modules that should only load on first use. Config loads, which
+share cached snapshots, are checked here too.
+"""
+
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+CLI_DIR = Path(__file__).parent
+
+# Cumulative import time budget for ledtomato_cli.main, in microseconds
+IMPORT_BUDGET_US = 150_000
+
+HEAVY_MODULES = ('rich', 'aiohttp', 'zeroconf', 'colorama', 'playsound', 'asyncio')
+
+
+def _run_python(*args):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=CLI_DIR, capture_output=True, text=True, timeout=60
+    )
+
+
+def _import_time_us():
+    result = _run_python("-X", "importtime", "-c", "import ledtomato_cli.main")
+    assert result.returncode == 0, result.stderr
+    match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| ledtomato_cli\.main$", result.stderr, re.M)
+    assert match, result.stderr
+    return int(match.group(1))
+
+
+def test_import_time_budget():
+    # Best of three cold starts to smooth out scheduler noise
+    best = min(_import_time_us() for _ in range(3))
+    assert best < IMPORT_BUDGET_US, f"ledtomato_cli.main imported in {best} us (budget {IMPORT_BUDGET_US} us)"
+
+
+def test_help_does_not_import_heavy_modules():
+    script = (
+        "import sys\n"
+        "from ledtomato_cli.main import cli\n"
+        "for args in (['--help'], ['stop', '--help'], ['status', '--help']):\n"
+        "    try:\n"
+        "        cli(args, prog_name='ledtomato')\n"
+        "    except SystemExit:\n"
+        "        pass\n"
+        f"print('loaded=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    result = _run_python("-c", script)
+    assert result.returncode == 0, result.stderr
+    loaded = result.stdout.strip().splitlines()[-1]
+    assert loaded == "loaded=", f"help output imported: {loaded[len('loaded='):]}"
+
+
+def test_config_load_creates_no_directories(tmp_path):
+    env_script = (
+        "import os\n"
+        f"root = {str(tmp_path)!r}\n"
+        "for name in ('XDG_CONFIG_HOME', 'XDG_DATA_HOME', 'XDG_CACHE_HOME'):\n"
+        "    os.environ[name] = os.path.join(root, name)\n"
+        "from ledtomato_cli.config import Config\n"
+        "Config.load()\n"
+        "print('entries=' + ','.join(sorted(os.listdir(root))))\n"
+    )
+    result = _run_python("-c", env_script)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "entries="
+
+
+def test_loaded_configs_share_no_state_and_warn_on_stderr(tmp_path, capsys):
+    from ledtomato_cli.config import Config
+
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({
+        'network': {'preferred_devices': ['desk'], 'retries': -1},
+        'events': {'webhooks': [{'url': 'http://hooks.local/a', 'headers': {'X-Team': 'infra'}}]},
+    }))
+    first = Config.load(str(config_file))
+    first.network.preferred_devices.append('lab')
+    first.events.webhooks[0]['headers']['X-Team'] = 'ops'
+    first.events.webhooks.append('http://hooks.local/b')
+
+    second = Config.load(str(config_file))  # served from the cached snapshot
+    assert second.network.preferred_devices == ['desk']
+    assert second.events.webhooks == [{'url': 'http://hooks.local/a', 'headers': {'X-Team': 'infra'}}]
+
+    captured = capsys.readouterr()
+    assert "Retries must not be negative" in captured.err and not captured.out
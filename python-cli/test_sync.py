@@ -0,0 +1,53 @@
+"""Tests for clock offset estimation and synchronized starts"""
+
+import asyncio
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.emulator import DeviceTransport, EmulatorFleet, NetworkConditions, VirtualDevice
+from ledtomato_cli.sync import estimate_offset, synchronized_start
+
+
+def test_offset_estimate_uses_lowest_rtt():
+    async def scenario():
+        clock = VirtualClock(start=100.0)
+        device = VirtualDevice(clock=clock)
+        device.boot_time -= 3600.0  # booted an hour before the client's clock reading
+        conditions = NetworkConditions(latency_ms=40, jitter_ms=30)
+        client = LEDTomatoClient('virtual', transport=DeviceTransport(device, conditions, seed=7))
+        return device, clock, await estimate_offset(client, probes=8, clock=clock)
+
+    device, clock, estimate = asyncio.run(scenario())
+    true_offset = device.millis() - clock.time() * 1000.0
+    assert estimate.samples == 8 and estimate.rtt_ms < 40
+    # The transport delays the response only, so the error is at most rtt / 2
+    assert abs(estimate.offset_ms - true_offset) <= estimate.rtt_ms / 2 + 1
+
+
+def test_fleet_starts_together():
+    async def scenario():
+        async with EmulatorFleet(count=4, conditions=NetworkConditions(latency_ms=5, jitter_ms=4)) as fleet:
+            for index, device in enumerate(fleet.devices):
+                device.boot_time -= 1000.0 * (index + 1) + 0.123 * index  # unrelated uptimes
+            clients = {address: LEDTomatoClient(address) for address in fleet.addresses}
+            results = await synchronized_start(clients, 'work', lead=0.3, probes=4)
+            return results, fleet.devices
+
+    results, devices = asyncio.run(scenario())
+    assert all(result.synchronized for result in results)
+    assert all(abs(result.skew_ms) < 50 for result in results)
+    # Ground truth: when each device's session began on the shared host clock
+    starts = [device.boot_time + device.started_at / 1000.0 for device in devices]
+    assert max(starts) - min(starts) < 0.05
+    assert all(device.running and device.state == 1 for device in devices)
+
+
+def test_started_at_is_when_the_armed_start_fired():
+    clock = VirtualClock()
+    device = VirtualDevice(clock=clock)
+    start_at = device.millis() + 1000
+    device.handle('POST', '/api/pomodoro/start', {'type': 'work', 'start_at': str(start_at)})
+    clock.advance(1.25)  # loop() got to it 250 ms late
+    device.update()
+    assert device.running and device.start_time == start_at
+    assert device.started_at == device.millis() == start_at + 250
@@ -0,0 +1,55 @@
+"""Tests for bounded status time series"""
+
+import math
+import tracemalloc
+
+from ledtomato_cli.timeseries import RingBuffer, TimeSeriesStore, sparkline
+
+
+def status(state, remaining, uptime=0):
+    return {'uptime': uptime, 'pomodoro': {'state': state, 'remaining': remaining}}
+
+
+def test_ring_buffer_keeps_the_newest_values():
+    buffer = RingBuffer(3, 'i')
+    for value in range(5):
+        buffer.append(value)
+    assert buffer.values() == [2, 3, 4] and list(buffer) == [2, 3, 4]
+    assert len(buffer) == 3 and buffer[0] == 2 and buffer[-1] == 4
+    assert buffer.nbytes == 3 * buffer._data.itemsize
+
+
+def test_downsample_buckets_and_missed_polls():
+    store = TimeSeriesStore(capacity=100)
+    for second in range(10):
+        if second in (4, 5):
+            store.record('desk', float(second), None, None)
+        else:
+            store.record('desk', float(second), 10.0 + second, status(1, 100 - second))
+    series = store.devices['desk']
+    rtt = series.downsample('rtt', 5, start=0, end=10)
+    assert [bucket.avg if bucket else None for bucket in rtt] == [10.5, 12.5, None, 16.5, 18.5]
+    assert rtt[0].min == 10 and rtt[0].max == 11 and rtt[0].count == 2
+    assert [bucket.avg for bucket in series.downsample('missed', 5, start=0, end=10)] == [0, 0, 1, 0, 0]
+    assert series.missed == 2 and math.isnan(series.rtt[4])
+    assert sparkline([1, None, 3, 5]) == '▁ ▅█' and sparkline([None, None]) == '  '
+
+
+def test_memory_stays_flat_once_full():
+    store = TimeSeriesStore(capacity=60)
+    for second in range(60):
+        for device in range(100):
+            store.record(f"10.0.{device}", float(second), 12.5, status(1, 1500 - second, second * 1000))
+    size = store.nbytes
+    assert size == 100 * 60 * 21
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for second in range(60, 600):
+        for device in range(100):
+            store.record(f"10.0.{device}", float(second), 12.5, status(1, 1500 - second, second * 1000))
+    grown = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename')
+                if stat.traceback[0].filename.endswith('timeseries.py'))
+    tracemalloc.stop()
+    assert store.nbytes == size and grown < 4096
+    assert store.devices['10.0.0'].samples == 600 and store.devices['10.0.0'].time[0] == 540.0
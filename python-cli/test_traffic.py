@@ -0,0 +1,70 @@
+"""Tests for trace recording and replay"""
+
+import asyncio
+
+from click.testing import CliRunner
+
+from ledtomato_cli.client import LEDTomatoClient
+from ledtomato_cli.clock import VirtualClock
+from ledtomato_cli.emulator import DeviceTransport, VirtualDevice
+from ledtomato_cli.main import cli
+from ledtomato_cli.traffic import ReplayTransport, Trace, TraceRecorder, diff_traces
+
+
+def record_session(path):
+    async def scenario():
+        clock = VirtualClock()
+        recorder = TraceRecorder()
+        client = LEDTomatoClient('10.0.0.7', transport=DeviceTransport(VirtualDevice(clock=clock)),
+                                 recorder=recorder)
+        with recorder.in_scenario('start'):
+            assert await client.start_timer('work')
+            assert (await client.get_status())['pomodoro']['running']
+        with recorder.in_scenario('stop'):
+            assert await client.stop_timer()
+            await client.get_status()
+        recorder.save(path)
+
+    asyncio.run(scenario())
+
+
+def test_record_and_replay(tmp_path):
+    path = tmp_path / 'session.jsonl.gz'
+    record_session(path)
+    trace = Trace.load(path)
+    assert trace.hosts == ['10.0.0.7:80']
+    summary = trace.summary()
+    assert summary['start']['requests'] == 2 and summary['stop']['requests'] == 2
+    assert summary['start']['bytes_sent'] == len('type=work')
+    assert summary['start']['endpoints'] == {'POST /api/pomodoro/start': 1, 'GET /api/status': 1}
+
+    async def replay():
+        transport = ReplayTransport(trace, speed=0)
+        client = LEDTomatoClient('10.0.0.7', transport=transport)
+        assert await client.start_timer('work')
+        first = await client.get_status()
+        second = await client.get_status()
+        # Asking more often than recorded repeats the last response
+        third = await client.get_status()
+        assert await client.get_config() is None
+        return transport, first, second, third
+
+    transport, first, second, third = asyncio.run(replay())
+    assert first['pomodoro']['running'] and not second['pomodoro']['running']
+    assert third == second
+    assert transport.served == 4 and transport.unmatched == 1
+
+
+def test_cli_replay_and_diff(tmp_path):
+    base = tmp_path / 'base.jsonl'
+    record_session(base)
+    current = tmp_path / 'current.jsonl'
+    runner = CliRunner()
+    result = runner.invoke(cli, ['--replay', str(base), '--replay-speed', '0', '--record', str(current), 'status'])
+    assert result.exit_code == 0, result.output
+    assert Trace.load(current).summary()['status']['requests'] == 1  # no ping preflight
+
+    rows = {row.scenario: row for row in diff_traces(Trace.load(base), Trace.load(current))}
+    assert rows['status'].change('requests') is None and rows['start'].current == {}
+    result = runner.invoke(cli, ['trace', 'diff', str(base), str(current)])
+    assert result.exit_code == 0 and 'Trace Diff' in result.output